@@ -1,7 +1,7 @@
 # backend/config/api_router.py
 
 from rest_framework.routers import DefaultRouter
-from repositories.views import BatchDocumentModuleView, ChatView, CohesiveTestGenerationView, ComplexityGraphView, ComplexityHotspotsView, CoverageUploadView, DashboardSummaryView, DocumentationSummaryView, LatestCoverageReportView, OrganizationDetailView, OrganizationListView, OrphanSymbolsView, RepositorySelectorListView, RepositoryViewSet,GithubReposView,FileContentView,GenerateDocstringView, CodeSymbolDetailView, RunTestsInSandboxView, SymbolAnalysisView, set_csrf_cookie
+from repositories.views import BatchDocumentModuleView, ComplexityGraphView, ComplexityHotspotsView, CoverageUploadView, DashboardSummaryView, DocumentationSummaryView, LatestCoverageReportView, OrganizationDetailView, OrganizationListView, OrphanSymbolsView, RepositorySelectorListView, RepositoryViewSet,GithubReposView,FileContentView, CodeSymbolDetailView, RunTestsInSandboxView, SymbolAnalysisView, set_csrf_cookie
 
 router = DefaultRouter()
 from django.urls import path # Make sure path is imported
@@ -14,28 +14,32 @@ from repositories.views import (
     RepositoryViewSet, 
     GithubReposView, 
     FileContentView, 
-    GenerateDocstringView, 
     SaveDocstringView,
     CodeSymbolDetailView,
     GenerateArchitectureDiagramView,
     SemanticSearchView,
+    OrganizationSemanticSearchView,
     CreateDocPRView,BatchGenerateDocsForFileView,
     CreateBatchDocsPRView,ProposeChangeView,
-    SummarizeModuleView,
     ModuleCoverageView ,
     ModuleDocumentationView,
     
     # --- IMPORT THE NEW VIEWS (we will create these next) ---
     BatchGenerateDocsForSelectedFilesView,
     CreateBatchPRForSelectedFilesView,
-    TaskStatusView,ApproveDocstringView,ExplainCodeView, SuggestTestsView,RepositoryInsightsView,CommitHistoryView,
-    ClassSummaryView,ReprocessRepositoryView, SuggestRefactorsView,GenerateModuleWorkflowView,DependencyGraphView,OrganizationMemberListView,
+    TaskStatusView,ApproveDocstringView,RepositoryInsightsView,CommitHistoryView,
+    ReprocessRepositoryView,GenerateModuleWorkflowView,DependencyGraphView,OrganizationMemberListView,
     OrganizationMemberDetailView,
     InvitationListView,
-    AcceptInviteView,GenerateModuleReadmeView,StreamModuleReadmeView,
+    AcceptInviteView,GenerateModuleReadmeView,
     LocalRepositoryUploadView
 )
 from repositories.views import CodeFileDetailView
+# Streaming endpoints are async views, served without blocking a worker under ASGI.
+from repositories.async_views import (
+    ChatView, ClassSummaryView, CohesiveTestGenerationView, ExplainCodeView, GenerateDocstringView,
+    StreamModuleReadmeView, SuggestRefactorsView, SuggestTestsView, SummarizeModuleView,
+)
 
 
 
@@ -92,6 +96,7 @@ urlpatterns += [
     path('organizations/<int:org_id>/members/', OrganizationMemberListView.as_view(), name='organization-member-list'),
     path('organizations/<int:org_id>/members/<int:membership_id>/', OrganizationMemberDetailView.as_view(), name='organization-member-detail'),
     path('organizations/<int:org_id>/invites/', InvitationListView.as_view(), name='organization-invites'),
+    path('organizations/<int:org_id>/search/semantic/', OrganizationSemanticSearchView.as_view(), name='organization-semantic-search'),
     path('invites/accept/<uuid:token>/', AcceptInviteView.as_view(), name='accept-invite'),
     path('auth/logout/', LogoutView.as_view(), name='api-logout'),
     path('repositories/<int:repo_id>/intelligence/complexity-hotspots/', ComplexityHotspotsView.as_view(), name='repository-complexity-hotspots'),
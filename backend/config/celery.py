@@ -19,6 +19,10 @@ app.conf.beat_schedule = {
         'schedule': crontab(minute='*/5'),  # Run every 5 minutes
         'args': (), # No arguments needed for this task
     },
+    'flush-ai-usage-counters': {
+        'task': 'repositories.tasks.flush_ai_usage_task',
+        'schedule': 60.0,  # Every minute; counters are exact in Redis in between
+    },
     # You can add other scheduled tasks here in the future
 }
 
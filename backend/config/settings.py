@@ -87,6 +87,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "config.wsgi.application"
+ASGI_APPLICATION = "config.asgi.application"
 
 
 # Database
@@ -98,6 +99,165 @@ DATABASES = {
 CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND')
 
+# Shared cache for all web and worker processes (search results, task dedupe).
+REDIS_URL = env.str('REDIS_URL', default=CELERY_BROKER_URL)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
+# --- Prompt context packs ---
+# How long a symbol's or class's precomputed prompt context stays cached (see
+# context_packs.py); re-ingestion and documentation saves retire it earlier.
+HELIX_CONTEXT_PACK_CACHE_SECONDS = env.int('HELIX_CONTEXT_PACK_CACHE_SECONDS', default=86400)
+
+# --- Access control ---
+# How long a user's organization/repository ids stay cached (see access.py);
+# membership and repository changes invalidate them before that.
+HELIX_ACCESS_CACHE_SECONDS = env.int('HELIX_ACCESS_CACHE_SECONDS', default=600)
+
+# --- AI usage metering ---
+# Monthly AI request counters live in Redis (see usage.py) and are flushed to
+# Organization every minute; how long an organization's limit is cached.
+HELIX_USAGE_QUOTA_CACHE_SECONDS = env.int('HELIX_USAGE_QUOTA_CACHE_SECONDS', default=300)
+
+# --- Retrieval / vector search tuning ---
+# Size of the HNSW candidate list used by knowledge and semantic searches.
+# Higher values trade latency for recall (pgvector's default is 40).
+HELIX_HNSW_EF_SEARCH = env.int('HELIX_HNSW_EF_SEARCH', default=100)
+# Iterative index scans (pgvector >= 0.8) keep filtered searches from returning
+# too few rows. Set to an empty string on older pgvector versions.
+HELIX_HNSW_ITERATIVE_SCAN = env.str('HELIX_HNSW_ITERATIVE_SCAN', default='relaxed_order')
+# Repositories with at least this many embedded symbols get their own partial HNSW index.
+HELIX_SYMBOL_PARTIAL_INDEX_MIN_ROWS = env.int('HELIX_SYMBOL_PARTIAL_INDEX_MIN_ROWS', default=50000)
+# Compact index used for ANN candidates: 'halfvec' (half-precision cast of the
+# full embedding) or 'reduced' (PCA projection, see `manage.py migrate_vector_storage`).
+HELIX_VECTOR_SEARCH_MODE = env.str('HELIX_VECTOR_SEARCH_MODE', default='halfvec')
+# Candidates fetched per requested result before the full-precision rerank.
+HELIX_VECTOR_RERANK_FACTOR = env.int('HELIX_VECTOR_RERANK_FACTOR', default=4)
+# Coarse-to-fine knowledge search: repositories with at least this many embedded
+# chunks first pick the closest module/class centroids, then search only inside them.
+HELIX_COARSE_TO_FINE_MIN_CHUNKS = env.int('HELIX_COARSE_TO_FINE_MIN_CHUNKS', default=20000)
+HELIX_COARSE_MODULES = env.int('HELIX_COARSE_MODULES', default=5)
+HELIX_COARSE_CLASSES = env.int('HELIX_COARSE_CLASSES', default=10)
+# Repositories with at most this many embedded chunks/symbols are searched
+# exactly in memory-mapped NumPy matrices instead of the HNSW indexes.
+HELIX_VECTOR_STORE_ENABLED = env.bool('HELIX_VECTOR_STORE_ENABLED', default=True)
+HELIX_VECTOR_STORE_DIR = env.str('HELIX_VECTOR_STORE_DIR', default='/var/repos/.vector_store')
+HELIX_VECTOR_STORE_MAX_ROWS = env.int('HELIX_VECTOR_STORE_MAX_ROWS', default=50000)
+# Organization-wide search: parallel per-repository searches, the time budget
+# for them, and how long per-repository results are cached.
+HELIX_ORG_SEARCH_CONCURRENCY = env.int('HELIX_ORG_SEARCH_CONCURRENCY', default=16)
+HELIX_ORG_SEARCH_TIMEOUT_SECONDS = env.float('HELIX_ORG_SEARCH_TIMEOUT_SECONDS', default=2.0)
+HELIX_ORG_SEARCH_CACHE_SECONDS = env.int('HELIX_ORG_SEARCH_CACHE_SECONDS', default=600)
+
+# --- Embeddings ---
+# 'openai' (embeddings endpoint + Batch API) or 'local' (offline CPU backend).
+# Vectors from different providers are not comparable: switching requires re-embedding.
+HELIX_EMBEDDING_PROVIDER = env.str('HELIX_EMBEDDING_PROVIDER', default='openai')
+HELIX_EMBEDDING_MODEL = env.str('HELIX_EMBEDDING_MODEL', default='text-embedding-3-small')
+# Optional sentence-transformers model for the local backend; empty uses the built-in hashing embedder.
+HELIX_LOCAL_EMBEDDING_MODEL = env.str('HELIX_LOCAL_EMBEDDING_MODEL', default='')
+HELIX_LOCAL_EMBEDDING_BATCH_SIZE = env.int('HELIX_LOCAL_EMBEDDING_BATCH_SIZE', default=256)
+# Worker processes for bulk local embedding (0 or 1 runs in-process).
+HELIX_LOCAL_EMBEDDING_WORKERS = env.int('HELIX_LOCAL_EMBEDDING_WORKERS', default=0)
+# Deltas up to this many items are embedded synchronously instead of via the Batch API.
+HELIX_SYNC_EMBEDDING_MAX_ITEMS = env.int('HELIX_SYNC_EMBEDDING_MAX_ITEMS', default=500)
+HELIX_SYNC_EMBEDDING_BATCH_SIZE = env.int('HELIX_SYNC_EMBEDDING_BATCH_SIZE', default=64)
+HELIX_SYNC_EMBEDDING_CONCURRENCY = env.int('HELIX_SYNC_EMBEDDING_CONCURRENCY', default=4)
+# Requests/tokens-per-minute budget for synchronous embedding, shared by all
+# workers through Redis (see repositories/rate_limit.py).
+HELIX_SYNC_EMBEDDING_RPM = env.int('HELIX_SYNC_EMBEDDING_RPM', default=500)
+HELIX_SYNC_EMBEDDING_TPM = env.int('HELIX_SYNC_EMBEDDING_TPM', default=1000000)
+
+# --- LLM generation ---
+# Requests/tokens-per-minute budget for chat completions, shared by all
+# workers through Redis (see repositories/rate_limit.py).
+HELIX_LLM_RPM = env.int('HELIX_LLM_RPM', default=500)
+HELIX_LLM_TPM = env.int('HELIX_LLM_TPM', default=200000)
+# Concurrent docstring generations per batch task. The output tokens reserved
+# per call come from the routed max_tokens (see repositories/model_router.py).
+HELIX_DOCSTRING_CONCURRENCY = env.int('HELIX_DOCSTRING_CONCURRENCY', default=8)
+# Prompt packing: small symbols (up to PACK_MAX_SYMBOL_TOKENS) from the same file
+# share one request, up to PACK_MAX_SYMBOLS symbols and PACK_TOKEN_BUDGET source tokens.
+HELIX_DOCSTRING_PACKING = env.bool('HELIX_DOCSTRING_PACKING', default=True)
+HELIX_DOCSTRING_PACK_MAX_SYMBOLS = env.int('HELIX_DOCSTRING_PACK_MAX_SYMBOLS', default=8)
+HELIX_DOCSTRING_PACK_MAX_SYMBOL_TOKENS = env.int('HELIX_DOCSTRING_PACK_MAX_SYMBOL_TOKENS', default=400)
+HELIX_DOCSTRING_PACK_TOKEN_BUDGET = env.int('HELIX_DOCSTRING_PACK_TOKEN_BUDGET', default=2000)
+# Module documentation with at least this many symbols to document is sent to
+# the OpenAI Batch API (half price, results within 24h) instead of live calls.
+HELIX_DOCSTRING_BATCH_API_MIN_ITEMS = env.int('HELIX_DOCSTRING_BATCH_API_MIN_ITEMS', default=500)
+# Persistent cache of LLM responses keyed by task, prompt version, model and
+# inputs (see repositories/llm_cache.py). 0 keeps entries indefinitely.
+HELIX_LLM_CACHE_ENABLED = env.bool('HELIX_LLM_CACHE_ENABLED', default=True)
+HELIX_LLM_CACHE_MAX_AGE_DAYS = env.int('HELIX_LLM_CACHE_MAX_AGE_DAYS', default=0)
+
+# --- Model routing ---
+# Models per tier. Trivial symbols (all TRIVIAL_* bounds met) go to the fast
+# tier; complex ones (any COMPLEX_* bound reached, FAN = fan-in + fan-out)
+# are escalated one tier above the task's default.
+HELIX_MODEL_FAST = env.str('HELIX_MODEL_FAST', default='gpt-4.1-nano')
+HELIX_MODEL_STANDARD = env.str('HELIX_MODEL_STANDARD', default='gpt-4.1-mini')
+HELIX_MODEL_LARGE = env.str('HELIX_MODEL_LARGE', default='gpt-4.1')
+HELIX_ROUTER_TRIVIAL_MAX_LOC = env.int('HELIX_ROUTER_TRIVIAL_MAX_LOC', default=10)
+HELIX_ROUTER_TRIVIAL_MAX_COMPLEXITY = env.int('HELIX_ROUTER_TRIVIAL_MAX_COMPLEXITY', default=2)
+HELIX_ROUTER_TRIVIAL_MAX_FAN_OUT = env.int('HELIX_ROUTER_TRIVIAL_MAX_FAN_OUT', default=3)
+HELIX_ROUTER_COMPLEX_MIN_LOC = env.int('HELIX_ROUTER_COMPLEX_MIN_LOC', default=120)
+HELIX_ROUTER_COMPLEX_MIN_COMPLEXITY = env.int('HELIX_ROUTER_COMPLEX_MIN_COMPLEXITY', default=15)
+HELIX_ROUTER_COMPLEX_MIN_FAN = env.int('HELIX_ROUTER_COMPLEX_MIN_FAN', default=25)
+
+# --- OpenAI client (see repositories/llm_client.py) ---
+# Connection pool, per-call timeouts (uploads/downloads of Batch API files get
+# longer), retry attempts with jittered backoff capped at MAX_BACKOFF, the
+# per-process cap on concurrent calls and how long a call waits for a slot,
+# and the circuit breaker's consecutive-failure threshold and cooldown.
+HELIX_OPENAI_MAX_CONNECTIONS = env.int('HELIX_OPENAI_MAX_CONNECTIONS', default=50)
+HELIX_OPENAI_MAX_KEEPALIVE_CONNECTIONS = env.int('HELIX_OPENAI_MAX_KEEPALIVE_CONNECTIONS', default=20)
+HELIX_OPENAI_CONNECT_TIMEOUT_SECONDS = env.float('HELIX_OPENAI_CONNECT_TIMEOUT_SECONDS', default=5.0)
+HELIX_OPENAI_TIMEOUT_SECONDS = env.float('HELIX_OPENAI_TIMEOUT_SECONDS', default=60.0)
+HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS = env.float('HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS', default=600.0)
+HELIX_OPENAI_MAX_ATTEMPTS = env.int('HELIX_OPENAI_MAX_ATTEMPTS', default=4)
+HELIX_OPENAI_MAX_BACKOFF_SECONDS = env.float('HELIX_OPENAI_MAX_BACKOFF_SECONDS', default=30.0)
+HELIX_OPENAI_MAX_CONCURRENCY = env.int('HELIX_OPENAI_MAX_CONCURRENCY', default=32)
+HELIX_OPENAI_QUEUE_TIMEOUT_SECONDS = env.float('HELIX_OPENAI_QUEUE_TIMEOUT_SECONDS', default=30.0)
+HELIX_OPENAI_BREAKER_FAILURES = env.int('HELIX_OPENAI_BREAKER_FAILURES', default=5)
+HELIX_OPENAI_BREAKER_COOLDOWN_SECONDS = env.float('HELIX_OPENAI_BREAKER_COOLDOWN_SECONDS', default=30.0)
+# Async streaming views (ASGI): concurrent model streams per worker process, and
+# threads for the chat agent, which still runs synchronously.
+HELIX_OPENAI_MAX_ASYNC_CONCURRENCY = env.int('HELIX_OPENAI_MAX_ASYNC_CONCURRENCY', default=500)
+HELIX_CHAT_STREAM_THREADS = env.int('HELIX_CHAT_STREAM_THREADS', default=16)
+
+# --- Chat agent ---
+# Read-only, RLS-scoped connections for the agent's SQL tool (per process), and
+# idle agents kept per (user, repository) between chat turns.
+HELIX_RLS_POOL_SIZE = env.int('HELIX_RLS_POOL_SIZE', default=10)
+HELIX_RLS_POOL_TIMEOUT_SECONDS = env.float('HELIX_RLS_POOL_TIMEOUT_SECONDS', default=10.0)
+HELIX_RLS_POOL_CONNECT_TIMEOUT_SECONDS = env.int('HELIX_RLS_POOL_CONNECT_TIMEOUT_SECONDS', default=5)
+# Guards on the agent's SQL: per-session statement timeout, EXPLAIN cost ceiling
+# (planner cost units), rows fetched from the server-side cursor, and the size
+# of each formatted cell and of the whole result handed back to the model.
+HELIX_AGENT_SQL_TIMEOUT_MS = env.int('HELIX_AGENT_SQL_TIMEOUT_MS', default=5000)
+HELIX_AGENT_SQL_MAX_COST = env.float('HELIX_AGENT_SQL_MAX_COST', default=100000.0)
+HELIX_AGENT_SQL_MAX_ROWS = env.int('HELIX_AGENT_SQL_MAX_ROWS', default=100)
+HELIX_AGENT_SQL_MAX_CELL_CHARS = env.int('HELIX_AGENT_SQL_MAX_CELL_CHARS', default=200)
+HELIX_AGENT_SQL_MAX_CHARS = env.int('HELIX_AGENT_SQL_MAX_CHARS', default=8000)
+HELIX_CHAT_AGENT_CACHE_SIZE = env.int('HELIX_CHAT_AGENT_CACHE_SIZE', default=256)
+HELIX_CHAT_AGENT_MAX_AGE_SECONDS = env.float('HELIX_CHAT_AGENT_MAX_AGE_SECONDS', default=900.0)
+# Answer retrieval questions with one search + one completion instead of the agent
+# (see chat_router.py); the margin is how much closer in embedding similarity a
+# question must be to the other intent to override its keyword reading.
+HELIX_CHAT_ROUTER_ENABLED = env.bool('HELIX_CHAT_ROUTER_ENABLED', default=True)
+HELIX_CHAT_ROUTER_MARGIN = env.float('HELIX_CHAT_ROUTER_MARGIN', default=0.05)
+
+# --- Knowledge chunking ---
+# Token budget per knowledge chunk, overlap between consecutive slices of a
+# long source, and the size below which adjacent symbols are packed together.
+HELIX_CHUNK_MAX_TOKENS = env.int('HELIX_CHUNK_MAX_TOKENS', default=800)
+HELIX_CHUNK_OVERLAP_TOKENS = env.int('HELIX_CHUNK_OVERLAP_TOKENS', default=100)
+HELIX_CHUNK_PACK_MAX_TOKENS = env.int('HELIX_CHUNK_PACK_MAX_TOKENS', default=120)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
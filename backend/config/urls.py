@@ -1,6 +1,7 @@
 from . import api_router # Import our new router
 from django.contrib import admin
 from django.urls import path,include
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from allauth.socialaccount.providers.github.provider import GitHubProvider # <--- ADD THIS IMPORT
 
 
@@ -8,4 +9,6 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('allauth.urls')),
     path('api/v1/', include(api_router)), 
-]
\ No newline at end of file
+]
+# runserver served static files in development; uvicorn does not (no-op unless DEBUG).
+urlpatterns += staticfiles_urlpatterns()
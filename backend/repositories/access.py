@@ -0,0 +1,106 @@
+# backend/repositories/access.py
+"""
+Cached organization-membership checks. A user can access the repositories of
+every organization they are a member of; instead of each view and agent tool
+querying OrganizationMember (often twice per request), the user's
+organization and repository ids are resolved once, kept in the shared cache
+(Redis) for HELIX_ACCESS_CACHE_SECONDS, and memoized on the user object for
+the rest of the request.
+
+signals.py invalidates a user's entry when one of their memberships changes,
+and every member's entry when a repository is created in or deleted from
+their organization. The TTL only bounds how stale an entry can get if an
+invalidation is missed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import OrganizationMember
+
+_CACHE_PREFIX = "helix:access:user:"
+_REQUEST_ATTR = "_helix_access"
+
+
+class UserAccess:
+    """The organizations a user belongs to and the repositories those organizations own."""
+    def __init__(self, organization_ids, repository_ids):
+        self.organization_ids = frozenset(organization_ids)
+        self.repository_ids = frozenset(repository_ids)
+
+
+def _user_id(user) -> int | None:
+    if isinstance(user, int):
+        return user
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+def _load(user_id: int) -> UserAccess:
+    key = f"{_CACHE_PREFIX}{user_id}"
+    cached = cache.get(key)
+    if cached is not None:
+        return UserAccess(*cached)
+    rows = OrganizationMember.objects.filter(user_id=user_id).values_list(
+        'organization_id', 'organization__repositories__id'
+    )
+    organization_ids = {org_id for org_id, _ in rows}
+    repository_ids = {repo_id for _, repo_id in rows if repo_id is not None}
+    cache.set(key, (sorted(organization_ids), sorted(repository_ids)), settings.HELIX_ACCESS_CACHE_SECONDS)
+    return UserAccess(organization_ids, repository_ids)
+
+
+def user_access(user) -> UserAccess:
+    """
+    Access of a user instance (memoized on it, i.e. for the request) or of a
+    user id. Anonymous users have access to nothing.
+    """
+    user_id = _user_id(user)
+    if user_id is None:
+        return UserAccess((), ())
+    if isinstance(user, int):
+        return _load(user_id)
+    access = getattr(user, _REQUEST_ATTR, None)
+    if access is None:
+        access = _load(user_id)
+        setattr(user, _REQUEST_ATTR, access)
+    return access
+
+
+def is_organization_member(user, org_id) -> bool:
+    try:
+        return int(org_id) in user_access(user).organization_ids
+    except (TypeError, ValueError):
+        return False
+
+
+def can_access_repository(user, repo_id) -> bool:
+    try:
+        return int(repo_id) in user_access(user).repository_ids
+    except (TypeError, ValueError):
+        return False
+
+
+def accessible_repository_ids(user) -> frozenset:
+    return user_access(user).repository_ids
+
+
+def accessible_organization_ids(user) -> frozenset:
+    return user_access(user).organization_ids
+
+
+def invalidate_user_access(*user_ids):
+    """
+    Drops the cached access of the given users (their next request reloads
+    it) once the current transaction commits, so a concurrent request cannot
+    cache the old memberships again in between.
+    """
+    if user_ids:
+        keys = [f"{_CACHE_PREFIX}{user_id}" for user_id in user_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_organization_access(org_id: int):
+    """Drops the cached access of every member of the organization."""
+    invalidate_user_access(*OrganizationMember.objects.filter(organization_id=org_id).values_list('user_id', flat=True))
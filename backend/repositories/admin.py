@@ -45,7 +45,7 @@ class OrganizationMemberAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'organization__name')
     raw_id_fields = ('user', 'organization')
 
-from .models import CodeFile, CodeSymbol,CodeClass,CodeDependency,Notification,EmbeddingBatchJob,Insight
+from .models import CodeFile, CodeSymbol,CodeClass,CodeDependency,Notification,EmbeddingBatchJob,Insight,DocstringBatchJob,LLMCallLog
 
 admin.site.register(CodeFile)
 admin.site.register(CodeClass) # Register the new Class model
@@ -116,6 +116,21 @@ class EmbeddingBatchJobAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(DocstringBatchJob)
+class DocstringBatchJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'repository', 'batch_id', 'status', 'module_path', 'item_count', 'succeeded_count', 'failed_count', 'created_at', 'completed_at')
+    list_filter = ('status', 'repository', 'created_at')
+    search_fields = ('batch_id', 'repository__full_name', 'module_path', 'workflow_task_id')
+    readonly_fields = ('created_at', 'updated_at', 'submitted_to_openai_at', 'completed_at', 'openai_metadata', 'content_hashes')
+
+@admin.register(LLMCallLog)
+class LLMCallLogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'model', 'tier', 'reason', 'prompt_tokens', 'completion_tokens', 'cost_usd', 'latency_ms', 'cached', 'batch', 'success', 'created_at')
+    list_filter = ('kind', 'model', 'tier', 'cached', 'batch', 'success', 'created_at')
+    search_fields = ('reason',)
+    raw_id_fields = ('symbol',)
     
 @admin.register(Insight)
 class InsightAdmin(admin.ModelAdmin):
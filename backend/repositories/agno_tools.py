@@ -1,15 +1,28 @@
 # backend/repositories/agno_tools.py
 from agno.tools import tool
-from openai import OpenAI
-import psycopg2 # Import the OpenAI library
-# We need access to our models and the OpenAI client
-from .models import KnowledgeChunk, CodeSymbol, OrganizationMember, Repository
-OPENAI_CLIENT = OpenAI()
-from pgvector.django import L2Distance
+import psycopg2
+# We need access to our models and the embedding provider
+from .models import CodeSymbol, Repository
+from .retrieval import (
+    layered_knowledge_search, lexical_knowledge_search, looks_like_identifier, describe_chunk_source,
+)
+from .embeddings import get_embedding_provider
+from .access import can_access_repository
 
 from typing import Optional
 from django.db.models import Q ,F,Count # <--- ADD THIS IMPORT
 
+def format_knowledge_context(rows: list[dict]) -> str:
+    """
+    Formats retrieved chunk rows into the context string handed to the model.
+    Rows are already ordered from high-level (READMEs) to low-level (source code).
+    """
+    context_str = "--- Retrieved Context (Prioritized from High-Level to Low-Level) ---\n\n"
+    for row in rows:
+        context_str += f"{describe_chunk_source(row)}\n"
+        context_str += f"Content:\n{row['content']}\n\n"
+    return context_str
+
 @tool
 def helix_knowledge_search(query: str, repo_id: int, user_id: int) -> str:
     """
@@ -24,10 +37,7 @@ def helix_knowledge_search(query: str, repo_id: int, user_id: int) -> str:
     # 1. Validate that the user has access to the requested repository.
     try:
         # This check ensures the repo belongs to an org the user is part of.
-        is_member = OrganizationMember.objects.filter(
-            organization__repositories__id=repo_id,
-            user_id=user_id
-        ).exists()
+        is_member = can_access_repository(user_id, repo_id)
 
         if not is_member:
             return "Error: You do not have permission to access this repository or it does not exist."
@@ -38,70 +48,28 @@ def helix_knowledge_search(query: str, repo_id: int, user_id: int) -> str:
     # --- END FIX ---
 
     try:
-        # 2. Generate an embedding for the user's query
-        query_embedding = OPENAI_CLIENT.embeddings.create(
-            input=[query], 
-            model="text-embedding-3-small"
-        ).data[0].embedding
+        # 2. Exact-name lookups (a function name, error string or config key) are
+        # answered from the full-text index alone, without an embedding call.
+        if looks_like_identifier(query):
+            rows = lexical_knowledge_search(repo_id, query)
+            if rows:
+                print(f"AGNO_TOOL: Exact-name lookup matched {len(rows)} chunks; skipping embedding.")
+                return format_knowledge_context(rows)
+
+        # 3. Generate an embedding for the user's query
+        query_embedding = get_embedding_provider().embed_query(query)
         
         # Now that we've confirmed access, the rest of the queries can proceed.
         # The RLS policies will provide an additional layer of security, but this
         # initial check is good practice and provides a clearer error message.
-        
-        context_chunks = {}
-
-        # Layer 1: Search for Module READMEs
-        readme_chunks = KnowledgeChunk.objects.filter(
-            repository_id=repo_id,
-            chunk_type=KnowledgeChunk.ChunkType.MODULE_README
-        ).order_by(L2Distance('embedding', query_embedding))[:2]
-        for chunk in readme_chunks:
-            context_chunks[chunk.id] = chunk
-
-        # Layer 2: Search for Class Summaries
-        class_summary_chunks = KnowledgeChunk.objects.filter(
-            repository_id=repo_id,
-            chunk_type=KnowledgeChunk.ChunkType.CLASS_SUMMARY
-        ).order_by(L2Distance('embedding', query_embedding))[:3]
-        for chunk in class_summary_chunks:
-            context_chunks[chunk.id] = chunk
-
-        # Layer 3 & 4: Fill with Docstrings and Source Code
-        if len(context_chunks) < 5:
-            needed = 5 - len(context_chunks)
-            remaining_chunks = KnowledgeChunk.objects.filter(
-                repository_id=repo_id,
-                chunk_type__in=[
-                    KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING,
-                    KnowledgeChunk.ChunkType.SYMBOL_SOURCE
-                ]
-            ).order_by(L2Distance('embedding', query_embedding))[:needed]
-            for chunk in remaining_chunks:
-                context_chunks[chunk.id] = chunk
-
-        if not context_chunks:
+        # All layers are fetched in a single round trip (see retrieval.py), with
+        # the docstring/source layer fusing vector and full-text rankings.
+        rows = layered_knowledge_search(repo_id, query_embedding, query_text=query)
+
+        if not rows:
             return "No relevant information was found in the knowledge base for this query."
 
-        # 3. Format the combined results into a structured string
-        # ... (The formatting logic remains the same, but we need to handle related fields being null) ...
-        
-        sorted_chunks = sorted(list(context_chunks.values()), key=lambda c: c.chunk_type)
-        context_str = "--- Retrieved Context (Prioritized from High-Level to Low-Level) ---\n\n"
-        
-        for chunk in sorted_chunks:
-            source_description = f"Source: {chunk.get_chunk_type_display()}"
-            # Add more specific source info if available
-            if chunk.related_class:
-                source_description += f" for class '{chunk.related_class.name}'"
-            if chunk.related_symbol:
-                source_description += f" for function '{chunk.related_symbol.name}'"
-            if chunk.related_file:
-                 source_description += f" in '{chunk.related_file.file_path}'"
-            
-            context_str += f"{source_description}\n"
-            context_str += f"Content:\n{chunk.content}\n\n"
-        
-        return context_str
+        return format_knowledge_context(rows)
 
     except Exception as e:
         print(f"AGNO_TOOL: ERROR in HelixKnowledgeSearchTool: {e}")
@@ -161,22 +129,141 @@ def execute_structural_query(repo_id: int, query: str, file_path: Optional[str]
 
     return "This structural query is not yet supported. I can list functions in a specific file or count orphan symbols."
 from agno.tools.postgres import PostgresTools
-from agno.utils.log import log_info, log_error
 from django.conf import settings
 from typing import Dict, Optional
 
+import json
+import time
+
+import sqlparse
+
+from psycopg2 import errors as pg_errors
+
+from . import metrics
+from .rls_pool import rls_connection
+
+_SQL_METRICS_SITE = "agent_sql"
+
+
+def _plan_cost(cursor, query: str) -> float:
+    """The planner's estimated total cost of `query`, without running it."""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {query}")
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+def _format_result(columns: list[str], rows: list[tuple], more_rows: bool) -> str:
+    """
+    Pipe-separated table, each column padded to its widest (truncated) value,
+    cut off at HELIX_AGENT_SQL_MAX_CHARS with a note telling the model what
+    it is not seeing.
+    """
+    max_cell = settings.HELIX_AGENT_SQL_MAX_CELL_CHARS
+    max_chars = settings.HELIX_AGENT_SQL_MAX_CHARS
+
+    def cell(value) -> str:
+        text = "NULL" if value is None else str(value).replace("\n", "\\n")
+        return text if len(text) <= max_cell else text[:max_cell - 3] + "..."
+
+    cells = [[cell(value) for value in row] for row in rows]
+    widths = [max([len(name)] + [len(row[i]) for row in cells]) for i, name in enumerate(columns)]
+    lines = [" | ".join(name.ljust(width) for name, width in zip(columns, widths)).rstrip()]
+    total = len(lines[0])
+    shown = 0
+    for row in cells:
+        line = " | ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        if total + len(line) + 1 > max_chars:
+            break
+        lines.append(line)
+        total += len(line) + 1
+        shown += 1
+
+    if not rows:
+        lines.append("(no rows)")
+    elif shown < len(rows) or more_rows:
+        lines.append(
+            f"({shown} rows shown; the query returned {'more than ' if more_rows else ''}{len(rows)}. "
+            "Filter, aggregate or add a LIMIT to see the rest.)"
+        )
+    return "\n".join(lines)
+
+
+def run_scoped_query(query: str, user_id: int) -> str:
+    """
+    Runs a SELECT on a pooled read-only connection scoped to `user_id` by RLS
+    and formats the result as a table for the model. The query is refused if
+    its planned cost exceeds HELIX_AGENT_SQL_MAX_COST, is cancelled after
+    HELIX_AGENT_SQL_TIMEOUT_MS (the connection's statement_timeout), and only
+    the first HELIX_AGENT_SQL_MAX_ROWS rows are fetched, through a server-side
+    cursor. Latency and rejections go to the "agent_sql" metrics site.
+    """
+    print(f"AGNO_TOOL: Executing scoped query for user {user_id}: '{query}'")
+    started = time.monotonic()
+
+    def done(result: str, error: str | None = None) -> str:
+        metrics.record(_SQL_METRICS_SITE, (time.monotonic() - started) * 1000, error=error)
+        return result
+
+    # Exactly one statement: EXPLAIN would only cost the first of several, while
+    # the rest ran unchecked (sqlparse ignores semicolons inside literals).
+    statements = [statement.strip().rstrip(";").strip() for statement in sqlparse.split(query)]
+    statements = [statement for statement in statements if statement]
+    if len(statements) != 1:
+        return done("Error: This tool runs exactly one SELECT statement per call.", "MultipleStatements")
+    query = statements[0]
+    # Security check: only allow SELECT statements (the connection is read-only regardless)
+    if not query.lower().startswith(("select", "with")):
+        return done("Error: This tool only supports read-only SELECT queries.", "NotSelect")
+
+    max_rows = settings.HELIX_AGENT_SQL_MAX_ROWS
+    try:
+        with rls_connection(user_id) as conn:
+            # Server-side cursors need a transaction; it is rolled back either way.
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cursor:
+                    cost = _plan_cost(cursor, query)
+                if cost > settings.HELIX_AGENT_SQL_MAX_COST:
+                    print(f"AGNO_TOOL: Rejected scoped query with planned cost {cost:.0f}.")
+                    return done(
+                        f"Error: This query is too expensive to run (planned cost {cost:.0f}, limit "
+                        f"{settings.HELIX_AGENT_SQL_MAX_COST:.0f}). Filter by repository_id, avoid cross joins, "
+                        "or aggregate with GROUP BY and a LIMIT.",
+                        "CostCeiling",
+                    )
+                with conn.cursor(name="helix_agent_sql") as cursor:
+                    cursor.itersize = max_rows + 1
+                    cursor.execute(query)
+                    rows = cursor.fetchmany(max_rows + 1)
+                    columns = [desc[0] for desc in cursor.description]
+            except pg_errors.QueryCanceled:
+                # Handled here so the pool keeps the (still healthy) connection.
+                print(f"AGNO_TOOL: Scoped query cancelled after {settings.HELIX_AGENT_SQL_TIMEOUT_MS}ms.")
+                return done(
+                    f"Error: The query was cancelled after {settings.HELIX_AGENT_SQL_TIMEOUT_MS}ms. "
+                    "Use a narrower filter or a simpler query.",
+                    "QueryCanceled",
+                )
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+                    conn.autocommit = True
+        return done(_format_result(columns, rows[:max_rows], len(rows) > max_rows))
+    except Exception as e:
+        print(f"AGNO_TOOL: ERROR in scoped query: {e}")
+        return done(f"An error occurred while executing the SQL query: {e}", type(e).__name__)
+
 class HelixPostgresTools(PostgresTools):
     """
     A custom Toolkit that inherits from PostgresTools to provide a full suite of
-    database tools, but overrides the connection and query execution to enforce
-    user-scoped Row-Level Security (RLS) and read-only access.
+    database tools, but runs every query through run_scoped_query: a pooled,
+    read-only connection with user-scoped Row-Level Security (RLS).
     """
     def __init__(self, user_id: int, **kwargs):
         self.user_id = user_id
         self.db_settings = settings.DATABASES['default']
-        # We manage the connection ourselves, so initialize it to None.
-        # The parent class also has a `_connection` attribute, which we will now control.
-        self._connection = None
         
         # Call the parent's __init__ to register all its tools (`show_tables`, etc.).
         # We pass the connection details from our Django settings.
@@ -198,60 +285,14 @@ class HelixPostgresTools(PostgresTools):
     @property
     def connection(self) -> psycopg2.extensions.connection:
         """
-        Overrides the parent's connection property to establish a secure,
-        user-scoped, read-only database connection.
+        The parent's own connection would not be RLS-scoped; all access goes
+        through run_query instead.
         """
-        if self._connection is None or self._connection.closed:
-            log_info(f"AGNO_TOOL_CONNECT: Establishing new RLS-scoped connection for user {self.user_id}")
-            conn_params = {
-                "host": self.host,
-                "port": self.port,
-                "dbname": self.db_name,
-                "user": self.user,
-                "password": self.password, # This now correctly uses the value set in __init__
-            }
-            self._connection = psycopg2.connect(**conn_params)
-            self._connection.set_session(readonly=True)
-            
-            # This is the crucial part: set the RLS session variable
-            try:
-                with self._connection.cursor() as cursor:
-                    cursor.execute("SET app.current_user_id = %s", (str(self.user_id),))
-                print(f"AGNO_TOOL_INIT: Set app.current_user_id = {self.user_id} for this session.")
-            except Exception as e:
-                log_error(f"AGNO_TOOL_INIT: FATAL - Failed to set session variable for RLS: {e}")
-                self._connection.close()
-                self._connection = None
-                raise
-        
-        return self._connection
+        raise NotImplementedError("HelixPostgresTools only queries through run_query (see rls_pool).")
 
     def run_query(self, query: str) -> str:
         """
         Overrides the parent's run_query method to enforce a strict SELECT-only policy.
         All other tools from the parent class (like show_tables) will now use this safe version.
         """
-        print(f"AGNO_TOOL: Executing OVERRIDDEN run_query with query: '{query}'")
-        # Security check: only allow SELECT statements
-        if not query.strip().lower().startswith('select'):
-            return "Error: This tool only supports read-only SELECT queries."
-
-        try:
-            # Use the secure connection from our overridden property
-            with self.connection.cursor() as cursor:
-                cursor.execute(query)
-                if cursor.description:
-                    columns = [desc[0] for desc in cursor.description]
-                    rows = cursor.fetchall()
-                    # Use a more robust formatting like the parent class
-                    result_rows = [",".join(map(str, row)) for row in rows]
-                    result_data = "\n".join(result_rows)
-                    return ",".join(columns) + "\n" + result_data
-                else:
-                    return f"Query executed successfully. Status message: {cursor.statusmessage}"
-        except Exception as e:
-            print(f"AGNO_TOOL: ERROR in overridden run_query: {e}")
-            # Rollback in case of error to keep the transaction state clean
-            if self._connection and not self._connection.closed:
-                self._connection.rollback()
-            return f"An error occurred while executing the SQL query: {e}"
\ No newline at end of file
+        return run_scoped_query(query, self.user_id)
@@ -1,70 +1,37 @@
 # backend/repositories/ai_services.py
-from collections import Counter
+from collections import OrderedDict
 import json
 import re
+import threading
+import time
 from typing import Generator,Optional
 from django.conf import settings
 from openai import OpenAI as OpenAIClient
 from agno.tools import tool
 import logging
-from django.db.models import Q
 
 logger = logging.getLogger(__name__)
-from .models import CodeClass, CodeSymbol, CodeDependency,KnowledgeChunk,CodeClass,CodeFile,ModuleDocumentation 
+from .models import CodeClass, CodeSymbol, ModuleDocumentation
 from pgvector.django import L2Distance
-def generate_class_summary_stream(
-    code_class: CodeClass,
-    openai_client: OpenAIClient
-) -> Generator[str, None, None]:
+from .llm_cache import cached_chat_completion, cached_chat_stream
+from .model_router import route as route_call
+from .llm_client import get_http_client
+from .context_packs import SymbolContext, class_context, module_dossier, symbol_context
+def class_summary_request(code_class: CodeClass) -> dict:
     """
-    Assembles a high-signal prompt and streams a summary for a CodeClass.
+    Assembles a high-signal prompt for a CodeClass summary and returns the
+    (a)cached_chat_stream arguments; save_class_summary stores the result.
     """
     
-    # 1. Gather Class Metadata
-    class_name = code_class.name
-    file_path = code_class.code_file.file_path
-    methods = CodeSymbol.objects.filter(code_class=code_class).order_by('start_line')
-
-    # 2. Assemble Interface Summary
-    public_methods_summary = []
-    private_methods_names = []
-    init_method_source = "N/A"
-
-    for method in methods:
-        # Extract signature from the start of the source code (a simple heuristic)
-        # A more robust solution would use the AST if the signature is stored separately.
-        try:
-            source_code = method.source_code # Assuming you add a property/method to get this
-            signature = source_code.split('):', 1)[0] + '):' if '):' in source_code else source_code.split('\n')[0]
-        except Exception:
-            signature = f"def {method.name}(...):"
-
-        if method.name.startswith('_'):
-            if method.name != "__init__":
-                private_methods_names.append(method.name)
-        else:
-            doc_summary = ""
-            if method.documentation:
-                doc_summary = f"  # {method.documentation.splitlines()[0]}" # First line of docstring
-            public_methods_summary.append(f"{signature}{doc_summary}")
-        
-        if method.name == "__init__":
-            init_method_source = method.source_code
-
-    # 3. Gather Dependency Context
-    # Get top 5 external functions/classes this class calls
-    external_callees = CodeDependency.objects.filter(
-        caller__code_class=code_class
-    ).exclude(
-        callee__code_class=code_class # Exclude internal method calls
-    ).select_related('callee').values_list('callee__name', flat=True).distinct()[:5]
-
-    # Get top 5 external functions/classes that call this class's methods
-    external_callers = CodeDependency.objects.filter(
-        callee__code_class=code_class
-    ).exclude(
-        caller__code_class=code_class
-    ).select_related('caller').values_list('caller__name', flat=True).distinct()[:5]
+    # 1-3. Interface summary and dependency context, from the class's cached context pack
+    context = class_context(code_class)
+    class_name = context.name
+    file_path = context.file_path
+    public_methods_summary = context.public_methods
+    private_methods_names = context.private_methods
+    init_method_source = context.init_source
+    external_callees = context.external_callees
+    external_callers = context.external_callers
 
     # 4. Construct the High-Signal Prompt
     prompt_parts = [
@@ -113,98 +80,83 @@ def generate_class_summary_stream(
     prompt = "\n".join(prompt_parts)
     print(f"DEBUG_CLASS_SUMMARY_PROMPT: For class {code_class.id}\n{prompt}\n--------------------")
 
-    # 5. Call LLM and Stream Response
-    try:
-        stream = openai_client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful AI software architect that writes clear, concise technical documentation in Markdown."},
-                {"role": "user", "content": prompt}
-            ],
-            stream=True,
-            temperature=0.4,
-            max_tokens=1000
-        )
-        full_response_text = ""
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                full_response_text += content
-                yield content  # If you're streaming to client
-
-        # After streaming is done, print the full content
-        if full_response_text:
-            # We can do some basic cleaning here if needed, e.g., stripping whitespace
-            cleaned_summary = full_response_text.strip()
-            
-            # For the one-line summary field, let's just take the first meaningful line.
-            # The "Purpose" section is what we want.
-            # … after cleaned_summary = full_response_text.strip() …
-
-            # Split into lines
-            lines = cleaned_summary.splitlines()
-
-            one_line_summary = ""
-
-            pattern = re.compile(
-                r"###\s*Purpose\s*\n+`?(?P<sentence>.+?)(?:`?\n|$)",
-                re.IGNORECASE,
-            )
+    route = route_call("class_summary")
+    return {
+        "kind": "class_summary",
+        "prompt_version": "v1",
+        "model": route.model,
+        "messages": [
+            {"role": "system", "content": "You are a helpful AI software architect that writes clear, concise technical documentation in Markdown."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.4,
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
+
+def save_class_summary(code_class: CodeClass, summary_text: str):
+    """Stores the streamed Markdown summary and its one-line "Purpose" on the class."""
+    # We can do some basic cleaning here if needed, e.g., stripping whitespace
+    cleaned_summary = summary_text.strip()
+    if not cleaned_summary:
+        return
 
-            m = pattern.search(cleaned_summary)
-            if m:
-                one_line_summary = m.group("sentence").strip()
-            else:
-                # As a last resort, try pulling the very next non-blank line after the first line
-                lines = cleaned_summary.splitlines()
-                for line in lines[1:]:
-                    if line.strip():
-                        one_line_summary = line.strip("` ").rstrip(".")
-                        break
-
-            # Save it
-            if not one_line_summary:
-                one_line_summary = lines[0].strip().replace("**", "")
-
-            # Update both fields on the model instance
-            code_class.summary = one_line_summary
-            code_class.generated_summary_md = cleaned_summary
-            
-            # Save both fields in a single database call
-            code_class.save(update_fields=['summary', 'generated_summary_md'])
-            print(f"CLASS_SUMMARY_SERVICE: Successfully saved both summaries for class {code_class.id}.")
+    # For the one-line summary field, let's just take the first meaningful line.
+    # The "Purpose" section is what we want.
+    lines = cleaned_summary.splitlines()
 
-    except Exception as e:
-        error_message = f"// Helix encountered an error while summarizing the class: {str(e)}"
-        print(f"CLASS_SUMMARY_STREAM_ERROR: {error_message}")
-        yield error_message
+    one_line_summary = ""
 
-def generate_refactor_stream(
-    symbol_obj: CodeSymbol,
-    openai_client: OpenAIClient
-) -> Generator[str, None, None]:
-    """
-    Assembles a high-signal prompt and streams refactoring suggestions for a CodeSymbol.
-    """
-    source_code = symbol_obj.source_code
-    if not source_code or source_code.strip().startswith("# Error:"):
-        yield f"// Helix could not retrieve valid source code to suggest refactors. Please try reprocessing the repository."
-        return
+    pattern = re.compile(
+        r"###\s*Purpose\s*\n+`?(?P<sentence>.+?)(?:`?\n|$)",
+        re.IGNORECASE,
+    )
 
-    symbol_kind = "method" if symbol_obj.code_class else "function"
-    
-    # --- Context Injection ---
+    m = pattern.search(cleaned_summary)
+    if m:
+        one_line_summary = m.group("sentence").strip()
+    else:
+        # As a last resort, try pulling the very next non-blank line after the first line
+        for line in lines[1:]:
+            if line.strip():
+                one_line_summary = line.strip("` ").rstrip(".")
+                break
+
+    # Save it
+    if not one_line_summary:
+        one_line_summary = lines[0].strip().replace("**", "")
+
+    # Update both fields on the model instance
+    code_class.summary = one_line_summary
+    code_class.generated_summary_md = cleaned_summary
+
+    # Save both fields in a single database call
+    code_class.save(update_fields=['summary', 'generated_summary_md'])
+    print(f"CLASS_SUMMARY_SERVICE: Successfully saved both summaries for class {code_class.id}.")
+
+def _metrics_context(context: SymbolContext) -> str:
+    """The name and metrics lines shared by the refactoring prompts."""
     context_parts = [
-        f"The {symbol_kind} is named `{symbol_obj.name}`."
+        f"The {context.kind} is named `{context.name}`."
     ]
-    if symbol_obj.loc is not None and symbol_obj.cyclomatic_complexity is not None:
+    if context.loc is not None and context.cyclomatic_complexity is not None:
         context_parts.append(
-            f"**Code Metrics:** It has a Lines of Code (LOC) of `{symbol_obj.loc}` and a Cyclomatic Complexity of `{symbol_obj.cyclomatic_complexity}`."
+            f"**Code Metrics:** It has a Lines of Code (LOC) of `{context.loc}` and a Cyclomatic Complexity of `{context.cyclomatic_complexity}`."
         )
-        if symbol_obj.cyclomatic_complexity > 10:
+        if context.cyclomatic_complexity > 10:
             context_parts.append("The complexity is high, so pay special attention to simplifying conditional logic.")
-    
-    context_str = "\n".join(context_parts)
+    return "\n".join(context_parts)
+
+def refactor_stream_request(symbol_obj: CodeSymbol) -> dict | None:
+    """
+    Assembles a high-signal prompt for refactoring suggestions on a CodeSymbol and
+    returns the (a)cached_chat_stream arguments, or None if the symbol has no valid source.
+    """
+    context = symbol_context(symbol_obj)
+    if not context.has_source:
+        return None
+    source_code = context.source_code
+    context_str = _metrics_context(context)
 
     # --- Prompt Engineering ---
     prompt = (
@@ -230,26 +182,19 @@ def generate_refactor_stream(
 
     print(f"DEBUG_SUGGEST_REFACTORS_PROMPT: For symbol {symbol_obj.id}\n{prompt}\n--------------------")
 
-    # --- LLM Call ---
-    try:
-        stream = openai_client.chat.completions.create(
-            model="gpt-4.1-mini", # "gpt-4-turbo-preview" is recommended
-            messages=[
-                {"role": "system", "content": "You are a helpful AI code quality analyst that provides specific refactoring suggestions in Markdown format."},
-                {"role": "user", "content": prompt}
-            ],
-            stream=True,
-            temperature=0.3, # Low temperature for factual, standard refactoring patterns
-            max_tokens=2048   # Allow for detailed suggestions with code
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        error_message = f"// Helix encountered an error while suggesting refactors: {str(e)}"
-        print(f"SUGGEST_REFACTORS_STREAM_ERROR: {error_message}")
-        yield error_message
+    route = route_call("refactor_stream", symbol_obj, context.fan_in, context.fan_out)
+    return {
+        "kind": "refactor_stream",
+        "prompt_version": "v1",
+        "model": route.model,
+        "messages": [
+            {"role": "system", "content": "You are a helpful AI code quality analyst that provides specific refactoring suggestions in Markdown format."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3, # Low temperature for factual, standard refactoring patterns
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
 
 
         
@@ -292,28 +237,44 @@ def user_scoped_run_query(query: str, user_id: int) -> str:
     Executes a SQL query with RLS enforced using the user_id.
     """
     try:
-        tool = HelixPostgresTools(user_id=user_id)
-        return tool.run_query(query)
+        return run_scoped_query(query, user_id)
     except Exception as e:
         return f"RLS query error: {e}"
 
-from .agno_tools import helix_knowledge_search,execute_structural_query,HelixPostgresTools
+from .agno_tools import helix_knowledge_search,execute_structural_query,run_scoped_query
+from .access import can_access_repository
+from .chat_router import FAST as FAST_CHAT, fast_answer_stream, route_chat_query
+from .sql_views import schema_digest
 db_settings = settings.DATABASES['default']
 
 def get_helix_qa_agent(user_id: int, repo_id: int, file_path: Optional[str] = None) -> Agent:
     """
     Factory function to create and configure the Helix Q&A agent.
     This is the central point for defining the agent's capabilities.
+    Chat turns take agents from _agent_pool instead of calling this directly.
     """
-    user_scoped_postgres_tools = HelixPostgresTools(user_id=user_id)
-    try:
-        repo = Repository.objects.get(id=repo_id)
-        repo_name = repo.full_name
-    except Repository.DoesNotExist:
-        repo_name = f"ID: {repo_id}"
+    repo_name = Repository.objects.filter(id=repo_id).values_list('full_name', flat=True).first() or f"ID: {repo_id}"
+    digest = schema_digest()
+    if digest:
+        sql_tool_instructions = (
+            "3. `user_scoped_run_query`: Use this for questions that ask for data about files, symbols, calls, complexity or coverage. "
+            f"Query ONLY these read-only views (do not run show_tables, the schema is below), always filtering on repository_id = {repo_id}:\n"
+            f"{digest}\n"
+            "You do not let the user know that you are using this SQL tool. You must pass user_id to this tool.\n"
+        )
+    else:
+        sql_tool_instructions = (
+            "3. `user_scoped_postgres_tools`: Use this for questions that ask for data about files, symbols etc. This lets you look at the database that stores everything. You MUST first run show_tables to see all the tables, and only then run your query. You do not let the user know that you are using this SQL tool. You must pass user_id to this tool.'.\n"
+        )
     agent = Agent(
         name="Helix",
-        model=OpenAIChat(id="gpt-4.1-mini"),
+        # The agent's own client shares the pooled connections, timeout and retry budget.
+        model=OpenAIChat(
+            id="gpt-4.1-mini",
+            http_client=get_http_client(),
+            timeout=settings.HELIX_OPENAI_TIMEOUT_SECONDS,
+            max_retries=settings.HELIX_OPENAI_MAX_ATTEMPTS - 1,
+        ),
         
         # 1. Provide the knowledge base for RAG
         
@@ -333,33 +294,102 @@ def get_helix_qa_agent(user_id: int, repo_id: int, file_path: Optional[str] = No
             "The columns in your vector DB are: id,chunk_type,content,embedding,related_class_id,related_file_id,related_symbol_id,repository_id,created_at"
             "1. `helix_knowledge_search`: This is your primary tool for answering questions. Use it for any questions about the 'how' or 'purpose' of code, architecture, or implementation examples. It automatically searches all levels of documentation, from high-level READMEs down to source code, and provides the most relevant context.\n"
             "2. `execute_structural_query`: Use this for questions that ask for lists of items or metadata that are function level, not repo level., like 'list all functions' or 'how many orphans' If you don't find your answer in first run of the tool use the user_scoped_postgres_tools.\n"
-            "3. `user_scoped_postgres_tools`: Use this for questions that ask for data about files, symbols etc. This lets you look at the database that stores everything. You MUST first run show_tables to see all the tables, and only then run your query. You do not let the user know that you are using this SQL tool. You must pass user_id to this tool.'.\n"
-
+            + sql_tool_instructions +
             "Based on the user's query, choose the best tool, execute it, and then formulate a helpful answer based on the tool's output. Cite function names or file paths when possible."
         ),debug_mode=True
     )
     return agent
 
+class AgentPool:
+    """
+    Idle Q&A agents per (user, repo), so a chat turn skips building the agent,
+    its tools and model client and looking up the repository name. An agent
+    serves one turn at a time; it goes back to the pool with its memory
+    cleared, so every turn still starts fresh. Keys past `max_keys` are
+    evicted least recently used first, and agents older than `max_age_seconds`
+    are rebuilt so a renamed repository is picked up.
+    """
+    def __init__(self, max_keys: int, max_age_seconds: float):
+        self.max_keys = max_keys
+        self.max_age_seconds = max_age_seconds
+        self._idle = OrderedDict()  # (user_id, repo_id) -> [(built_at, agent), ...]
+        self._lock = threading.Lock()
+
+    def checkout(self, user_id: int, repo_id: int) -> tuple[float, Agent]:
+        key = (user_id, repo_id)
+        with self._lock:
+            agents = self._idle.get(key)
+            while agents:
+                built_at, agent = agents.pop()
+                if time.monotonic() - built_at < self.max_age_seconds:
+                    self._idle.move_to_end(key)
+                    return built_at, agent
+        return time.monotonic(), get_helix_qa_agent(user_id=user_id, repo_id=repo_id)
+
+    def checkin(self, user_id: int, repo_id: int, built_at: float, agent: Agent):
+        if agent.memory is not None:
+            agent.memory.clear()
+        key = (user_id, repo_id)
+        with self._lock:
+            self._idle.setdefault(key, []).append((built_at, agent))
+            self._idle.move_to_end(key)
+            while len(self._idle) > self.max_keys:
+                self._idle.popitem(last=False)
+
+_agent_pool = None
+_agent_pool_lock = threading.Lock()
+
+def get_agent_pool() -> AgentPool:
+    global _agent_pool
+    with _agent_pool_lock:
+        if _agent_pool is None:
+            _agent_pool = AgentPool(settings.HELIX_CHAT_AGENT_CACHE_SIZE, settings.HELIX_CHAT_AGENT_MAX_AGE_SECONDS)
+        return _agent_pool
+
 def handle_chat_query_stream(user_id: int,repo_id: int, query: str, file_path: str | None = None) -> Generator[str, None, None]:
     """
     Handles a user's chat query by invoking the Agno-powered Q&A agent.
     This function is now a simple wrapper around the agent's execution.
     """
-    print(f"AGNO_SERVICE: Handling query for repo {repo_id} with Agno agent. Query: '{query}'")
+    print(f"AGNO_SERVICE: Handling query for repo {repo_id}. Query: '{query}'")
+    # Retrieval questions skip the agent loop (see chat_router); anything it cannot answer falls through.
+    try:
+        chat_route = route_chat_query(query)
+        print(f"AGNO_SERVICE: Routed to {chat_route.path} ({chat_route.reason}).")
+        if chat_route.path == FAST_CHAT:
+            repo_name = Repository.objects.filter(id=repo_id).values_list('full_name', flat=True).first() if (
+                can_access_repository(user_id, repo_id)
+            ) else None
+            stream = fast_answer_stream(repo_id, repo_name, query, chat_route, file_path) if repo_name else None
+            if stream is not None:
+                yield from stream
+                return
+            print("AGNO_SERVICE: Fast path found no context; using the agent.")
+    except Exception as e:
+        print(f"AGNO_SERVICE: Chat routing failed, using the agent: {e}")
+
+    pool = get_agent_pool()
+    completed = False
     try:
-        # Get a freshly configured agent with the latest context
-        agent = get_helix_qa_agent(user_id=user_id, repo_id=repo_id,file_path=file_path)
+        # Reuse an idle agent for this user and repository if there is one
+        started = time.monotonic()
+        built_at, agent = pool.checkout(user_id, repo_id)
+        reused = built_at < started
         run_iterator = agent.run(message=query, stream=True) # Also stream intermediate steps for debugging
+        first_token = True
         
         # Loop through the iterator and yield each chunk's content
         for chunk in run_iterator:
             # The chunk object from agno likely has a .content attribute for the text token
             if chunk and hasattr(chunk, 'content') and chunk.content:
+                if first_token:
+                    first_token = False
+                    print(f"AGNO_SERVICE: First token after {(time.monotonic() - started) * 1000:.0f}ms ({'reused' if reused else 'new'} agent).")
                 # You might want to format this as SSE JSON if the consumer expects it
                 # For a simple generator, just yielding the text is fine.
                 # Let's assume you want to yield the raw token string.
                 yield chunk.content
-        
+        completed = True
             
     except Exception as e:
         print(f"AGNO_SERVICE: FATAL - Error during agent execution: {e}")
@@ -367,117 +397,65 @@ def handle_chat_query_stream(user_id: int,repo_id: int, query: str, file_path: s
         import traceback
         traceback.print_exc()
         yield f"// Helix encountered a critical error while processing your request."   
+    finally:
+        # An agent whose run failed or was abandoned mid-stream is dropped, not reused.
+        if completed:
+            pool.checkin(user_id, repo_id, built_at, agent)
         
-def generate_module_readme_stream(
-    repo_id: int,
-    module_path: str,
-    openai_client: OpenAIClient
-) -> Generator[str, None, None]:
+def module_readme_request(repo_id: int, module_path: str) -> dict | None:
     """
-    Generates an in-depth, architectural README.md for a module by synthesizing
-    semantic data from KnowledgeChunks and structural data from CodeDependencies.
+    Builds the prompt for an in-depth, architectural README.md for a module from
+    its cached dossier (see context_packs.module_dossier).
+    Returns the (a)cached_chat_stream arguments, or None if the module has no files.
     """
     print(f"MODULE_README_SERVICE (v3): Starting hyper-contextual analysis for repo {repo_id}, path '{module_path}'")
 
-    # --- Step 1: Scoping & Initial Data Gathering ---
-    files_in_module = CodeFile.objects.filter(
-        repository_id=repo_id, file_path__startswith=module_path
-    ).prefetch_related('classes', 'symbols')
-    
-    if not files_in_module.exists():
-        yield "Could not find any files in the specified module path to generate a README."
-        return
-
-    file_ids_in_module = [f.id for f in files_in_module]
-    all_symbols_in_module = CodeSymbol.objects.filter(code_file_id__in=file_ids_in_module)
-    symbol_ids_in_module = [s.id for s in all_symbols_in_module]
-    print(f"MODULE_README_SERVICE: Found {len(file_ids_in_module)} files and {len(symbol_ids_in_module)} symbols.")
-
-    # --- Step 2: Build the "Module Content Manifest" and Infer Ecosystem ---
-    file_content_map = {}
-    all_module_imports = set()
-    for file in files_in_module:
-        file_content_map[file.file_path] = {
-            "classes": [c.name for c in file.classes.all()],
-            "functions": [s.name for s in file.symbols.filter(code_class__isnull=True)],
-            "imports": file.imports or []
-        }
-        all_module_imports.update(file.imports or [])
-
-    inferred_ecosystem = []
-    if any('django' in imp for imp in all_module_imports): inferred_ecosystem.append('Django')
-    if any('pandas' in imp or 'numpy' in imp for imp in all_module_imports): inferred_ecosystem.append('Data Science (Pandas/NumPy)')
-    if any('react' in imp for imp in all_module_imports): inferred_ecosystem.append('React')
-    if any('fastapi' in imp for imp in all_module_imports): inferred_ecosystem.append('FastAPI')
-    print(f"MODULE_README_SERVICE: Inferred ecosystem: {inferred_ecosystem}")
-
-    # --- Step 3: Gather Semantic Layer (from KnowledgeChunks) ---
-    chunks = KnowledgeChunk.objects.filter(
-        related_file_id__in=file_ids_in_module,
-        chunk_type__in=[KnowledgeChunk.ChunkType.CLASS_SUMMARY, KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING]
-    ).select_related('related_class', 'related_symbol')
-    class_summaries_map = {chunk.related_class.id: chunk.content for chunk in chunks if chunk.chunk_type == 'CLASS_SUMMARY'}
-    symbol_doc_summaries_map = {chunk.related_symbol.id: chunk.content.strip().split('\n')[0] for chunk in chunks if chunk.chunk_type == 'SYMBOL_DOCSTRING'}
-
-    # --- Step 4: Gather Structural & Quality Layers ---
-    # Dependencies & Consumers
-    incoming_deps = CodeDependency.objects.filter(callee_id__in=symbol_ids_in_module).exclude(caller_id__in=symbol_ids_in_module).select_related('caller__code_file', 'callee')
-    outgoing_deps = CodeDependency.objects.filter(caller_id__in=symbol_ids_in_module).exclude(callee_id__in=symbol_ids_in_module).select_related('callee__code_file')
-    
-    external_consumers = sorted(list(set(dep.caller.code_file.file_path.replace('/', '.').replace('.py', '') for dep in incoming_deps if dep.caller.code_file)))
-    external_dependencies = sorted(list(set(dep.callee.code_file.file_path.replace('/', '.').replace('.py', '') for dep in outgoing_deps if dep.callee.code_file)))
-
-    # Key Entrypoints (weighted by call count)
-    entrypoint_counts = Counter(dep.callee for dep in incoming_deps)
-    key_entrypoints = [item[0] for item in entrypoint_counts.most_common(5)]
-
-    # Code Health Summary
-    health_symbols = all_symbols_in_module.filter(
-        Q(cyclomatic_complexity__gte=10) | Q(loc__gte=100) | Q(is_orphan=True)
-    ).order_by('-cyclomatic_complexity', '-loc')[:5] # Top 5 health concerns
+    dossier = module_dossier(repo_id, module_path)
+    if dossier is None:
+        return None
+    print(f"MODULE_README_SERVICE: Found {dossier.file_count} files and {dossier.symbol_count} symbols.")
+    print(f"MODULE_README_SERVICE: Inferred ecosystem: {dossier.ecosystem}")
 
-    # --- Step 5: Construct the Hyper-Contextualized Prompt ---
+    # --- Construct the Hyper-Contextualized Prompt ---
     prompt_parts = [
         "You are an expert Staff Engineer writing a comprehensive, in-depth architectural README.md for a software module.",
         "Based *only* on the architectural analysis provided below, generate a detailed and insightful README.",
         "\n--- ARCHITECTURAL ANALYSIS DOSSIER ---"
     ]
-    if inferred_ecosystem:
-        prompt_parts.append(f"**Project Ecosystem:** {', '.join(inferred_ecosystem)}")
+    if dossier.ecosystem:
+        prompt_parts.append(f"**Project Ecosystem:** {', '.join(dossier.ecosystem)}")
     prompt_parts.append(f"**Module Path:** `{module_path or 'Repository Root'}`")
 
-    if file_content_map:
+    if dossier.files:
         prompt_parts.append("\n**Module Content Manifest:**")
-        for file_path, contents in sorted(file_content_map.items())[:10]: # Limit files for brevity
-            prompt_parts.append(f"- **File:** `{file_path}`")
+        for contents in dossier.files:
+            prompt_parts.append(f"- **File:** `{contents['file_path']}`")
             if contents["classes"]: prompt_parts.append(f"  - **Classes:** {', '.join([f'`{c}`' for c in contents['classes']])}")
             if contents["functions"]: prompt_parts.append(f"  - **Functions:** {', '.join([f'`{f}()`' for f in contents['functions']])}")
-            if contents["imports"]: prompt_parts.append(f"  - **Imports:** {', '.join([f'`{i}`' for i in contents['imports'][:5]])}")
+            if contents["imports"]: prompt_parts.append(f"  - **Imports:** {', '.join([f'`{i}`' for i in contents['imports']])}")
 
-    if key_entrypoints:
+    if dossier.entrypoints:
         prompt_parts.append("\n**Key Public-Facing Components (Most Used Externally):**")
-        for symbol in key_entrypoints:
-            summary = symbol_doc_summaries_map.get(symbol.id, "No summary available.")
-            count = entrypoint_counts[symbol]
-            prompt_parts.append(f"- `def {symbol.name}(...)` (called {count} times externally): {summary}")
+        for entrypoint in dossier.entrypoints:
+            prompt_parts.append(f"- `def {entrypoint['name']}(...)` (called {entrypoint['count']} times externally): {entrypoint['summary']}")
 
-    if health_symbols:
+    if dossier.health:
         prompt_parts.append("\n**Code Health Summary:**")
-        for symbol in health_symbols:
-            if symbol.cyclomatic_complexity and symbol.cyclomatic_complexity >= 10:
-                prompt_parts.append(f"- **High Complexity:** `{symbol.name}` has a complexity of {symbol.cyclomatic_complexity}.")
-            if symbol.loc and symbol.loc >= 100:
-                prompt_parts.append(f"- **Large Symbol:** `{symbol.name}` is {symbol.loc} lines long.")
-            if symbol.is_orphan:
-                prompt_parts.append(f"- **Potential Dead Code:** `{symbol.name}` is an orphan (no incoming calls).")
-
-    if external_dependencies:
+        for symbol in dossier.health:
+            if symbol['cyclomatic_complexity'] and symbol['cyclomatic_complexity'] >= 10:
+                prompt_parts.append(f"- **High Complexity:** `{symbol['name']}` has a complexity of {symbol['cyclomatic_complexity']}.")
+            if symbol['loc'] and symbol['loc'] >= 100:
+                prompt_parts.append(f"- **Large Symbol:** `{symbol['name']}` is {symbol['loc']} lines long.")
+            if symbol['is_orphan']:
+                prompt_parts.append(f"- **Potential Dead Code:** `{symbol['name']}` is an orphan (no incoming calls).")
+
+    if dossier.external_dependencies:
         prompt_parts.append("\n**External Dependencies (This module relies on):**")
-        prompt_parts.extend([f"- `{dep}`" for dep in external_dependencies[:10]])
+        prompt_parts.extend([f"- `{dep}`" for dep in dossier.external_dependencies])
 
-    if external_consumers:
+    if dossier.external_consumers:
         prompt_parts.append("\n**External Consumers (Who uses this module):**")
-        prompt_parts.extend([f"- `{consumer}`" for consumer in external_consumers[:10]])
+        prompt_parts.extend([f"- `{consumer}`" for consumer in dossier.external_consumers])
 
     prompt_parts.extend([
         "\n--- TASK ---",
@@ -494,30 +472,48 @@ def generate_module_readme_stream(
     print(f"MODULE_README_SERVICE: Sending final prompt to LLM. Length: {len(final_prompt)}")
     print(final_prompt)
 
-    # --- Step 5: Stream to LLM and Save ---
+    route = route_call("module_readme")
+    return {
+        "kind": "module_readme",
+        "prompt_version": "v1",
+        "model": route.model,
+        "messages": [{"role": "user", "content": final_prompt}],
+        "temperature": 0.3,
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
+
+def save_module_readme(repo_id: int, module_path: str, readme_text: str):
+    cleaned_readme = readme_text.strip()
+    if not cleaned_readme:
+        return
+    module_doc, created = ModuleDocumentation.objects.update_or_create(
+        repository_id=repo_id,
+        module_path=module_path,
+        defaults={'content_md': cleaned_readme}
+    )
+    action = "created" if created else "updated"
+    print(f"MODULE_README_SERVICE: Successfully {action} ModuleDocumentation for repo {repo_id}, path '{module_path}'.")
+
+def generate_module_readme_stream(
+    repo_id: int,
+    module_path: str,
+    openai_client: OpenAIClient
+) -> Generator[str, None, None]:
+    """
+    Streams the module README built by module_readme_request and saves it once complete.
+    """
+    request = module_readme_request(repo_id, module_path)
+    if request is None:
+        yield "Could not find any files in the specified module path to generate a README."
+        return
+
     full_response_text = ""
     try:
-        stream = openai_client.chat.completions.create(
-            model="gpt-4.1-mini", # Use a powerful model for this complex task
-            messages=[{"role": "user", "content": final_prompt}],
-            stream=True,
-            temperature=0.3,
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                full_response_text += content
-                yield content
-                
-        if full_response_text:
-            cleaned_readme = full_response_text.strip()
-            module_doc, created = ModuleDocumentation.objects.update_or_create(
-                repository_id=repo_id,
-                module_path=module_path,
-                defaults={'content_md': cleaned_readme}
-            )
-            action = "created" if created else "updated"
-            print(f"MODULE_README_SERVICE: Successfully {action} ModuleDocumentation for repo {repo_id}, path '{module_path}'.")
+        for content in cached_chat_stream(openai_client, **request):
+            full_response_text += content
+            yield content
+        save_module_readme(repo_id, module_path, full_response_text)
     except Exception as e:
         print(f"MODULE_README_SERVICE: FATAL - LLM streaming failed: {e}")
         yield f"// Helix encountered an error while generating the README."
@@ -527,25 +523,12 @@ def generate_refactoring_suggestions(symbol_obj: CodeSymbol, openai_client: Open
     Uses an LLM to analyze a CodeSymbol and generate a list of
     structured refactoring suggestions in JSON format.
     """
-    source_code = symbol_obj.source_code
-    if not source_code or source_code.strip().startswith("# Error:"):
+    context = symbol_context(symbol_obj)
+    if not context.has_source:
         logger.error(f"AI_REFACTOR: Invalid source code for symbol {symbol_obj.id}.")
         return []
-
-    symbol_kind = "method" if symbol_obj.code_class else "function"
-    
-    # --- Context Injection (re-used from your existing function) ---
-    context_parts = [
-        f"The {symbol_kind} is named `{symbol_obj.name}`."
-    ]
-    if symbol_obj.loc is not None and symbol_obj.cyclomatic_complexity is not None:
-        context_parts.append(
-            f"**Code Metrics:** It has a Lines of Code (LOC) of `{symbol_obj.loc}` and a Cyclomatic Complexity of `{symbol_obj.cyclomatic_complexity}`."
-        )
-        if symbol_obj.cyclomatic_complexity > 10:
-            context_parts.append("The complexity is high, so pay special attention to simplifying conditional logic.")
-    
-    context_str = "\n".join(context_parts)
+    source_code = context.source_code
+    context_str = _metrics_context(context)
 
     # --- NEW, JSON-FOCUSED PROMPT ---
     # This prompt is adapted from yours to request a specific JSON structure.
@@ -572,8 +555,12 @@ def generate_refactoring_suggestions(symbol_obj: CodeSymbol, openai_client: Open
     # --- LLM Call (Non-streaming, JSON mode) ---
     try:
         logger.info(f"AI_REFACTOR: Requesting refactoring suggestions for symbol {symbol_obj.id}.")
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1-mini", # Or your preferred model that supports JSON mode
+        route = route_call("refactor_suggestions", symbol_obj, context.fan_in, context.fan_out)
+        content = cached_chat_completion(
+            openai_client, "refactor_suggestions", "v1",
+            model=route.model,
+            max_tokens=route.max_tokens,
+            route=route,
             response_format={"type": "json_object"}, # Enable JSON mode
             messages=[
                 {"role": "system", "content": "You are a helpful AI code quality analyst that provides refactoring suggestions in a structured JSON format."},
@@ -581,8 +568,6 @@ def generate_refactoring_suggestions(symbol_obj: CodeSymbol, openai_client: Open
             ],
             temperature=0.2,
         )
-        
-        content = response.choices[0].message.content
         if not content:
             logger.warning(f"AI_REFACTOR: LLM returned empty content for symbol {symbol_obj.id}.")
             return []
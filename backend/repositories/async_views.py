@@ -0,0 +1,419 @@
+# backend/repositories/async_views.py
+"""
+Async views for the endpoints that stream model output. Under ASGI each open
+stream is a coroutine waiting on the AsyncOpenAI client instead of a worker
+thread blocked on the network, so one process can hold many slow streams.
+
+Database work (permission checks, prompt building, the LLM cache and call
+log) is short and runs through sync_to_async; only the model call itself is
+natively async. The Q&A chat is the exception: its agno agent and tools use
+the sync ORM, so the agent runs in a small thread pool and its output is
+handed to the event loop through a queue.
+"""
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from .access import accessible_repository_ids, can_access_repository
+from .ai_services import (
+    class_summary_request, handle_chat_query_stream, module_readme_request, refactor_stream_request,
+    save_class_summary, save_module_readme,
+)
+from .context_packs import symbol_context
+from .decorators import consume_ai_request
+from .llm_cache import acached_chat_stream
+from .llm_client import get_async_openai_client
+from .models import CodeClass, CodeSymbol
+from .views import (
+    cohesive_tests_request, docstring_stream_prompt, docstring_stream_request, explanation_request, tests_request,
+)
+
+
+class AsyncStreamingView(View):
+    """
+    Base class for the async streaming views. Like the DRF views they replace,
+    anonymous requests get a 403; CSRF is checked by CsrfViewMiddleware.
+    Set `usage_limited` to count the request against the organization's AI
+    request limit (what check_usage_limit does for sync views).
+    """
+    usage_limited = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+        request.user = user
+        if self.usage_limited:
+            limited = await sync_to_async(consume_ai_request)(kwargs)
+            if limited is not None:
+                return limited
+        return await super().dispatch(request, *args, **kwargs)
+
+
+def _streaming_response(stream, content_type='text/plain; charset=utf-8') -> StreamingHttpResponse:
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['X-Accel-Buffering'] = 'no'  # Useful for Nginx to disable buffering
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+async def _stream_or_report(request: dict, error_prefix: str, log_tag: str):
+    """Streams a chat completion; an error mid-stream is reported in the text, as the sync generators did."""
+    try:
+        async for content in acached_chat_stream(get_async_openai_client(), **request):
+            yield content
+    except Exception as e:
+        error_message = f"{error_prefix}: {str(e)}"
+        print(f"{log_tag}: {error_message}")
+        yield error_message
+
+
+def _symbol_for_member(symbol_id: int, user, *related) -> CodeSymbol | None:
+    q_filter = Q(id=symbol_id) & (
+        Q(code_file__repository_id__in=accessible_repository_ids(user)) |
+        Q(code_class__code_file__repository_id__in=accessible_repository_ids(user))
+    )
+    return CodeSymbol.objects.select_related(*related).filter(q_filter).first()
+
+
+_chat_executor = None
+_chat_executor_lock = threading.Lock()
+
+
+def _chat_threads() -> ThreadPoolExecutor:
+    global _chat_executor
+    with _chat_executor_lock:
+        if _chat_executor is None:
+            _chat_executor = ThreadPoolExecutor(
+                max_workers=settings.HELIX_CHAT_STREAM_THREADS, thread_name_prefix="helix-chat"
+            )
+        return _chat_executor
+
+
+async def _iterate_in_thread(make_iterator):
+    """
+    Runs a blocking generator in the chat thread pool and yields its items on
+    the event loop. If the client disconnects, the generator is abandoned at
+    its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    abandoned = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:  # The event loop has closed.
+            abandoned.set()
+
+    def pump():
+        try:
+            for item in make_iterator():
+                if abandoned.is_set():
+                    break
+                put(item)
+        finally:
+            close_old_connections()
+            put(done)
+
+    loop.run_in_executor(_chat_threads(), pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            yield item
+    finally:
+        abandoned.set()
+
+
+class GenerateDocstringView(AsyncStreamingView):
+
+    async def get(self, request, *args, **kwargs):
+        function_id = kwargs.get('function_id')
+        print(f"VIEW_GEN_DOC: Request for symbol_id={function_id}, user={request.user.username}")
+
+        if not get_async_openai_client():
+            return JsonResponse({"error": "OpenAI service not available or not configured."}, status=503)
+
+        def prepare():
+            code_symbol_obj = _symbol_for_member(function_id, request.user, 'code_file', 'code_class__code_file')
+            if code_symbol_obj is None:
+                print(f"VIEW_GEN_DOC: Symbol with ID {function_id} not found or permission denied for user {request.user.username}.")
+                return JsonResponse({"error": "Symbol not found or permission denied."}, status=404)
+
+            context = symbol_context(code_symbol_obj)
+            if not context.has_source:
+                error_msg = context.source_code or "Could not retrieve source code for the symbol."
+                print(f"VIEW_GEN_DOC: {error_msg} for symbol {code_symbol_obj.name}")
+                return JsonResponse({"error": error_msg}, status=500)
+
+            prompt = docstring_stream_prompt(context)
+            return docstring_stream_request(prompt, code_symbol_obj, context)
+
+        prepared = await sync_to_async(prepare)()
+        if isinstance(prepared, JsonResponse):
+            return prepared
+        stream = _stream_or_report(prepared, "// Error during OpenAI stream", "STREAM_GEN")
+        return StreamingHttpResponse(stream, content_type='text/plain; charset=utf-8')
+
+
+class ExplainCodeView(AsyncStreamingView):
+
+    async def post(self, request, symbol_id, *args, **kwargs):
+        print(f"VIEW_EXPLAIN_CODE: Request for symbol_id: {symbol_id} by user: {request.user.username}")
+
+        if not get_async_openai_client():
+            return JsonResponse({"error": "Helix's explanation service is currently unavailable."}, status=503)
+
+        def prepare():
+            symbol_obj = _symbol_for_member(symbol_id, request.user, 'code_file', 'code_class__code_file')
+            if symbol_obj is None:
+                return JsonResponse({"error": "Symbol not found or permission denied."}, status=404)
+
+            context = symbol_context(symbol_obj)
+            if not context.has_source:
+                error_msg = context.source_code or "Could not retrieve source code for the symbol."
+                print(f"VIEW_EXPLAIN_CODE: {error_msg} for symbol {symbol_obj.name}")
+                return JsonResponse({"error": error_msg}, status=500)
+            return explanation_request(symbol_obj, context)
+
+        prepared = await sync_to_async(prepare)()
+        if isinstance(prepared, JsonResponse):
+            return prepared
+        return _streaming_response(_stream_or_report(
+            prepared, "// Helix encountered an error while generating the explanation", "EXPLAIN_CODE_STREAM_ERROR"
+        ))
+
+
+class SuggestTestsView(AsyncStreamingView):
+
+    async def post(self, request, symbol_id, *args, **kwargs):
+        print(f"VIEW_SUGGEST_TESTS: Request for symbol_id: {symbol_id} by user: {request.user.username}")
+
+        if not get_async_openai_client():
+            return JsonResponse({"error": "Helix's AI service is currently unavailable."}, status=503)
+
+        def prepare():
+            symbol_obj = _symbol_for_member(symbol_id, request.user, 'code_file', 'code_class__code_file')
+            if symbol_obj is None:
+                return JsonResponse({"error": "Symbol not found or permission denied."}, status=404)
+
+            context = symbol_context(symbol_obj)
+            if not context.has_source:
+                error_msg = context.source_code or "Could not retrieve source code for the symbol."
+                print(f"VIEW_SUGGEST_TESTS: {error_msg} for symbol {symbol_obj.name}")
+                return JsonResponse({"error": f"Helix could not retrieve valid source code: {context.source_code}"}, status=500)
+            return tests_request(symbol_obj, context)
+
+        prepared = await sync_to_async(prepare)()
+        if isinstance(prepared, JsonResponse):
+            return prepared
+        return _streaming_response(_stream_or_report(
+            prepared, "// Helix encountered an error while generating test suggestions", "SUGGEST_TESTS_STREAM_ERROR"
+        ))
+
+
+class SuggestRefactorsView(AsyncStreamingView):
+
+    async def get(self, request, symbol_id, *args, **kwargs):
+        if not get_async_openai_client():
+            return JsonResponse({"error": "AI service not configured."}, status=503)
+
+        def prepare():
+            symbol = _symbol_for_member(symbol_id, request.user, 'code_file', 'code_class__code_file')
+            if symbol is None:
+                return JsonResponse({"error": "Symbol not found or you do not have permission."}, status=404)
+            return refactor_stream_request(symbol)
+
+        prepared = await sync_to_async(prepare)()
+        if isinstance(prepared, JsonResponse):
+            return prepared
+        if prepared is None:
+            async def no_source():
+                yield "// Helix could not retrieve valid source code to suggest refactors. Please try reprocessing the repository."
+            return StreamingHttpResponse(no_source(), content_type='text/plain; charset=utf-8')
+
+        stream = _stream_or_report(
+            prepared, "// Helix encountered an error while suggesting refactors", "SUGGEST_REFACTORS_STREAM_ERROR"
+        )
+        return StreamingHttpResponse(stream, content_type='text/plain; charset=utf-8')
+
+
+class CohesiveTestGenerationView(AsyncStreamingView):
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b"{}")
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON body."}, status=400)
+        symbol_ids = data.get('symbol_ids')
+        if not isinstance(symbol_ids, list) or not symbol_ids:
+            return JsonResponse({"error": "A list of 'symbol_ids' is required."}, status=400)
+
+        if not get_async_openai_client():
+            return JsonResponse({"error": "AI service unavailable."}, status=503)
+
+        def prepare():
+            q_filter = Q(id__in=symbol_ids) & (
+                Q(code_file__repository_id__in=accessible_repository_ids(request.user)) |
+                Q(code_class__code_file__repository_id__in=accessible_repository_ids(request.user))
+            )
+            symbols = list(CodeSymbol.objects.filter(q_filter).select_related('code_file', 'code_class__code_file'))
+            if len(symbols) != len(symbol_ids):
+                return "// Error: One or more symbols were not found or you do not have permission to access them."
+            request_args = cohesive_tests_request(symbols)
+            if request_args is None:
+                return "// Error: Could not retrieve source code for any of the selected symbols."
+            return request_args
+
+        prepared = await sync_to_async(prepare)()
+        if isinstance(prepared, str):
+            async def report(message=prepared):
+                yield message
+            return _streaming_response(report())
+        return _streaming_response(_stream_or_report(prepared, "// Helix encountered an error", "COHESIVE_TESTS_STREAM_ERROR"))
+
+
+async def _class_summary_stream(code_class: CodeClass, request: dict):
+    """Streams the class summary, then saves it on the class once complete."""
+    full_response_text = ""
+    try:
+        async for content in acached_chat_stream(get_async_openai_client(), **request):
+            full_response_text += content
+            yield content
+        await sync_to_async(save_class_summary)(code_class, full_response_text)
+    except Exception as e:
+        error_message = f"// Helix encountered an error while summarizing the class: {str(e)}"
+        print(f"CLASS_SUMMARY_STREAM_ERROR: {error_message}")
+        yield error_message
+
+
+class ClassSummaryView(AsyncStreamingView):
+
+    async def post(self, request, class_id, *args, **kwargs):
+        print(f"VIEW_CLASS_SUMMARY: Request for class_id: {class_id} by user: {request.user.username}")
+
+        if not get_async_openai_client():
+            return JsonResponse({"error": "Helix's AI service is currently unavailable."}, status=503)
+
+        def prepare():
+            # Check access via the file the class belongs to
+            code_class = CodeClass.objects.select_related('code_file__repository').filter(
+                id=class_id,
+                code_file__repository_id__in=accessible_repository_ids(request.user)
+            ).first()
+            if code_class is None:
+                return JsonResponse({"error": "Class not found or permission denied."}, status=404)
+            return code_class, class_summary_request(code_class)
+
+        prepared = await sync_to_async(prepare)()
+        if isinstance(prepared, JsonResponse):
+            return prepared
+        return _streaming_response(_class_summary_stream(*prepared))
+
+
+class ChatView(AsyncStreamingView):
+    usage_limited = True
+
+    async def post(self, request, repo_id, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b"{}")
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON body."}, status=400)
+        query = data.get('query')
+        current_file_path = data.get('current_file_path')
+
+        if not query or not isinstance(query, str) or len(query.strip()) < 3:
+            return JsonResponse({"error": "A meaningful query string is required."}, status=400)
+
+        print(f"CHAT_VIEW: Received query for repo {repo_id}: '{query}'. File context: '{current_file_path}'")
+
+        is_member = await sync_to_async(can_access_repository)(request.user, repo_id)
+        if not is_member:
+            return JsonResponse({"error": "Repository not found or permission denied."}, status=404)
+
+        user_id = request.user.id
+        stream = _iterate_in_thread(lambda: handle_chat_query_stream(
+            user_id=user_id,
+            repo_id=repo_id,
+            query=query.strip(),
+            file_path=current_file_path
+        ))
+        return _streaming_response(stream)
+
+
+class SummarizeModuleView(AsyncStreamingView):
+    usage_limited = True
+
+    async def post(self, request, repo_id, *args, **kwargs):
+        try:
+            data = json.loads(request.body or b"{}")
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON body."}, status=400)
+        module_path = data.get('path')
+
+        if module_path is None or not isinstance(module_path, str):
+            return JsonResponse({"error": "A 'path' string for the module/directory is required."}, status=400)
+
+        print(f"SUMMARIZE_MODULE_VIEW: Request for repo {repo_id}, path '{module_path}'")
+
+        if not get_async_openai_client():
+            return JsonResponse({"error": "Helix's AI service is currently unavailable."}, status=503)
+
+        if not await sync_to_async(can_access_repository)(request.user, repo_id):
+            return JsonResponse({"error": "Repository not found or permission denied."}, status=404)
+
+        return _streaming_response(_module_readme_stream(repo_id, module_path.strip()))
+
+
+async def _module_readme_stream(repo_id: int, module_path: str):
+    """The async counterpart of ai_services.generate_module_readme_stream: streams the README, then saves it."""
+    request = await sync_to_async(module_readme_request)(repo_id, module_path)
+    if request is None:
+        yield "Could not find any files in the specified module path to generate a README."
+        return
+
+    full_response_text = ""
+    try:
+        async for content in acached_chat_stream(get_async_openai_client(), **request):
+            full_response_text += content
+            yield content
+        await sync_to_async(save_module_readme)(repo_id, module_path, full_response_text)
+    except Exception as e:
+        print(f"MODULE_README_SERVICE: FATAL - LLM streaming failed: {e}")
+        yield "// Helix encountered an error while generating the README."
+
+
+class StreamModuleReadmeView(AsyncStreamingView):
+
+    async def get(self, request, repo_id, *args, **kwargs):
+        if not await sync_to_async(can_access_repository)(request.user, repo_id):
+            return StreamingHttpResponse(status=404)
+
+        if not get_async_openai_client():
+            return JsonResponse({"error": "Helix's AI service is currently unavailable."}, status=503)
+
+        module_path = request.GET.get('module_path', '').strip()
+
+        async def event_stream():
+            """Server-Sent Events: one `data` event per chunk, then an `end` event."""
+            async for chunk in _module_readme_stream(repo_id, module_path):
+                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+                await asyncio.sleep(0.02) # Small pause to prevent overwhelming the client
+
+            yield "event: end\n"
+            yield "data: {}\n\n"
+
+        response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,135 @@
+# backend/repositories/benchmarks.py
+"""
+Helpers shared by the vector search benchmark management commands. They build
+a synthetic, clustered embedding corpus, load it into a temporary table and
+compare approximate (HNSW) results against exact NumPy ground truth.
+"""
+import time
+
+import numpy as np
+from django.db import connection, transaction
+
+from .retrieval import vector_literal
+
+BENCH_TABLE = "helix_bench_vectors"
+
+
+def synthetic_corpus(rows: int, dims: int, repos: int, clusters: int = 64, seed: int = 42):
+    """
+    Generates `rows` unit vectors grouped around `clusters` random centers, and
+    assigns them to `repos` repositories with a skewed (Zipf-like) size
+    distribution, so that a few repositories are large and most are small,
+    as in production. Returns (vectors float32[rows, dims], repo_ids int[rows]).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(rows, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    weights = 1.0 / np.arange(1, repos + 1)
+    repo_ids = rng.choice(np.arange(1, repos + 1), size=rows, p=weights / weights.sum())
+    return vectors, repo_ids
+
+
+def synthetic_queries(vectors, repo_ids, count: int, seed: int = 7):
+    """Picks `count` query vectors near corpus points, each scoped to that point's repository."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(vectors), size=count)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(count, vectors.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries, repo_ids[picks]
+
+
+def exact_top_k(vectors, repo_ids, query, repo_id, k: int) -> list[int]:
+    """Exact L2 top-k (as 1-based row ids) within one repository, used as ground truth."""
+    candidate_rows = np.flatnonzero(repo_ids == repo_id)
+    distances = np.linalg.norm(vectors[candidate_rows] - query, axis=1)
+    order = np.argsort(distances)[:k]
+    return [int(candidate_rows[i]) + 1 for i in order]
+
+
+def recall_at_k(found: list[int], truth: list[int]) -> float:
+    if not truth:
+        return 1.0
+    return len(set(found) & set(truth)) / len(truth)
+
+
+def latency_summary(latencies_ms: list[float]) -> dict:
+    values = np.array(latencies_ms or [0.0])
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "mean": float(values.mean()),
+    }
+
+
+def create_bench_table(vectors, repo_ids, column_type: str = "vector", batch_size: int = 500):
+    """
+    Loads the corpus into a TEMPORARY table (dropped automatically when the
+    connection closes). Row ids are 1-based positions in `vectors`.
+    """
+    dims = vectors.shape[1]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {BENCH_TABLE} ("
+            f"id bigint PRIMARY KEY, repository_id integer NOT NULL, embedding {column_type}({dims}) NOT NULL)"
+        )
+        for start in range(0, len(vectors), batch_size):
+            batch = [
+                (start + offset + 1, int(repo_ids[start + offset]), vector_literal(vector))
+                for offset, vector in enumerate(vectors[start:start + batch_size])
+            ]
+            cursor.executemany(
+                f"INSERT INTO {BENCH_TABLE} (id, repository_id, embedding) VALUES (%s, %s, %s::{column_type})",
+                batch
+            )
+        cursor.execute(f"ANALYZE {BENCH_TABLE}")
+
+
+def add_bench_column(column: str, column_type: str, vectors, batch_size: int = 500):
+    """Adds a vector column (e.g. a reduced projection) to the benchmark table, row-aligned with `vectors`."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {BENCH_TABLE} ADD COLUMN {column} {column_type}({vectors.shape[1]})")
+        for start in range(0, len(vectors), batch_size):
+            batch = [
+                (vector_literal(vector), start + offset + 1)
+                for offset, vector in enumerate(vectors[start:start + batch_size])
+            ]
+            cursor.executemany(f"UPDATE {BENCH_TABLE} SET {column} = %s::{column_type} WHERE id = %s", batch)
+        cursor.execute(f"ANALYZE {BENCH_TABLE}")
+
+
+def create_hnsw_index(index_name: str, expression: str = "embedding", opclass: str = "vector_l2_ops",
+                      where: str | None = None) -> float:
+    """Builds an HNSW index on the benchmark table and returns the build time in seconds."""
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX {index_name} ON {BENCH_TABLE} USING hnsw (({expression}) {opclass}) "
+            f"WITH (m = 16, ef_construction = 64)" + (f" WHERE {where}" if where else "")
+        )
+    return time.perf_counter() - started
+
+
+def relation_size_mb(relation: str) -> float:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_relation_size(%s::regclass)", [relation])
+        return cursor.fetchone()[0] / (1024 * 1024)
+
+
+def timed_query(sql: str, params, settings_sql: list[str]) -> tuple[list[int], float]:
+    """
+    Runs one search query in its own transaction after applying the given
+    SET LOCAL statements. Returns (ids, latency in milliseconds).
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for statement in settings_sql:
+                cursor.execute(statement)
+            started = time.perf_counter()
+            cursor.execute(sql, params)
+            ids = [row[0] for row in cursor.fetchall()]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+    return ids, elapsed_ms
@@ -0,0 +1,124 @@
+# backend/repositories/centroids.py
+"""
+Pooled file / class / module vectors for coarse-to-fine retrieval. Centroids
+are the mean of the existing knowledge chunk embeddings in each area, computed
+with NumPy (no extra embedding calls) and refreshed per file as chunks are
+re-embedded. Module centroids are pooled from the file centroids of the files
+directly inside that directory.
+"""
+import os
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .embeddings import EMBEDDING_DIMENSIONS
+from .models import EmbeddingCentroid, KnowledgeChunk
+
+
+def _module_of(file_path: str) -> str:
+    return os.path.dirname(file_path)
+
+
+def refresh_centroids(repo_id: int, file_ids=None) -> int:
+    """
+    Recomputes the centroids of the given files (all files if None), the
+    classes inside them and the modules that contain them. Returns the number
+    of centroid rows written.
+    """
+    chunks = KnowledgeChunk.objects.filter(
+        repository_id=repo_id, embedding__isnull=False, related_file__isnull=False
+    )
+    if file_ids is not None:
+        file_ids = list(file_ids)
+        if not file_ids:
+            return 0
+        chunks = chunks.filter(related_file_id__in=file_ids)
+
+    # Stream the embeddings and accumulate per-area sums so memory stays
+    # proportional to the number of areas, not the number of chunks.
+    file_sums, file_counts, file_paths = {}, {}, {}
+    class_sums, class_counts, class_files = {}, {}, {}
+    rows = chunks.values_list('related_file_id', 'related_file__file_path', 'related_class_id', 'embedding')
+    for file_id, file_path, class_id, embedding in rows.iterator(chunk_size=2000):
+        vector = np.asarray(embedding, dtype=np.float64)
+        if file_id not in file_sums:
+            file_sums[file_id] = np.zeros(EMBEDDING_DIMENSIONS)
+            file_counts[file_id] = 0
+            file_paths[file_id] = file_path
+        file_sums[file_id] += vector
+        file_counts[file_id] += 1
+        if class_id:
+            if class_id not in class_sums:
+                class_sums[class_id] = np.zeros(EMBEDDING_DIMENSIONS)
+                class_counts[class_id] = 0
+                class_files[class_id] = file_id
+            class_sums[class_id] += vector
+            class_counts[class_id] += 1
+
+    new_rows = [
+        EmbeddingCentroid(
+            repository_id=repo_id, level=EmbeddingCentroid.Level.FILE, module_path=_module_of(file_paths[file_id]),
+            code_file_id=file_id, chunk_count=count, embedding=(file_sums[file_id] / count).tolist(),
+        )
+        for file_id, count in file_counts.items()
+    ] + [
+        EmbeddingCentroid(
+            repository_id=repo_id, level=EmbeddingCentroid.Level.CLASS,
+            module_path=_module_of(file_paths[class_files[class_id]]), code_file_id=class_files[class_id],
+            code_class_id=class_id, chunk_count=count, embedding=(class_sums[class_id] / count).tolist(),
+        )
+        for class_id, count in class_counts.items()
+    ]
+
+    centroids = EmbeddingCentroid.objects.filter(repository_id=repo_id)
+    with transaction.atomic():
+        if file_ids is None:
+            centroids.delete()
+        else:
+            # Modules that held these files before the refresh must be re-pooled too.
+            affected_modules = set(
+                centroids.filter(level=EmbeddingCentroid.Level.FILE, code_file_id__in=file_ids)
+                .values_list('module_path', flat=True)
+            )
+            centroids.filter(
+                Q(level=EmbeddingCentroid.Level.FILE) | Q(level=EmbeddingCentroid.Level.CLASS),
+                code_file_id__in=file_ids,
+            ).delete()
+        EmbeddingCentroid.objects.bulk_create(new_rows, batch_size=500)
+
+        if file_ids is None:
+            affected_modules = None
+        else:
+            affected_modules |= {_module_of(path) for path in file_paths.values()}
+        written = len(new_rows) + _pool_module_centroids(repo_id, affected_modules)
+    return written
+
+
+def _pool_module_centroids(repo_id: int, module_paths=None) -> int:
+    """Rebuilds MODULE centroids (all, or only `module_paths`) as chunk-weighted means of their file centroids."""
+    centroids = EmbeddingCentroid.objects.filter(repository_id=repo_id)
+    file_centroids = centroids.filter(level=EmbeddingCentroid.Level.FILE)
+    module_centroids = centroids.filter(level=EmbeddingCentroid.Level.MODULE)
+    if module_paths is not None:
+        module_paths = list(module_paths)
+        file_centroids = file_centroids.filter(module_path__in=module_paths)
+        module_centroids = module_centroids.filter(module_path__in=module_paths)
+    module_centroids.delete()
+
+    sums, counts = {}, {}
+    for module_path, chunk_count, embedding in file_centroids.values_list('module_path', 'chunk_count', 'embedding'):
+        if module_path not in sums:
+            sums[module_path] = np.zeros(EMBEDDING_DIMENSIONS)
+            counts[module_path] = 0
+        sums[module_path] += np.asarray(embedding, dtype=np.float64) * chunk_count
+        counts[module_path] += chunk_count
+
+    EmbeddingCentroid.objects.bulk_create([
+        EmbeddingCentroid(
+            repository_id=repo_id, level=EmbeddingCentroid.Level.MODULE, module_path=module_path,
+            chunk_count=count, embedding=(sums[module_path] / count).tolist(),
+        )
+        for module_path, count in counts.items() if count
+    ], batch_size=500)
+    return len(sums)
@@ -0,0 +1,187 @@
+# backend/repositories/chat_router.py
+"""
+Query router for the Q&A chat. Most chat questions are plain retrieval
+("how does X work", "what does Y do"); running them through the agent costs
+several model round trips (plan, search, often show_tables and SQL) before
+the first answer token. The router classifies each question locally and
+answers retrieval questions with one knowledge search and one streamed
+completion; structural questions (counts, listings, metrics) and anything
+ambiguous still go to the agent.
+
+Classification, cheapest signal first:
+  1. structural keyword patterns -> agent
+  2. exact-name lookups (see retrieval.looks_like_identifier) -> fast path,
+     answered from the full-text index without an embedding
+  3. similarity of the query embedding to example questions of each intent,
+     biased toward the fast path when the question reads like a retrieval
+     question. The embedding is reused for the search itself.
+"""
+import re
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .agno_tools import format_knowledge_context
+from .embeddings import get_embedding_provider
+from .llm_cache import cached_chat_stream
+from .llm_client import get_openai_client
+from .model_router import route as route_call
+from .retrieval import layered_knowledge_search, lexical_knowledge_search, looks_like_identifier
+
+FAST, AGENT = "fast", "agent"
+
+_STRUCTURAL = re.compile(
+    r"\b(how many|count|number of|list (all|every|the)|show (me )?(all|every)|all (the )?(functions|classes|files|methods|modules|symbols)"
+    r"|which (files?|functions?|classes|methods|modules)|orphans?|dead code|complexity|largest|biggest|longest|smallest"
+    r"|most (called|used|complex)|lines of code|loc|coverage|tables?|sql|statistics|stats)\b",
+    re.IGNORECASE,
+)
+_RETRIEVAL = re.compile(
+    r"^\s*(how (does|do|is|are|can|should)|what (does|do|is|are|happens)|what's|why|where (is|are|does|do)"
+    r"|explain|describe|tell me about|summari[sz]e|walk me through)\b",
+    re.IGNORECASE,
+)
+
+INTENT_EXAMPLES = {
+    FAST: [
+        "How does authentication work in this project?",
+        "What does the parse_config function do?",
+        "Explain how the caching layer works.",
+        "Where is the retry logic implemented?",
+        "Why does the worker use a queue here?",
+        "Describe the purpose of the payments module.",
+        "How do I add a new API endpoint?",
+        "What happens when a request fails validation?",
+    ],
+    AGENT: [
+        "How many functions are in this repository?",
+        "List all classes in the models file.",
+        "Which files have the highest cyclomatic complexity?",
+        "Show me all orphan functions.",
+        "Count the symbols that have no docstring.",
+        "What are the largest files by lines of code?",
+        "Which functions call save_user and what do they return?",
+        "Compare the test coverage of the api and core modules.",
+    ],
+}
+
+
+class ChatRoute:
+    """The router's decision for one question. `query_embedding` is set when it was computed for routing."""
+    def __init__(self, path: str, reason: str, query_embedding=None):
+        self.path = path
+        self.reason = reason
+        self.query_embedding = query_embedding
+
+    def __repr__(self):
+        return f"ChatRoute({self.path}, {self.reason})"
+
+
+_intent_vectors = None
+_intent_lock = threading.Lock()
+
+
+def _intent_matrices() -> dict[str, np.ndarray] | None:
+    """Normalized example embeddings per intent, computed once per process; None if embedding failed."""
+    global _intent_vectors
+    with _intent_lock:
+        if _intent_vectors is None:
+            try:
+                provider = get_embedding_provider()
+                _intent_vectors = {}
+                for intent, examples in INTENT_EXAMPLES.items():
+                    matrix = np.array(provider.embed(examples), dtype=np.float32)
+                    _intent_vectors[intent] = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-9)
+            except Exception as e:
+                print(f"CHAT_ROUTER: Could not embed intent examples, routing by patterns only: {e}")
+                _intent_vectors = None
+                return None
+        return _intent_vectors
+
+
+def route_chat_query(query: str) -> ChatRoute:
+    if not settings.HELIX_CHAT_ROUTER_ENABLED:
+        return ChatRoute(AGENT, "router disabled")
+    if _STRUCTURAL.search(query):
+        return ChatRoute(AGENT, "structural pattern")
+    if looks_like_identifier(query):
+        return ChatRoute(FAST, "identifier lookup")
+
+    reads_like_retrieval = bool(_RETRIEVAL.match(query))
+    intents = _intent_matrices()
+    if intents is None:
+        return ChatRoute(FAST if reads_like_retrieval else AGENT, "retrieval pattern" if reads_like_retrieval else "no signal")
+
+    try:
+        query_embedding = get_embedding_provider().embed_query(query)
+    except Exception as e:
+        print(f"CHAT_ROUTER: Could not embed query: {e}")
+        return ChatRoute(AGENT, "embedding failed")
+    vector = np.array(query_embedding, dtype=np.float32)
+    vector /= max(float(np.linalg.norm(vector)), 1e-9)
+    fast_similarity = float((intents[FAST] @ vector).max())
+    agent_similarity = float((intents[AGENT] @ vector).max())
+
+    # A retrieval-style question needs clear evidence to go to the agent; anything else needs clear evidence to skip it.
+    margin = settings.HELIX_CHAT_ROUTER_MARGIN
+    if reads_like_retrieval:
+        path = AGENT if agent_similarity - fast_similarity >= margin else FAST
+    else:
+        path = FAST if fast_similarity - agent_similarity >= margin else AGENT
+    return ChatRoute(path, f"similarity fast={fast_similarity:.2f} agent={agent_similarity:.2f}", query_embedding)
+
+
+def fast_answer_stream(repo_id: int, repo_name: str, query: str, chat_route: ChatRoute, file_path: str | None = None):
+    """
+    Answers a retrieval question with one knowledge search and one streamed
+    completion. Returns None (before anything is streamed) if the search
+    finds nothing or no client is configured, so the caller can fall back to
+    the agent. The caller has already checked the user's access to the repo.
+    """
+    started = time.monotonic()
+    openai_client = get_openai_client()
+    if openai_client is None:
+        return None
+    if chat_route.query_embedding is None and looks_like_identifier(query):
+        rows = lexical_knowledge_search(repo_id, query)
+    else:
+        query_embedding = chat_route.query_embedding or get_embedding_provider().embed_query(query)
+        rows = layered_knowledge_search(repo_id, query_embedding, query_text=query)
+    if not rows:
+        return None
+
+    context_lines = [f"You are answering a question about the repository '{repo_name}'."]
+    if file_path:
+        context_lines.append(f"The user currently has the file '{file_path}' open.")
+    route = route_call("chat_answer")
+    request = {
+        "model": route.model,
+        "messages": [
+            {"role": "system", "content": (
+                "You are Helix, an AI assistant for a software repository. Answer the user's question using only "
+                "the retrieved context below. Cite function names or file paths when possible. If the context does "
+                "not contain the answer, say so plainly instead of guessing.\n\n"
+                + "\n".join(context_lines) + "\n\n" + format_knowledge_context(rows)
+            )},
+            {"role": "user", "content": query},
+        ],
+        "temperature": 0.2,
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
+
+    def stream():
+        first_token = True
+        try:
+            for content in cached_chat_stream(openai_client, "chat_answer", "v1", **request):
+                if first_token:
+                    first_token = False
+                    print(f"CHAT_ROUTER: First token after {(time.monotonic() - started) * 1000:.0f}ms (fast path).")
+                yield content
+        except Exception as e:
+            print(f"CHAT_ROUTER: Fast-path completion failed: {e}")
+            yield "// Helix encountered a critical error while processing your request."
+
+    return stream()
@@ -0,0 +1,206 @@
+# backend/repositories/chunking.py
+"""
+Token-aware chunking for the knowledge index. Long symbol sources are split at
+statement boundaries into overlapping slices of at most HELIX_CHUNK_MAX_TOKENS
+tokens, each recording its line range; small adjacent symbols in the same file
+are packed into a single chunk. Docstrings are split on line boundaries.
+
+Tokens are counted with tiktoken's cl100k_base encoding (the one used by the
+OpenAI embedding models) when it is installed, otherwise estimated locally.
+"""
+import ast
+import functools
+import re
+import textwrap
+
+from django.conf import settings
+
+from .models import KnowledgeChunk
+
+_TOKEN_ESTIMATE = re.compile(r"\w+|[^\w\s]")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # Not installed, or the BPE file cannot be loaded.
+        print(f"CHUNKING: tiktoken unavailable ({e}); estimating token counts.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Rough BPE estimate: one token per word or punctuation mark, plus one per
+    # extra 4 characters of long words.
+    return sum(1 + max(len(token) - 4, 0) // 4 for token in _TOKEN_ESTIMATE.findall(text))
+
+
+def statement_boundaries(source: str) -> set[int]:
+    """
+    Returns the 0-based line offsets where a statement starts, at any nesting
+    depth. Falls back to blank lines and dedents when the source is not valid
+    Python on its own.
+    """
+    try:
+        tree = ast.parse(textwrap.dedent(source))
+    except (SyntaxError, ValueError):
+        lines = source.splitlines()
+        boundaries = {0}
+        for i in range(1, len(lines)):
+            previous, current = lines[i - 1], lines[i]
+            if not previous.strip() or (current.strip() and
+                                        len(current) - len(current.lstrip()) <= len(previous) - len(previous.lstrip())):
+                boundaries.add(i)
+        return boundaries
+    return {node.lineno - 1 for node in ast.walk(tree) if isinstance(node, ast.stmt)} | {0}
+
+
+def split_lines(text: str, start_line: int = 1, max_tokens: int | None = None,
+                overlap_tokens: int | None = None, boundaries: set[int] | None = None) -> list[tuple[str, int, int]]:
+    """
+    Splits `text` into (slice text, first line, last line) tuples of at most
+    `max_tokens` tokens. Slices end just before a boundary line when possible
+    (every line is a boundary if none are given), and each slice after the
+    first starts with up to `overlap_tokens` tokens of the previous one.
+    Line numbers are 1-based and offset by `start_line`.
+    """
+    max_tokens = max_tokens or settings.HELIX_CHUNK_MAX_TOKENS
+    overlap_tokens = settings.HELIX_CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    lines = text.splitlines(keepends=True)
+    if not lines:
+        return []
+    line_tokens = [count_tokens(line) for line in lines]
+    if sum(line_tokens) <= max_tokens:
+        return [(text, start_line, start_line + len(lines) - 1)]
+    if boundaries is None:
+        boundaries = set(range(len(lines)))
+
+    slices = []
+    begin = 0
+    while begin < len(lines):
+        # Grow the slice line by line until the budget is used up.
+        end, used = begin, 0
+        while end < len(lines) and (used + line_tokens[end] <= max_tokens or end == begin):
+            used += line_tokens[end]
+            end += 1
+        if end < len(lines):
+            # Prefer to stop right before the last statement that starts in the
+            # slice or right after it (a boundary at `end` keeps the whole slice).
+            cut = max((b for b in boundaries if begin < b <= end), default=None)
+            if cut is not None:
+                end = cut
+        slices.append(("".join(lines[begin:end]), start_line + begin, start_line + end - 1))
+        if end >= len(lines):
+            break
+        # Step back over the trailing lines that fit in the overlap budget.
+        next_begin, carried = end, 0
+        while next_begin - 1 > begin and carried + line_tokens[next_begin - 1] <= overlap_tokens:
+            next_begin -= 1
+            carried += line_tokens[next_begin]
+        begin = next_begin
+    return slices
+
+
+def _related_file(symbol):
+    return symbol.code_file or (symbol.code_class and symbol.code_class.code_file)
+
+
+def docstring_chunks(repo, symbol) -> list[KnowledgeChunk]:
+    """SYMBOL_DOCSTRING chunks for a symbol, or an empty list if it has no meaningful docstring."""
+    if not symbol.documentation or len(symbol.documentation.strip()) <= 20:
+        return []
+    parts = split_lines(symbol.documentation, start_line=1)
+    chunks = []
+    for index, (text, _, _) in enumerate(parts, start=1):
+        part_label = f" (part {index}/{len(parts)})" if len(parts) > 1 else ""
+        chunks.append(KnowledgeChunk(
+            repository=repo,
+            chunk_type=KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING,
+            content=f"Documentation for function '{symbol.name}'{part_label}:\n{text}",
+            related_symbol=symbol,
+            related_class=symbol.code_class,
+            related_file=_related_file(symbol),
+        ))
+    return chunks
+
+
+def source_chunks(repo, symbols_with_source) -> list[KnowledgeChunk]:
+    """
+    SYMBOL_SOURCE chunks for (symbol, source) pairs. Sources longer than
+    HELIX_CHUNK_MAX_TOKENS are split at statement boundaries; runs of adjacent
+    symbols in the same file that are each smaller than HELIX_CHUNK_PACK_MAX_TOKENS
+    are packed together up to the chunk budget.
+    """
+    max_tokens = settings.HELIX_CHUNK_MAX_TOKENS
+    pack_max_tokens = settings.HELIX_CHUNK_PACK_MAX_TOKENS
+    chunks = []
+    pack = []  # [(symbol, source, tokens)] waiting to be packed
+
+    def flush_pack():
+        if len(pack) == 1:
+            symbol, source, _ = pack[0]
+            chunks.append(_source_chunk(repo, symbol, source, symbol.start_line, symbol.end_line))
+        elif pack:
+            names = ", ".join(f"'{symbol.name}'" for symbol, _, _ in pack)
+            first, last = pack[0][0], pack[-1][0]
+            body = "\n".join(source.rstrip("\n") for _, source, _ in pack)
+            chunks.append(KnowledgeChunk(
+                repository=repo,
+                chunk_type=KnowledgeChunk.ChunkType.SYMBOL_SOURCE,
+                content=f"Source code for functions {names}:\n```python\n{body}\n```",
+                related_file=_related_file(first),
+                start_line=first.start_line,
+                end_line=last.end_line,
+            ))
+        pack.clear()
+
+    ordered = sorted(symbols_with_source, key=lambda pair: (getattr(_related_file(pair[0]), 'id', 0), pair[0].start_line))
+    for symbol, source in ordered:
+        tokens = count_tokens(source)
+        if tokens < pack_max_tokens:
+            if pack:
+                same_file = _related_file(pack[-1][0]) == _related_file(symbol)
+                fits = sum(t for _, _, t in pack) + tokens <= max_tokens
+                if not (same_file and fits):
+                    flush_pack()
+            pack.append((symbol, source, tokens))
+            continue
+        flush_pack()
+        if tokens <= max_tokens:
+            chunks.append(_source_chunk(repo, symbol, source, symbol.start_line, symbol.end_line))
+            continue
+        parts = split_lines(source, start_line=symbol.start_line, boundaries=statement_boundaries(source))
+        for index, (text, first_line, last_line) in enumerate(parts, start=1):
+            chunks.append(_source_chunk(repo, symbol, text, first_line, last_line, part=(index, len(parts))))
+    flush_pack()
+    return chunks
+
+
+def _source_chunk(repo, symbol, source, start_line, end_line, part=None) -> KnowledgeChunk:
+    label = f" (lines {start_line}-{end_line}, part {part[0]}/{part[1]})" if part else ""
+    return KnowledgeChunk(
+        repository=repo,
+        chunk_type=KnowledgeChunk.ChunkType.SYMBOL_SOURCE,
+        content=f"Source code for function '{symbol.name}'{label}:\n```python\n{source}\n```",
+        related_symbol=symbol,
+        related_class=symbol.code_class,
+        related_file=_related_file(symbol),
+        start_line=start_line,
+        end_line=end_line,
+    )
+
+
+def symbol_chunks(repo, symbols) -> list[KnowledgeChunk]:
+    """Docstring and source chunks for an iterable of CodeSymbols."""
+    chunks, symbols_with_source = [], []
+    for symbol in symbols:
+        chunks.extend(docstring_chunks(repo, symbol))
+        source = symbol.source_code
+        if source and not source.strip().startswith("# Error:"):
+            symbols_with_source.append((symbol, source))
+    chunks.extend(source_chunks(repo, symbols_with_source))
+    return chunks
@@ -0,0 +1,434 @@
+# backend/repositories/context_packs.py
+"""
+Precomputed prompt context for symbols and classes. Every AI feature about a
+symbol (explanation, tests, refactoring, docstrings) needs the same handful
+of facts: file path, source, documentation, metrics and its callers and
+callees. Building them costs several queries plus a read of the source file,
+so they are assembled once into a compact "context pack" and kept in the
+shared cache.
+
+Pack keys contain the pack format version, the repository's context
+generation and the symbol's content hash (a class's structure hash).
+Re-ingesting a repository or saving documentation bumps the generation (see
+bump_context_generation), which retires all of the repository's packs at
+once; editing one symbol changes its content hash.
+
+Module dossiers (the architectural summary behind a module README) are
+cached the same way, keyed by module path and generation.
+"""
+import hashlib
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CodeClass, CodeDependency, CodeFile, CodeSymbol
+from .utils import REPO_CACHE_BASE_PATH
+
+PACK_VERSION = 1
+# Caller/callee names kept per pack; prompts use the first few.
+MAX_NEIGHBOURS = 5
+
+_GENERATION_PREFIX = "helix:ctx:generation:"
+
+
+def context_generation(repo_ids) -> dict[int, int]:
+    """{repo_id: current context generation} in one cache round trip."""
+    repo_ids = list(repo_ids)
+    found = cache.get_many([f"{_GENERATION_PREFIX}{repo_id}" for repo_id in repo_ids])
+    return {repo_id: found.get(f"{_GENERATION_PREFIX}{repo_id}", 0) for repo_id in repo_ids}
+
+
+def bump_context_generation(repo_ids):
+    """
+    Retires every cached context pack (and module dossier) of the given
+    repositories once the current transaction commits.
+    """
+    repo_ids = [repo_id for repo_id in set(repo_ids) if repo_id is not None]
+
+    def bump():
+        for repo_id in repo_ids:
+            key = f"{_GENERATION_PREFIX}{repo_id}"
+            # Generations never expire, so an old pack key cannot come back into use.
+            if not cache.add(key, 1, timeout=None):
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.set(key, 1, timeout=None)
+
+    if repo_ids:
+        transaction.on_commit(bump)
+
+
+def _digest(text: str | None) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()[:12]
+
+
+def _code_file(symbol: CodeSymbol):
+    if symbol.code_file_id:
+        return symbol.code_file
+    if symbol.code_class_id and symbol.code_class.code_file_id:
+        return symbol.code_class.code_file
+    return None
+
+
+def _read_lines(repo_id: int, file_path: str) -> list[str] | str:
+    """The file's lines from the repository cache, or an '# Error:' string."""
+    if not REPO_CACHE_BASE_PATH:
+        return "# Error: System configuration issue (REPO_CACHE_BASE_PATH is not set)."
+    full_path = os.path.join(REPO_CACHE_BASE_PATH, str(repo_id), file_path)
+    if not os.path.exists(full_path):
+        print(f"CONTEXT_PACK: File not found in cache: {full_path}")
+        return "# Error: Source file not found in cache."
+    try:
+        with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.readlines()
+    except Exception as e:
+        print(f"CONTEXT_PACK: Error reading {full_path}: {e}")
+        return f"# Error reading file: {e}"
+
+
+def _slice_source(lines: list[str] | str, start_line: int, end_line: int) -> str:
+    if isinstance(lines, str):
+        return lines
+    if start_line > 0 and end_line >= start_line and end_line <= len(lines):
+        return "".join(lines[start_line - 1:end_line])
+    return f"# Error: Invalid line numbers ({start_line}-{end_line})."
+
+
+class SymbolContext:
+    """Everything the AI prompts use about one function or method."""
+    def __init__(self, symbol_id: int, name: str, kind: str, class_name: str | None, file_path: str,
+                 source_code: str, documentation: str, loc: int | None, cyclomatic_complexity: int | None,
+                 callers: list[str], callees: list[str], fan_in: int, fan_out: int):
+        self.symbol_id = symbol_id
+        self.name = name
+        self.kind = kind
+        self.class_name = class_name
+        self.file_path = file_path
+        self.source_code = source_code
+        self.documentation = documentation
+        self.loc = loc
+        self.cyclomatic_complexity = cyclomatic_complexity
+        self.callers = callers
+        self.callees = callees
+        self.fan_in = fan_in
+        self.fan_out = fan_out
+
+    @property
+    def has_source(self) -> bool:
+        return bool(self.source_code) and not self.source_code.strip().startswith("# Error")
+
+    @property
+    def module_path(self) -> str:
+        """Dotted import path of the symbol's file."""
+        return self.file_path.replace('.py', '').replace('/', '.')
+
+    def doc_preview(self, limit: int) -> str:
+        return (self.documentation[:limit] + '...') if len(self.documentation) > limit else self.documentation
+
+
+def _symbol_key(symbol: CodeSymbol, generation: int) -> str:
+    return f"helix:ctx:v{PACK_VERSION}:symbol:{symbol.id}:{generation}:{symbol.content_hash or _digest(symbol.name)}"
+
+
+def _neighbours(symbol_ids: list[int]) -> tuple[dict, dict, dict, dict]:
+    """Caller and callee names (first MAX_NEIGHBOURS) and fan-in/out counts, in two queries."""
+    callers, callees, fan_in, fan_out = {}, {}, {}, {}
+    for callee_id, caller_name in CodeDependency.objects.filter(callee_id__in=symbol_ids).order_by('id') \
+            .values_list('callee_id', 'caller__name'):
+        fan_in[callee_id] = fan_in.get(callee_id, 0) + 1
+        names = callers.setdefault(callee_id, [])
+        if len(names) < MAX_NEIGHBOURS:
+            names.append(caller_name)
+    for caller_id, callee_name in CodeDependency.objects.filter(caller_id__in=symbol_ids).order_by('id') \
+            .values_list('caller_id', 'callee__name'):
+        fan_out[caller_id] = fan_out.get(caller_id, 0) + 1
+        names = callees.setdefault(caller_id, [])
+        if len(names) < MAX_NEIGHBOURS:
+            names.append(callee_name)
+    return callers, callees, fan_in, fan_out
+
+
+def _build_symbol_contexts(symbols: list[CodeSymbol]) -> dict[int, SymbolContext]:
+    callers, callees, fan_in, fan_out = _neighbours([symbol.id for symbol in symbols])
+    files = {}
+    contexts = {}
+    for symbol in symbols:
+        code_file = _code_file(symbol)
+        if code_file is None:
+            file_path = "N/A"
+            source_code = f"# Error: Symbol {symbol.id} is not linked to a file."
+        else:
+            file_path = code_file.file_path
+            file_key = (code_file.repository_id, file_path)
+            if file_key not in files:
+                files[file_key] = _read_lines(*file_key)
+            source_code = _slice_source(files[file_key], symbol.start_line, symbol.end_line)
+        contexts[symbol.id] = SymbolContext(
+            symbol_id=symbol.id,
+            name=symbol.name,
+            kind="method" if symbol.code_class_id else "function",
+            class_name=symbol.code_class.name if symbol.code_class_id else None,
+            file_path=file_path,
+            source_code=source_code,
+            documentation=(symbol.documentation or "").strip(),
+            loc=symbol.loc,
+            cyclomatic_complexity=symbol.cyclomatic_complexity,
+            callers=callers.get(symbol.id, []),
+            callees=callees.get(symbol.id, []),
+            fan_in=fan_in.get(symbol.id, 0),
+            fan_out=fan_out.get(symbol.id, 0),
+        )
+    return contexts
+
+
+def symbol_contexts(symbols) -> dict[int, SymbolContext]:
+    """
+    {symbol_id: SymbolContext} for `symbols` (CodeSymbols, ideally with
+    code_file and code_class selected). Cached packs cost one cache round
+    trip for all of them; the rest are built together, reading each source
+    file once. Packs whose source could not be read, and symbols without a
+    repository (which no generation bump would reach), are not cached.
+    """
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    generations = context_generation({symbol.repository_id for symbol in symbols if symbol.repository_id})
+    keys = {
+        symbol.id: _symbol_key(symbol, generations[symbol.repository_id])
+        for symbol in symbols if symbol.repository_id
+    }
+    cached = cache.get_many(list(keys.values())) if keys else {}
+    contexts = {symbol_id: SymbolContext(**cached[key]) for symbol_id, key in keys.items() if key in cached}
+
+    missing = [symbol for symbol in symbols if symbol.id not in contexts]
+    if missing:
+        built = _build_symbol_contexts(missing)
+        cache.set_many(
+            {keys[symbol_id]: vars(context) for symbol_id, context in built.items()
+             if symbol_id in keys and context.has_source},
+            settings.HELIX_CONTEXT_PACK_CACHE_SECONDS,
+        )
+        contexts.update(built)
+    return contexts
+
+
+def symbol_context(symbol: CodeSymbol) -> SymbolContext:
+    return symbol_contexts([symbol])[symbol.id]
+
+
+class ClassContext:
+    """The interface and relationships of one class, as used by the class summary prompt."""
+    def __init__(self, class_id: int, name: str, file_path: str, public_methods: list[str],
+                 private_methods: list[str], init_source: str, external_callees: list[str],
+                 external_callers: list[str]):
+        self.class_id = class_id
+        self.name = name
+        self.file_path = file_path
+        self.public_methods = public_methods
+        self.private_methods = private_methods
+        self.init_source = init_source
+        self.external_callees = external_callees
+        self.external_callers = external_callers
+
+
+def _method_signature(source_code: str, name: str) -> str:
+    # Taken from the start of the source (a simple heuristic).
+    if not source_code or source_code.startswith("# Error"):
+        return f"def {name}(...):"
+    return source_code.split('):', 1)[0] + '):' if '):' in source_code else source_code.split('\n')[0]
+
+
+def _build_class_context(code_class) -> tuple[ClassContext, bool]:
+    """The class's context, and whether its source file could be read."""
+    methods = list(CodeSymbol.objects.filter(code_class=code_class).order_by('start_line'))
+    lines = _read_lines(code_class.code_file.repository_id, code_class.code_file.file_path)
+
+    public_methods, private_methods = [], []
+    init_source = "N/A"
+    for method in methods:
+        source_code = _slice_source(lines, method.start_line, method.end_line)
+        if method.name.startswith('_'):
+            if method.name != "__init__":
+                private_methods.append(method.name)
+        else:
+            doc_summary = ""
+            if method.documentation:
+                doc_summary = f"  # {method.documentation.splitlines()[0]}" # First line of docstring
+            public_methods.append(f"{_method_signature(source_code, method.name)}{doc_summary}")
+        if method.name == "__init__":
+            init_source = source_code
+
+    # Up to 5 external functions this class calls, and 5 that call its methods.
+    external_callees = list(CodeDependency.objects.filter(caller__code_class=code_class).exclude(
+        callee__code_class=code_class
+    ).values_list('callee__name', flat=True).distinct()[:5])
+    external_callers = list(CodeDependency.objects.filter(callee__code_class=code_class).exclude(
+        caller__code_class=code_class
+    ).values_list('caller__name', flat=True).distinct()[:5])
+
+    context = ClassContext(
+        class_id=code_class.id,
+        name=code_class.name,
+        file_path=code_class.code_file.file_path,
+        public_methods=public_methods,
+        private_methods=private_methods,
+        init_source=init_source,
+        external_callees=external_callees,
+        external_callers=external_callers,
+    )
+    return context, not isinstance(lines, str)
+
+
+def class_context(code_class) -> ClassContext:
+    """The cached ClassContext of a CodeClass (with code_file selected)."""
+    repo_id = code_class.code_file.repository_id
+    generation = context_generation([repo_id])[repo_id]
+    key = f"helix:ctx:v{PACK_VERSION}:class:{code_class.id}:{generation}:{code_class.structure_hash or ''}"
+    cached = cache.get(key)
+    if cached is not None:
+        return ClassContext(**cached)
+    context, readable = _build_class_context(code_class)
+    if readable:
+        cache.set(key, vars(context), settings.HELIX_CONTEXT_PACK_CACHE_SECONDS)
+    return context
+
+
+# Dossier lists are cut to what the README prompt shows.
+DOSSIER_MAX_FILES = 10
+DOSSIER_MAX_IMPORTS = 5
+DOSSIER_MAX_ENTRYPOINTS = 5
+DOSSIER_MAX_HEALTH = 5
+DOSSIER_MAX_MODULES = 10
+
+_ECOSYSTEM_MARKERS = [
+    ('Django', ('django',)),
+    ('Data Science (Pandas/NumPy)', ('pandas', 'numpy')),
+    ('React', ('react',)),
+    ('FastAPI', ('fastapi',)),
+]
+
+
+class ModuleDossier:
+    """The architectural analysis of a module (a file path prefix) used by the module README prompt."""
+    def __init__(self, module_path: str, file_count: int, symbol_count: int, ecosystem: list[str],
+                 files: list[dict], entrypoints: list[dict], health: list[dict],
+                 external_dependencies: list[str], external_consumers: list[str]):
+        self.module_path = module_path
+        self.file_count = file_count
+        self.symbol_count = symbol_count
+        self.ecosystem = ecosystem
+        self.files = files
+        self.entrypoints = entrypoints
+        self.health = health
+        self.external_dependencies = external_dependencies
+        self.external_consumers = external_consumers
+
+
+def _dotted(file_path: str) -> str:
+    return file_path.replace('/', '.').replace('.py', '')
+
+
+def _doc_summary(documentation: str | None) -> str | None:
+    # Mirrors docstring_chunks: short docstrings carry no summary.
+    if not documentation or len(documentation.strip()) <= 20:
+        return None
+    return documentation.strip().split('\n')[0]
+
+
+def _build_module_dossier(repo_id: int, module_path: str) -> ModuleDossier | None:
+    """Five queries whatever the module's size: files, classes, symbols, incoming and outgoing calls."""
+    files = list(CodeFile.objects.filter(
+        repository_id=repo_id, file_path__startswith=module_path
+    ).values_list('id', 'file_path', 'imports'))
+    if not files:
+        return None
+    file_ids = [file_id for file_id, _, _ in files]
+
+    classes_by_file = {}
+    for file_id, name in CodeClass.objects.filter(code_file_id__in=file_ids).order_by('start_line') \
+            .values_list('code_file_id', 'name'):
+        classes_by_file.setdefault(file_id, []).append(name)
+
+    symbols = list(CodeSymbol.objects.filter(code_file_id__in=file_ids).order_by('start_line').values(
+        'id', 'name', 'code_file_id', 'code_class_id', 'documentation', 'cyclomatic_complexity', 'loc', 'is_orphan'
+    ))
+    symbols_by_id = {symbol['id']: symbol for symbol in symbols}
+    functions_by_file = {}
+    for symbol in symbols:
+        if symbol['code_class_id'] is None:
+            functions_by_file.setdefault(symbol['code_file_id'], []).append(symbol['name'])
+
+    # Calls crossing the module boundary; callers/callees outside any file (methods) are kept, as before.
+    incoming = list(CodeDependency.objects.filter(callee__code_file_id__in=file_ids).exclude(
+        caller__code_file_id__in=file_ids
+    ).values_list('callee_id', 'caller__code_file__file_path'))
+    outgoing_paths = set(CodeDependency.objects.filter(caller__code_file_id__in=file_ids).exclude(
+        callee__code_file_id__in=file_ids
+    ).values_list('callee__code_file__file_path', flat=True))
+
+    all_imports = set()
+    for _, _, imports in files:
+        all_imports.update(imports or [])
+    ecosystem = [
+        label for label, markers in _ECOSYSTEM_MARKERS
+        if any(marker in imp for imp in all_imports for marker in markers)
+    ]
+
+    manifest = [
+        {
+            "file_path": file_path,
+            "classes": classes_by_file.get(file_id, []),
+            "functions": functions_by_file.get(file_id, []),
+            "imports": (imports or [])[:DOSSIER_MAX_IMPORTS],
+        }
+        for file_id, file_path, imports in sorted(files, key=lambda f: f[1])[:DOSSIER_MAX_FILES]
+    ]
+
+    entrypoint_counts = Counter(callee_id for callee_id, _ in incoming)
+    entrypoints = [
+        {
+            "name": symbols_by_id[callee_id]['name'],
+            "count": count,
+            "summary": _doc_summary(symbols_by_id[callee_id]['documentation']) or "No summary available.",
+        }
+        for callee_id, count in entrypoint_counts.most_common(DOSSIER_MAX_ENTRYPOINTS)
+    ]
+
+    concerns = [
+        symbol for symbol in symbols
+        if (symbol['cyclomatic_complexity'] or 0) >= 10 or (symbol['loc'] or 0) >= 100 or symbol['is_orphan']
+    ]
+    concerns.sort(key=lambda s: (s['cyclomatic_complexity'] or 0, s['loc'] or 0), reverse=True)
+    health = [
+        {key: symbol[key] for key in ('name', 'cyclomatic_complexity', 'loc', 'is_orphan')}
+        for symbol in concerns[:DOSSIER_MAX_HEALTH]
+    ]
+
+    return ModuleDossier(
+        module_path=module_path,
+        file_count=len(files),
+        symbol_count=len(symbols),
+        ecosystem=ecosystem,
+        files=manifest,
+        entrypoints=entrypoints,
+        health=health,
+        external_dependencies=sorted({_dotted(path) for path in outgoing_paths if path})[:DOSSIER_MAX_MODULES],
+        external_consumers=sorted({_dotted(path) for _, path in incoming if path})[:DOSSIER_MAX_MODULES],
+    )
+
+
+def module_dossier(repo_id: int, module_path: str) -> ModuleDossier | None:
+    """The cached ModuleDossier of a module, or None if no file is under `module_path`."""
+    generation = context_generation([repo_id])[repo_id]
+    key = f"helix:ctx:v{PACK_VERSION}:module:{repo_id}:{generation}:{_digest(module_path)}"
+    cached = cache.get(key)
+    if cached is not None:
+        return ModuleDossier(**cached)
+    dossier = _build_module_dossier(repo_id, module_path)
+    if dossier is not None:
+        cache.set(key, vars(dossier), settings.HELIX_CONTEXT_PACK_CACHE_SECONDS)
+    return dossier
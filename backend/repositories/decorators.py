@@ -1,34 +1,29 @@
 # backend/repositories/decorators.py
 from functools import wraps
-from .models import Organization, Repository
+from .usage import consume, organization_quota
 from django.http import JsonResponse
 
+def consume_ai_request(kwargs) -> JsonResponse | None:
+    """Counts one AI request against the organization; returns a 429 response if it is over its limit."""
+    # We need to get the organization from the request.
+    # This assumes the org_id or repo_id is in the URL kwargs.
+    quota = organization_quota(org_id=kwargs.get('org_id'), repo_id=kwargs.get('repo_id'))
+
+    if quota:
+        org_id, limit = quota
+        # Checked and counted atomically in Redis; the monthly reset is a new counter key.
+        if not consume(org_id, limit):
+            return JsonResponse(
+                {"error": "You have reached your monthly limit for AI requests."},
+                status=429 # "Too Many Requests" is a fitting status code
+            )
+    return None
+
 def check_usage_limit(view_func):
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        # We need to get the organization from the request.
-        # This assumes the org_id or repo_id is in the URL kwargs.
-        repo_id = kwargs.get('repo_id')
-        org_id = kwargs.get('org_id')
-        
-        organization = None
-        if org_id:
-            organization = Organization.objects.get(id=org_id)
-        elif repo_id:
-            organization = Repository.objects.select_related('organization').get(id=repo_id).organization
-
-        if organization:
-            # TODO: Add logic to reset `ai_requests_this_month` if a new month has started.
-            
-            if organization.ai_requests_this_month >= organization.ai_requests_limit:
-                return JsonResponse(
-                    {"error": "You have reached your monthly limit for AI requests."},
-                    status=429 # "Too Many Requests" is a fitting status code
-                )
-            
-            # Increment the count
-            organization.ai_requests_this_month += 1
-            organization.save(update_fields=['ai_requests_this_month'])
-
+        limited = consume_ai_request(kwargs)
+        if limited is not None:
+            return limited
         return view_func(request, *args, **kwargs)
-    return _wrapped_view
\ No newline at end of file
+    return _wrapped_view
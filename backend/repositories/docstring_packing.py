@@ -0,0 +1,80 @@
+# backend/repositories/docstring_packing.py
+"""
+Prompt packing for bulk docstring generation. Small symbols from the same file
+are grouped into one request (bounded by HELIX_DOCSTRING_PACK_TOKEN_BUDGET and
+HELIX_DOCSTRING_PACK_MAX_SYMBOLS) that asks for a JSON object with one
+docstring per symbol, so the system prompt and per-request overhead are paid
+once per pack instead of once per symbol. Items missing from the response are
+regenerated one by one by the caller.
+"""
+import json
+
+from django.conf import settings
+
+PACKED_SYSTEM_PROMPT = (
+    "You are an expert Python programmer. You will receive several Python functions from the same file, "
+    "each introduced by an identifier such as [s1]. For each one, write a concise, professional, Google-style "
+    "docstring: start with a one-line summary, then describe the arguments and what the function returns. "
+    "Do not include the function signature or surrounding triple quotes. "
+    'Respond with a JSON object of the form {"docstrings": {"s1": "...", "s2": "..."}} containing every identifier.'
+)
+
+
+class PackItem:
+    """One symbol waiting for a docstring."""
+    def __init__(self, symbol_id: int, file_path: str, name: str, source: str, tokens: int):
+        self.symbol_id = symbol_id
+        self.file_path = file_path
+        self.name = name
+        self.source = source
+        self.tokens = tokens
+
+
+def pack_items(items: list[PackItem]) -> list[list[PackItem]]:
+    """
+    Groups items into packs of neighbouring small symbols from the same file.
+    Symbols larger than HELIX_DOCSTRING_PACK_MAX_SYMBOL_TOKENS get a pack of their own.
+    """
+    budget = settings.HELIX_DOCSTRING_PACK_TOKEN_BUDGET
+    max_symbols = settings.HELIX_DOCSTRING_PACK_MAX_SYMBOLS
+    max_symbol_tokens = settings.HELIX_DOCSTRING_PACK_MAX_SYMBOL_TOKENS
+
+    packs, current, current_tokens = [], [], 0
+    for item in items:
+        if item.tokens > max_symbol_tokens:
+            packs.append([item])
+            continue
+        fits = (current and current[0].file_path == item.file_path
+                and len(current) < max_symbols and current_tokens + item.tokens <= budget)
+        if not fits:
+            if current:
+                packs.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += item.tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def packed_prompt(pack: list[PackItem]) -> str:
+    parts = [f"File: {pack[0].file_path}\n"]
+    for index, item in enumerate(pack, start=1):
+        parts.append(f"[s{index}] {item.name}\n```python\n{item.source}\n```\n")
+    return "\n".join(parts)
+
+
+def parse_packed_response(content: str | None, pack: list[PackItem]) -> dict[int, str]:
+    """Returns {symbol_id: raw docstring} for the items the response answered."""
+    try:
+        docstrings = json.loads(content or "").get("docstrings", {})
+    except (json.JSONDecodeError, AttributeError):
+        return {}
+    if not isinstance(docstrings, dict):
+        return {}
+    results = {}
+    for index, item in enumerate(pack, start=1):
+        value = docstrings.get(f"s{index}")
+        if isinstance(value, str) and value.strip():
+            results[item.symbol_id] = value
+    return results
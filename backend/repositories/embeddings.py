@@ -0,0 +1,254 @@
+# backend/repositories/embeddings.py
+"""
+Embedding providers. Every call site that needs an embedding (query-time
+search, the batch submission tasks and the batch poller) goes through
+`get_embedding_provider()` instead of talking to OpenAI directly.
+
+Backends:
+  - "openai": the OpenAI embeddings endpoint, plus the Batch API for bulk jobs.
+  - "local":  a CPU backend that needs no network access. It uses a
+              sentence-transformers model when HELIX_LOCAL_EMBEDDING_MODEL is
+              set (and the package is installed), otherwise a deterministic
+              feature-hashing embedder over identifier-aware tokens.
+
+All providers return vectors of EMBEDDING_DIMENSIONS so they fit the existing
+VectorField columns. Vectors from different providers are not comparable, so
+switching HELIX_EMBEDDING_PROVIDER requires re-embedding existing rows.
+"""
+import functools
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from openai import OpenAI
+
+from .llm_client import call_openai, get_openai_client
+from .utils import identifier_words
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+class EmbeddingProvider:
+    """Base interface for embedding backends."""
+    name = "base"
+    model = ""
+    # True if bulk jobs can be submitted through the OpenAI Batch API.
+    supports_batch_api = False
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embeds a list of texts, returning one vector per text in order."""
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed([text])[0]
+
+    def batch_request(self, custom_id: str, text: str) -> dict:
+        """Builds one line of a Batch API .jsonl input file."""
+        raise NotImplementedError(f"The '{self.name}' embedding provider does not support the Batch API.")
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    name = "openai"
+    supports_batch_api = True
+    batch_endpoint = "/v1/embeddings"
+
+    def __init__(self, client: OpenAI | None = None, model: str | None = None):
+        self.client = client or get_openai_client()
+        self.model = model or settings.HELIX_EMBEDDING_MODEL
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        response = call_openai("embeddings", self.client.embeddings.create, input=texts, model=self.model)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def batch_request(self, custom_id: str, text: str) -> dict:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": self.batch_endpoint,
+            "body": {"model": self.model, "input": text},
+        }
+
+
+class _HashingBackend:
+    """
+    Feature-hashing embedder: identifier-aware words, word bigrams and
+    character trigrams are hashed into signed buckets and L2-normalized.
+    Deterministic, needs no model download and is fast; lexical rather than semantic.
+    """
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def _features(self, text: str):
+        words = identifier_words(text)
+        for word in words:
+            yield word, 1.0
+            if len(word) >= 5:
+                for i in range(len(word) - 2):
+                    yield f"#{word[i:i + 3]}", 0.25
+        for first, second in zip(words, words[1:]):
+            yield f"{first} {second}", 0.5
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                sign = 1.0 if digest & 1 else -1.0
+                matrix[row, (digest >> 1) % self.dimensions] += sign * weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class _SentenceTransformerBackend:
+    """Runs a sentence-transformers model on CPU, zero-padding its output to `dimensions`."""
+    def __init__(self, model_name: str, dimensions: int):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimensions = dimensions
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True)
+        vectors = vectors.astype(np.float32)[:, :self.dimensions]
+        if vectors.shape[1] < self.dimensions:
+            # Zero-padding keeps L2 distances between padded vectors unchanged.
+            vectors = np.pad(vectors, ((0, 0), (0, self.dimensions - vectors.shape[1])))
+        return vectors
+
+
+@functools.lru_cache(maxsize=None)
+def _local_backend(model_name: str, dimensions: int):
+    if model_name:
+        try:
+            return _SentenceTransformerBackend(model_name, dimensions)
+        except ImportError:
+            print(f"EMBEDDINGS: sentence-transformers is not installed; using the hashing embedder instead of '{model_name}'.")
+    return _HashingBackend(dimensions)
+
+
+def _encode_locally(model_name: str, dimensions: int, texts: list[str]) -> list[list[float]]:
+    # Module-level so it can run in worker processes.
+    return _local_backend(model_name, dimensions).encode(texts).tolist()
+
+
+def _init_local_worker(model_name: str, dimensions: int):
+    # Loads the model once per worker process instead of once per batch.
+    _local_backend(model_name, dimensions)
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    name = "local"
+
+    def __init__(self, model_name: str | None = None, batch_size: int | None = None, workers: int | None = None):
+        self.model_name = settings.HELIX_LOCAL_EMBEDDING_MODEL if model_name is None else model_name
+        self.model = self.model_name or "helix-hashing-v1"
+        self.batch_size = batch_size or settings.HELIX_LOCAL_EMBEDDING_BATCH_SIZE
+        self.workers = settings.HELIX_LOCAL_EMBEDDING_WORKERS if workers is None else workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        The provider's worker pool, started on first use and kept for the life
+        of the process. Workers are spawned rather than forked (the parent may
+        be running threads or an event loop) and load the model once each.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_local_worker,
+                    initargs=(self.model_name, EMBEDDING_DIMENSIONS),
+                )
+            return self._pool
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        # Small inputs (e.g. a search query) always run in-process; only bulk
+        # work is worth the cost of handing batches to a worker pool. Daemonic
+        # processes (Celery prefork children) cannot start a pool of their own.
+        use_pool = self.workers > 1 and len(batches) > 1 and not multiprocessing.current_process().daemon
+        if use_pool:
+            results = self._get_pool().map(_encode_locally, [self.model_name] * len(batches),
+                                           [EMBEDDING_DIMENSIONS] * len(batches), batches)
+            return [vector for batch in results for vector in batch]
+        return [vector for batch in batches for vector in _encode_locally(self.model_name, EMBEDDING_DIMENSIONS, batch)]
+
+
+EMBEDDING_PROVIDERS = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+    LocalEmbeddingProvider.name: LocalEmbeddingProvider,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_embedding_provider() -> EmbeddingProvider:
+    """Returns the process-wide provider selected by HELIX_EMBEDDING_PROVIDER."""
+    provider_name = settings.HELIX_EMBEDDING_PROVIDER
+    try:
+        provider_class = EMBEDDING_PROVIDERS[provider_name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown HELIX_EMBEDDING_PROVIDER '{provider_name}'. Choose one of: {', '.join(EMBEDDING_PROVIDERS)}."
+        )
+    return provider_class()
+
+
+def symbol_embedding_text(symbol) -> str:
+    """The text embedded for a CodeSymbol: its name plus its documentation, if any."""
+    text = symbol.name
+    if symbol.documentation:
+        # OpenAI recommends replacing newlines with spaces for their embedding models.
+        doc_cleaned = symbol.documentation.replace("\n", " ").strip()
+        if doc_cleaned:
+            text += f"\n\n{doc_cleaned}"
+    return text
+
+
+def store_embeddings(job_type: str, updates: dict) -> int:
+    """
+    Writes {pk: vector} embeddings to KnowledgeChunk or CodeSymbol rows,
+    depending on the EmbeddingBatchJob job type, plus their reduced copies when
+    an EmbeddingProjection is active. Returns the number of rows updated.
+    """
+    # Imported here so worker processes can import this module without Django set up.
+    from .models import CodeSymbol, EmbeddingBatchJob, KnowledgeChunk
+    from .projection import get_write_projection
+    from .vector_store import record_embedding_updates
+
+    if job_type == EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING:
+        model, store_kind = KnowledgeChunk, "chunks"
+    elif job_type == EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING:
+        model, store_kind = CodeSymbol, "symbols"
+    else:
+        raise ValueError(f"Unsupported embedding job type: {job_type}")
+
+    items_to_update = list(model.objects.filter(id__in=updates.keys()).only('id', 'repository_id'))
+    for item in items_to_update:
+        item.embedding = updates[item.id]
+    fields = ['embedding']
+
+    # Keep the reduced copy in step with the active projection (or the one replacing it).
+    projection = get_write_projection()
+    if projection and items_to_update:
+        reduced = projection.project([updates[item.id] for item in items_to_update])
+        for item, vector in zip(items_to_update, reduced):
+            item.embedding_reduced = vector.tolist()
+        fields.append('embedding_reduced')
+
+    model.objects.bulk_update(items_to_update, fields, batch_size=500)
+
+    # Keep the per-repository in-memory matrices (vector_store.py) in step.
+    updates_by_repo = {}
+    for item in items_to_update:
+        updates_by_repo.setdefault(item.repository_id, {})[item.id] = updates[item.id]
+    record_embedding_updates(store_kind, updates_by_repo)
+    return len(items_to_update)
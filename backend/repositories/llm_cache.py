@@ -0,0 +1,181 @@
+# backend/repositories/llm_cache.py
+"""
+Persistent cache for LLM responses. Entries are keyed by
+(task kind, prompt-template version, model, hash of every input sent to the
+model), so an unchanged symbol, or identical code in another repository, is
+answered without calling the API. Bump a task's prompt version whenever its
+template or post-processing changes in a way that should invalidate old
+answers.
+
+Streamed responses are stored chunk by chunk and replayed with the same
+chunking; only responses that completed without an error are stored.
+
+Every call, cached or not, is recorded through model_router.record_call.
+API calls go through llm_client, with the task kind as the metrics call site.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .chunking import count_tokens
+from .llm_client import astream_openai, call_openai, stream_openai
+from .model_router import record_call
+from .models import LLMCacheEntry
+
+
+def cache_key(kind: str, prompt_version: str, model: str, messages: list, params: dict) -> str:
+    inputs = json.dumps({"messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    inputs_hash = hashlib.sha256(inputs.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{kind}\0{prompt_version}\0{model}\0{inputs_hash}".encode("utf-8")).hexdigest()
+
+
+def _lookup(key: str) -> LLMCacheEntry | None:
+    if not settings.HELIX_LLM_CACHE_ENABLED:
+        return None
+    entries = LLMCacheEntry.objects.filter(key=key)
+    if settings.HELIX_LLM_CACHE_MAX_AGE_DAYS:
+        entries = entries.filter(created_at__gte=timezone.now() - timedelta(days=settings.HELIX_LLM_CACHE_MAX_AGE_DAYS))
+    entry = entries.first()
+    if entry is not None:
+        LLMCacheEntry.objects.filter(id=entry.id).update(hit_count=F('hit_count') + 1, last_hit_at=timezone.now())
+    return entry
+
+
+def _store(key: str, kind: str, prompt_version: str, model: str, chunks: list[str]):
+    if not settings.HELIX_LLM_CACHE_ENABLED or not "".join(chunks).strip():
+        return
+    try:
+        LLMCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={"kind": kind, "prompt_version": prompt_version, "model": model, "chunks": chunks,
+                      "hit_count": 0, "last_hit_at": None, "created_at": timezone.now()},
+        )
+    except Exception as e:
+        # A failed cache write must never fail the request that produced the answer.
+        print(f"LLM_CACHE: Could not store {kind} response: {e}")
+
+
+def _prompt_tokens(messages: list) -> int:
+    return sum(count_tokens(message.get("content") or "") for message in messages)
+
+
+def cached_chat_stream(openai_client, kind: str, prompt_version: str, *, model: str, messages: list, route=None, **params):
+    """
+    Yields the text chunks of a streamed chat completion, from the cache when
+    an identical request has completed before. API errors are raised as usual.
+    `route` (a model_router.Route) is only used for the call log.
+    """
+    key = cache_key(kind, prompt_version, model, messages, params)
+    entry = _lookup(key)
+    if entry is not None:
+        print(f"LLM_CACHE: Hit for {kind} ({key[:12]}), replaying {len(entry.chunks)} chunks.")
+        record_call(kind, model, route, cached=True)
+        yield from entry.chunks
+        return
+
+    started = time.monotonic()
+    chunks = []
+    usage = {}
+    success = False
+    try:
+        stream = stream_openai(
+            kind, openai_client.chat.completions.create, model=model, messages=messages,
+            on_usage=lambda prompt_tokens, completion_tokens: usage.update(prompt=prompt_tokens, completion=completion_tokens),
+            **params
+        )
+        for chunk in stream:
+            content = chunk.choices[0].delta.content
+            if content:
+                chunks.append(content)
+                yield content
+        success = True
+    finally:
+        # Usage arrives with the last chunk; streams cut short are estimated locally.
+        record_call(kind, model, route, prompt_tokens=usage.get("prompt", _prompt_tokens(messages)),
+                    completion_tokens=usage.get("completion", count_tokens("".join(chunks))),
+                    latency_ms=int((time.monotonic() - started) * 1000), success=success)
+    _store(key, kind, prompt_version, model, chunks)
+
+
+async def acached_chat_stream(openai_client, kind: str, prompt_version: str, *, model: str, messages: list, route=None, **params):
+    """
+    The async version of cached_chat_stream, for the ASGI streaming views:
+    `openai_client` is an AsyncOpenAI client and the cache and call log are
+    read and written through sync_to_async.
+    """
+    key = cache_key(kind, prompt_version, model, messages, params)
+    entry = await sync_to_async(_lookup)(key)
+    if entry is not None:
+        print(f"LLM_CACHE: Hit for {kind} ({key[:12]}), replaying {len(entry.chunks)} chunks.")
+        await sync_to_async(record_call)(kind, model, route, cached=True)
+        for chunk in entry.chunks:
+            yield chunk
+        return
+
+    started = time.monotonic()
+    chunks = []
+    usage = {}
+    success = False
+    try:
+        stream = astream_openai(
+            kind, openai_client.chat.completions.create, model=model, messages=messages,
+            on_usage=lambda prompt_tokens, completion_tokens: usage.update(prompt=prompt_tokens, completion=completion_tokens),
+            **params
+        )
+        async for chunk in stream:
+            content = chunk.choices[0].delta.content
+            if content:
+                chunks.append(content)
+                yield content
+        success = True
+    finally:
+        await sync_to_async(record_call)(
+            kind, model, route, prompt_tokens=usage.get("prompt", _prompt_tokens(messages)),
+            completion_tokens=usage.get("completion", count_tokens("".join(chunks))),
+            latency_ms=int((time.monotonic() - started) * 1000), success=success,
+        )
+    await sync_to_async(_store)(key, kind, prompt_version, model, chunks)
+
+
+def lookup_completion(kind: str, prompt_version: str, *, model: str, messages: list, **params) -> str | None:
+    """Returns the cached text for a chat completion request, or None."""
+    entry = _lookup(cache_key(kind, prompt_version, model, messages, params))
+    return entry.content if entry is not None else None
+
+
+def store_completion(content: str, kind: str, prompt_version: str, *, model: str, messages: list, **params):
+    """Stores a completion produced outside cached_chat_completion (e.g. by the Batch API)."""
+    _store(cache_key(kind, prompt_version, model, messages, params), kind, prompt_version, model, [content])
+
+
+def cached_chat_completion(openai_client, kind: str, prompt_version: str, *, model: str, messages: list,
+                           route=None, **params) -> str | None:
+    """Returns the text of a (non-streamed) chat completion, from the cache when possible."""
+    key = cache_key(kind, prompt_version, model, messages, params)
+    entry = _lookup(key)
+    if entry is not None:
+        print(f"LLM_CACHE: Hit for {kind} ({key[:12]}).")
+        record_call(kind, model, route, cached=True)
+        return entry.content
+
+    started = time.monotonic()
+    try:
+        completion = call_openai(kind, openai_client.chat.completions.create, model=model, messages=messages, **params)
+    except Exception:
+        record_call(kind, model, route, latency_ms=int((time.monotonic() - started) * 1000), success=False)
+        raise
+    usage = completion.usage
+    record_call(kind, model, route,
+                prompt_tokens=usage.prompt_tokens if usage else _prompt_tokens(messages),
+                completion_tokens=usage.completion_tokens if usage else 0,
+                latency_ms=int((time.monotonic() - started) * 1000))
+    content = completion.choices[0].message.content
+    if content:
+        _store(key, kind, prompt_version, model, [content])
+    return content
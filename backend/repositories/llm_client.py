@@ -0,0 +1,339 @@
+# backend/repositories/llm_client.py
+"""
+The shared OpenAI client and the policy every model API call goes through.
+
+get_openai_client() returns one client per process, created on first use (so
+after Celery/gunicorn have forked), whose connection pool keeps connections
+to the API alive between calls. call_openai() and stream_openai() wrap a call
+with:
+
+  - a process-wide cap on concurrent calls (HELIX_OPENAI_MAX_CONCURRENCY), so
+    a slow provider cannot occupy every worker thread;
+  - the client's timeout, overridable per call with `timeout=`;
+  - retries of rate-limit, timeout, connection and 5xx errors with jittered
+    exponential backoff;
+  - a circuit breaker: after HELIX_OPENAI_BREAKER_FAILURES consecutive
+    failed calls (timeouts, connection and 5xx errors), calls fail fast with LLMUnavailableError for
+    HELIX_OPENAI_BREAKER_COOLDOWN_SECONDS, then a single trial call decides
+    whether to close it again;
+
+and record latency, tokens and errors per call site (see metrics.py).
+
+get_async_openai_client() and astream_openai() are the asyncio counterparts
+used by the async streaming views; they share the circuit breaker but have
+their own, larger cap on concurrent streams (HELIX_OPENAI_MAX_ASYNC_CONCURRENCY),
+since an open stream costs a coroutine rather than a thread.
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+from django.conf import settings
+
+from . import metrics
+
+
+class LLMUnavailableError(Exception):
+    """Raised without calling the API when the circuit is open or no call slot frees up in time."""
+
+
+_client = None
+_http_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """The pooled httpx client under the shared OpenAI client, for libraries that build their own."""
+    global _http_client
+    with _client_lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=settings.HELIX_OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HELIX_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(settings.HELIX_OPENAI_TIMEOUT_SECONDS, connect=settings.HELIX_OPENAI_CONNECT_TIMEOUT_SECONDS),
+            )
+        return _http_client
+
+
+def get_openai_client():
+    """Returns the process-wide OpenAI client, or None if it cannot be configured (e.g. no API key)."""
+    global _client
+    if _client is None:
+        http_client = get_http_client()
+        with _client_lock:
+            if _client is None:
+                try:
+                    from openai import OpenAI
+                    # Retries are handled here, so the SDK's own are disabled.
+                    _client = OpenAI(http_client=http_client, max_retries=0, timeout=settings.HELIX_OPENAI_TIMEOUT_SECONDS)
+                except Exception as e:
+                    print(f"LLM_CLIENT: Could not initialize the OpenAI client: {e}")
+                    return None
+    return _client
+
+
+class CircuitBreaker:
+    """Counts consecutive failed calls; open means "fail fast" until the cooldown has passed."""
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_seconds or self._trial_running:
+                return False
+            # Half-open: let one trial call through.
+            self._trial_running = True
+            return True
+
+    def abandon_trial(self):
+        """The allowed call never ran; let the next one be the trial instead."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print("LLM_CLIENT: Circuit closed.")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"LLM_CLIENT: Circuit opened after {self._failures} consecutive failures.")
+                self._opened_at = time.monotonic()
+
+
+_breaker = None
+_slots = None
+
+
+def _policy():
+    global _breaker, _slots
+    with _client_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(settings.HELIX_OPENAI_BREAKER_FAILURES, settings.HELIX_OPENAI_BREAKER_COOLDOWN_SECONDS)
+            _slots = threading.BoundedSemaphore(settings.HELIX_OPENAI_MAX_CONCURRENCY)
+    return _breaker, _slots
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Rate limits, timeouts, dropped connections and server-side errors."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in (408, 409, 429) or status_code >= 500
+    return type(error).__name__ in ("RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError")
+
+
+def _record_retryable_failure(breaker: CircuitBreaker, error: Exception):
+    # Rate limits mean "slow down", not "down": they are retried but do not open the circuit.
+    if getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError":
+        breaker.abandon_trial()
+    else:
+        breaker.record_failure()
+
+
+def _backoff_delay(site: str, attempt: int, error: Exception) -> float:
+    delay = random.uniform(0, min(settings.HELIX_OPENAI_MAX_BACKOFF_SECONDS, 2 ** attempt))
+    print(f"LLM_CLIENT: {site} failed with {type(error).__name__} (attempt {attempt + 1}/{settings.HELIX_OPENAI_MAX_ATTEMPTS}); retrying in {delay:.1f}s.")
+    return delay
+
+
+def _acquire(site: str):
+    breaker, slots = _policy()
+    if not breaker.allow():
+        metrics.record(site, 0, error="CircuitOpen")
+        raise LLMUnavailableError("The AI service is temporarily unavailable (circuit open).")
+    if not slots.acquire(timeout=settings.HELIX_OPENAI_QUEUE_TIMEOUT_SECONDS):
+        breaker.abandon_trial()
+        metrics.record(site, 0, error="QueueTimeout")
+        raise LLMUnavailableError("Too many concurrent AI requests; try again shortly.")
+    return breaker, slots
+
+
+def call_openai(site: str, fn, *args, **kwargs):
+    """
+    Calls fn(*args, **kwargs) (an OpenAI client method) under the shared policy.
+    Non-retryable errors and the last retryable one are raised.
+    """
+    for attempt in range(settings.HELIX_OPENAI_MAX_ATTEMPTS):
+        breaker, slots = _acquire(site)
+        started = time.monotonic()
+        try:
+            response = fn(*args, **kwargs)
+        except Exception as e:
+            metrics.record(site, (time.monotonic() - started) * 1000, error=type(e).__name__)
+            if not is_retryable_error(e):
+                # The provider answered; the request itself was bad.
+                breaker.record_success()
+                raise
+            _record_retryable_failure(breaker, e)
+            if attempt == settings.HELIX_OPENAI_MAX_ATTEMPTS - 1:
+                raise
+            last_error = e
+        else:
+            breaker.record_success()
+            usage = getattr(response, "usage", None)
+            metrics.record(site, (time.monotonic() - started) * 1000,
+                           prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                           completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+            return response
+        finally:
+            slots.release()
+        time.sleep(_backoff_delay(site, attempt, last_error))
+
+
+def stream_openai(site: str, fn, *args, on_usage=None, **kwargs):
+    """
+    Yields the chunks of a streamed chat completion, fn(*args, stream=True, **kwargs),
+    under the shared policy. The call slot is held until the stream is exhausted or
+    closed. Only failures before the first chunk are retried.
+    `on_usage(prompt_tokens, completion_tokens)` is called with the usage the API reports at the end.
+    """
+    for attempt in range(settings.HELIX_OPENAI_MAX_ATTEMPTS):
+        breaker, slots = _acquire(site)
+        started = time.monotonic()
+        stream, yielded = None, False
+        try:
+            stream = fn(*args, stream=True, stream_options={"include_usage": True}, **kwargs)
+            for chunk in stream:
+                if chunk.usage:
+                    metrics.record_tokens(site, chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                    if on_usage:
+                        on_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if chunk.choices:
+                    yielded = True
+                    yield chunk
+        except GeneratorExit:
+            # The consumer went away (e.g. the browser closed the connection); not a provider failure.
+            if stream is not None:
+                stream.close()
+            breaker.abandon_trial()
+            metrics.record(site, (time.monotonic() - started) * 1000)
+            raise
+        except Exception as e:
+            metrics.record(site, (time.monotonic() - started) * 1000, error=type(e).__name__)
+            if not is_retryable_error(e):
+                breaker.record_success()
+                raise
+            _record_retryable_failure(breaker, e)
+            if yielded or attempt == settings.HELIX_OPENAI_MAX_ATTEMPTS - 1:
+                raise
+            last_error = e
+        else:
+            breaker.record_success()
+            metrics.record(site, (time.monotonic() - started) * 1000)
+            return
+        finally:
+            slots.release()
+        time.sleep(_backoff_delay(site, attempt, last_error))
+
+
+# httpx.AsyncClient and asyncio.Semaphore are bound to the event loop that
+# first uses them, so each loop gets its own: one per ASGI worker process,
+# or a short-lived one per request when async views are served over WSGI.
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def _state_for_running_loop() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None:
+        state = _loop_state[loop] = {
+            "client": None,
+            "slots": asyncio.Semaphore(settings.HELIX_OPENAI_MAX_ASYNC_CONCURRENCY),
+        }
+    return state
+
+
+def get_async_openai_client():
+    """Returns the AsyncOpenAI client of the running event loop, or None if it cannot be configured."""
+    state = _state_for_running_loop()
+    if state["client"] is None:
+        try:
+            import httpx
+            from openai import AsyncOpenAI
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.HELIX_OPENAI_MAX_ASYNC_CONCURRENCY,
+                    max_keepalive_connections=settings.HELIX_OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(settings.HELIX_OPENAI_TIMEOUT_SECONDS, connect=settings.HELIX_OPENAI_CONNECT_TIMEOUT_SECONDS),
+            )
+            state["client"] = AsyncOpenAI(http_client=http_client, max_retries=0, timeout=settings.HELIX_OPENAI_TIMEOUT_SECONDS)
+        except Exception as e:
+            print(f"LLM_CLIENT: Could not initialize the async OpenAI client: {e}")
+            return None
+    return state["client"]
+
+
+async def astream_openai(site: str, fn, *args, on_usage=None, **kwargs):
+    """
+    The asyncio version of stream_openai: `fn` is an AsyncOpenAI method and
+    chunks are yielded from an async generator. Metrics are written from a
+    worker thread so a slow Redis never stalls the event loop.
+    """
+    breaker, _ = _policy()
+    slots = _state_for_running_loop()["slots"]
+    for attempt in range(settings.HELIX_OPENAI_MAX_ATTEMPTS):
+        if not breaker.allow():
+            await asyncio.to_thread(metrics.record, site, 0, error="CircuitOpen")
+            raise LLMUnavailableError("The AI service is temporarily unavailable (circuit open).")
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=settings.HELIX_OPENAI_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            breaker.abandon_trial()
+            await asyncio.to_thread(metrics.record, site, 0, error="QueueTimeout")
+            raise LLMUnavailableError("Too many concurrent AI requests; try again shortly.")
+
+        started = time.monotonic()
+        stream, yielded = None, False
+        try:
+            stream = await fn(*args, stream=True, stream_options={"include_usage": True}, **kwargs)
+            async for chunk in stream:
+                if chunk.usage:
+                    await asyncio.to_thread(metrics.record_tokens, site, chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                    if on_usage:
+                        on_usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if chunk.choices:
+                    yielded = True
+                    yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            # The client disconnected; not a provider failure.
+            if stream is not None:
+                await stream.close()
+            breaker.abandon_trial()
+            await asyncio.to_thread(metrics.record, site, (time.monotonic() - started) * 1000)
+            raise
+        except Exception as e:
+            await asyncio.to_thread(metrics.record, site, (time.monotonic() - started) * 1000, error=type(e).__name__)
+            if not is_retryable_error(e):
+                breaker.record_success()
+                raise
+            _record_retryable_failure(breaker, e)
+            if yielded or attempt == settings.HELIX_OPENAI_MAX_ATTEMPTS - 1:
+                raise
+            last_error = e
+        else:
+            breaker.record_success()
+            await asyncio.to_thread(metrics.record, site, (time.monotonic() - started) * 1000)
+            return
+        finally:
+            slots.release()
+        await asyncio.sleep(_backoff_delay(site, attempt, last_error))
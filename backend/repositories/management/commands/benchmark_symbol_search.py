@@ -0,0 +1,90 @@
+# Recall/latency benchmark for repository-scoped symbol search
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from repositories.benchmarks import (
+    BENCH_TABLE, create_bench_table, create_hnsw_index, exact_top_k, latency_summary,
+    recall_at_k, relation_size_mb, synthetic_corpus, synthetic_queries, timed_query,
+)
+from repositories.retrieval import vector_literal
+
+SEARCH_SQL = f"""
+    WITH candidates AS MATERIALIZED (
+        SELECT id, embedding <-> %(query)s::vector AS distance
+        FROM {BENCH_TABLE}
+        WHERE repository_id = %(repo_id)s
+        ORDER BY embedding <-> %(query)s::vector
+        LIMIT %(k)s
+    )
+    SELECT id FROM candidates ORDER BY distance
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks repository-scoped ANN search (the query shape used by SemanticSearchView) '
+        'against exact search on a synthetic corpus loaded into a temporary table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Number of synthetic symbols.')
+        parser.add_argument('--dims', type=int, default=1536, help='Embedding dimensions.')
+        parser.add_argument('--repos', type=int, default=20, help='Number of synthetic repositories.')
+        parser.add_argument('--queries', type=int, default=100, help='Number of queries per configuration.')
+        parser.add_argument('--k', type=int, default=10, help='Top-k to retrieve.')
+        parser.add_argument('--ef-search', default='40,100,200', help='Comma-separated hnsw.ef_search values.')
+        parser.add_argument('--partial-min-rows', type=int, default=2000,
+                            help='Repositories with at least this many rows get a partial index.')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        ef_values = [int(v) for v in options['ef_search'].split(',') if v.strip()]
+
+        self.stdout.write(f"Generating {options['rows']} x {options['dims']} corpus over {options['repos']} repositories...")
+        vectors, repo_ids = synthetic_corpus(options['rows'], options['dims'], options['repos'])
+        queries, query_repos = synthetic_queries(vectors, repo_ids, options['queries'])
+        truth = [exact_top_k(vectors, repo_ids, q, r, k) for q, r in zip(queries, query_repos)]
+
+        self.stdout.write("Loading corpus into a temporary table...")
+        create_bench_table(vectors, repo_ids)
+
+        def run(label, ef_search, extra_settings):
+            recalls, latencies = [], []
+            for query, repo_id, expected in zip(queries, query_repos, truth):
+                params = {"query": vector_literal(query), "repo_id": int(repo_id), "k": k}
+                settings_sql = [f"SET LOCAL hnsw.ef_search = {ef_search}"] + extra_settings
+                ids, elapsed_ms = timed_query(SEARCH_SQL, params, settings_sql)
+                recalls.append(recall_at_k(ids, expected))
+                latencies.append(elapsed_ms)
+            stats = latency_summary(latencies)
+            self.stdout.write(
+                f"{label:<28} ef={ef_search:<5} recall@{k}={sum(recalls) / len(recalls):.3f} "
+                f"p50={stats['p50']:.2f}ms p95={stats['p95']:.2f}ms"
+            )
+
+        # Exact baseline: sequential scan with the index disabled.
+        run("exact (seq scan)", ef_values[0], ["SET LOCAL enable_indexscan = off"])
+
+        build_seconds = create_hnsw_index(f"{BENCH_TABLE}_hnsw")
+        self.stdout.write(
+            f"Global HNSW index built in {build_seconds:.1f}s "
+            f"({relation_size_mb(f'{BENCH_TABLE}_hnsw'):.1f} MB)"
+        )
+        for ef_search in ef_values:
+            run("hnsw post-filter", ef_search, [])
+        try:
+            for ef_search in ef_values:
+                run("hnsw iterative scan", ef_search, ["SET LOCAL hnsw.iterative_scan = relaxed_order"])
+        except DatabaseError as e:
+            self.stdout.write(self.style.WARNING(f"Iterative scans unavailable (pgvector < 0.8?): {e}"))
+
+        repo_values, repo_counts = np.unique(repo_ids, return_counts=True)
+        large_repos = [int(r) for r, c in zip(repo_values, repo_counts) if c >= options['partial_min_rows']]
+        for repo_id in large_repos:
+            create_hnsw_index(f"{BENCH_TABLE}_repo_{repo_id}_hnsw", where=f"repository_id = {repo_id}")
+        self.stdout.write(f"Built partial indexes for {len(large_repos)} repositories with >= {options['partial_min_rows']} rows.")
+        for ef_search in ef_values:
+            run("hnsw + partial indexes", ef_search, [])
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete."))
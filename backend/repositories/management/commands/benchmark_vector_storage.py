@@ -0,0 +1,89 @@
+# Recall/latency/memory benchmark for full, half-precision and reduced vector indexes
+from django.core.management.base import BaseCommand
+
+from repositories.benchmarks import (
+    BENCH_TABLE, add_bench_column, create_bench_table, create_hnsw_index, exact_top_k, latency_summary,
+    recall_at_k, relation_size_mb, synthetic_corpus, synthetic_queries, timed_query,
+)
+from repositories.projection import Projection, fit_projection
+from repositories.retrieval import vector_literal
+
+# Same shape as retrieval._reranked_candidates_sql: compact-index candidates,
+# reranked by exact full-precision distance.
+RERANK_SQL = """
+    SELECT c.id
+    FROM (
+        SELECT t.id, t.embedding FROM {table} t
+        ORDER BY {distance}
+        LIMIT %(candidates)s
+    ) c
+    ORDER BY c.embedding <-> %(query)s::vector
+    LIMIT %(k)s
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares full-precision, half-precision (halfvec) and PCA-reduced HNSW indexes '
+        'with full-precision rerank on a synthetic corpus: recall, latency and index size.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Number of synthetic vectors.')
+        parser.add_argument('--dims', type=int, default=1536, help='Embedding dimensions.')
+        parser.add_argument('--reduced-dims', type=int, default=256, help='Dimensions of the PCA projection.')
+        parser.add_argument('--queries', type=int, default=100, help='Number of queries per configuration.')
+        parser.add_argument('--k', type=int, default=10, help='Top-k to retrieve.')
+        parser.add_argument('--ef-search', type=int, default=100, help='hnsw.ef_search for every run.')
+        parser.add_argument('--rerank-factors', default='1,4', help='Comma-separated candidate multipliers.')
+
+    def handle(self, *args, **options):
+        k, dims, reduced_dims = options['k'], options['dims'], options['reduced_dims']
+        factors = [int(v) for v in options['rerank_factors'].split(',') if v.strip()]
+
+        self.stdout.write(f"Generating {options['rows']} x {dims} corpus...")
+        vectors, repo_ids = synthetic_corpus(options['rows'], dims, repos=1)
+        queries, query_repos = synthetic_queries(vectors, repo_ids, options['queries'])
+        truth = [exact_top_k(vectors, repo_ids, q, r, k) for q, r in zip(queries, query_repos)]
+
+        mean, components, explained = fit_projection(vectors[:min(len(vectors), 20000)], reduced_dims)
+        projection = Projection(None, mean, components)
+        self.stdout.write(f"PCA {dims}->{reduced_dims} keeps {explained:.1%} of the variance.")
+
+        self.stdout.write("Loading corpus into a temporary table...")
+        create_bench_table(vectors, repo_ids)
+        add_bench_column("embedding_reduced", "halfvec", projection.project(vectors))
+
+        configs = [
+            # (label, index expression, opclass, query distance, uses reduced query)
+            ("full vector", "embedding", "vector_l2_ops",
+             "t.embedding <-> %(query)s::vector", False),
+            ("halfvec", f"embedding::halfvec({dims})", "halfvec_l2_ops",
+             f"t.embedding::halfvec({dims}) <-> %(query)s::halfvec({dims})", False),
+            (f"reduced {reduced_dims} halfvec", "embedding_reduced", "halfvec_l2_ops",
+             f"t.embedding_reduced <-> %(query_reduced)s::halfvec({reduced_dims})", True),
+        ]
+
+        for position, (label, expression, opclass, distance, reduced) in enumerate(configs):
+            index_name = f"{BENCH_TABLE}_{position}_hnsw"
+            build_seconds = create_hnsw_index(index_name, expression=expression, opclass=opclass)
+            self.stdout.write(
+                f"{label}: index built in {build_seconds:.1f}s ({relation_size_mb(index_name):.1f} MB)"
+            )
+            sql = RERANK_SQL.format(table=BENCH_TABLE, distance=distance)
+            for factor in factors:
+                recalls, latencies = [], []
+                for query, expected in zip(queries, truth):
+                    params = {"query": vector_literal(query), "k": k, "candidates": k * factor}
+                    if reduced:
+                        params["query_reduced"] = vector_literal(projection.project(query))
+                    ids, elapsed_ms = timed_query(sql, params, [f"SET LOCAL hnsw.ef_search = {options['ef_search']}"])
+                    recalls.append(recall_at_k(ids, expected))
+                    latencies.append(elapsed_ms)
+                stats = latency_summary(latencies)
+                self.stdout.write(
+                    f"  rerank x{factor:<3} recall@{k}={sum(recalls) / len(recalls):.3f} "
+                    f"p50={stats['p50']:.2f}ms p95={stats['p95']:.2f}ms"
+                )
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete."))
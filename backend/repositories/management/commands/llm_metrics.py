@@ -0,0 +1,29 @@
+# Prints the per-call-site metrics of model API calls
+from django.core.management.base import BaseCommand
+
+from repositories import metrics
+
+
+class Command(BaseCommand):
+    help = 'Shows calls, errors, latency and token usage of model API calls per call site, across all processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear all counters after printing them.')
+
+    def handle(self, *args, **options):
+        sites = metrics.snapshot()
+        if not sites:
+            self.stdout.write("No model API calls recorded yet.")
+        else:
+            self.stdout.write(f"{'site':<24} {'calls':>8} {'errors':>7} {'mean ms':>8} {'p50':>9} {'p95':>9} {'prompt tok':>11} {'output tok':>11}")
+            for site, row in sites.items():
+                self.stdout.write(
+                    f"{site:<24} {row['calls']:>8} {row['errors']:>7} {row['mean_latency_ms']:>8} {row['p50']:>9} "
+                    f"{row['p95']:>9} {row['prompt_tokens']:>11} {row['completion_tokens']:>11}"
+                )
+                if row['error_types']:
+                    details = ", ".join(f"{name}={count}" for name, count in sorted(row['error_types'].items()))
+                    self.stdout.write(f"{'':<24} errors: {details}")
+        if options['reset']:
+            metrics.reset()
+            self.stdout.write(self.style.SUCCESS("Counters cleared."))
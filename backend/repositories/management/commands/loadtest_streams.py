@@ -0,0 +1,145 @@
+# Concurrency load test for the streaming AI endpoints
+import asyncio
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from repositories.benchmarks import latency_summary
+
+
+async def _mock_openai_handler(reader, writer, token_delay: float, tokens: int):
+    """Answers any request with an OpenAI-style chat completion SSE stream, one token every `token_delay` seconds."""
+    try:
+        headers = b""
+        while b"\r\n\r\n" not in headers:
+            data = await reader.read(65536)
+            if not data:
+                return
+            headers += data
+        head, _, body = headers.partition(b"\r\n\r\n")
+        length = next(
+            (int(line.split(b":", 1)[1]) for line in head.split(b"\r\n") if line.lower().startswith(b"content-length:")),
+            0,
+        )
+        while len(body) < length:
+            body += await reader.read(length - len(body))
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        )
+        for i in range(tokens):
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": "mock",
+                     "choices": [{"index": 0, "delta": {"content": f"token{i} "}, "finish_reason": None}]}
+            writer.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+            await asyncio.sleep(token_delay)
+        usage = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": "mock", "choices": [],
+                 "usage": {"prompt_tokens": 100, "completion_tokens": tokens, "total_tokens": 100 + tokens}}
+        writer.write(f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n".encode())
+        await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Opens N concurrent requests against a streaming endpoint and reports time to first byte, '
+        'total stream time and errors. Use --mock-openai to serve a slow fake OpenAI API, and point '
+        'the backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and HELIX_LLM_CACHE_ENABLED=false '
+        'to compare WSGI and ASGI deployments without spending tokens.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mock-openai', type=int, metavar='PORT',
+                            help='Serve a fake OpenAI streaming API on this port instead of running a load test.')
+        parser.add_argument('--token-delay', type=float, default=0.05, help='Mock: seconds between streamed tokens.')
+        parser.add_argument('--tokens', type=int, default=100, help='Mock: tokens per response.')
+        parser.add_argument('--url', help='Full URL of the endpoint, e.g. http://localhost:8000/api/v1/symbols/1/explain-code/')
+        parser.add_argument('--method', default='POST', choices=['GET', 'POST'])
+        parser.add_argument('--body', default='{}', help='JSON body for POST requests.')
+        parser.add_argument('--concurrency', type=int, default=100, help='Concurrent streams.')
+        parser.add_argument('--sessionid', help='Value of the sessionid cookie of a logged-in user.')
+        parser.add_argument('--csrftoken', help='Value of the csrftoken cookie (needed for POST).')
+        parser.add_argument('--timeout', type=float, default=300.0, help='Per-request timeout in seconds.')
+
+    def handle(self, *args, **options):
+        if options['mock_openai']:
+            asyncio.run(self._serve_mock(options['mock_openai'], options['token_delay'], options['tokens']))
+            return
+        if not options['url']:
+            raise CommandError("Pass --url (or --mock-openai PORT to run the fake API).")
+        asyncio.run(self._load_test(options))
+
+    async def _serve_mock(self, port: int, token_delay: float, tokens: int):
+        server = await asyncio.start_server(
+            lambda r, w: _mock_openai_handler(r, w, token_delay, tokens), '0.0.0.0', port
+        )
+        self.stdout.write(
+            f"Mock OpenAI API on port {port}: {tokens} tokens per response, {token_delay}s apart. Ctrl+C to stop."
+        )
+        async with server:
+            await server.serve_forever()
+
+    async def _load_test(self, options):
+        import httpx
+
+        cookies = {}
+        headers = {}
+        if options['sessionid']:
+            cookies['sessionid'] = options['sessionid']
+        if options['csrftoken']:
+            cookies['csrftoken'] = options['csrftoken']
+            headers['X-CSRFToken'] = options['csrftoken']
+            headers['Referer'] = options['url']
+        body = json.loads(options['body']) if options['method'] == 'POST' else None
+
+        ttfb_ms, total_ms, errors = [], [], []
+        open_streams = 0
+        peak_open_streams = 0
+
+        async def one(client):
+            nonlocal open_streams, peak_open_streams
+            started = time.monotonic()
+            first_byte = None
+            try:
+                async with client.stream(options['method'], options['url'], json=body) as response:
+                    open_streams += 1
+                    peak_open_streams = max(peak_open_streams, open_streams)
+                    try:
+                        if response.status_code != 200:
+                            errors.append(f"HTTP {response.status_code}")
+                            return
+                        async for chunk in response.aiter_bytes():
+                            if first_byte is None and chunk:
+                                first_byte = time.monotonic()
+                    finally:
+                        open_streams -= 1
+            except Exception as e:
+                errors.append(type(e).__name__)
+                return
+            if first_byte is not None:
+                ttfb_ms.append((first_byte - started) * 1000)
+            total_ms.append((time.monotonic() - started) * 1000)
+
+        limits = httpx.Limits(max_connections=options['concurrency'], max_keepalive_connections=0)
+        self.stdout.write(f"Opening {options['concurrency']} concurrent {options['method']} streams to {options['url']}...")
+        wall_started = time.monotonic()
+        async with httpx.AsyncClient(cookies=cookies, headers=headers, limits=limits, timeout=options['timeout']) as client:
+            await asyncio.gather(*(one(client) for _ in range(options['concurrency'])))
+        wall_s = time.monotonic() - wall_started
+
+        ttfb = latency_summary(ttfb_ms)
+        total = latency_summary(total_ms)
+        self.stdout.write(f"Completed {len(total_ms)}/{options['concurrency']} streams in {wall_s:.1f}s "
+                          f"(peak {peak_open_streams} open at once).")
+        self.stdout.write(f"  time to first byte  p50={ttfb['p50']:.0f}ms p95={ttfb['p95']:.0f}ms")
+        self.stdout.write(f"  total stream time   p50={total['p50']:.0f}ms p95={total['p95']:.0f}ms")
+        if errors:
+            counts = {}
+            for error in errors:
+                counts[error] = counts.get(error, 0) + 1
+            details = ", ".join(f"{name}={count}" for name, count in sorted(counts.items()))
+            self.stdout.write(self.style.WARNING(f"  errors: {details}"))
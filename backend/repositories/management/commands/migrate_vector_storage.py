@@ -0,0 +1,68 @@
+# Moves existing embeddings to the compact vector storage layout
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from repositories.models import CodeSymbol, KnowledgeChunk, Repository
+from repositories.projection import (
+    REDUCED_EMBEDDING_DIMENSIONS, activate_projection, backfill_reduced_embeddings, create_projection,
+    get_active_projection, load_projection,
+)
+from repositories.retrieval import drop_symbol_partial_index, ensure_symbol_partial_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Migrates existing embeddings to the compact search indexes: optionally fits a PCA '
+        'projection and backfills embedding_reduced, then rebuilds per-repository partial '
+        'symbol indexes for the current HELIX_VECTOR_SEARCH_MODE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reduced', action='store_true',
+                            help='Fit a new projection (unless --reuse-projection) and backfill embedding_reduced.')
+        parser.add_argument('--reuse-projection', action='store_true',
+                            help='With --reduced, backfill using the already active projection.')
+        parser.add_argument('--sample-size', type=int, default=20000, help='Embeddings sampled to fit the projection.')
+        parser.add_argument('--dimensions', type=int, default=REDUCED_EMBEDDING_DIMENSIONS,
+                            help='Target dimensions (must match the embedding_reduced column).')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per backfill batch.')
+
+    def handle(self, *args, **options):
+        if options['reduced']:
+            if options['dimensions'] != REDUCED_EMBEDDING_DIMENSIONS:
+                raise CommandError(f"embedding_reduced columns have {REDUCED_EMBEDDING_DIMENSIONS} dimensions.")
+            record = None
+            if options['reuse_projection']:
+                projection = get_active_projection()
+                if not projection:
+                    raise CommandError("No active projection to reuse.")
+            else:
+                self.stdout.write(f"Fitting a {options['dimensions']}-dimension projection on up to {options['sample_size']} embeddings...")
+                try:
+                    record = create_projection(settings.HELIX_EMBEDDING_MODEL, options['sample_size'], options['dimensions'])
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write(f"Projection {record.id} keeps {record.explained_variance:.1%} of the sample's variance.")
+                projection = load_projection(record.id)
+
+            # A new projection stays inactive (searches keep the old one) until every row is backfilled.
+            try:
+                for model in (KnowledgeChunk, CodeSymbol):
+                    updated = backfill_reduced_embeddings(model, projection, options['batch_size'])
+                    self.stdout.write(f"Backfilled embedding_reduced for {updated} {model.__name__} rows.")
+            except Exception:
+                if record is not None:
+                    # Otherwise new embeddings would keep being reduced with it.
+                    record.delete()
+                raise
+            if record is not None:
+                activate_projection(record.id)
+                self.stdout.write(f"Projection {record.id} is now active.")
+
+        self.stdout.write(f"Rebuilding partial symbol indexes for mode '{settings.HELIX_VECTOR_SEARCH_MODE}'...")
+        rebuilt = 0
+        for repo_id in Repository.objects.values_list('id', flat=True):
+            drop_symbol_partial_index(repo_id)
+            if ensure_symbol_partial_index(repo_id):
+                rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Vector storage migrated; {rebuilt} partial symbol indexes built."))
@@ -0,0 +1,107 @@
+# backend/repositories/metrics.py
+"""
+Per-call-site metrics for external model API calls (and the chat agent's SQL
+tool, site "agent_sql"): call and error counts (by error type), a latency
+histogram and token totals. Counters live in one
+Redis hash per call site, so every web and worker process adds to the same
+numbers; snapshot() reads them back (see the llm_metrics command).
+
+Recording is best effort: if Redis cannot be reached the sample is dropped.
+"""
+import threading
+
+from django.conf import settings
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+_KEY_PREFIX = "helix:metrics:llm:"
+_SITES_KEY = "helix:metrics:llm:sites"
+
+_client = None
+_client_lock = threading.Lock()
+_warned = False
+
+
+def _redis():
+    global _client
+    with _client_lock:
+        if _client is None:
+            import redis
+            _client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        return _client
+
+
+def record(site: str, latency_ms: float, prompt_tokens: int = 0, completion_tokens: int = 0, error: str | None = None):
+    """Adds one call to `site`'s counters. `error` is the error type name, or None for a success."""
+    global _warned
+    bucket = next((f"le_{bound}" for bound in LATENCY_BUCKETS_MS if latency_ms <= bound), "le_inf")
+    key = f"{_KEY_PREFIX}{site}"
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.sadd(_SITES_KEY, site)
+        pipe.hincrby(key, "calls", 1)
+        pipe.hincrby(key, "latency_ms_total", int(latency_ms))
+        pipe.hincrby(key, f"latency_{bucket}", 1)
+        if prompt_tokens:
+            pipe.hincrby(key, "prompt_tokens", int(prompt_tokens))
+        if completion_tokens:
+            pipe.hincrby(key, "completion_tokens", int(completion_tokens))
+        if error:
+            pipe.hincrby(key, "errors", 1)
+            pipe.hincrby(key, f"error:{error}", 1)
+        pipe.execute()
+    except Exception as e:
+        if not _warned:
+            print(f"METRICS: Could not record LLM metrics ({e}); further failures are silent.")
+            _warned = True
+
+
+def record_tokens(site: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+    """Adds token usage reported after the call was recorded (e.g. at the end of a stream)."""
+    key = f"{_KEY_PREFIX}{site}"
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        pipe.hincrby(key, "prompt_tokens", int(prompt_tokens))
+        pipe.hincrby(key, "completion_tokens", int(completion_tokens))
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def _percentile(histogram: dict[str, int], total: int, fraction: float) -> str:
+    """Upper bound of the latency bucket holding the given fraction of calls."""
+    seen = 0
+    for bound in LATENCY_BUCKETS_MS:
+        seen += histogram.get(f"le_{bound}", 0)
+        if seen >= total * fraction:
+            return f"<={bound}ms"
+    return f">{LATENCY_BUCKETS_MS[-1]}ms"
+
+
+def snapshot() -> dict[str, dict]:
+    """{site: {"calls", "errors", "error_types", "mean_latency_ms", "p50", "p95", "prompt_tokens", "completion_tokens"}}"""
+    client = _redis()
+    sites = sorted(site.decode() for site in client.smembers(_SITES_KEY))
+    result = {}
+    for site in sites:
+        raw = {k.decode(): int(v) for k, v in client.hgetall(f"{_KEY_PREFIX}{site}").items()}
+        calls = raw.get("calls", 0)
+        histogram = {k[len("latency_"):]: v for k, v in raw.items() if k.startswith("latency_le_")}
+        result[site] = {
+            "calls": calls,
+            "errors": raw.get("errors", 0),
+            "error_types": {k[len("error:"):]: v for k, v in raw.items() if k.startswith("error:")},
+            "mean_latency_ms": round(raw.get("latency_ms_total", 0) / calls) if calls else 0,
+            "p50": _percentile(histogram, calls, 0.5) if calls else "-",
+            "p95": _percentile(histogram, calls, 0.95) if calls else "-",
+            "prompt_tokens": raw.get("prompt_tokens", 0),
+            "completion_tokens": raw.get("completion_tokens", 0),
+        }
+    return result
+
+
+def reset():
+    client = _redis()
+    sites = [site.decode() for site in client.smembers(_SITES_KEY)]
+    if sites:
+        client.delete(*[f"{_KEY_PREFIX}{site}" for site in sites])
+    client.delete(_SITES_KEY)
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-19 09:12
+
+import django.db.models.deletion
+import pgvector.django.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0036_merge_20250911_1936'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codesymbol',
+            name='repository',
+            field=models.ForeignKey(blank=True, help_text='The repository this symbol belongs to (denormalized for search).', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='symbols', to='repositories.repository'),
+        ),
+        # Backfill the denormalized repository from the symbol's file or class.
+        migrations.RunSQL(
+            sql="""
+                UPDATE code_symbols s
+                SET repository_id = f.repository_id
+                FROM code_files f
+                WHERE s.code_file_id = f.id AND s.repository_id IS NULL;
+
+                UPDATE code_symbols s
+                SET repository_id = f.repository_id
+                FROM code_classes c
+                JOIN code_files f ON f.id = c.code_file_id
+                WHERE s.code_class_id = c.id AND s.repository_id IS NULL;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='codesymbol',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='symbol_embedding_hnsw_l2_idx', opclasses=['vector_l2_ops']),
+        ),
+    ]
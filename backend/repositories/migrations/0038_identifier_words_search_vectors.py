@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-19 10:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import repositories.models
+from django.db import migrations, models
+
+
+# Appends a copy of the (length-capped) text in which CamelCase boundaries are
+# split and every non-alphanumeric run becomes a space, so that `getUserName`,
+# `get_user_name` and `settings.USER_NAME` all yield the words get/user/name.
+# Must stay in sync with utils.identifier_words().
+CREATE_IDENTIFIER_WORDS_SQL = r"""
+CREATE OR REPLACE FUNCTION helix_identifier_words(input text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT left(input, 100000) || ' ' || regexp_replace(
+        regexp_replace(
+            regexp_replace(left(input, 100000), '([A-Z]+)([A-Z][a-z])', '\1 \2', 'g'),
+            '([a-z0-9])([A-Z])', '\1 \2', 'g'
+        ),
+        '[^A-Za-z0-9]+', ' ', 'g'
+    )
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0037_codesymbol_repository_symbol_embedding_hnsw'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_IDENTIFIER_WORDS_SQL,
+            reverse_sql="DROP FUNCTION IF EXISTS helix_identifier_words(text);",
+        ),
+        migrations.AddField(
+            model_name='knowledgechunk',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector(repositories.models.IdentifierWords('content'), config='simple'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='codesymbol',
+            name='name_search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector(repositories.models.IdentifierWords('name'), config='simple'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='knowledgechunk',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='knowledge_search_gin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='codesymbol',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name_search_vector'], name='symbol_name_search_gin_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0038_identifier_words_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingbatchjob',
+            name='dispatch_mode',
+            field=models.CharField(choices=[('SYNC', 'Synchronous Micro-batches'), ('BATCH_API', 'OpenAI Batch API')], default='BATCH_API', help_text='Whether this job used synchronous micro-batches or the Batch API.', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='embeddingbatchjob',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of items submitted for embedding.'),
+        ),
+        migrations.AddField(
+            model_name='embeddingbatchjob',
+            name='latency_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Time from dispatch until the embeddings were stored, in milliseconds.', null=True),
+        ),
+    ]
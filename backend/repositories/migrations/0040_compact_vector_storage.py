@@ -0,0 +1,89 @@
+# Generated by Django 5.2.3 on 2026-10-19 12:05
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+import pgvector.django.halfvec
+import pgvector.django.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0039_embeddingbatchjob_dispatch_mode_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingProjection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('embedding_model', models.CharField(help_text='Embedding model the projection was fitted on.', max_length=100)),
+                ('source_dimensions', models.PositiveIntegerField()),
+                ('target_dimensions', models.PositiveIntegerField()),
+                ('mean', models.BinaryField()),
+                ('components', models.BinaryField()),
+                ('explained_variance', models.FloatField(help_text="Share of the sample's variance kept by the projection.")),
+                ('sample_size', models.PositiveIntegerField()),
+                ('is_active', models.BooleanField(db_index=True, default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'embedding_projections',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='codesymbol',
+            name='embedding_reduced',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=256, null=True),
+        ),
+        migrations.AddField(
+            model_name='knowledgechunk',
+            name='embedding_reduced',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=256, null=True),
+        ),
+        # Replace the full-precision HNSW indexes with half-precision ones over
+        # the same column; the stored vectors themselves are unchanged.
+        migrations.RemoveIndex(
+            model_name='codesymbol',
+            name='symbol_embedding_hnsw_l2_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='knowledgechunk',
+            name='knowledge_embedding_hnsw_l2_idx',
+        ),
+        migrations.AddIndex(
+            model_name='codesymbol',
+            index=pgvector.django.indexes.HnswIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Cast('embedding', pgvector.django.halfvec.HalfVectorField(dimensions=1536)), name='halfvec_l2_ops'), ef_construction=64, m=16, name='symbol_embedding_half_hnsw_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='codesymbol',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_reduced'], m=16, name='symbol_emb_reduced_hnsw_idx', opclasses=['halfvec_l2_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='knowledgechunk',
+            index=pgvector.django.indexes.HnswIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Cast('embedding', pgvector.django.halfvec.HalfVectorField(dimensions=1536)), name='halfvec_l2_ops'), ef_construction=64, m=16, name='knowledge_emb_half_hnsw_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='knowledgechunk',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_reduced'], m=16, name='knowledge_emb_red_hnsw_idx', opclasses=['halfvec_l2_ops']),
+        ),
+        # Per-repository partial indexes were full precision; drop them so
+        # `manage.py migrate_vector_storage` can rebuild them in the new format.
+        migrations.RunSQL(
+            sql="""
+                DO $$
+                DECLARE idx record;
+                BEGIN
+                    FOR idx IN
+                        SELECT indexname FROM pg_indexes
+                        WHERE tablename = 'code_symbols' AND indexname LIKE 'code\\_symbols\\_embedding\\_repo\\_%\\_hnsw'
+                    LOOP
+                        EXECUTE format('DROP INDEX IF EXISTS %I', idx.indexname);
+                    END LOOP;
+                END $$;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0040_compact_vector_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgechunk',
+            name='start_line',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='knowledgechunk',
+            name='end_line',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
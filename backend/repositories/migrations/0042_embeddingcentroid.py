@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 13:48
+
+import django.db.models.deletion
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0041_knowledgechunk_line_range'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCentroid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.CharField(choices=[('FILE', 'File'), ('CLASS', 'Class'), ('MODULE', 'Module')], max_length=10)),
+                ('module_path', models.CharField(blank=True, default='', max_length=1024)),
+                ('chunk_count', models.PositiveIntegerField(default=0)),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=1536)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('code_class', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='repositories.codeclass')),
+                ('code_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='repositories.codefile')),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='embedding_centroids', to='repositories.repository')),
+            ],
+            options={
+                'db_table': 'embedding_centroids',
+                'indexes': [models.Index(fields=['repository', 'level', 'module_path'], name='centroid_repo_level_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0042_embeddingcentroid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repository',
+            name='embedding_generation',
+            field=models.PositiveIntegerField(default=0, help_text="Bumped whenever the repository's stored embeddings change; versions the on-disk vector matrices."),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0043_repository_embedding_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='SHA-256 of kind, prompt version, model and inputs.', max_length=64, unique=True)),
+                ('kind', models.CharField(db_index=True, help_text="Task that produced the response, e.g. 'explanation'.", max_length=50)),
+                ('prompt_version', models.CharField(max_length=20)),
+                ('model', models.CharField(max_length=100)),
+                ('chunks', models.JSONField(default=list, help_text='Response text, split as it was streamed.')),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_hit_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'llm_cache_entries',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0044_llmcacheentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocstringBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(blank=True, db_index=True, help_text='OpenAI Batch API Job ID', max_length=100, null=True, unique=True)),
+                ('input_file_id', models.CharField(blank=True, default='', help_text='OpenAI File ID for the input batch .jsonl file', max_length=100)),
+                ('output_file_id', models.CharField(blank=True, help_text='OpenAI File ID for the output results .jsonl file', max_length=100, null=True)),
+                ('error_file_id', models.CharField(blank=True, help_text='OpenAI File ID for the error details .jsonl file', max_length=100, null=True)),
+                ('status', models.CharField(choices=[('pending_submission', 'Pending Submission to OpenAI'), ('validating', 'Validating'), ('failed_validation', 'Failed Validation'), ('in_progress', 'In Progress'), ('finalizing', 'Finalizing'), ('completed', 'Completed by OpenAI'), ('failed', 'Failed by OpenAI'), ('expired', 'Expired by OpenAI'), ('cancelling', 'Cancelling'), ('cancelled', 'Cancelled'), ('results_processing', 'Processing Results'), ('results_processed', 'Results Processed in DB'), ('results_failed_to_process', 'Failed to Process Results')], db_index=True, default='pending_submission', max_length=30)),
+                ('module_path', models.CharField(blank=True, help_text='Module being documented, if started by the module workflow.', max_length=1024, null=True)),
+                ('workflow_task_id', models.CharField(blank=True, db_index=True, help_text='Celery task ID of the AsyncTaskStatus tracking this job.', max_length=255, null=True)),
+                ('content_hashes', models.JSONField(default=dict)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('succeeded_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('error_details', models.TextField(blank=True, null=True)),
+                ('openai_metadata', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('submitted_to_openai_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='docstring_batch_jobs', to='repositories.repository')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='docstring_batch_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'docstring_batch_jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
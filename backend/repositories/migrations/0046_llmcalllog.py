@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0045_docstringbatchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCallLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(db_index=True, max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('tier', models.CharField(blank=True, default='', max_length=20)),
+                ('reason', models.CharField(blank=True, default='', help_text='Why the router picked this tier.', max_length=255)),
+                ('max_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('cost_usd', models.FloatField(blank=True, help_text='Estimated from the model price table; null for unknown models.', null=True)),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('cached', models.BooleanField(default=False, help_text='Answered from the LLM cache.')),
+                ('batch', models.BooleanField(default=False, help_text='Produced by the OpenAI Batch API.')),
+                ('success', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('symbol', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='repositories.codesymbol')),
+            ],
+            options={
+                'db_table': 'llm_call_logs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
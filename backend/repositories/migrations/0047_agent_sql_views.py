@@ -0,0 +1,157 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+# Curated read-only views for the chat agent's SQL tool (see sql_views.py).
+# They are security_invoker views (PostgreSQL 15+), so any RLS policy on the
+# underlying tables still applies to the querying role, and each one is
+# additionally limited to repositories the user in app.current_user_id
+# belongs to. sql_views.AGENT_VIEWS lists them for the schema digest.
+CREATE_VIEWS_SQL = r"""
+CREATE OR REPLACE FUNCTION helix_visible_repository_ids() RETURNS SETOF bigint
+LANGUAGE sql STABLE AS $$
+    SELECT r.id::bigint
+    FROM repositories r
+    JOIN organization_members m ON m.organization_id = r.organization_id
+    WHERE m.user_id = nullif(current_setting('app.current_user_id', true), '')::bigint
+$$;
+
+CREATE OR REPLACE VIEW helix_symbol_summary WITH (security_invoker = true) AS
+SELECT
+    s.id AS symbol_id,
+    s.repository_id,
+    f.file_path,
+    c.name AS class_name,
+    s.name AS symbol_name,
+    CASE WHEN s.code_class_id IS NULL THEN 'function' ELSE 'method' END AS kind,
+    s.start_line,
+    s.end_line,
+    s.loc,
+    s.cyclomatic_complexity,
+    s.is_orphan,
+    s.documentation_status,
+    coalesce(s.existing_docstring, '') <> '' AS has_docstring,
+    (SELECT count(*) FROM code_dependencies d WHERE d.callee_id = s.id) AS fan_in,
+    (SELECT count(*) FROM code_dependencies d WHERE d.caller_id = s.id) AS fan_out
+FROM code_symbols s
+LEFT JOIN code_classes c ON c.id = s.code_class_id
+JOIN code_files f ON f.id = coalesce(s.code_file_id, c.code_file_id)
+WHERE s.repository_id IN (SELECT helix_visible_repository_ids());
+
+CREATE OR REPLACE VIEW helix_call_edges WITH (security_invoker = true) AS
+SELECT
+    caller.repository_id,
+    caller.id AS caller_id,
+    caller.name AS caller_name,
+    caller_file.file_path AS caller_file_path,
+    callee.id AS callee_id,
+    callee.name AS callee_name,
+    callee_file.file_path AS callee_file_path,
+    caller_file.id <> callee_file.id AS crosses_files
+FROM code_dependencies d
+JOIN code_symbols caller ON caller.id = d.caller_id
+JOIN code_symbols callee ON callee.id = d.callee_id
+LEFT JOIN code_classes caller_class ON caller_class.id = caller.code_class_id
+LEFT JOIN code_classes callee_class ON callee_class.id = callee.code_class_id
+JOIN code_files caller_file ON caller_file.id = coalesce(caller.code_file_id, caller_class.code_file_id)
+JOIN code_files callee_file ON callee_file.id = coalesce(callee.code_file_id, callee_class.code_file_id)
+WHERE caller.repository_id IN (SELECT helix_visible_repository_ids());
+
+CREATE OR REPLACE VIEW helix_file_metrics WITH (security_invoker = true) AS
+WITH symbol_files AS (
+    SELECT s.id, s.loc, s.cyclomatic_complexity, s.is_orphan, s.existing_docstring,
+           coalesce(s.code_file_id, c.code_file_id) AS file_id
+    FROM code_symbols s
+    LEFT JOIN code_classes c ON c.id = s.code_class_id
+    WHERE s.repository_id IN (SELECT helix_visible_repository_ids())
+)
+SELECT
+    f.repository_id,
+    f.id AS file_id,
+    f.file_path,
+    (SELECT count(*) FROM code_classes c WHERE c.code_file_id = f.id) AS class_count,
+    count(s.id) AS symbol_count,
+    coalesce(sum(s.loc), 0) AS total_loc,
+    max(s.cyclomatic_complexity) AS max_complexity,
+    round(avg(s.cyclomatic_complexity)::numeric, 2) AS avg_complexity,
+    count(s.id) FILTER (WHERE s.is_orphan) AS orphan_count,
+    count(s.id) FILTER (WHERE coalesce(s.existing_docstring, '') = '') AS undocumented_count
+FROM code_files f
+LEFT JOIN symbol_files s ON s.file_id = f.id
+WHERE f.repository_id IN (SELECT helix_visible_repository_ids())
+GROUP BY f.repository_id, f.id, f.file_path;
+
+CREATE OR REPLACE VIEW helix_symbol_coverage WITH (security_invoker = true) AS
+WITH latest AS (
+    SELECT DISTINCT ON (repository_id) id, repository_id, commit_hash
+    FROM test_coverage_reports
+    WHERE repository_id IN (SELECT helix_visible_repository_ids())
+    ORDER BY repository_id, uploaded_at DESC
+),
+symbol_files AS (
+    SELECT s.id, s.repository_id, s.name, s.start_line, s.end_line,
+           coalesce(s.code_file_id, c.code_file_id) AS file_id
+    FROM code_symbols s
+    LEFT JOIN code_classes c ON c.id = s.code_class_id
+    WHERE s.repository_id IN (SELECT repository_id FROM latest)
+)
+SELECT
+    s.repository_id,
+    s.id AS symbol_id,
+    s.name AS symbol_name,
+    f.file_path,
+    latest.commit_hash,
+    lines.covered AS covered_lines,
+    lines.missed AS missed_lines,
+    CASE WHEN lines.covered + lines.missed > 0
+         THEN round(lines.covered::numeric / (lines.covered + lines.missed), 3) END AS line_rate
+FROM latest
+JOIN test_file_coverage fcov ON fcov.report_id = latest.id
+JOIN code_files f ON f.id = fcov.code_file_id
+JOIN symbol_files s ON s.file_id = f.id
+CROSS JOIN LATERAL (
+    SELECT
+        (SELECT count(*) FROM jsonb_array_elements_text(fcov.covered_lines) l
+         WHERE l::int BETWEEN s.start_line AND s.end_line) AS covered,
+        (SELECT count(*) FROM jsonb_array_elements_text(fcov.missed_lines) l
+         WHERE l::int BETWEEN s.start_line AND s.end_line) AS missed
+) lines;
+
+COMMENT ON VIEW helix_symbol_summary IS 'One row per function/method: location, size, complexity, docs and call fan-in/out.';
+COMMENT ON VIEW helix_call_edges IS 'One row per call from caller to callee, with both symbols'' names and files.';
+COMMENT ON VIEW helix_file_metrics IS 'One row per file: class/symbol counts, total LOC, complexity, orphans, undocumented symbols.';
+COMMENT ON VIEW helix_symbol_coverage IS 'Line coverage per symbol from the latest uploaded coverage report of each repository.';
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT FROM pg_catalog.pg_roles WHERE rolname = 'helix_readonly') THEN
+        GRANT SELECT ON helix_symbol_summary, helix_call_edges, helix_file_metrics, helix_symbol_coverage TO helix_readonly;
+        GRANT EXECUTE ON FUNCTION helix_visible_repository_ids() TO helix_readonly;
+    END IF;
+END
+$$;
+"""
+
+DROP_VIEWS_SQL = """
+DROP VIEW IF EXISTS helix_symbol_coverage;
+DROP VIEW IF EXISTS helix_file_metrics;
+DROP VIEW IF EXISTS helix_call_edges;
+DROP VIEW IF EXISTS helix_symbol_summary;
+DROP FUNCTION IF EXISTS helix_visible_repository_ids();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0046_llmcalllog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testcoveragereport',
+            index=models.Index(fields=['repository', '-uploaded_at'], name='coverage_repo_recent_idx'),
+        ),
+        migrations.RunSQL(sql=CREATE_VIEWS_SQL, reverse_sql=DROP_VIEWS_SQL),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0047_agent_sql_views'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='repository',
+            old_name='embedding_generation',
+            new_name='symbol_embedding_generation',
+        ),
+        migrations.AlterField(
+            model_name='repository',
+            name='symbol_embedding_generation',
+            field=models.PositiveIntegerField(default=0, help_text="Bumped whenever the repository's symbol embeddings change; versions its on-disk symbols matrix."),
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='chunk_embedding_generation',
+            field=models.PositiveIntegerField(default=0, help_text="Bumped whenever the repository's knowledge chunk embeddings change; versions its on-disk chunks matrix."),
+        ),
+        # Both counters continue from the shared one, so an existing chunks
+        # manifest can never match a generation it was not built for.
+        migrations.RunSQL(
+            sql="UPDATE repositories SET chunk_embedding_generation = symbol_embedding_generation;",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repositories', '0048_repository_per_kind_embedding_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='docstringbatchjob',
+            name='expected_jobs',
+            field=models.PositiveIntegerField(default=1, help_text='Number of batch jobs submitted together with this one for the same workflow.'),
+        ),
+    ]
@@ -0,0 +1,153 @@
+# backend/repositories/model_router.py
+"""
+Model routing for AI generation calls. The model and max_tokens are chosen
+from the task kind and the metrics Helix already stores for the symbol (loc,
+cyclomatic_complexity, call fan-in/out): trivial code goes to the fast tier,
+complex code is escalated one tier above the task's default, everything else
+uses the default.
+
+Every call's decision, latency, token usage and estimated cost is recorded in
+LLMCallLog so the thresholds can be tuned against real traffic.
+"""
+from django.conf import settings
+from django.db.models import Count
+
+from .models import CodeDependency, LLMCallLog
+
+FAST, STANDARD, LARGE = "fast", "standard", "large"
+_TIERS = [FAST, STANDARD, LARGE]
+
+# Default (tier, max_tokens) per task kind.
+KIND_DEFAULTS = {
+    "docstring": (STANDARD, 400),
+    "docstring_pack": (STANDARD, 400),  # per packed symbol
+    "docstring_stream": (STANDARD, 600),
+    "explanation": (FAST, 1000),
+    "test_suggestions": (STANDARD, 1500),
+    "cohesive_tests": (STANDARD, 4000),
+    "refactor_stream": (STANDARD, 2048),
+    "refactor_suggestions": (STANDARD, 3000),
+    "class_summary": (STANDARD, 1000),
+    "module_readme": (STANDARD, 4000),
+    "chat_answer": (STANDARD, 1500),
+}
+
+# USD per million (input, output) tokens. Batch API calls are billed at half.
+MODEL_PRICES = {
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+
+class Route:
+    """The router's decision for one call."""
+    def __init__(self, kind: str, tier: str, model: str, max_tokens: int, reason: str, symbol_id: int | None = None):
+        self.kind = kind
+        self.tier = tier
+        self.model = model
+        self.max_tokens = max_tokens
+        self.reason = reason
+        self.symbol_id = symbol_id
+
+    def __repr__(self):
+        return f"Route({self.kind}: {self.model}, max_tokens={self.max_tokens}, {self.reason})"
+
+
+def tier_model(tier: str) -> str:
+    return {
+        FAST: settings.HELIX_MODEL_FAST,
+        STANDARD: settings.HELIX_MODEL_STANDARD,
+        LARGE: settings.HELIX_MODEL_LARGE,
+    }[tier]
+
+
+def fan_counts(symbol_ids) -> dict[int, tuple[int, int]]:
+    """{symbol_id: (fan_in, fan_out)} from the call graph, in two queries."""
+    symbol_ids = list(symbol_ids)
+    fan_in = dict(
+        CodeDependency.objects.filter(callee_id__in=symbol_ids)
+        .values('callee_id').annotate(n=Count('id')).values_list('callee_id', 'n')
+    )
+    fan_out = dict(
+        CodeDependency.objects.filter(caller_id__in=symbol_ids)
+        .values('caller_id').annotate(n=Count('id')).values_list('caller_id', 'n')
+    )
+    return {symbol_id: (fan_in.get(symbol_id, 0), fan_out.get(symbol_id, 0)) for symbol_id in symbol_ids}
+
+
+def route(kind: str, symbol=None, fan_in: int | None = None, fan_out: int | None = None) -> Route:
+    """
+    Picks the tier, model and max_tokens for a `kind` call about `symbol`
+    (a CodeSymbol, or None for calls without one). Pass fan_in/fan_out when
+    they are already known (see fan_counts) to avoid the per-symbol queries.
+    """
+    tier, max_tokens = KIND_DEFAULTS.get(kind, (STANDARD, 1000))
+    if symbol is None:
+        return Route(kind, tier, tier_model(tier), max_tokens, "default for task")
+
+    if fan_in is None or fan_out is None:
+        fan_in, fan_out = fan_counts([symbol.id])[symbol.id]
+    loc = symbol.loc or 0
+    complexity = symbol.cyclomatic_complexity or 0
+    metrics = f"loc={loc}, cc={complexity}, in={fan_in}, out={fan_out}"
+
+    if (0 < loc <= settings.HELIX_ROUTER_TRIVIAL_MAX_LOC
+            and complexity <= settings.HELIX_ROUTER_TRIVIAL_MAX_COMPLEXITY
+            and fan_out <= settings.HELIX_ROUTER_TRIVIAL_MAX_FAN_OUT):
+        return Route(kind, FAST, tier_model(FAST), max(max_tokens // 2, 150), f"trivial ({metrics})", symbol.id)
+
+    if (complexity >= settings.HELIX_ROUTER_COMPLEX_MIN_COMPLEXITY
+            or loc >= settings.HELIX_ROUTER_COMPLEX_MIN_LOC
+            or fan_in + fan_out >= settings.HELIX_ROUTER_COMPLEX_MIN_FAN):
+        tier = _TIERS[min(_TIERS.index(tier) + 1, len(_TIERS) - 1)]
+        return Route(kind, tier, tier_model(tier), int(max_tokens * 1.5), f"complex ({metrics})", symbol.id)
+
+    return Route(kind, tier, tier_model(tier), max_tokens, f"default ({metrics})", symbol.id)
+
+
+def combine_routes(kind: str, routes: list[Route]) -> Route:
+    """One route for a packed request: the highest tier among its items, with their token budgets summed."""
+    tier = max((r.tier for r in routes), key=_TIERS.index)
+    return Route(kind, tier, tier_model(tier), sum(r.max_tokens for r in routes), f"pack of {len(routes)}")
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float | None:
+    # Dated snapshots ("gpt-4.1-mini-2025-04-14") are priced like their base model.
+    base = max((name for name in MODEL_PRICES if model.startswith(name)), key=len, default=None)
+    if base is None:
+        return None
+    input_price, output_price = MODEL_PRICES[base]
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return cost / 2 if batch else cost
+
+
+def call_log(kind: str, model: str, route: Route | None = None, prompt_tokens: int = 0, completion_tokens: int = 0,
+             latency_ms: int | None = None, cached: bool = False, batch: bool = False, success: bool = True,
+             symbol_id: int | None = None) -> LLMCallLog:
+    """An unsaved LLMCallLog row; use record_call, or bulk_create for Batch API results."""
+    return LLMCallLog(
+        kind=kind,
+        model=model,
+        tier=route.tier if route else '',
+        reason=(route.reason if route else '')[:255],
+        symbol_id=symbol_id or (route.symbol_id if route else None),
+        max_tokens=route.max_tokens if route else None,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        cost_usd=0.0 if cached else estimate_cost(model, prompt_tokens, completion_tokens, batch=batch),
+        latency_ms=latency_ms,
+        cached=cached,
+        batch=batch,
+        success=success,
+    )
+
+
+def record_call(kind: str, model: str, route: Route | None = None, **fields):
+    """Writes an LLMCallLog row (see call_log). Never raises: logging must not fail the call it describes."""
+    try:
+        call_log(kind, model, route, **fields).save()
+    except Exception as e:
+        print(f"MODEL_ROUTER: Could not record {kind} call: {e}")
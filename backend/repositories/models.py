@@ -2,11 +2,26 @@ import uuid
 from django.db import models
 from django.conf import settings
 from pgvector.django import VectorField # Import VectorField
-from pgvector.django import HnswIndex
+from pgvector.django import HalfVectorField, HnswIndex
+from django.db.models.functions import Cast
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from .utils import get_source_for_symbol
 User = get_user_model()
+
+
+class IdentifierWords(models.Func):
+    """
+    Wraps the `helix_identifier_words` SQL function (created in migration 0038),
+    which appends a copy of the text with snake_case / CamelCase identifiers and
+    dotted keys split into separate words, so full-text search can match parts
+    of identifiers as well as whole ones.
+    """
+    function = 'helix_identifier_words'
+    output_field = models.TextField()
+
 class Organization(models.Model):
     """
     Represents a team or workspace that owns repositories.
@@ -121,6 +136,14 @@ class Repository(models.Model):
         help_text="The number of unique contributors to the repository."
     )
     orphan_symbol_count = models.IntegerField(default=0)
+    symbol_embedding_generation = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped whenever the repository's symbol embeddings change; versions its on-disk symbols matrix."
+    )
+    chunk_embedding_generation = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped whenever the repository's knowledge chunk embeddings change; versions its on-disk chunks matrix."
+    )
     source_root = models.CharField(
         max_length=255,
         default='.',
@@ -178,14 +201,33 @@ class CodeSymbol(models.Model):
     code_file = models.ForeignKey(CodeFile, on_delete=models.CASCADE, related_name='symbols', null=True, blank=True)
     # OR it can belong to a class (method)
     code_class = models.ForeignKey(CodeClass, on_delete=models.CASCADE, related_name='methods', null=True, blank=True)
+    # Denormalized owner repository, so vector searches can pre-filter by repo
+    # without joining through code_file / code_class.
+    repository = models.ForeignKey(
+        Repository,
+        on_delete=models.CASCADE,
+        related_name='symbols',
+        null=True,
+        blank=True,
+        help_text="The repository this symbol belongs to (denormalized for search)."
+    )
     unique_id = models.CharField(max_length=1024, blank=True, null=True, db_index=True) # Must be exactly 'unique_id'
     name = models.CharField(max_length=255)
+    # Identifier-aware full-text vector over the symbol name (for exact-name lookups).
+    name_search_vector = models.GeneratedField(
+        expression=SearchVector(IdentifierWords('name'), config='simple'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
     start_line = models.IntegerField()
     end_line = models.IntegerField()
     content_hash = models.CharField(max_length=64, blank=True, null=True)
     documentation_hash = models.CharField(max_length=64, blank=True, null=True)
     documentation = models.TextField(blank=True, null=True)
     embedding = VectorField(dimensions=1536, blank=True, null=True)
+    # PCA-reduced, half-precision copy of `embedding` (see projection.py). Only
+    # populated once an EmbeddingProjection is active.
+    embedding_reduced = HalfVectorField(dimensions=256, blank=True, null=True)
     @property
     def source_code(self) -> str:
         """
@@ -235,6 +277,26 @@ class CodeSymbol(models.Model):
 
     class Meta:
         db_table = 'code_symbols'
+        indexes = [
+            # Global ANN index for symbol embeddings, built over a half-precision
+            # cast (half the size of a full-precision index); candidates are
+            # reranked against the full vectors. Large repositories also get a
+            # partial index of their own (see retrieval.ensure_symbol_partial_index).
+            HnswIndex(
+                OpClass(Cast('embedding', HalfVectorField(dimensions=1536)), name='halfvec_l2_ops'),
+                name='symbol_embedding_half_hnsw_idx',
+                m=16,
+                ef_construction=64
+            ),
+            HnswIndex(
+                name='symbol_emb_reduced_hnsw_idx',
+                fields=['embedding_reduced'],
+                m=16,
+                ef_construction=64,
+                opclasses=['halfvec_l2_ops']
+            ),
+            GinIndex(name='symbol_name_search_gin_idx', fields=['name_search_vector']),
+        ]
 
     def __str__(self):
         parent = self.code_class.name if self.code_class else self.code_file.file_path
@@ -399,6 +461,24 @@ class EmbeddingBatchJob(models.Model):
     openai_completed_at = models.DateTimeField(null=True, blank=True) # When OpenAI marks it complete
     results_processed_at = models.DateTimeField(null=True, blank=True) # When we finish DB updates
 
+    # How the embeddings were produced: small deltas go through synchronous
+    # micro-batches, large backfills through the OpenAI Batch API.
+    class DispatchMode(models.TextChoices):
+        SYNC = 'SYNC', 'Synchronous Micro-batches'
+        BATCH_API = 'BATCH_API', 'OpenAI Batch API'
+    dispatch_mode = models.CharField(
+        max_length=10,
+        choices=DispatchMode.choices,
+        default=DispatchMode.BATCH_API,
+        help_text="Whether this job used synchronous micro-batches or the Batch API."
+    )
+    item_count = models.PositiveIntegerField(default=0, help_text="Number of items submitted for embedding.")
+    latency_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Time from dispatch until the embeddings were stored, in milliseconds."
+    )
+
     # Metadata from OpenAI or our own
     openai_metadata = models.JSONField(null=True, blank=True, help_text="Metadata from OpenAI Batch object")
     custom_metadata = models.JSONField(null=True, blank=True, help_text="Custom metadata for this job")
@@ -413,6 +493,129 @@ class EmbeddingBatchJob(models.Model):
         verbose_name = "Embedding Batch Job"
         verbose_name_plural = "Embedding Batch Jobs"
 
+
+class DocstringBatchJob(models.Model):
+    """
+    A bulk docstring generation submitted to the OpenAI Batch API. The poller
+    (poll_and_process_completed_batches_task) applies the results to
+    CodeSymbol.documentation in bulk, skipping symbols whose code changed
+    after submission.
+    """
+    repository = models.ForeignKey('Repository', on_delete=models.CASCADE, related_name="docstring_batch_jobs")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="docstring_batch_jobs")
+    batch_id = models.CharField(max_length=100, unique=True, null=True, blank=True, db_index=True, help_text="OpenAI Batch API Job ID")
+    input_file_id = models.CharField(max_length=100, blank=True, default='', help_text="OpenAI File ID for the input batch .jsonl file")
+    output_file_id = models.CharField(max_length=100, null=True, blank=True, help_text="OpenAI File ID for the output results .jsonl file")
+    error_file_id = models.CharField(max_length=100, null=True, blank=True, help_text="OpenAI File ID for the error details .jsonl file")
+    status = models.CharField(
+        max_length=30,
+        choices=EmbeddingBatchJob.JobStatus.choices,
+        default=EmbeddingBatchJob.JobStatus.PENDING_SUBMISSION,
+        db_index=True
+    )
+    module_path = models.CharField(max_length=1024, null=True, blank=True, help_text="Module being documented, if started by the module workflow.")
+    workflow_task_id = models.CharField(max_length=255, null=True, blank=True, db_index=True, help_text="Celery task ID of the AsyncTaskStatus tracking this job.")
+    # {symbol_id: content_hash at submission}; results for symbols edited since are discarded.
+    content_hashes = models.JSONField(default=dict)
+    item_count = models.PositiveIntegerField(default=0)
+    expected_jobs = models.PositiveIntegerField(default=1, help_text="Number of batch jobs submitted together with this one for the same workflow.")
+    succeeded_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    error_details = models.TextField(null=True, blank=True)
+    openai_metadata = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    submitted_to_openai_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Docstring Batch {self.batch_id or 'N/A'} for Repo {self.repository_id} - Status: {self.get_status_display()}"
+
+    class Meta:
+        db_table = 'docstring_batch_jobs'
+        ordering = ['-created_at']
+
+
+class EmbeddingProjection(models.Model):
+    """
+    A PCA projection fitted with NumPy on a sample of stored embeddings. When
+    active, new embeddings also get a reduced-dimension `embedding_reduced`
+    copy, and vector search can run against the much smaller reduced index
+    before reranking candidates with the full vectors (see projection.py).
+    """
+    embedding_model = models.CharField(max_length=100, help_text="Embedding model the projection was fitted on.")
+    source_dimensions = models.PositiveIntegerField()
+    target_dimensions = models.PositiveIntegerField()
+    # float32 arrays: mean [source_dimensions], components [target_dimensions, source_dimensions]
+    mean = models.BinaryField()
+    components = models.BinaryField()
+    explained_variance = models.FloatField(help_text="Share of the sample's variance kept by the projection.")
+    sample_size = models.PositiveIntegerField()
+    is_active = models.BooleanField(default=False, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Projection {self.source_dimensions}->{self.target_dimensions} ({self.embedding_model}){' [active]' if self.is_active else ''}"
+
+    class Meta:
+        db_table = 'embedding_projections'
+        ordering = ['-created_at']
+
+class LLMCacheEntry(models.Model):
+    """
+    A stored LLM response, keyed by a hash of the task kind, prompt-template
+    version, model and every input sent to the model. Identical requests (the
+    same code, in any repository) are answered from here; streamed responses
+    keep their original chunks so they can be replayed (see llm_cache.py).
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of kind, prompt version, model and inputs.")
+    kind = models.CharField(max_length=50, db_index=True, help_text="Task that produced the response, e.g. 'explanation'.")
+    prompt_version = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    chunks = models.JSONField(default=list, help_text="Response text, split as it was streamed.")
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def content(self) -> str:
+        return "".join(self.chunks)
+
+    def __str__(self):
+        return f"{self.kind} {self.prompt_version} ({self.model}) {self.key[:12]}"
+
+    class Meta:
+        db_table = 'llm_cache_entries'
+
+
+class LLMCallLog(models.Model):
+    """
+    One AI generation call: the model the router chose and why, and what the
+    call cost in latency and tokens. Used to tune the routing thresholds
+    (see model_router.py).
+    """
+    kind = models.CharField(max_length=50, db_index=True)
+    model = models.CharField(max_length=100)
+    tier = models.CharField(max_length=20, blank=True, default='')
+    reason = models.CharField(max_length=255, blank=True, default='', help_text="Why the router picked this tier.")
+    symbol = models.ForeignKey('CodeSymbol', on_delete=models.SET_NULL, null=True, blank=True, related_name='llm_calls')
+    max_tokens = models.PositiveIntegerField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    cost_usd = models.FloatField(null=True, blank=True, help_text="Estimated from the model price table; null for unknown models.")
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    cached = models.BooleanField(default=False, help_text="Answered from the LLM cache.")
+    batch = models.BooleanField(default=False, help_text="Produced by the OpenAI Batch API.")
+    success = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} via {self.model} ({self.latency_ms}ms)"
+
+    class Meta:
+        db_table = 'llm_call_logs'
+        ordering = ['-created_at']
+
 class Insight(models.Model):
     """
     Stores a single piece of generated insight about a repository change.
@@ -483,11 +686,24 @@ class KnowledgeChunk(models.Model):
         null=True,  # 03c03c03c ADD THIS: Allow the field to be null in the database
         blank=True  # 03c03c03c ADD THIS: Allow the field to be blank in Django forms/admin
     ) # Using default for OpenAI's text-embedding-ada-002
+    # PCA-reduced, half-precision copy of `embedding` (see projection.py).
+    embedding_reduced = HalfVectorField(dimensions=256, null=True, blank=True)
+
+    # Identifier-aware full-text vector over the content, used for lexical
+    # retrieval alongside the embedding (see retrieval.py).
+    search_vector = models.GeneratedField(
+        expression=SearchVector(IdentifierWords('content'), config='simple'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     # Links back to the source of the content for citation and context
     related_file = models.ForeignKey(CodeFile, on_delete=models.CASCADE, null=True, blank=True)
     related_class = models.ForeignKey(CodeClass, on_delete=models.CASCADE, null=True, blank=True)
     related_symbol = models.ForeignKey(CodeSymbol, on_delete=models.CASCADE, null=True, blank=True)
+    # Line range in related_file covered by this chunk (source chunks only; see chunking.py).
+    start_line = models.IntegerField(null=True, blank=True)
+    end_line = models.IntegerField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -496,14 +712,23 @@ class KnowledgeChunk(models.Model):
         ordering = ['-created_at']
         indexes = [
             # Add an HNSW index for fast, approximate nearest-neighbor search.
-            # This is crucial for performance on large datasets.
+            # This is crucial for performance on large datasets. The index is
+            # built over a half-precision cast to keep it in memory; results
+            # are reranked against the full-precision column.
             HnswIndex(
-                name='knowledge_embedding_hnsw_l2_idx',
-                fields=['embedding'],
+                OpClass(Cast('embedding', HalfVectorField(dimensions=1536)), name='halfvec_l2_ops'),
+                name='knowledge_emb_half_hnsw_idx',
                 m=16,              # Recommended starting point
-                ef_construction=64, # Recommended starting point
-                opclasses=['vector_l2_ops']
+                ef_construction=64 # Recommended starting point
+            ),
+            HnswIndex(
+                name='knowledge_emb_red_hnsw_idx',
+                fields=['embedding_reduced'],
+                m=16,
+                ef_construction=64,
+                opclasses=['halfvec_l2_ops']
             ),
+            GinIndex(name='knowledge_search_gin_idx', fields=['search_vector']),
         ]
 
     def __str__(self):
@@ -515,7 +740,41 @@ class KnowledgeChunk(models.Model):
         elif self.related_file:
             related_name = self.related_file.file_path
         return f"{self.get_chunk_type_display()} for '{related_name}'"
-    
+
+
+class EmbeddingCentroid(models.Model):
+    """
+    The mean embedding of a file's, class's or module's knowledge chunks,
+    computed locally from existing chunk embeddings (see centroids.py).
+    Retrieval on large repositories ranks these first and then searches only
+    the chunks inside the closest modules and classes.
+    """
+    class Level(models.TextChoices):
+        FILE = 'FILE', 'File'
+        CLASS = 'CLASS', 'Class'
+        MODULE = 'MODULE', 'Module'
+
+    repository = models.ForeignKey(Repository, on_delete=models.CASCADE, related_name='embedding_centroids')
+    level = models.CharField(max_length=10, choices=Level.choices)
+    # Directory of the file (FILE/CLASS) or the module itself (MODULE); '' is the repository root.
+    module_path = models.CharField(max_length=1024, blank=True, default='')
+    code_file = models.ForeignKey(CodeFile, on_delete=models.CASCADE, null=True, blank=True)
+    code_class = models.ForeignKey(CodeClass, on_delete=models.CASCADE, null=True, blank=True)
+    chunk_count = models.PositiveIntegerField(default=0)
+    # Unnormalized mean, so module centroids can be pooled from file centroids;
+    # compared with cosine distance.
+    embedding = VectorField(dimensions=1536)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_level_display()} centroid for '{self.module_path or 'Repository Root'}' ({self.chunk_count} chunks)"
+
+    class Meta:
+        db_table = 'embedding_centroids'
+        indexes = [
+            models.Index(fields=['repository', 'level', 'module_path'], name='centroid_repo_level_idx'),
+        ]
+
 class ModuleDocumentation(models.Model):
     """
     Stores AI-generated README.md content for a specific module/directory
@@ -605,6 +864,10 @@ class TestCoverageReport(models.Model):
     class Meta:
         db_table = 'test_coverage_reports'
         ordering = ['-uploaded_at']
+        indexes = [
+            # Latest report per repository (see the helix_symbol_coverage view).
+            models.Index(fields=['repository', '-uploaded_at'], name='coverage_repo_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Coverage Report for {self.repository.name} at {self.commit_hash[:7]}"
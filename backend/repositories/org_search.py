@@ -0,0 +1,108 @@
+# backend/repositories/org_search.py
+"""
+Organization-wide semantic search. The query is embedded once, each
+repository is searched for its own top-k in parallel (search_symbols, which
+uses the repository's in-memory matrix or its index) and the per-repository
+lists are merged with a heap.
+
+Per-repository results are cached under the repository's
+symbol_embedding_generation, so any change to its symbol embeddings makes the
+old entries unreachable without explicit invalidation. Repositories that do
+not answer within HELIX_ORG_SEARCH_TIMEOUT_SECONDS are left out of the merge
+and reported, which keeps latency bounded as the organization grows.
+"""
+import hashlib
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .embeddings import get_embedding_provider
+from .models import Repository
+from .retrieval import search_symbols
+
+# Shared by all requests in the process, so the total number of concurrent
+# per-repository queries stays bounded no matter how many searches run.
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.HELIX_ORG_SEARCH_CONCURRENCY, thread_name_prefix="org-search"
+        )
+    return _executor
+
+
+def _query_digest(query_text: str, per_repo_limit: int) -> str:
+    key = f"{settings.HELIX_EMBEDDING_PROVIDER}\0{settings.HELIX_EMBEDDING_MODEL}\0{per_repo_limit}\0{query_text.strip()}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _search_repository(repo_id: int, query_embedding, limit: int) -> list[tuple[int, float]]:
+    try:
+        return search_symbols([repo_id], query_embedding, limit=limit)
+    finally:
+        # Pool threads never see request_finished, so release their connection here.
+        close_old_connections()
+
+
+def search_organization(repo_ids, query_text: str, limit: int = 10) -> dict:
+    """
+    Searches every repository in `repo_ids` and returns
+    {"hits": [(repo_id, symbol_id, distance)] best first, "searched": [...],
+    "timed_out": [...], "failed": [...]} where the last three are repository ids.
+    """
+    started = time.monotonic()
+    limit = int(limit)
+    digest = _query_digest(query_text, limit)
+    generations = dict(Repository.objects.filter(id__in=list(repo_ids)).values_list('id', 'symbol_embedding_generation'))
+    keys = {repo_id: f"org_search:{repo_id}:{generation}:{digest}" for repo_id, generation in generations.items()}
+
+    cached = cache.get_many(list(keys.values()))
+    results = {repo_id: cached[key] for repo_id, key in keys.items() if key in cached}
+    missing = [repo_id for repo_id in keys if repo_id not in results]
+    timed_out, failed = [], []
+
+    if missing:
+        query_embedding = get_embedding_provider().embed_query(query_text)
+        executor = _get_executor()
+        futures = {executor.submit(_search_repository, repo_id, query_embedding, limit): repo_id for repo_id in missing}
+        done, not_done = wait(futures, timeout=settings.HELIX_ORG_SEARCH_TIMEOUT_SECONDS)
+        fresh = {}
+        for future in done:
+            repo_id = futures[future]
+            try:
+                fresh[repo_id] = future.result()
+            except Exception as e:
+                print(f"ORG_SEARCH: Search of repository {repo_id} failed: {e}")
+                failed.append(repo_id)
+        for future in not_done:
+            # Queued searches are dropped; running ones finish in the background.
+            future.cancel()
+            timed_out.append(futures[future])
+        if fresh:
+            cache.set_many(
+                {keys[repo_id]: hits for repo_id, hits in fresh.items()},
+                timeout=settings.HELIX_ORG_SEARCH_CACHE_SECONDS,
+            )
+        results.update(fresh)
+
+    merged = heapq.nsmallest(
+        limit,
+        ((distance, repo_id, symbol_id) for repo_id, hits in results.items() for symbol_id, distance in hits),
+    )
+    print(
+        f"ORG_SEARCH: {len(keys)} repositories ({len(keys) - len(missing)} cached, {len(timed_out)} timed out, "
+        f"{len(failed)} failed) in {(time.monotonic() - started) * 1000:.0f}ms."
+    )
+    return {
+        "hits": [(repo_id, symbol_id, distance) for distance, repo_id, symbol_id in merged],
+        "searched": sorted(results),
+        "timed_out": timed_out,
+        "failed": failed,
+    }
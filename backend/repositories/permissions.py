@@ -1,6 +1,7 @@
 # backend/repositories/permissions.py
 from rest_framework import permissions
-from .models import Organization, OrganizationMember, Repository
+from .models import Organization, Repository
+from .access import is_organization_member
 
 class IsMemberOfOrganization(permissions.BasePermission):
     """
@@ -20,24 +21,21 @@ class IsMemberOfOrganization(permissions.BasePermission):
         """
         # `obj` is the instance being accessed (e.g., a Repository instance).
         
-        organization = None
+        organization_id = None
         
         # Determine the organization from the object being accessed.
         if isinstance(obj, Repository):
-            organization = obj.organization
+            organization_id = obj.organization_id
         elif hasattr(obj, 'repository'): # For models like CodeFile, CodeSymbol, etc.
-            organization = obj.repository.organization
+            organization_id = obj.repository.organization_id
         # Add more elifs here for other models like Organization itself.
         elif isinstance(obj, Organization):
-            organization = obj
+            organization_id = obj.id
 
-        if not organization:
+        if not organization_id:
             # If we can't determine the organization, deny permission for safety.
             return False
 
         # The core logic: Check if a membership exists for the current user
         # in the determined organization.
-        return OrganizationMember.objects.filter(
-            organization=organization,
-            user=request.user
-        ).exists()
\ No newline at end of file
+        return is_organization_member(request.user, organization_id)
\ No newline at end of file
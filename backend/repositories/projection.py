@@ -0,0 +1,141 @@
+# backend/repositories/projection.py
+"""
+Reduced-dimension embeddings. A PCA projection is fitted with NumPy on a
+sample of stored embeddings and saved as an EmbeddingProjection. While a
+projection is active, every stored embedding also gets a half-precision
+`embedding_reduced` copy, which is indexed by a much smaller HNSW index.
+Search then fetches candidates from that index and reranks them against the
+full-precision vectors (see retrieval.py).
+"""
+import functools
+
+import numpy as np
+from django.db import transaction
+
+from .models import CodeSymbol, EmbeddingProjection, KnowledgeChunk
+
+REDUCED_EMBEDDING_DIMENSIONS = 256
+
+
+class Projection:
+    """An in-memory copy of an EmbeddingProjection's matrices."""
+    def __init__(self, projection_id: int, mean: np.ndarray, components: np.ndarray):
+        self.id = projection_id
+        self.mean = mean
+        self.components = components
+
+    @classmethod
+    def from_model(cls, projection: EmbeddingProjection) -> "Projection":
+        mean = np.frombuffer(bytes(projection.mean), dtype=np.float32)
+        components = np.frombuffer(bytes(projection.components), dtype=np.float32).reshape(
+            projection.target_dimensions, projection.source_dimensions
+        )
+        return cls(projection.id, mean, components)
+
+    def project(self, vectors) -> np.ndarray:
+        """Projects a [n, source] array (or a single vector) into the reduced space."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return (vectors - self.mean) @ self.components.T
+
+
+def fit_projection(vectors: np.ndarray, target_dimensions: int = REDUCED_EMBEDDING_DIMENSIONS):
+    """
+    Fits a PCA projection on `vectors` [n, source] with an SVD of the centered
+    sample. Returns (mean, components [target, source], explained variance share).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) < target_dimensions:
+        raise ValueError(f"Need at least {target_dimensions} sample vectors to fit the projection, got {len(vectors)}.")
+    mean = vectors.mean(axis=0)
+    _, singular_values, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+    variance = singular_values ** 2
+    explained = float(variance[:target_dimensions].sum() / variance.sum()) if variance.sum() else 0.0
+    return mean.astype(np.float32), vt[:target_dimensions].astype(np.float32), explained
+
+
+def sample_embeddings(sample_size: int) -> np.ndarray:
+    """Draws up to `sample_size` stored embeddings, split between knowledge chunks and symbols."""
+    vectors = []
+    for model in (KnowledgeChunk, CodeSymbol):
+        rows = model.objects.filter(embedding__isnull=False).order_by('?').values_list('embedding', flat=True)
+        vectors.extend(np.asarray(v, dtype=np.float32) for v in rows[:sample_size // 2])
+    return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+
+def create_projection(embedding_model: str, sample_size: int = 20000,
+                      target_dimensions: int = REDUCED_EMBEDDING_DIMENSIONS) -> EmbeddingProjection:
+    """
+    Fits a projection on a sample of stored embeddings and saves it inactive:
+    searches keep using the current one until backfill_reduced_embeddings has
+    run with the new one and activate_projection switches over.
+    """
+    sample = sample_embeddings(sample_size)
+    mean, components, explained = fit_projection(sample, target_dimensions)
+    return EmbeddingProjection.objects.create(
+        embedding_model=embedding_model,
+        source_dimensions=components.shape[1],
+        target_dimensions=target_dimensions,
+        mean=mean.tobytes(),
+        components=components.tobytes(),
+        explained_variance=explained,
+        sample_size=len(sample),
+        is_active=False,
+    )
+
+
+def activate_projection(projection_id: int):
+    """Makes a (backfilled) projection the active one, in one transaction."""
+    with transaction.atomic():
+        EmbeddingProjection.objects.filter(is_active=True).exclude(id=projection_id).update(is_active=False)
+        EmbeddingProjection.objects.filter(id=projection_id).update(is_active=True)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_projection(projection_id: int) -> Projection:
+    # Projections are never modified once saved, so caching by id is safe.
+    return Projection.from_model(EmbeddingProjection.objects.get(id=projection_id))
+
+
+def get_active_projection() -> Projection | None:
+    """Returns the active projection, or None. The matrices are cached per process."""
+    projection_id = EmbeddingProjection.objects.filter(is_active=True).values_list('id', flat=True).first()
+    return _load_projection(projection_id) if projection_id else None
+
+
+def load_projection(projection_id: int) -> Projection:
+    return _load_projection(projection_id)
+
+
+def get_write_projection() -> Projection | None:
+    """
+    The projection newly stored embeddings are reduced with: the newest one,
+    which is the active projection, or one being backfilled to replace it
+    (so rows embedded during the backfill are not left in the old space).
+    """
+    latest_id = EmbeddingProjection.objects.order_by('-id').values_list('id', flat=True).first()
+    if latest_id is None:
+        return None
+    active = get_active_projection()
+    if active is None or latest_id > active.id:
+        return _load_projection(latest_id)
+    return active
+
+
+def backfill_reduced_embeddings(model, projection: Projection, batch_size: int = 1000) -> int:
+    """
+    Recomputes `embedding_reduced` for every row of `model` (KnowledgeChunk or
+    CodeSymbol) that has a full embedding. Returns the number of rows updated.
+    """
+    updated = 0
+    queryset = model.objects.filter(embedding__isnull=False).only('id', 'embedding').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return updated
+        reduced = projection.project(np.stack([np.asarray(row.embedding, dtype=np.float32) for row in batch]))
+        for row, vector in zip(batch, reduced):
+            row.embedding_reduced = vector.tolist()
+        model.objects.bulk_update(batch, ['embedding_reduced'], batch_size=batch_size)
+        updated += len(batch)
+        last_id = batch[-1].id
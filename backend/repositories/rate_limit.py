@@ -0,0 +1,143 @@
+# backend/repositories/rate_limit.py
+"""
+Rate limiting for calls to external model APIs.
+
+TokenBucket limits a single process. RedisRateLimiter enforces a
+requests-per-minute and a tokens-per-minute budget shared by every worker
+process, so that N concurrent Celery workers together stay under the
+provider's limits. Retrying calls the provider rejected anyway is done by
+llm_client.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+
+class TokenBucket:
+    """
+    A thread-safe, in-process token bucket. `rate_per_minute` tokens are added
+    continuously up to `capacity`; `acquire()` blocks until enough tokens are
+    available. Used to keep concurrent calls to an external API under a
+    requests-per-minute budget.
+    """
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(rate_per_minute / 60.0, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_seconds = (tokens - self._tokens) / self.rate_per_second
+            time.sleep(wait_seconds)
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(name: str, rate_per_minute: float) -> TokenBucket:
+    """Returns the process-wide bucket registered under `name`, creating it on first use."""
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            bucket = _buckets[name] = TokenBucket(rate_per_minute)
+        return bucket
+
+
+# Both buckets live in one hash and are refilled and debited atomically.
+# Returns the number of seconds to wait (as a string, since Lua numbers are
+# truncated to integers on the way out), or "0" if the call may proceed.
+_REDIS_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local request_rate, request_capacity, request_cost = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local token_rate, token_capacity, token_cost = tonumber(ARGV[5]), tonumber(ARGV[6]), tonumber(ARGV[7])
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'updated_at')
+local requests = tonumber(state[1]) or request_capacity
+local tokens = tonumber(state[2]) or token_capacity
+local elapsed = math.max(now - (tonumber(state[3]) or now), 0)
+requests = math.min(request_capacity, requests + elapsed * request_rate)
+tokens = math.min(token_capacity, tokens + elapsed * token_rate)
+local wait = 0
+if requests < request_cost then wait = (request_cost - requests) / request_rate end
+if tokens < token_cost then wait = math.max(wait, (token_cost - tokens) / token_rate) end
+if wait == 0 then
+    requests = requests - request_cost
+    tokens = tokens - token_cost
+end
+redis.call('HSET', KEYS[1], 'requests', requests, 'tokens', tokens, 'updated_at', now)
+redis.call('EXPIRE', KEYS[1], 120)
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """
+    A requests-per-minute plus tokens-per-minute limiter shared through Redis.
+    Each bucket holds at most `burst_seconds` worth of budget. If Redis cannot
+    be reached, falls back to in-process buckets with the same limits.
+    """
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float, burst_seconds: float = 10.0):
+        self.key = f"helix:rate_limit:{name}"
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_capacity = max(self.request_rate * burst_seconds, 1.0)
+        self.token_capacity = max(self.token_rate * burst_seconds, 1.0)
+        self._script = None
+        self._fallback = (
+            TokenBucket(requests_per_minute, self.request_capacity),
+            TokenBucket(tokens_per_minute, self.token_capacity),
+        )
+
+    def _get_script(self):
+        if self._script is None:
+            import redis
+            client = redis.Redis.from_url(settings.REDIS_URL)
+            self._script = client.register_script(_REDIS_BUCKET_SCRIPT)
+        return self._script
+
+    def acquire(self, tokens: float = 0.0):
+        """Blocks until one request and `tokens` tokens fit in the shared budget."""
+        # A single call larger than the bucket could never fit; let it through at full capacity.
+        tokens = min(float(tokens), self.token_capacity)
+        while True:
+            try:
+                wait_seconds = float(self._get_script()(
+                    keys=[self.key],
+                    args=[time.time(), self.request_rate, self.request_capacity, 1,
+                          self.token_rate, self.token_capacity, tokens],
+                ))
+            except Exception as e:
+                print(f"RATE_LIMIT: Redis unavailable for {self.key} ({e}); using in-process limits.")
+                self._fallback[0].acquire(1)
+                if tokens:
+                    self._fallback[1].acquire(tokens)
+                return
+            if wait_seconds <= 0:
+                return
+            time.sleep(wait_seconds)
+
+
+_limiters: dict[str, RedisRateLimiter] = {}
+
+
+def get_rate_limiter(name: str, requests_per_minute: float, tokens_per_minute: float) -> RedisRateLimiter:
+    """Returns the process-wide limiter registered under `name`, creating it on first use."""
+    with _buckets_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = _limiters[name] = RedisRateLimiter(name, requests_per_minute, tokens_per_minute)
+        return limiter
+
@@ -0,0 +1,488 @@
+# backend/repositories/retrieval.py
+import heapq
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import CodeSymbol, KnowledgeChunk
+from .projection import get_active_projection
+from .vector_store import CHUNK_TYPE_CODES, stores_for_search
+from .utils import identifier_words
+
+# Each layer is (layer number, chunk types, top-k). Layers are ordered from
+# high-level (module READMEs) down to low-level (docstrings and source code).
+KNOWLEDGE_LAYERS = (
+    (1, [KnowledgeChunk.ChunkType.MODULE_README], 2),
+    (2, [KnowledgeChunk.ChunkType.CLASS_SUMMARY], 3),
+    (3, [KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING, KnowledgeChunk.ChunkType.SYMBOL_SOURCE], 5),
+)
+# The last layer only fills the context up to this many chunks in total.
+MAX_CONTEXT_CHUNKS = 5
+# The last (docstring/source) layer fuses vector and lexical rankings with
+# reciprocal rank fusion: score = sum(1 / (RRF_K + rank)) over both lists.
+RRF_K = 60
+HYBRID_CANDIDATES = 40
+
+_IDENTIFIER_TOKEN = re.compile(r'^[A-Za-z_][\w.:/-]*$')
+_QUOTED = re.compile(r'^([`"\'])(.+)\1$', re.S)
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "of", "on", "or", "the", "this", "to", "what", "when",
+    "where", "which", "who", "why", "with",
+}
+
+
+def vector_literal(embedding) -> str:
+    """Serializes an embedding into pgvector's text input format."""
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+
+# ANN candidates come from a compact index and are reranked with the exact
+# full-precision distance. The expressions must match the indexed expressions
+# in models.py exactly for the planner to use those indexes.
+_HALFVEC_DISTANCE = "{alias}.embedding::halfvec(1536) <-> %(query)s::halfvec(1536)"
+_REDUCED_DISTANCE = "{alias}.embedding_reduced <-> %(query_reduced)s::halfvec(256)"
+# Exact distance, used when coarse-to-fine retrieval has already narrowed the
+# search to a few modules/classes and a scan of those rows is cheaper than the index.
+_EXACT_DISTANCE = "{alias}.embedding <-> %(query)s::vector"
+
+
+def _ann_plan(query_embedding) -> tuple[dict, str, str]:
+    """
+    Picks the compact index for HELIX_VECTOR_SEARCH_MODE. Returns (params,
+    candidate distance template, column that must be non-null). "reduced"
+    falls back to "halfvec" while no EmbeddingProjection is active.
+    """
+    params = {"query": vector_literal(query_embedding), "rerank_factor": settings.HELIX_VECTOR_RERANK_FACTOR}
+    if settings.HELIX_VECTOR_SEARCH_MODE == "reduced":
+        projection = get_active_projection()
+        if projection:
+            params["query_reduced"] = vector_literal(projection.project(query_embedding))
+            return params, _REDUCED_DISTANCE, "embedding_reduced"
+    return params, _HALFVEC_DISTANCE, "embedding"
+
+
+def _reranked_candidates_sql(table: str, where: str, limit_param: str, distance: str, column: str) -> str:
+    """
+    Returns a subquery yielding (id, distance): the top `limit * rerank_factor`
+    rows by the compact index's distance, reranked by exact distance and cut
+    to `limit`. `where` refers to the table as `t`.
+    """
+    return f"""
+        SELECT c.id, c.embedding <-> %(query)s::vector AS distance
+        FROM (
+            SELECT t.id, t.embedding
+            FROM {table} t
+            WHERE {where} AND t.{column} IS NOT NULL
+            ORDER BY {distance.format(alias='t')}
+            LIMIT %({limit_param})s * %(rerank_factor)s
+        ) c
+        ORDER BY distance
+        LIMIT %({limit_param})s"""
+
+
+def build_tsquery(query_text: str, max_terms: int = 16, operator: str = "|") -> str:
+    """
+    Builds a `to_tsquery('simple', ...)` expression from free text. Each
+    whitespace-separated token becomes one term; identifiers that split into
+    several words become a phrase (`get <-> user <-> name`). Terms are OR-ed
+    so ts_rank_cd can rank chunks by how many of them they contain. Only
+    [a-z0-9] lexemes are emitted, so the result is always valid tsquery syntax.
+    Pass operator="&" to require every term instead.
+    """
+    terms = []
+    for token in query_text.split():
+        words = identifier_words(token)
+        if not words:
+            continue
+        if len(words) == 1:
+            if words[0] in _STOPWORDS:
+                continue
+            term = words[0]
+        else:
+            term = "(" + " <-> ".join(words) + ")"
+        if term not in terms:
+            terms.append(term)
+    return f" {operator} ".join(terms[:max_terms])
+
+
+def looks_like_identifier(query_text: str) -> bool:
+    """
+    True for queries that are an exact name rather than a question: anything
+    wrapped in quotes/backticks, or a single token such as `get_user_name`,
+    `HTTPResponseError` or `settings.CELERY_BROKER_URL`.
+    """
+    query_text = query_text.strip()
+    if _QUOTED.match(query_text):
+        return True
+    if " " in query_text or not _IDENTIFIER_TOKEN.match(query_text):
+        return False
+    return len(identifier_words(query_text)) > 1 or any(c in query_text for c in "_.:/")
+
+
+def set_local_ef_search(cursor, ef_search=None):
+    """
+    Sets `hnsw.ef_search` for the current transaction only. Must be called
+    inside `transaction.atomic()` so the setting does not leak into other
+    queries that reuse the same connection.
+    """
+    ef_search = int(ef_search or settings.HELIX_HNSW_EF_SEARCH)
+    cursor.execute(f"SET LOCAL hnsw.ef_search = {ef_search}")
+
+
+def set_local_iterative_scan(cursor):
+    """
+    Enables pgvector's iterative index scans (pgvector >= 0.8) for the current
+    transaction. Without them an HNSW scan returns `ef_search` candidates and
+    only then applies the WHERE clause, so a filter on a small repository can
+    leave far fewer than k rows. Set HELIX_HNSW_ITERATIVE_SCAN to an empty
+    string to disable this on older pgvector versions.
+    """
+    mode = settings.HELIX_HNSW_ITERATIVE_SCAN
+    if mode:
+        if mode not in ("relaxed_order", "strict_order"):
+            raise ValueError(f"Unsupported hnsw.iterative_scan mode: {mode}")
+        cursor.execute(f"SET LOCAL hnsw.iterative_scan = {mode}")
+
+
+# Shared projection: chunk content plus the related class/symbol/file names,
+# joined in the same statement so callers never lazily load them.
+_CHUNK_DETAILS_SQL = """
+        SELECT h.layer, h.sort_key, kc.id, kc.chunk_type, kc.content,
+               cc.name AS class_name, cs.name AS symbol_name, cf.file_path
+        FROM hits h
+        JOIN knowledge_chunks kc ON kc.id = h.id
+        LEFT JOIN code_classes cc ON cc.id = kc.related_class_id
+        LEFT JOIN code_symbols cs ON cs.id = kc.related_symbol_id
+        LEFT JOIN code_files cf ON cf.id = kc.related_file_id
+        ORDER BY h.layer, h.sort_key
+"""
+
+
+def _precomputed_candidates_sql(layer: int) -> str:
+    """(id, distance) rows computed outside the database (see vector_store.py), passed in as arrays."""
+    return f"""
+        SELECT p.id, p.distance
+        FROM unnest(%(pre_ids_{layer})s::bigint[], %(pre_distances_{layer})s::float8[]) AS p(id, distance)"""
+
+
+def _layered_knowledge_sql(distance: str, column: str, scoped: bool = False, precomputed: bool = False):
+    last_layer = KNOWLEDGE_LAYERS[-1][0]
+    branches = []
+    for layer, _, _ in KNOWLEDGE_LAYERS[:-1]:
+        if precomputed:
+            candidates = _precomputed_candidates_sql(layer)
+        else:
+            candidates = _reranked_candidates_sql(
+                "knowledge_chunks",
+                f"t.repository_id = %(repo_id)s AND t.chunk_type = ANY(%(types_{layer})s)",
+                f"limit_{layer}", distance, column,
+            )
+        branches.append(f"""
+            (SELECT id, {layer} AS layer, distance AS sort_key FROM ({candidates}) layer_{layer})""")
+    # The last layer is hybrid: the vector and lexical top candidates are
+    # fused with RRF, and sort_key is the negated fused score.
+    branches.append(f"""
+            (SELECT id, {last_layer} AS layer, -score AS sort_key FROM fused)""")
+    last_layer_filter = f"t.repository_id = %(repo_id)s AND t.chunk_type = ANY(%(types_{last_layer})s)"
+    if scoped:
+        last_layer_filter += (
+            " AND (t.related_file_id = ANY(%(scope_files)s) OR t.related_class_id = ANY(%(scope_classes)s))"
+        )
+        distance, column = _EXACT_DISTANCE, "embedding"
+    if precomputed:
+        last_layer_candidates = _precomputed_candidates_sql(last_layer)
+    else:
+        last_layer_candidates = _reranked_candidates_sql(
+            "knowledge_chunks", last_layer_filter, "candidates", distance, column,
+        )
+    return f"""
+        WITH tsq AS (SELECT to_tsquery('simple', %(tsquery)s) AS q),
+        vector_candidates AS (
+            SELECT id, row_number() OVER (ORDER BY distance) AS rnk
+            FROM ({last_layer_candidates}
+            ) v
+        ),
+        lexical_candidates AS (
+            SELECT id, row_number() OVER (ORDER BY rank DESC) AS rnk
+            FROM (
+                SELECT kc.id, ts_rank_cd(kc.search_vector, tsq.q) AS rank
+                FROM knowledge_chunks kc, tsq
+                WHERE kc.repository_id = %(repo_id)s
+                  AND kc.chunk_type = ANY(%(types_{last_layer})s)
+                  AND kc.search_vector @@ tsq.q
+                ORDER BY rank DESC
+                LIMIT %(candidates)s
+            ) l
+        ),
+        fused AS (
+            SELECT id, SUM(1.0 / (%(rrf_k)s + rnk)) AS score
+            FROM (
+                SELECT id, rnk FROM vector_candidates
+                UNION ALL
+                SELECT id, rnk FROM lexical_candidates
+            ) c
+            GROUP BY id
+            ORDER BY score DESC
+            LIMIT %(limit_{last_layer})s
+        ),
+        hits AS ({" UNION ALL ".join(branches)}
+        )
+        {_CHUNK_DETAILS_SQL}
+    """
+
+
+def layered_knowledge_search(repo_id: int, query_embedding, query_text: str = "", ef_search=None) -> list[dict]:
+    """
+    Runs the multi-layered knowledge search in a single query. Every layer
+    gets its own ORDER BY <-> ... LIMIT k branch (so each one can use the HNSW
+    index) and the branches are combined with UNION ALL. Vector candidates
+    come from the compact (half-precision or reduced) index and are reranked
+    against the full-precision embeddings. The docstring/source
+    layer additionally fuses in full-text matches for `query_text` (RRF), so
+    exact identifiers are not lost to pure vector ranking. The related class,
+    symbol and file names are joined in the same query.
+
+    Small repositories take their vector candidates from the in-memory matrix
+    (see vector_store.py) instead of the index. On large repositories the
+    vector side of the docstring/source layer is first narrowed to the closest
+    modules and classes (see select_search_scope).
+
+    Returns a list of dicts ordered from high-level to low-level layers, with
+    the last layer trimmed so that at most MAX_CONTEXT_CHUNKS are returned.
+    """
+    params, distance, column = _ann_plan(query_embedding)
+    params.update({
+        "repo_id": repo_id,
+        "tsquery": build_tsquery(query_text),
+        "candidates": HYBRID_CANDIDATES,
+        "rrf_k": RRF_K,
+    })
+    for layer, chunk_types, limit in KNOWLEDGE_LAYERS:
+        params[f"types_{layer}"] = [str(t) for t in chunk_types]
+        params[f"limit_{layer}"] = limit
+
+    last_layer = KNOWLEDGE_LAYERS[-1][0]
+    scope = None
+    store = stores_for_search([repo_id], "chunks").get(repo_id)
+    if store is not None:
+        # Small repository: exact vector candidates from the in-memory matrix.
+        for layer, chunk_types, limit in KNOWLEDGE_LAYERS:
+            hits = store.search(
+                query_embedding, HYBRID_CANDIDATES if layer == last_layer else limit,
+                type_codes={CHUNK_TYPE_CODES[str(t)] for t in chunk_types},
+            )
+            params[f"pre_ids_{layer}"] = [pk for pk, _ in hits]
+            params[f"pre_distances_{layer}"] = [distance for _, distance in hits]
+    else:
+        scope = select_search_scope(repo_id, query_embedding)
+        if scope:
+            params["scope_files"], params["scope_classes"] = scope
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            set_local_ef_search(cursor, ef_search)
+            set_local_iterative_scan(cursor)
+            cursor.execute(
+                _layered_knowledge_sql(distance, column, scoped=bool(scope), precomputed=store is not None), params
+            )
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    higher_layers = [row for row in rows if row["layer"] != last_layer]
+    needed = max(MAX_CONTEXT_CHUNKS - len(higher_layers), 0)
+    fill = [row for row in rows if row["layer"] == last_layer][:needed]
+    return higher_layers + fill
+
+
+def select_search_scope(repo_id: int, query_embedding) -> tuple[list[int], list[int]] | None:
+    """
+    Coarse step of coarse-to-fine retrieval: ranks the repository's module and
+    class centroids (see centroids.py) by cosine distance to the query and
+    returns (file ids in the top HELIX_COARSE_MODULES modules, top
+    HELIX_COARSE_CLASSES class ids). Returns None when the repository has
+    fewer than HELIX_COARSE_TO_FINE_MIN_CHUNKS embedded chunks or no
+    centroids, in which case the flat search is used.
+    """
+    sql = """
+        WITH ranked AS (
+            SELECT c.level, c.module_path, c.code_class_id,
+                   row_number() OVER (PARTITION BY c.level ORDER BY c.embedding <=> %(query)s::vector) AS rnk,
+                   SUM(c.chunk_count) FILTER (WHERE c.level = 'FILE') OVER () AS total_chunks
+            FROM embedding_centroids c
+            WHERE c.repository_id = %(repo_id)s
+        )
+        SELECT
+            (SELECT MAX(total_chunks) FROM ranked),
+            ARRAY(
+                SELECT f.code_file_id FROM embedding_centroids f
+                WHERE f.repository_id = %(repo_id)s AND f.level = 'FILE'
+                  AND f.module_path IN (SELECT module_path FROM ranked WHERE level = 'MODULE' AND rnk <= %(modules)s)
+            ),
+            ARRAY(SELECT code_class_id FROM ranked WHERE level = 'CLASS' AND rnk <= %(classes)s)
+    """
+    params = {
+        "query": vector_literal(query_embedding),
+        "repo_id": repo_id,
+        "modules": settings.HELIX_COARSE_MODULES,
+        "classes": settings.HELIX_COARSE_CLASSES,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        total_chunks, file_ids, class_ids = cursor.fetchone()
+    if not total_chunks or total_chunks < settings.HELIX_COARSE_TO_FINE_MIN_CHUNKS:
+        return None
+    if not file_ids and not class_ids:
+        return None
+    return list(file_ids), list(class_ids)
+
+
+def lexical_knowledge_search(repo_id: int, query_text: str, limit: int = MAX_CONTEXT_CHUNKS) -> list[dict]:
+    """
+    Full-text only search over all chunk types, ranked by ts_rank_cd. Used for
+    exact-name lookups, which do not need an embedding at all. Rows have the
+    same shape as layered_knowledge_search().
+    """
+    tsquery = build_tsquery(_QUOTED.sub(r'\2', query_text.strip()), operator="&")
+    if not tsquery:
+        return []
+    sql = f"""
+        WITH tsq AS (SELECT to_tsquery('simple', %(tsquery)s) AS q),
+        hits AS (
+            SELECT kc.id, 0 AS layer, -ts_rank_cd(kc.search_vector, tsq.q) AS sort_key
+            FROM knowledge_chunks kc, tsq
+            WHERE kc.repository_id = %(repo_id)s AND kc.search_vector @@ tsq.q
+            ORDER BY sort_key
+            LIMIT %(limit)s
+        )
+        {_CHUNK_DETAILS_SQL}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"tsquery": tsquery, "repo_id": repo_id, "limit": int(limit)})
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def describe_chunk_source(row: dict) -> str:
+    """Builds the 'Source: ...' line used when presenting a retrieved chunk."""
+    description = f"Source: {KnowledgeChunk.ChunkType(row['chunk_type']).label}"
+    if row.get("class_name"):
+        description += f" for class '{row['class_name']}'"
+    if row.get("symbol_name"):
+        description += f" for function '{row['symbol_name']}'"
+    if row.get("file_path"):
+        description += f" in '{row['file_path']}'"
+    return description
+
+
+def symbol_partial_index_name(repo_id: int) -> str:
+    return f"code_symbols_embedding_repo_{int(repo_id)}_hnsw"
+
+
+def search_symbols(repo_ids, query_embedding, limit: int = 5, ef_search=None) -> list[tuple[int, float]]:
+    """
+    Repository-scoped ANN search over CodeSymbol embeddings. Returns a list of
+    (symbol_id, distance) tuples ordered by distance.
+
+    When every repository has a current in-memory matrix (vector_store.py),
+    the search is exact and runs in NumPy. Otherwise candidates are fetched
+    from the compact index and reranked against the full-precision
+    embeddings (see _ann_plan).
+
+    For a single repository the filter is written as `repository_id = <id>` so
+    the planner can pick that repository's partial HNSW index when one exists.
+    Otherwise the global HNSW index is used with iterative scans, so recall
+    does not collapse when the repositories make up a small share of the table.
+    """
+    repo_ids = [int(r) for r in repo_ids]
+    if not repo_ids:
+        return []
+
+    # Small repositories are searched exactly in their in-memory matrices.
+    stores = stores_for_search(repo_ids, "symbols")
+    if len(stores) == len(repo_ids):
+        hits = (hit for store in stores.values() for hit in store.search(query_embedding, limit))
+        return heapq.nsmallest(int(limit), hits, key=lambda hit: hit[1])
+
+    params, distance, column = _ann_plan(query_embedding)
+    params["limit"] = int(limit)
+    if len(repo_ids) == 1:
+        repo_filter = "t.repository_id = %(repo_id)s"
+        params["repo_id"] = repo_ids[0]
+    else:
+        repo_filter = "t.repository_id = ANY(%(repo_ids)s)"
+        params["repo_ids"] = repo_ids
+
+    # Candidates from the compact index (returned slightly out of order by
+    # relaxed iterative scans) are re-sorted by exact full-precision distance.
+    sql = _reranked_candidates_sql("code_symbols", repo_filter, "limit", distance, column)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            set_local_ef_search(cursor, ef_search)
+            set_local_iterative_scan(cursor)
+            cursor.execute(sql, params)
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def search_symbols_by_name(repo_ids, query_text: str, limit: int = 5) -> list[tuple[int, float]]:
+    """
+    Exact-name symbol lookup on the identifier-aware name index. Returns
+    (symbol_id, sort_key) tuples, best match first; lower is better, matching
+    the distances returned by search_symbols().
+    """
+    repo_ids = [int(r) for r in repo_ids]
+    tsquery = build_tsquery(_QUOTED.sub(r'\2', query_text.strip()), operator="&")
+    if not repo_ids or not tsquery:
+        return []
+    sql = """
+        SELECT s.id, -ts_rank_cd(s.name_search_vector, q) AS sort_key
+        FROM code_symbols s, to_tsquery('simple', %(tsquery)s) AS q
+        WHERE s.repository_id = ANY(%(repo_ids)s) AND s.name_search_vector @@ q
+        ORDER BY sort_key, length(s.name)
+        LIMIT %(limit)s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"tsquery": tsquery, "repo_ids": repo_ids, "limit": int(limit)})
+        return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+def ensure_symbol_partial_index(repo_id: int) -> bool:
+    """
+    Creates a partial HNSW index over a repository's symbol embeddings once it
+    has at least HELIX_SYMBOL_PARTIAL_INDEX_MIN_ROWS embedded symbols. Searches
+    scoped to that repository then walk a graph that only contains its own
+    symbols, which keeps both recall and latency stable as other repositories
+    grow. Returns True if the index exists after the call.
+
+    Uses CREATE INDEX CONCURRENTLY, so it must not run inside a transaction.
+    """
+    embedded_count = CodeSymbol.objects.filter(repository_id=repo_id, embedding__isnull=False).count()
+    if embedded_count < settings.HELIX_SYMBOL_PARTIAL_INDEX_MIN_ROWS:
+        return False
+
+    index_name = symbol_partial_index_name(repo_id)
+    print(f"RETRIEVAL: Ensuring partial HNSW index {index_name} ({embedded_count} embedded symbols).")
+    # Same expression as the global index the queries are planned against.
+    if settings.HELIX_VECTOR_SEARCH_MODE == "reduced":
+        indexed = "embedding_reduced halfvec_l2_ops"
+    else:
+        indexed = "(embedding::halfvec(1536)) halfvec_l2_ops"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+            f"ON code_symbols USING hnsw ({indexed}) "
+            f"WITH (m = 16, ef_construction = 64) "
+            f"WHERE repository_id = {int(repo_id)}"
+        )
+    return True
+
+
+def drop_symbol_partial_index(repo_id: int):
+    """
+    Drops a repository's partial symbol index, if it has one.
+
+    Uses DROP INDEX CONCURRENTLY, so it must not run inside a transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {symbol_partial_index_name(repo_id)}")
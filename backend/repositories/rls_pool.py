@@ -0,0 +1,112 @@
+# backend/repositories/rls_pool.py
+"""
+A per-process pool of read-only database connections for the chat agent's
+SQL tool. Connections log in as the read-only role with
+default_transaction_read_only on and a statement_timeout
+(HELIX_AGENT_SQL_TIMEOUT_MS), and Row-Level Security scopes them to one user
+through the app.current_user_id setting.
+
+Every checkout resets the session (RESET ALL, so nothing a previous query
+changed survives) and re-scopes it to the requesting user in a single round
+trip, so a chat turn never pays for a new connection.
+"""
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from django.conf import settings
+
+
+class RLSPoolExhausted(Exception):
+    """No read-only connection became free within HELIX_RLS_POOL_TIMEOUT_SECONDS."""
+
+
+class RLSConnectionPool:
+    """A LIFO stack of idle connections, with at most `size` checked out at once."""
+    def __init__(self, size: int, timeout: float):
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        db_settings = settings.DATABASES['default']
+        conn = psycopg2.connect(
+            host=db_settings.get('HOST', 'localhost'),
+            port=db_settings.get('PORT', 5432),
+            dbname=db_settings.get('NAME'),
+            user=settings.READONLY_DB_USER,
+            password=settings.READONLY_DB_PASSWORD,
+            connect_timeout=settings.HELIX_RLS_POOL_CONNECT_TIMEOUT_SECONDS,
+            # Session defaults, so RESET ALL on checkout restores them too.
+            options=(
+                "-c default_transaction_read_only=on"
+                f" -c statement_timeout={settings.HELIX_AGENT_SQL_TIMEOUT_MS}"
+                f" -c idle_in_transaction_session_timeout={settings.HELIX_AGENT_SQL_TIMEOUT_MS * 2}"
+            ),
+        )
+        conn.autocommit = True
+        print(f"RLS_POOL: Opened a read-only connection ({len(self._idle)} idle).")
+        return conn
+
+    def _scope(self, conn, user_id: int):
+        with conn.cursor() as cursor:
+            cursor.execute("RESET ALL; SELECT set_config('app.current_user_id', %s, false)", (str(user_id),))
+
+    def _checkout(self, user_id: int):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is not None and not conn.closed:
+            try:
+                self._scope(conn, user_id)
+                return conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # The server dropped the idle connection; replace it once.
+                print(f"RLS_POOL: Discarding a stale connection: {e}")
+                conn.close()
+        conn = self._connect()
+        try:
+            self._scope(conn, user_id)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @contextmanager
+    def connection(self, user_id: int):
+        """A connection scoped to `user_id` for the duration of the block."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RLSPoolExhausted("No read-only database connection is available; try again shortly.")
+        conn = None
+        broken = False
+        try:
+            conn = self._checkout(user_id)
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                if broken or conn.closed:
+                    conn.close()
+                else:
+                    with self._lock:
+                        self._idle.append(conn)
+            self._slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_rls_pool() -> RLSConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RLSConnectionPool(settings.HELIX_RLS_POOL_SIZE, settings.HELIX_RLS_POOL_TIMEOUT_SECONDS)
+        return _pool
+
+
+def rls_connection(user_id: int):
+    """Shortcut for get_rls_pool().connection(user_id)."""
+    return get_rls_pool().connection(user_id)
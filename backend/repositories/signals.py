@@ -1,8 +1,17 @@
 # backend/repositories/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
-from .models import Repository
-from .tasks import process_repository
+from .models import OrganizationMember, Repository
+from .tasks import drop_symbol_search_index_task, process_repository
+from .access import invalidate_organization_access, invalidate_user_access
+
+@receiver(post_init, sender=Repository)
+def repository_post_init(sender, instance, **kwargs):
+    """Remembers the organization the repository was loaded with, see repository_post_save."""
+    # Deferred (.only()/.defer()) loads leave the field out; nothing to compare then.
+    if 'organization_id' in instance.__dict__:
+        instance._helix_loaded_organization_id = instance.organization_id
 
 @receiver(post_save, sender=Repository)
 def repository_post_save(sender, instance, created, **kwargs):
@@ -10,7 +19,34 @@ def repository_post_save(sender, instance, created, **kwargs):
     When a Repository is saved, if it's a new one,
     kick off the background processing task.
     """
+    previous_organization_id = getattr(instance, '_helix_loaded_organization_id', instance.organization_id)
+    instance._helix_loaded_organization_id = instance.organization_id
+    if not created and previous_organization_id != instance.organization_id:
+        # Moving a repository hides it from the old organization's members and
+        # shows it to the new organization's members.
+        invalidate_organization_access(previous_organization_id)
+        invalidate_organization_access(instance.organization_id)
     if created:
+        # Members of the organization can now see one more repository.
+        invalidate_organization_access(instance.organization_id)
         print(f"New repository created: {instance.full_name}. Kicking off processing task.")
         # .delay() is the Celery way to run a task in the background
-        process_repository.delay(instance.id)
\ No newline at end of file
+        process_repository.delay(instance.id)
+
+@receiver(post_delete, sender=Repository)
+def repository_post_delete(sender, instance, **kwargs):
+    """
+    Drops the repository's partial symbol index (if it had one), since its
+    predicate can no longer match any rows. The drop runs in a task after the
+    delete commits, so the delete never waits on a lock over code_symbols.
+    """
+    invalidate_organization_access(instance.organization_id)
+    repo_id = instance.id
+    transaction.on_commit(lambda: drop_symbol_search_index_task.delay(repo_id))
+
+
+@receiver(post_save, sender=OrganizationMember)
+@receiver(post_delete, sender=OrganizationMember)
+def organization_member_changed(sender, instance, **kwargs):
+    """Joining or leaving an organization changes which repositories the user can access."""
+    invalidate_user_access(instance.user_id)
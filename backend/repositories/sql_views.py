@@ -0,0 +1,71 @@
+# backend/repositories/sql_views.py
+"""
+The curated read-only views the chat agent's SQL tool is pointed at
+(created in migration 0047), and the compact schema digest that describes
+them in the agent's instructions. Giving the model the digest up front saves
+the show_tables round trip it used to need on every SQL turn, and steers it
+to pre-joined views instead of ad-hoc joins over the raw tables.
+"""
+from django.db import connection
+
+AGENT_VIEWS = (
+    "helix_symbol_summary",
+    "helix_call_edges",
+    "helix_file_metrics",
+    "helix_symbol_coverage",
+)
+
+_SHORT_TYPES = {
+    "bigint": "int",
+    "integer": "int",
+    "smallint": "int",
+    "character varying": "text",
+    "boolean": "bool",
+    "numeric": "numeric",
+    "text": "text",
+}
+
+_digest = None
+
+
+def schema_digest() -> str:
+    """
+    One line per view (name, comment) followed by its columns and short
+    types, read from the catalog once per process, i.e. once per deploy.
+    Returns "" (and retries on the next call) if the views are missing, so
+    callers can fall back.
+    """
+    global _digest
+    if _digest is not None:
+        return _digest
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT c.table_name, c.column_name, c.data_type,
+                       obj_description(format('%%I', c.table_name)::regclass, 'pg_class')
+                FROM information_schema.columns c
+                WHERE c.table_schema = 'public' AND c.table_name = ANY(%s)
+                ORDER BY c.table_name, c.ordinal_position
+                """,
+                [list(AGENT_VIEWS)],
+            )
+            rows = cursor.fetchall()
+    except Exception as e:
+        print(f"SQL_VIEWS: Could not build the schema digest: {e}")
+        return ""
+
+    views = {}
+    for view, column, data_type, comment in rows:
+        entry = views.setdefault(view, {"comment": comment or "", "columns": []})
+        entry["columns"].append(f"{column} {_SHORT_TYPES.get(data_type, data_type)}")
+    if set(views) != set(AGENT_VIEWS):
+        print(f"SQL_VIEWS: Missing agent views: {sorted(set(AGENT_VIEWS) - set(views))}")
+        return ""
+
+    lines = []
+    for view in AGENT_VIEWS:
+        lines.append(f"{view} -- {views[view]['comment']}")
+        lines.append(f"  ({', '.join(views[view]['columns'])})")
+    _digest = "\n".join(lines)
+    return _digest
@@ -21,8 +21,9 @@ from django.contrib.auth import get_user_model
 import datetime
 import tempfile
 from django.utils import timezone
-from django.db import transaction,models  # Import the transaction module
+from django.db import transaction,models,close_old_connections  # Import the transaction module
 from .models import CodeFile, CodeSymbol, CodeClass,CodeDependency,EmbeddingBatchJob,Insight,KnowledgeChunk,ModuleDocumentation
+from .models import DocstringBatchJob
 from .models import Notification, AsyncTaskStatus # Ensure Notification is imported
 from allauth.socialaccount.models import SocialAccount
 import xml.etree.ElementTree as ET
@@ -32,13 +33,27 @@ from git import Repo, GitCommandError # <--- Import GitPython
 from .models import TestCoverageReport, FileCoverage, CodeFile, Repository
 OPENAI_EMBEDDING_BATCH_SIZE = 50
 OPENAI_EMBEDDING_BATCH_FILE_MAX_REQUESTS = 49000
+OPENAI_CHAT_BATCH_FILE_MAX_REQUESTS = 49000
 # Define the path to our compiled Rust binary INSIDE the container
 REPO_CACHE_BASE_PATH = "/var/repos"
 from openai import OpenAI # Import the OpenAI library
 RUST_ENGINE_PATH = "/app/engine/helix-engine/target/release/helix-engine"
-OPENAI_CLIENT = OpenAI()
-OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
 from django.core.cache import cache
+from .retrieval import drop_symbol_partial_index, ensure_symbol_partial_index
+from .embeddings import get_embedding_provider, store_embeddings, symbol_embedding_text
+from .rate_limit import get_rate_limiter
+from .llm_client import call_openai, get_openai_client
+from .chunking import count_tokens, docstring_chunks, symbol_chunks
+from .centroids import refresh_centroids
+from .vector_store import build_store, bump_generation
+from .llm_cache import cached_chat_completion, lookup_completion, store_completion
+from .docstring_packing import PACKED_SYSTEM_PROMPT, PackItem, pack_items, packed_prompt, parse_packed_response
+from .model_router import call_log, combine_routes, route as route_call
+from .context_packs import SymbolContext, bump_context_generation, symbol_contexts
+from .models import LLMCallLog
+from .usage import flush_usage
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
 
 @app.task
 def process_repository(repo_id, is_local=False, local_path=None):
@@ -301,6 +316,7 @@ def process_repository(repo_id, is_local=False, local_path=None):
                         # Set code_file for functions, code_class for methods
                         'code_file': code_file_obj if not class_name else None,
                         'code_class': class_map_in_file.get(class_name) if class_name else None,
+                        'repository': repo,
                     }
 
                     # 5. Perform the database operation
@@ -331,16 +347,17 @@ def process_repository(repo_id, is_local=False, local_path=None):
                 Q(unique_id__in=list(removed_uids)) &
                 (Q(code_file__repository=repo) | Q(code_class__code_file__repository=repo))
             ).delete()
+                bump_generation([repo.id])
 
             print(f"PROCESS_REPO_TASK: Finished Pass 1. Processed {len(processed_unique_ids_from_rust)} symbols from Rust output.")
 
             # PASS 1.5: Generate Embeddings
-            if OPENAI_CLIENT: # Only submit if client is available
-                print(f"PROCESS_REPO_TASK: Dispatching asynchronous batch embedding job for repo {repo.id}...")
-                submit_embedding_batch_job_task.delay(repo_id=repo.id)
-
-            else:
-                print("PROCESS_REPO_TASK: Skipping embedding job submission as OpenAI client is not available.")
+            # Dispatched on commit so the task sees this pass's symbols; it picks
+            # synchronous micro-batches or the Batch API depending on the delta size.
+            print(f"PROCESS_REPO_TASK: Dispatching embedding job for repo {repo.id}...")
+            transaction.on_commit(lambda: dispatch_embeddings_task.delay(
+                repo_id=repo.id, job_type=EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING
+            ))
             # --- END NEW ---
 
             # PASS 2: Link Dependencies
@@ -362,6 +379,8 @@ def process_repository(repo_id, is_local=False, local_path=None):
                     if callee_symbol and callee_symbol.id != caller_symbol.id:
                         CodeDependency.objects.get_or_create(caller=caller_symbol, callee=callee_symbol)
             print("PROCESS_REPO_TASK: Finished Pass 2.")
+            # Sources and the call graph changed; retire the repository's cached prompt context.
+            bump_context_generation([repo.id])
 
             stale_symbols_count = len(newly_stale_symbol_details)
 
@@ -653,77 +672,183 @@ def create_documentation_pr_task(self, symbol_id, user_id):
         # self.retry(exc=e)
         raise
     
-def get_source_for_symbol_in_task(symbol_obj: CodeSymbol) -> str | None:
-    actual_code_file = None
-    if symbol_obj.code_file:
-        actual_code_file = symbol_obj.code_file
-    elif symbol_obj.code_class and symbol_obj.code_class.code_file:
-        actual_code_file = symbol_obj.code_class.code_file
-    
-    if not actual_code_file:
-        print(f"ERROR_HELPER: Symbol {symbol_obj.id} ({symbol_obj.name}) has no associated CodeFile.")
-        return None
+# --- Helper to call OpenAI for docstring (non-streaming) ---
+# The model and max_tokens come from model_router, based on the symbol's metrics.
+DOCSTRING_SYSTEM_PROMPT = "You are an expert Python programmer. Your task is to write a concise, professional, Google-style docstring for the given function. Do not include the function signature itself, only the docstring content inside triple quotes. Start with a one-line summary. Then, describe the arguments, and what the function returns. If context is provided about callers/callees, use it to make the docstring more informative."
 
-    # Ensure REPO_CACHE_BASE_PATH is correctly defined and accessible
-    # It might be settings.REPO_CACHE_BASE_PATH or imported from models.py
-    if not REPO_CACHE_BASE_PATH:
-        print("ERROR_HELPER: REPO_CACHE_BASE_PATH is not defined.")
-        return None
 
-    repo_path_for_file = os.path.join(REPO_CACHE_BASE_PATH, str(actual_code_file.repository.id))
-    full_file_path_for_file = os.path.join(repo_path_for_file, actual_code_file.file_path)
+def docstring_messages(prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": DOCSTRING_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
-    if os.path.exists(full_file_path_for_file):
-        try:
-            with open(full_file_path_for_file, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            # Ensure start_line and end_line are valid 1-based indices
-            if symbol_obj.start_line > 0 and \
-               symbol_obj.end_line >= symbol_obj.start_line and \
-               symbol_obj.end_line <= len(lines):
-                symbol_code_lines = lines[symbol_obj.start_line - 1 : symbol_obj.end_line]
-                return "".join(symbol_code_lines)
-            else:
-                print(f"WARNING_HELPER: Invalid start/end lines for symbol {symbol_obj.unique_id} in file {full_file_path_for_file}. Start: {symbol_obj.start_line}, End: {symbol_obj.end_line}, Total lines: {len(lines)}")
-                return f"# Error: Could not extract source due to invalid line numbers ({symbol_obj.start_line}-{symbol_obj.end_line})."
-        except Exception as e:
-            print(f"ERROR_HELPER: Error reading file content for symbol {symbol_obj.unique_id}: {e}")
-            return f"# Error reading file: {e}"
-    else:
-        print(f"WARNING_HELPER: Source file not found in cache for symbol {symbol_obj.unique_id}: {full_file_path_for_file}")
-        return "# Error: Source file not found in cache."
-    return None # Should not be reached if logic is correct
 
-# --- Helper to call OpenAI for docstring (non-streaming) ---
-def call_openai_for_docstring(prompt: str, openai_client: OpenAI | None) -> str | None:
+def request_docstring(prompt: str, openai_client: OpenAI, route=None) -> str | None:
+    """Generates a docstring for `prompt`. API errors are raised to the caller."""
+    route = route or route_call("docstring")
+    # For openai >= 1.0.0; identical prompts are answered from the LLM cache.
+    generated_content = cached_chat_completion(
+        openai_client, "docstring", "v1", model=route.model, messages=docstring_messages(prompt),
+        max_tokens=route.max_tokens, route=route
+    )
+    return clean_docstring(generated_content)
+
+
+def clean_docstring(generated_content: str | None) -> str | None:
+    # Clean the docstring (remove surrounding quotes if AI adds them, strip whitespace)
+    if generated_content:
+        generated_content = generated_content.strip()
+        if generated_content.startswith('"""') and generated_content.endswith('"""'):
+            generated_content = generated_content[3:-3].strip()
+        elif generated_content.startswith("'''") and generated_content.endswith("'''"):
+            generated_content = generated_content[3:-3].strip()
+        return generated_content
+    return None
+
+
+def call_openai_for_docstring(prompt: str, openai_client: OpenAI | None, route=None) -> str | None:
     if not openai_client:
         print("WARNING_HELPER: OpenAI client not provided to call_openai_for_docstring.")
         return None
     try:
-        # Ensure you are using the correct API structure for your OpenAI library version
-        # For openai >= 1.0.0
-        completion = openai_client.chat.completions.create(
-            model="gpt-4.1-mini", # Cheaper/faster for batch, consider gpt-4-turbo-preview for quality
-            messages=[
-                {"role": "system", "content": "You are an expert Python programmer. Your task is to write a concise, professional, Google-style docstring for the given function. Do not include the function signature itself, only the docstring content inside triple quotes. Start with a one-line summary. Then, describe the arguments, and what the function returns. If context is provided about callers/callees, use it to make the docstring more informative."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        generated_content = completion.choices[0].message.content
-        
-        # Clean the docstring (remove surrounding quotes if AI adds them, strip whitespace)
-        if generated_content:
-            generated_content = generated_content.strip()
-            if generated_content.startswith('"""') and generated_content.endswith('"""'):
-                generated_content = generated_content[3:-3].strip()
-            elif generated_content.startswith("'''") and generated_content.endswith("'''"):
-                generated_content = generated_content[3:-3].strip()
-            return generated_content
-        return None
+        return request_docstring(prompt, openai_client, route)
     except Exception as e:
         print(f"ERROR_HELPER: Error calling OpenAI for docstring: {e}")
         return None
-    
+
+
+def _docstring_prompt_text(file_path: str, name: str, source_code: str) -> str:
+    return f"Generate a Python docstring for the following code snippet (file: {file_path}, symbol: {name}):\n\n```python\n{source_code}\n```"
+
+
+def _docstring_prompt(context: SymbolContext) -> str:
+    return _docstring_prompt_text(context.file_path, context.name, context.source_code)
+
+
+def _docstring_routes(symbols, contexts: dict) -> dict:
+    """{symbol_id: Route} for "docstring" calls, with the call-graph counts taken from the symbols' context packs."""
+    return {
+        symbol.id: route_call("docstring", symbol, contexts[symbol.id].fan_in, contexts[symbol.id].fan_out)
+        for symbol in symbols
+    }
+
+
+def generate_docstrings_concurrently(symbols, openai_client: OpenAI, log_prefix: str, on_progress=None) -> tuple[dict, int]:
+    """
+    Generates docstrings for `symbols` on a bounded thread pool. Every call
+    first takes its share of the shared requests/tokens-per-minute budget
+    (see rate_limit.py) and 429s are retried by llm_client, so throughput
+    rises to the provider limit across all workers without exceeding it.
+
+    With HELIX_DOCSTRING_PACKING, small symbols from the same file share one
+    request (see docstring_packing.py); items a packed response leaves out
+    are retried one at a time. Each symbol's model and output budget come
+    from model_router; a pack uses the highest tier among its symbols.
+
+    Sources and routes are resolved up front; the pool threads only touch the
+    database for the LLM cache and call log.
+    `on_progress(done, total)` is called from the calling thread.
+    Returns ({symbol_id: docstring}, number of failed or skipped symbols).
+    """
+    items, failed = [], 0
+    contexts = symbol_contexts(symbols)
+    routes = _docstring_routes(symbols, contexts)
+    # Neighbouring symbols of a file end up next to each other, ready for packing.
+    for symbol in sorted(symbols, key=lambda s: (contexts[s.id].file_path, s.start_line)):
+        context = contexts[symbol.id]
+        if not context.has_source:
+            print(f"{log_prefix}: Skipping symbol {symbol.unique_id or symbol.name}: Could not get source code ({context.source_code}).")
+            failed += 1
+            continue
+        items.append(PackItem(symbol.id, context.file_path, symbol.name, context.source_code, count_tokens(context.source_code)))
+
+    # One budget per model: provider limits are per model, and tiers should not starve each other.
+    def limiter_for(model):
+        return get_rate_limiter(f"chat:{model}", settings.HELIX_LLM_RPM, settings.HELIX_LLM_TPM)
+    system_tokens = count_tokens(DOCSTRING_SYSTEM_PROMPT)
+    packed_system_tokens = count_tokens(PACKED_SYSTEM_PROMPT)
+
+    def generate_single(item):
+        route = routes[item.symbol_id]
+        prompt = _docstring_prompt_text(item.file_path, item.name, item.source)
+        limiter_for(route.model).acquire(system_tokens + count_tokens(prompt) + route.max_tokens)
+        return request_docstring(prompt, openai_client, route)
+
+    def generate_pack(pack):
+        results = {}
+        try:
+            if len(pack) > 1:
+                route = combine_routes("docstring_pack", [routes[item.symbol_id] for item in pack])
+                prompt = packed_prompt(pack)
+                limiter_for(route.model).acquire(packed_system_tokens + count_tokens(prompt) + route.max_tokens)
+                try:
+                    content = cached_chat_completion(
+                        openai_client, "docstring_pack", "v1",
+                        model=route.model,
+                        messages=[{"role": "system", "content": PACKED_SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+                        response_format={"type": "json_object"},
+                        max_tokens=route.max_tokens,
+                        route=route,
+                    )
+                    results = {symbol_id: clean_docstring(text) for symbol_id, text in parse_packed_response(content, pack).items()}
+                except Exception as e:
+                    print(f"{log_prefix}: Packed request for {len(pack)} symbols failed, falling back to single requests: {e}")
+            for item in pack:
+                if not results.get(item.symbol_id):
+                    try:
+                        results[item.symbol_id] = generate_single(item)
+                    except Exception as e:
+                        print(f"{log_prefix}: Error generating doc for symbol {item.symbol_id}: {e}")
+            return results
+        finally:
+            # Pool threads never see request_finished, so release their connection here.
+            close_old_connections()
+
+    packs = pack_items(items) if settings.HELIX_DOCSTRING_PACKING else [[item] for item in items]
+    docstrings, done = {}, 0
+    print(f"{log_prefix}: Generating {len(items)} docstrings in {len(packs)} requests with {settings.HELIX_DOCSTRING_CONCURRENCY} concurrent requests.")
+    with ThreadPoolExecutor(max_workers=settings.HELIX_DOCSTRING_CONCURRENCY) as executor:
+        futures = {executor.submit(generate_pack, pack): pack for pack in packs}
+        for future in as_completed(futures):
+            pack = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                print(f"{log_prefix}: Error generating docs for {len(pack)} symbol(s): {e}")
+                results = {}
+            for item in pack:
+                if results.get(item.symbol_id):
+                    docstrings[item.symbol_id] = results[item.symbol_id]
+                else:
+                    failed += 1
+            done += len(pack)
+            if on_progress:
+                on_progress(done, len(items))
+    return docstrings, failed
+
+
+def save_generated_docstrings(symbols, docstrings: dict) -> list[CodeSymbol]:
+    """Applies generated docstrings to `symbols` and writes them in bulk. Returns the updated symbols."""
+    updated = []
+    for symbol in symbols:
+        content = docstrings.get(symbol.id)
+        if not content:
+            continue
+        symbol.documentation = content
+        if symbol.content_hash:
+            symbol.documentation_hash = symbol.content_hash
+            symbol.documentation_status = CodeSymbol.DocStatus.FRESH
+        else:
+            # Fallback if content_hash is missing (should be rare after process_repo)
+            symbol.documentation_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+            symbol.documentation_status = CodeSymbol.DocStatus.PENDING_REVIEW
+        updated.append(symbol)
+    CodeSymbol.objects.bulk_update(updated, ['documentation', 'documentation_hash', 'documentation_status'], batch_size=500)
+    # Prompt context packs include documentation.
+    bump_context_generation(symbol.repository_id for symbol in updated)
+    return updated
+
 @app.task(bind=True, max_retries=2, default_retry_delay=180) # Fewer retries, longer delay for batch
 def batch_generate_docstrings_task(self, code_file_id: int, user_id: int):
     try:
@@ -757,45 +882,19 @@ def batch_generate_docstrings_task(self, code_file_id: int, user_id: int):
 
     print(f"Found {len(symbols_to_document)} symbols to document in {code_file.file_path} (ID: {code_file_id}).")
     
-    openai_client = OPENAI_CLIENT
+    openai_client = get_openai_client()
     
     if not openai_client:
         return {"status": "error", "message": "OpenAI client not available. Cannot generate documentation."}
 
-    successful_generations = 0
-    failed_generations = 0
-
-    for symbol in symbols_to_document:
-        source_code = get_source_for_symbol_in_task(symbol)
-        if not source_code or source_code.startswith("# Error:"):
-            print(f"Skipping symbol {symbol.unique_id or symbol.name}: Could not get source code ({source_code}).")
-            failed_generations += 1
-            continue
-        
-        prompt = f"Generate a Python docstring for the following code snippet (file: {symbol.code_file.file_path if symbol.code_file else symbol.code_class.code_file.file_path}, symbol: {symbol.name}):\n\n```python\n{source_code}\n```"
-        # Add contextual prompting here later if desired (callers/callees)
-        
-        print(f"Generating doc for: {symbol.unique_id or symbol.name} (ID: {symbol.id})")
-        docstring_content = call_openai_for_docstring(prompt, openai_client)
+    docstrings, failed_generations = generate_docstrings_concurrently(symbols_to_document, openai_client, "BATCH_DOCS_TASK")
+    try:
+        successful_generations = len(save_generated_docstrings(symbols_to_document, docstrings))
+    except Exception as e:
+        print(f"BATCH_DOCS_TASK: Error saving generated docs for {code_file.file_path}: {e}")
+        successful_generations = 0
+        failed_generations += len(docstrings)
 
-        if docstring_content:
-            symbol.documentation = docstring_content
-            symbol.documentation_hash = symbol.content_hash
-            symbol.documentation_status = CodeSymbol.DocStatus.FRESH # Or some other status
- # Mark as fresh
-            try:
-                symbol.save(update_fields = ['documentation', 'documentation_hash', 'documentation_status'])
-                print(f"Generated and saved doc for: {symbol.unique_id or symbol.name}")
-                successful_generations += 1
-            except Exception as e:
-                print(f"Error saving doc for symbol {symbol.unique_id or symbol.name}: {e}")
-                failed_generations += 1
-        else:
-            print(f"Failed to generate doc for: {symbol.unique_id or symbol.name}")
-            failed_generations += 1
-        
-        time.sleep(0.1) # Basic rate limiting: 0.5 seconds between OpenAI calls
-    
     print(f"BATCH_DOCS_TASK: Triggering stats recalculation for repo {repo_id} after {successful_generations} successful generations.")
     calculate_documentation_coverage_task.delay(repo_id)
     
@@ -1012,8 +1111,7 @@ def batch_generate_docstrings_for_files_task(self, repo_id: int, user_id: int, f
         print(f"BATCH_DOC_GEN_TASK: ERROR - Creating/updating AsyncTaskStatus for {task_id}: {e}")
         # Allow task to proceed but status won't be fully tracked if task_status_obj is None
 
-    # Use the globally initialized OPENAI_CLIENT if available
-    current_openai_client = OPENAI_CLIENT 
+    current_openai_client = get_openai_client()
     if not current_openai_client:
         message = "OpenAI client not available (OPENAI_API_KEY not set or init failed)."
         print(f"BATCH_DOC_GEN_TASK: {message}")
@@ -1028,105 +1126,59 @@ def batch_generate_docstrings_for_files_task(self, repo_id: int, user_id: int, f
     overall_failed_symbol_generations = 0
     files_processed_count = 0
     files_with_new_docs_paths = set()
-    total_files_to_process = len(file_ids)
 
-    for i, code_file_id in enumerate(file_ids):
+    # Collect the symbols of every file first, then generate them all concurrently.
+    symbols_to_document = []
+    file_path_by_symbol_id = {}
+    for code_file_id in file_ids:
         try:
             code_file = CodeFile.objects.select_related('repository').get(
                 id=code_file_id, repository_id=repo_id
             )
         except CodeFile.DoesNotExist:
             print(f"BATCH_DOC_GEN_TASK: Skipping file ID {code_file_id}: Not found for repo {repo_id}.")
-            overall_failed_symbol_generations += 1 
-            files_processed_count += 1
-            if task_status_obj and total_files_to_process > 0:
-                task_status_obj.progress = int(((i + 1) / total_files_to_process) * 100)
-                task_status_obj.message = f"Processed {i+1}/{total_files_to_process} files. Current: {code_file.file_path if 'code_file' in locals() else 'ID '+str(code_file_id)} (File not found)"
-                task_status_obj.save(update_fields=['progress', 'message', 'updated_at'])
+            overall_failed_symbol_generations += 1
             continue
-        
         files_processed_count += 1
-        current_progress_message = f"Processing file {files_processed_count}/{total_files_to_process}: {code_file.file_path}"
-        print(f"BATCH_DOC_GEN_TASK: {current_progress_message}")
-        if task_status_obj:
-            task_status_obj.message = current_progress_message
-            # Calculate progress more granularly if possible, or update per file
-            task_status_obj.progress = int(((i + 0.5) / total_files_to_process) * 100) # Mid-file processing
-            task_status_obj.save(update_fields=['progress', 'message', 'updated_at'])
 
-        symbols_to_document = CodeSymbol.objects.filter(
+        file_symbols = list(CodeSymbol.objects.filter(
             Q(code_file=code_file) | Q(code_class__code_file=code_file),
             content_hash__isnull=False
         ).filter(
             Q(documentation__isnull=True) | Q(documentation__exact='') |
             (Q(documentation_hash__isnull=False) & ~Q(documentation_hash=F('content_hash'))) |
             (Q(documentation_hash__isnull=True) & ~Q(documentation__isnull=True) & ~Q(documentation__exact=''))
-        ).select_related('code_class', 'code_file__repository')
+        ).select_related('code_class__code_file', 'code_file__repository'))
 
-        if not symbols_to_document.exists():
+        if not file_symbols:
             print(f"BATCH_DOC_GEN_TASK: No symbols to document in file {code_file.file_path}.")
-            # Update progress for this file completion
-            if task_status_obj and total_files_to_process > 0:
-                task_status_obj.progress = int(((i + 1) / total_files_to_process) * 100)
-                task_status_obj.save(update_fields=['progress', 'updated_at'])
             continue
+        print(f"BATCH_DOC_GEN_TASK: Found {len(file_symbols)} symbols to document in {code_file.file_path}.")
+        symbols_to_document.extend(file_symbols)
+        file_path_by_symbol_id.update({symbol.id: code_file.file_path for symbol in file_symbols})
+
+    last_reported = [0]
+
+    def report_progress(done, total):
+        # Saving on every completion would add a write per symbol; report in 5% steps.
+        progress = int(done / total * 100)
+        if task_status_obj and (progress - last_reported[0] >= 5 or done == total):
+            last_reported[0] = progress
+            task_status_obj.progress = min(progress, 99)
+            task_status_obj.message = f"Generated {done}/{total} docstrings across {files_processed_count} file(s)."
+            task_status_obj.save(update_fields=['progress', 'message', 'updated_at'])
 
-        print(f"BATCH_DOC_GEN_TASK: Found {symbols_to_document.count()} symbols to document in {code_file.file_path}.")
-        
-        file_had_successful_generation_this_run = False
-        for symbol_idx, symbol in enumerate(symbols_to_document):
-            source_code = get_source_for_symbol_in_task(symbol)
-            if not source_code or source_code.startswith("# Error:"):
-                print(f"BATCH_DOC_GEN_TASK: Skipping symbol {symbol.unique_id or symbol.name}: Could not get source code ({source_code}).")
-                overall_failed_symbol_generations += 1
-                continue
-            
-            symbol_file_path_for_prompt = symbol.code_file.file_path if symbol.code_file else \
-                                     (symbol.code_class.code_file.file_path if symbol.code_class and symbol.code_class.code_file else "N/A")
-
-            prompt = f"Generate a Python docstring for the following code snippet (file: {symbol_file_path_for_prompt}, symbol: {symbol.name}):\n\n```python\n{source_code}\n```"
-            
-            print(f"BATCH_DOC_GEN_TASK: Generating doc for: {symbol.unique_id or symbol.name} (ID: {symbol.id})")
-            docstring_content = call_openai_for_docstring(prompt, current_openai_client)
-
-            if docstring_content:
-                symbol.documentation = docstring_content
-                if symbol.content_hash: # Ensure content_hash exists
-                    symbol.documentation_hash = symbol.content_hash 
-                    symbol.documentation_status = CodeSymbol.DocStatus.FRESH
-                    print(f"BATCH_DOC_GEN_TASK: PRE-SAVE for Symbol {symbol.id}: status='{symbol.documentation_status}', doc_hash='{symbol.documentation_hash}', content_hash='{symbol.content_hash}'")
-                else:
-                    # Fallback if content_hash is missing (should be rare after process_repo)
-                    hasher = hashlib.sha256()
-                    hasher.update(docstring_content.encode('utf-8'))
-                    symbol.documentation_hash = hasher.hexdigest()
-                    symbol.documentation_status = CodeSymbol.DocStatus.PENDING_REVIEW # Or some other status
-                    print(f"BATCH_DOC_GEN_TASK: PRE-SAVE (no content_hash) for Symbol {symbol.id}: status='{symbol.documentation_status}', doc_hash='{symbol.documentation_hash}'")
-                
-                update_fields_to_save = ['documentation', 'documentation_hash', 'documentation_status']
-                try:
-                    symbol.save(update_fields=update_fields_to_save)
-                    saved_symbol_check = CodeSymbol.objects.get(pk=symbol.pk)
-                    print(f"BATCH_DOC_GEN_TASK: POST-SAVE for Symbol {symbol.id}: DB status='{saved_symbol_check.documentation_status}', "
-                        f"DB doc_hash='{saved_symbol_check.documentation_hash}', DB content_hash='{saved_symbol_check.content_hash}', "
-                        f"DB doc empty: {not bool(saved_symbol_check.documentation.strip() if saved_symbol_check.documentation else False)}")
-                    overall_successful_symbol_generations += 1
-                    file_had_successful_generation_this_run = True
-                except Exception as e:
-                    print(f"BATCH_DOC_GEN_TASK: Error saving doc for symbol {symbol.unique_id or symbol.name}: {e}")
-                    overall_failed_symbol_generations += 1
-            else:
-                print(f"BATCH_DOC_GEN_TASK: Failed to generate doc for: {symbol.unique_id or symbol.name}")
-                overall_failed_symbol_generations += 1
-            
-            time.sleep(0.25) 
-
-        if file_had_successful_generation_this_run:
-            files_with_new_docs_paths.add(code_file.file_path)
-        # --- End of per-file processing ---
-        if task_status_obj and total_files_to_process > 0:
-            task_status_obj.progress = int(((i + 1) / total_files_to_process) * 100)
-            task_status_obj.save(update_fields=['progress', 'updated_at'])
+    docstrings, failed = generate_docstrings_concurrently(
+        symbols_to_document, current_openai_client, "BATCH_DOC_GEN_TASK", on_progress=report_progress
+    )
+    overall_failed_symbol_generations += failed
+    try:
+        updated_symbols = save_generated_docstrings(symbols_to_document, docstrings)
+        overall_successful_symbol_generations = len(updated_symbols)
+        files_with_new_docs_paths.update(file_path_by_symbol_id[symbol.id] for symbol in updated_symbols)
+    except Exception as e:
+        print(f"BATCH_DOC_GEN_TASK: Error saving generated docs for repo {repo_id}: {e}")
+        overall_failed_symbol_generations += len(docstrings)
 
     final_summary_message = (
         f"Batch documentation generation for repo {repo_id} complete. "
@@ -1600,7 +1652,7 @@ def submit_embedding_batch_job_task(self, repo_id: int):
     task_id = self.request.id # Celery task ID of this submission task
     print(f"EMBED_BATCH_SUBMIT_TASK: Started (ID: {task_id}) for repo_id {repo_id}")
 
-    if not OPENAI_CLIENT:
+    if not get_openai_client():
         message = "OpenAI client not available (OPENAI_API_KEY not set or init failed). Cannot submit embedding batch."
         print(f"EMBED_BATCH_SUBMIT_TASK: {message}")
         # Potentially create an EmbeddingBatchJob record with a FAILED_SUBMISSION status
@@ -1623,6 +1675,13 @@ def submit_embedding_batch_job_task(self, repo_id: int):
         print(f"EMBED_BATCH_SUBMIT_TASK: {message}")
         return {"status": "success", "message": message, "batch_id": None}
 
+    provider = get_embedding_provider()
+    if not provider.supports_batch_api:
+        texts_by_pk = {symbol.id: symbol_embedding_text(symbol) for symbol in symbols_to_embed}
+        result = embed_synchronously(repo, EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING, texts_by_pk, provider, log_prefix="EMBED_BATCH_SUBMIT_TASK")
+        ensure_symbol_search_index_task.delay(repo_id=repo.id)
+        return result
+
     print(f"EMBED_BATCH_SUBMIT_TASK: Preparing batch file for {symbols_to_embed.count()} symbols from repo {repo.full_name}.")
 
     batch_requests_for_jsonl = []
@@ -1636,24 +1695,7 @@ def submit_embedding_batch_job_task(self, repo_id: int):
         custom_id = f"symbol-{symbol.id}" 
         symbol_pks_in_batch.append(symbol.id)
 
-        text_to_embed = symbol.name
-        if symbol.documentation:
-            # OpenAI recommends replacing newlines with spaces for their embedding models.
-            doc_cleaned = symbol.documentation.replace("\n", " ").strip()
-            if doc_cleaned: # Only append if there's actual content after cleaning
-                text_to_embed += f"\n\n{doc_cleaned}" # Use a clear separator
-
-        batch_requests_for_jsonl.append({
-            "custom_id": custom_id,
-            "method": "POST",
-            "url": "/v1/embeddings", # Correct endpoint for embeddings
-            "body": {
-                "model": OPENAI_EMBEDDING_MODEL, # Your configured embedding model
-                "input": text_to_embed
-                # "encoding_format": "float", # Default is float, can also be "base64"
-                # "dimensions": 1536 # Optional: if using a model that supports other dimensions
-            }
-        })
+        batch_requests_for_jsonl.append(provider.batch_request(custom_id, symbol_embedding_text(symbol)))
         
         # Adhere to OpenAI's per-batch request limit
         if len(batch_requests_for_jsonl) >= OPENAI_EMBEDDING_BATCH_FILE_MAX_REQUESTS:
@@ -1667,14 +1709,6 @@ def submit_embedding_batch_job_task(self, repo_id: int):
         print(f"EMBED_BATCH_SUBMIT_TASK: {message}")
         return {"status": "success", "message": message, "batch_id": None}
 
-    # Create an initial EmbeddingBatchJob record to track this attempt
-    # We'll update it with OpenAI IDs once the submission is successful
-    job_record = EmbeddingBatchJob.objects.create(
-        repository=repo,
-        status=EmbeddingBatchJob.JobStatus.PENDING_SUBMISSION,
-        custom_metadata={"celery_task_id": task_id, "symbol_count": len(batch_requests_for_jsonl)}
-    )
-
     batch_input_file_path = None
     job_record = None # Initialize job_record as None
     try:
@@ -1684,22 +1718,27 @@ def submit_embedding_batch_job_task(self, repo_id: int):
                 tmp_file.write(json.dumps(request_data) + "\n")
             batch_input_file_path = tmp_file.name
         
-        with open(batch_input_file_path, "rb") as f_for_upload:
-            uploaded_file = OPENAI_CLIENT.files.create(file=f_for_upload, purpose="batch")
+        # A path (rather than an open file) is re-read if the upload has to be retried.
+        uploaded_file = call_openai("batch_api", get_openai_client().files.create, file=Path(batch_input_file_path),
+                                    purpose="batch", timeout=settings.HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS)
 
+        # The poller parses `symbol-{pk}` custom_ids only for SYMBOL_EMBEDDING jobs.
         job_record = EmbeddingBatchJob(
             repository=repo,
-            job_type=EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING,
+            job_type=EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING,
             status=EmbeddingBatchJob.JobStatus.PENDING_SUBMISSION,
             input_file_id=uploaded_file.id, # We already have this
+            dispatch_mode=EmbeddingBatchJob.DispatchMode.BATCH_API,
+            item_count=len(batch_requests_for_jsonl),
+            custom_metadata={"celery_task_id": task_id, "symbol_count": len(batch_requests_for_jsonl)}
         )
 
         job_record.save() # Now it has an ID.
 
         # 3. Now, create the batch job on OpenAI, passing our database ID in the metadata.
-        openai_batch = OPENAI_CLIENT.batches.create(
+        openai_batch = call_openai("batch_api", get_openai_client().batches.create,
             input_file_id=uploaded_file.id,
-            endpoint="/v1/embeddings",
+            endpoint=provider.batch_endpoint,
             completion_window="24h",
             metadata={"helix_job_id": str(job_record.id), "repo_id": str(repo.id)}
         )
@@ -1731,6 +1770,198 @@ def submit_embedding_batch_job_task(self, repo_id: int):
         if batch_input_file_path and os.path.exists(batch_input_file_path):
             os.remove(batch_input_file_path)
             
+def _pending_embedding_texts(repo, job_type: str) -> dict:
+    """Returns {pk: text} for the repository's symbols or knowledge chunks that have no embedding yet."""
+    if job_type == EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING:
+        symbols = CodeSymbol.objects.filter(
+            (Q(code_file__repository=repo) | Q(code_class__code_file__repository=repo)),
+            embedding__isnull=True
+        ).only('id', 'name', 'documentation')
+        return {symbol.id: symbol_embedding_text(symbol) for symbol in symbols}
+    if job_type == EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING:
+        chunks = KnowledgeChunk.objects.filter(repository=repo, embedding__isnull=True).only('id', 'content')
+        return {chunk.id: chunk.content for chunk in chunks}
+    raise ValueError(f"Unsupported embedding job type: {job_type}")
+
+def embed_synchronously(repo, job_type: str, texts_by_pk: dict, provider, log_prefix: str = "EMBED_TASK") -> dict:
+    """
+    Embeds {pk: text} items through the provider's synchronous endpoint and
+    stores the vectors, recording a SYNC EmbeddingBatchJob with its latency.
+
+    Items are split into micro-batches of HELIX_SYNC_EMBEDDING_BATCH_SIZE that
+    run HELIX_SYNC_EMBEDDING_CONCURRENCY at a time, with every request drawn
+    from the HELIX_SYNC_EMBEDDING_RPM/TPM budget shared by all workers.
+    """
+    started_at = time.monotonic()
+    pks = list(texts_by_pk.keys())
+    job_record = EmbeddingBatchJob.objects.create(
+        repository=repo,
+        job_type=job_type,
+        status=EmbeddingBatchJob.JobStatus.IN_PROGRESS,
+        dispatch_mode=EmbeddingBatchJob.DispatchMode.SYNC,
+        input_file_id='',
+        item_count=len(pks),
+        custom_metadata={"provider": provider.name, "model": provider.model}
+    )
+
+    batch_size = settings.HELIX_SYNC_EMBEDDING_BATCH_SIZE
+    micro_batches = [pks[i:i + batch_size] for i in range(0, len(pks), batch_size)]
+    # Shared through Redis, so the budget holds across every worker process.
+    limiter = get_rate_limiter(
+        f"embeddings:{provider.name}:{provider.model}",
+        settings.HELIX_SYNC_EMBEDDING_RPM, settings.HELIX_SYNC_EMBEDDING_TPM,
+    )
+
+    def embed_micro_batch(batch_pks):
+        texts = [texts_by_pk[pk] for pk in batch_pks]
+        limiter.acquire(sum(count_tokens(text) for text in texts))
+        return batch_pks, provider.embed(texts)
+
+    print(f"{log_prefix}: Embedding {len(pks)} items synchronously in {len(micro_batches)} micro-batches "
+          f"with the '{provider.name}' provider.")
+    try:
+        updates = {}
+        workers = max(1, min(settings.HELIX_SYNC_EMBEDDING_CONCURRENCY, len(micro_batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for batch_pks, vectors in executor.map(embed_micro_batch, micro_batches):
+                updates.update(zip(batch_pks, vectors))
+
+        with transaction.atomic():
+            updated_count = store_embeddings(job_type, updates)
+    except Exception as e:
+        error_message = f"Synchronous embedding failed: {str(e)}"
+        print(f"{log_prefix}: ERROR - {error_message}")
+        job_record.status = EmbeddingBatchJob.JobStatus.FAILED
+        job_record.error_details = error_message
+        job_record.save(update_fields=['status', 'error_details', 'updated_at'])
+        return {"status": "error", "message": error_message, "helix_job_id": job_record.id}
+
+    now = timezone.now()
+    job_record.status = EmbeddingBatchJob.JobStatus.RESULTS_PROCESSED
+    job_record.completed_at = now
+    job_record.results_processed_at = now
+    job_record.latency_ms = int((time.monotonic() - started_at) * 1000)
+    job_record.save(update_fields=['status', 'completed_at', 'results_processed_at', 'latency_ms', 'updated_at'])
+    print(f"{log_prefix}: Stored {updated_count} embeddings in {job_record.latency_ms}ms (Job ID {job_record.id}).")
+    if job_type == EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING:
+        file_ids = set(KnowledgeChunk.objects.filter(id__in=pks).values_list('related_file_id', flat=True))
+        file_ids.discard(None)
+        if file_ids:
+            refresh_centroids_task.delay(repo_id=repo.id, file_ids=sorted(file_ids))
+    return {"status": "success", "message": f"Embedded {updated_count} items synchronously.",
+            "helix_job_id": job_record.id, "batch_id": None}
+
+@app.task
+def dispatch_embeddings_task(repo_id: int, job_type: str):
+    """
+    Embeds the repository's pending symbols or knowledge chunks, choosing the
+    cheapest path that keeps them fresh:
+      - up to HELIX_SYNC_EMBEDDING_MAX_ITEMS items (or a provider without a
+        Batch API): synchronous micro-batches, searchable within seconds;
+      - larger backfills: the OpenAI Batch API, at lower cost but up to 24h latency.
+    """
+    try:
+        repo = Repository.objects.get(id=repo_id)
+    except Repository.DoesNotExist:
+        print(f"EMBED_DISPATCH_TASK: ERROR - Repository {repo_id} not found.")
+        return {"status": "error", "message": f"Repository {repo_id} not found."}
+
+    texts_by_pk = _pending_embedding_texts(repo, job_type)
+    if not texts_by_pk:
+        print(f"EMBED_DISPATCH_TASK: No pending {job_type} items for repo {repo_id}.")
+        return {"status": "success", "message": "Nothing to embed.", "batch_id": None}
+
+    provider = get_embedding_provider()
+    use_sync = not provider.supports_batch_api or len(texts_by_pk) <= settings.HELIX_SYNC_EMBEDDING_MAX_ITEMS
+    print(f"EMBED_DISPATCH_TASK: {len(texts_by_pk)} pending {job_type} items for repo {repo_id}; "
+          f"using {'synchronous micro-batches' if use_sync else 'the Batch API'}.")
+
+    if not use_sync:
+        if job_type == EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING:
+            submit_embedding_batch_job_task.delay(repo_id=repo_id)
+        else:
+            submit_knowledge_chunk_embedding_batch_task.delay(repo_id=repo_id)
+        return {"status": "success", "message": "Dispatched to the Batch API.", "batch_id": None}
+
+    result = embed_synchronously(repo, job_type, texts_by_pk, provider, log_prefix="EMBED_DISPATCH_TASK")
+    if job_type == EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING and result["status"] == "success":
+        ensure_symbol_search_index_task.delay(repo_id=repo_id)
+    return result
+
+@app.task
+def refresh_symbol_knowledge_task(symbol_id: int):
+    """
+    Re-indexes a single symbol after its documentation changed (e.g. a docstring
+    saved from the UI): clears its embedding, rebuilds its SYMBOL_DOCSTRING
+    knowledge chunk and embeds both through the dispatcher, which takes the
+    synchronous path for a delta this small.
+    """
+    try:
+        symbol = CodeSymbol.objects.select_related('code_file__repository', 'code_class__code_file__repository').get(id=symbol_id)
+    except CodeSymbol.DoesNotExist:
+        print(f"SYMBOL_REFRESH_TASK: ERROR - Symbol {symbol_id} not found.")
+        return
+
+    code_file = symbol.code_file or (symbol.code_class and symbol.code_class.code_file)
+    if not code_file:
+        print(f"SYMBOL_REFRESH_TASK: Symbol {symbol_id} has no file; skipping.")
+        return
+    repo = code_file.repository
+
+    with transaction.atomic():
+        CodeSymbol.objects.filter(id=symbol.id).update(embedding=None, embedding_reduced=None)
+        KnowledgeChunk.objects.filter(
+            related_symbol=symbol, chunk_type=KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING
+        ).delete()
+        KnowledgeChunk.objects.bulk_create(docstring_chunks(repo, symbol))
+        bump_generation([repo.id])
+
+    dispatch_embeddings_task.delay(repo_id=repo.id, job_type=EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING)
+    dispatch_embeddings_task.delay(repo_id=repo.id, job_type=EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING)
+    print(f"SYMBOL_REFRESH_TASK: Refreshed knowledge for symbol {symbol_id} in repo {repo.id}.")
+
+@app.task
+def refresh_centroids_task(repo_id: int, file_ids: list[int] | None = None):
+    """
+    Recomputes the file/class/module centroids used by coarse-to-fine retrieval
+    for the given files, or for the whole repository if no files are given.
+    """
+    try:
+        written = refresh_centroids(repo_id, file_ids)
+        scope = f"{len(file_ids)} files" if file_ids is not None else "all files"
+        print(f"CENTROID_TASK: Refreshed {written} centroids for repo {repo_id} ({scope}).")
+    except Exception as e:
+        print(f"CENTROID_TASK: ERROR - Could not refresh centroids for repo {repo_id}: {e}")
+
+@app.task
+def build_vector_store_task(repo_id: int, kind: str):
+    """(Re)builds a repository's memory-mapped embedding matrix (see vector_store.py)."""
+    try:
+        build_store(repo_id, kind)
+    except Exception as e:
+        print(f"VECTOR_STORE_TASK: ERROR - Could not build {kind} matrix for repo {repo_id}: {e}")
+
+@app.task
+def ensure_symbol_search_index_task(repo_id: int):
+    """
+    Creates the repository's partial HNSW index over symbol embeddings if the
+    repository is large enough to benefit from one (see retrieval.py).
+    """
+    try:
+        created = ensure_symbol_partial_index(repo_id)
+        print(f"SYMBOL_INDEX_TASK: Partial symbol index for repo {repo_id}: {'present' if created else 'not needed'}.")
+    except Exception as e:
+        print(f"SYMBOL_INDEX_TASK: ERROR - Could not create partial symbol index for repo {repo_id}: {e}")
+
+@app.task
+def drop_symbol_search_index_task(repo_id: int):
+    """Drops a deleted repository's partial HNSW index over symbol embeddings, if it had one."""
+    try:
+        drop_symbol_partial_index(repo_id)
+        print(f"SYMBOL_INDEX_TASK: Dropped partial symbol index for repo {repo_id} (if present).")
+    except Exception as e:
+        print(f"SYMBOL_INDEX_TASK: ERROR - Could not drop partial symbol index for repo {repo_id}: {e}")
+
 @app.task
 def generate_insights_on_change_task(repo_id: int, commit_hash: str = None, diff_report: dict = None):
     """
@@ -1809,7 +2040,7 @@ def submit_knowledge_chunk_embedding_batch_task(self, repo_id: int):
     print(f"KNOWLEDGE_BATCH_SUBMIT_TASK: Started (ID: {task_id}) for repo_id {repo_id}")
 
     # 1. Pre-flight check for OpenAI Client
-    if not OPENAI_CLIENT:
+    if not get_openai_client():
         message = "OpenAI client not available (OPENAI_API_KEY not set or init failed). Cannot submit embedding batch."
         print(f"KNOWLEDGE_BATCH_SUBMIT_TASK: FATAL - {message}")
         # We cannot proceed, so we exit.
@@ -1834,6 +2065,11 @@ def submit_knowledge_chunk_embedding_batch_task(self, repo_id: int):
         print(f"KNOWLEDGE_BATCH_SUBMIT_TASK: {message}")
         return {"status": "success", "message": message, "batch_id": None}
 
+    provider = get_embedding_provider()
+    if not provider.supports_batch_api:
+        texts_by_pk = {chunk.id: chunk.content for chunk in chunks_to_embed}
+        return embed_synchronously(repo, EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING, texts_by_pk, provider, log_prefix="KNOWLEDGE_BATCH_SUBMIT_TASK")
+
     print(f"KNOWLEDGE_BATCH_SUBMIT_TASK: Preparing batch file for {chunks_to_embed.count()} knowledge chunks from repo '{repo.full_name}'.")
 
     # 4. Prepare the requests for the JSONL file
@@ -1849,15 +2085,7 @@ def submit_knowledge_chunk_embedding_batch_task(self, repo_id: int):
         # The content from the chunk is already formatted with context.
         text_to_embed = chunk.content
 
-        batch_requests_for_jsonl.append({
-            "custom_id": custom_id,
-            "method": "POST",
-            "url": "/v1/embeddings",
-            "body": {
-                "model": OPENAI_EMBEDDING_MODEL,
-                "input": text_to_embed
-            }
-        })
+        batch_requests_for_jsonl.append(provider.batch_request(custom_id, text_to_embed))
         
         # Adhere to OpenAI's documented limit per batch file.
         if len(batch_requests_for_jsonl) >= OPENAI_EMBEDDING_BATCH_FILE_MAX_REQUESTS:
@@ -1875,6 +2103,8 @@ def submit_knowledge_chunk_embedding_batch_task(self, repo_id: int):
         repository=repo,
         job_type=EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING,
         status=EmbeddingBatchJob.JobStatus.PENDING_SUBMISSION,
+        dispatch_mode=EmbeddingBatchJob.DispatchMode.BATCH_API,
+        item_count=len(batch_requests_for_jsonl),
         custom_metadata={"celery_task_id": task_id, "chunk_count": len(batch_requests_for_jsonl)}
     )
 
@@ -1889,19 +2119,20 @@ def submit_knowledge_chunk_embedding_batch_task(self, repo_id: int):
         print(f"KNOWLEDGE_BATCH_SUBMIT_TASK: Batch input file created at {batch_input_file_path} for Job ID {job_record.id}")
 
         # 7. Upload the file to OpenAI
-        with open(batch_input_file_path, "rb") as f_for_upload:
-            uploaded_file = OPENAI_CLIENT.files.create(
-                file=f_for_upload,
-                purpose="batch"
-            )
+        uploaded_file = call_openai(
+            "batch_api", get_openai_client().files.create,
+            file=Path(batch_input_file_path),
+            purpose="batch",
+            timeout=settings.HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS
+        )
         
         job_record.input_file_id = uploaded_file.id
         print(f"KNOWLEDGE_BATCH_SUBMIT_TASK: Batch input file uploaded. OpenAI File ID: {uploaded_file.id}")
 
         # 8. Create the batch job using the uploaded file
-        openai_batch = OPENAI_CLIENT.batches.create(
+        openai_batch = call_openai("batch_api", get_openai_client().batches.create,
             input_file_id=uploaded_file.id,
-            endpoint="/v1/embeddings",
+            endpoint=provider.batch_endpoint,
             completion_window="24h",
             metadata={
                 "helix_cme_job_id": str(job_record.id),
@@ -1962,41 +2193,15 @@ def index_repository_knowledge_task(repo_id: int):
 
     # Clear old chunks to ensure data is fresh
     deleted_count, _ = KnowledgeChunk.objects.filter(repository=repo).delete()
+    bump_generation([repo.id], kinds=("chunks",))
     print(f"KNOWLEDGE_INDEX_TASK: Cleared {deleted_count} old knowledge chunks for repo {repo.id}.")
 
     symbols_to_index = CodeSymbol.objects.filter(
         Q(code_file__repository=repo) | Q(code_class__code_file__repository=repo)
     ).select_related('code_file', 'code_class__code_file').iterator(chunk_size=500)
 
-    chunks_to_create = []
-
-    for symbol in symbols_to_index:
-        # Chunk for Docstring
-        if symbol.documentation and len(symbol.documentation.strip()) > 20:
-            doc_content = f"Documentation for function '{symbol.name}':\n{symbol.documentation}"
-            chunks_to_create.append(KnowledgeChunk(
-                repository=repo,
-                chunk_type=KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING,
-                content=doc_content,
-                embedding=None, # Explicitly null
-                related_symbol=symbol,
-                related_class=symbol.code_class,
-                related_file=symbol.code_file or (symbol.code_class and symbol.code_class.code_file)
-            ))
-
-        # Chunk for Source Code
-        source_code = symbol.source_code
-        if source_code and not source_code.strip().startswith("# Error:"):
-            source_content = f"Source code for function '{symbol.name}':\n```python\n{source_code}\n```"
-            chunks_to_create.append(KnowledgeChunk(
-                repository=repo,
-                chunk_type=KnowledgeChunk.ChunkType.SYMBOL_SOURCE,
-                content=source_content,
-                embedding=None, # Explicitly null
-                related_symbol=symbol,
-                related_class=symbol.code_class,
-                related_file=symbol.code_file or (symbol.code_class and symbol.code_class.code_file)
-            ))
+    # Long sources are split at statement boundaries and small neighbours packed (see chunking.py).
+    chunks_to_create = symbol_chunks(repo, symbols_to_index)
 
     if not chunks_to_create:
         print(f"KNOWLEDGE_INDEX_TASK: No new content found to index for repo {repo.id}. Task complete.")
@@ -2006,14 +2211,21 @@ def index_repository_knowledge_task(repo_id: int):
         KnowledgeChunk.objects.bulk_create(chunks_to_create, batch_size=500)
         print(f"KNOWLEDGE_INDEX_TASK: Created {len(chunks_to_create)} knowledge chunks (without embeddings).")
 
-        # --- NEW: Dispatch the batch submission task ---
-        print(f"KNOWLEDGE_INDEX_TASK: Dispatching batch job submission task for repo {repo.id}.")
-        submit_knowledge_chunk_embedding_batch_task.delay(repo_id=repo.id)
+        # --- NEW: Dispatch the embedding task ---
+        print(f"KNOWLEDGE_INDEX_TASK: Dispatching embedding task for repo {repo.id}.")
+        dispatch_embeddings_task.delay(repo_id=repo.id, job_type=EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING)
         # --- END NEW ---
 
     except Exception as e:
         print(f"KNOWLEDGE_INDEX_TASK: FATAL - DB error during bulk_create: {e}")
 
+@app.task(ignore_result=True)
+def flush_ai_usage_task():
+    """Copies the Redis AI request counters to Organization.ai_requests_this_month (see usage.py)."""
+    written = flush_usage()
+    if written:
+        print(f"USAGE_FLUSH_TASK: Updated AI request counts of {written} organization(s).")
+
 @app.task(bind=True)
 def poll_and_process_completed_batches_task(self):
     """
@@ -2024,13 +2236,17 @@ def poll_and_process_completed_batches_task(self):
     task_id = self.request.id
     print(f"BATCH_POLL_TASK: Started (ID: {task_id})")
 
-    if not OPENAI_CLIENT:
+    if not get_openai_client():
         print("BATCH_POLL_TASK: Aborting, OpenAI client not available.")
         return
 
+    # Bulk docstring jobs share this poller (see submit_docstring_batch_task).
+    process_docstring_batch_jobs()
+
     # 1. Find our jobs that are currently in-flight with OpenAI.
     in_progress_jobs = EmbeddingBatchJob.objects.filter(
-        status__in=['validating', 'in_progress', 'finalizing']
+        status__in=['validating', 'in_progress', 'finalizing'],
+        dispatch_mode=EmbeddingBatchJob.DispatchMode.BATCH_API  # SYNC jobs finish in their own task
     ).select_related('repository')
 
     if not in_progress_jobs.exists():
@@ -2044,7 +2260,7 @@ def poll_and_process_completed_batches_task(self):
             print(f"BATCH_POLL_TASK: Checking status for Job ID {job.id} (OpenAI Batch ID: {job.batch_id})")
             
             # 2. Retrieve the latest status of the batch job from OpenAI.
-            openai_batch = OPENAI_CLIENT.batches.retrieve(job.batch_id)
+            openai_batch = call_openai("batch_api", get_openai_client().batches.retrieve, job.batch_id)
             
             # Update our local record with the latest status and metadata.
             job.status = openai_batch.status
@@ -2060,7 +2276,7 @@ def poll_and_process_completed_batches_task(self):
                     raise Exception("Batch job completed but no output_file_id was provided by OpenAI.")
 
                 # 4. Download the output file content from OpenAI.
-                output_file_content_response = OPENAI_CLIENT.files.content(output_file_id)
+                output_file_content_response = call_openai("batch_api", get_openai_client().files.content, output_file_id, timeout=settings.HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS)
                 output_data = output_file_content_response.read().decode('utf-8')
                 
                 output_lines = output_data.strip().split('\n')
@@ -2110,29 +2326,25 @@ def poll_and_process_completed_batches_task(self):
 
                 # --- REFACTORED LOGIC: Update the correct database model based on job_type ---
                 with transaction.atomic():
-                    if job.job_type == EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING:
-                        print(f"BATCH_POLL_TASK: [Job {job.id}] Preparing to update {len(updates_to_perform)} KnowledgeChunk records.")
-                        items_to_update = list(KnowledgeChunk.objects.filter(id__in=updates_to_perform.keys()))
-                        for item in items_to_update:
-                            item.embedding = updates_to_perform.get(item.id)
-                        KnowledgeChunk.objects.bulk_update(items_to_update, ['embedding'], batch_size=500)
-                        print(f"BATCH_POLL_TASK: [Job {job.id}] Successfully updated {len(items_to_update)} KnowledgeChunk records.")
-
-                    elif job.job_type == EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING:
-                        # PREREQUISITE: Your CodeSymbol model must have an 'embedding' VectorField.
-                        print(f"BATCH_POLL_TASK: [Job {job.id}] Preparing to update {len(updates_to_perform)} CodeSymbol records.")
-                        items_to_update = list(CodeSymbol.objects.filter(id__in=updates_to_perform.keys()))
-                        for item in items_to_update:
-                            item.embedding = updates_to_perform.get(item.id)
-                        CodeSymbol.objects.bulk_update(items_to_update, ['embedding'], batch_size=500)
-                        print(f"BATCH_POLL_TASK: [Job {job.id}] Successfully updated {len(items_to_update)} CodeSymbol records.")
+                    print(f"BATCH_POLL_TASK: [Job {job.id}] Preparing to update {len(updates_to_perform)} {job.job_type} records.")
+                    updated_count = store_embeddings(job.job_type, updates_to_perform)
+                    print(f"BATCH_POLL_TASK: [Job {job.id}] Successfully updated {updated_count} records.")
                 # --- END REFACTORED LOGIC ---
 
+                if job.job_type == EmbeddingBatchJob.JobType.SYMBOL_EMBEDDING:
+                    # Large repositories get their own partial ANN index once embedded.
+                    ensure_symbol_search_index_task.delay(repo_id=job.repository_id)
+                else:
+                    # Batch jobs are backfills, so rebuild every centroid of the repository.
+                    refresh_centroids_task.delay(repo_id=job.repository_id)
+
                 # 7. Finalize our internal job record.
                 job.output_file_id = output_file_id
                 job.completed_at = timezone.now()
+                job.results_processed_at = job.completed_at
+                job.latency_ms = int((job.completed_at - job.created_at).total_seconds() * 1000)
                 job.status = EmbeddingBatchJob.JobStatus.RESULTS_PROCESSED
-                job.save(update_fields=['output_file_id', 'completed_at', 'status'])
+                job.save(update_fields=['output_file_id', 'completed_at', 'results_processed_at', 'latency_ms', 'status'])
 
             elif openai_batch.status in ['failed', 'expired', 'cancelled']:
                 # Handle terminal failure states.
@@ -2290,6 +2502,7 @@ def sync_knowledge_index_task(repo_id: int):
     # For idempotency, we can clear all chunks and rebuild.
     # A more advanced version could use hashes to only update changed items.
     KnowledgeChunk.objects.filter(repository=repo).delete()
+    bump_generation([repo.id], kinds=("chunks",))
     print(f"KNOWLEDGE_SYNC_TASK: Cleared old knowledge chunks for repo {repo.id}.")
 
     chunks_to_create = []
@@ -2319,29 +2532,11 @@ def sync_knowledge_index_task(repo_id: int):
             related_file=code_class.code_file
         ))
 
-    # 3. Index CodeSymbol docstrings and source
+    # 3. Index CodeSymbol docstrings and source (split/packed by token count)
     symbols = CodeSymbol.objects.filter(
         Q(code_file__repository=repo) | Q(code_class__code_file__repository=repo)
     ).select_related('code_file', 'code_class__code_file')
-
-    for symbol in symbols:
-        # Docstring
-        if symbol.documentation and len(symbol.documentation.strip()) > 20:
-            chunks_to_create.append(KnowledgeChunk(
-                repository=repo, chunk_type=KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING,
-                content=f"Documentation for function '{symbol.name}':\n{symbol.documentation}",
-                related_symbol=symbol, related_class=symbol.code_class,
-                related_file=symbol.code_file or (symbol.code_class and symbol.code_class.code_file)
-            ))
-        # Source Code
-        source_code = symbol.source_code
-        if source_code and not source_code.strip().startswith("# Error:"):
-             chunks_to_create.append(KnowledgeChunk(
-                repository=repo, chunk_type=KnowledgeChunk.ChunkType.SYMBOL_SOURCE,
-                content=f"Source code for function '{symbol.name}':\n```python\n{source_code}\n```",
-                related_symbol=symbol, related_class=symbol.code_class,
-                related_file=symbol.code_file or (symbol.code_class and symbol.code_class.code_file)
-            ))
+    chunks_to_create.extend(symbol_chunks(repo, symbols))
 
     if not chunks_to_create:
         print(f"KNOWLEDGE_SYNC_TASK: No content found to index for repo {repo.id}.")
@@ -2351,8 +2546,8 @@ def sync_knowledge_index_task(repo_id: int):
     KnowledgeChunk.objects.bulk_create(chunks_to_create, batch_size=500)
     print(f"KNOWLEDGE_SYNC_TASK: Created {len(chunks_to_create)} knowledge chunk records.")
 
-    # Dispatch the existing batch embedding task to finish the job
-    submit_knowledge_chunk_embedding_batch_task.delay(repo_id=repo.id)
+    # Dispatch the embedding task to finish the job
+    dispatch_embeddings_task.delay(repo_id=repo.id, job_type=EmbeddingBatchJob.JobType.KNOWLEDGE_CHUNK_EMBEDDING)
     print(f"KNOWLEDGE_SYNC_TASK: Dispatched embedding task for repo {repo.id}.")
 
 @app.task
@@ -2363,7 +2558,7 @@ def generate_and_save_module_readme_task(previous_task_result, repo_id: int, mod
     """
     print(f"README_GENERATION_TASK: Starting for repo {repo_id}, path '{module_path}'.")
 
-    client = OPENAI_CLIENT
+    client = get_openai_client()
     if not client:
         raise Exception("OpenAI client not available in README generation task.")
 
@@ -2426,6 +2621,19 @@ def generate_module_documentation_workflow_task(self, user_id: int, repo_id: int
         status_tracker.message = "No files found in module; nothing to do."
         status_tracker.save()
         return
+
+    # Large backfills go through the Batch API; the poller finishes the workflow.
+    pending_count = symbols_needing_documentation(file_ids).count()
+    if pending_count >= settings.HELIX_DOCSTRING_BATCH_API_MIN_ITEMS:
+        submit_docstring_batch_task.delay(
+            repo_id=repo_id, user_id=user_id, file_ids=file_ids,
+            module_path=module_path, workflow_task_id=task_id
+        )
+        status_tracker.status = 'IN_PROGRESS'
+        status_tracker.message = f"Step 1: Submitted {pending_count} symbols to the OpenAI Batch API (results within 24h)..."
+        status_tracker.save()
+        return
+
     workflow_chain = chain(
         batch_generate_docstrings_for_files_task.s(
             repo_id=repo_id,
@@ -2444,6 +2652,286 @@ def generate_module_documentation_workflow_task(self, user_id: int, repo_id: int
     status_tracker.status = 'IN_PROGRESS'
     status_tracker.message = "Step 1: Generating documentation for individual files..."
     status_tracker.save()
+
+
+def symbols_needing_documentation(file_ids):
+    """Symbols in the given files that have no docstring or a stale one."""
+    return CodeSymbol.objects.filter(
+        Q(code_file_id__in=file_ids) | Q(code_class__code_file_id__in=file_ids),
+        content_hash__isnull=False
+    ).filter(
+        Q(documentation__isnull=True) | Q(documentation__exact='') |
+        (Q(documentation_hash__isnull=False) & ~Q(documentation_hash=F('content_hash'))) |
+        (Q(documentation_hash__isnull=True) & ~Q(documentation__isnull=True) & ~Q(documentation__exact=''))
+    ).select_related('code_class__code_file__repository', 'code_file__repository')
+
+
+@app.task(bind=True)
+def submit_docstring_batch_task(self, repo_id: int, user_id: int, file_ids: list[int],
+                                module_path: str | None = None, workflow_task_id: str | None = None):
+    """
+    Bulk docstring generation through the OpenAI Batch API: writes one chat
+    completion request per symbol into .jsonl files (split at the per-file
+    request limit), submits them and records a DocstringBatchJob for each.
+    Prompts already answered in the LLM cache are applied immediately.
+    """
+    log_prefix = "DOCSTRING_BATCH_SUBMIT_TASK"
+    print(f"{log_prefix}: Started (ID: {self.request.id}) for repo {repo_id}, {len(file_ids)} file(s).")
+    if not get_openai_client():
+        message = "OpenAI client not available. Cannot submit docstring batch."
+        print(f"{log_prefix}: FATAL - {message}")
+        _finish_docstring_workflow(repo_id, module_path, workflow_task_id, failure_message=message)
+        return {"status": "error", "message": message}
+
+    symbols = list(symbols_needing_documentation(file_ids))
+    contexts = symbol_contexts(symbols)
+    routes = _docstring_routes(symbols, contexts)
+    cached_docstrings, requests_by_symbol, failed = {}, {}, 0
+    for symbol in symbols:
+        if not contexts[symbol.id].has_source:
+            failed += 1
+            continue
+        route = routes[symbol.id]
+        messages = docstring_messages(_docstring_prompt(contexts[symbol.id]))
+        cached = lookup_completion("docstring", "v1", model=route.model, messages=messages, max_tokens=route.max_tokens)
+        if cached:
+            cached_docstrings[symbol.id] = clean_docstring(cached)
+            continue
+        requests_by_symbol[symbol.id] = {
+            "custom_id": f"symbol-{symbol.id}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": route.model, "messages": messages, "max_tokens": route.max_tokens},
+        }
+
+    if cached_docstrings:
+        saved = save_generated_docstrings(symbols, cached_docstrings)
+        print(f"{log_prefix}: Applied {len(saved)} docstrings from the LLM cache.")
+    if failed:
+        print(f"{log_prefix}: Skipped {failed} symbols without readable source.")
+
+    if not requests_by_symbol:
+        _finish_docstring_workflow(repo_id, module_path, workflow_task_id)
+        return {"status": "success", "message": "Nothing to submit.", "job_ids": []}
+
+    content_hash_by_id = {symbol.id: symbol.content_hash for symbol in symbols}
+    symbol_ids = list(requests_by_symbol)
+    parts = [
+        symbol_ids[start:start + OPENAI_CHAT_BATCH_FILE_MAX_REQUESTS]
+        for start in range(0, len(symbol_ids), OPENAI_CHAT_BATCH_FILE_MAX_REQUESTS)
+    ]
+    job_ids = []
+    for part in parts:
+        job = DocstringBatchJob.objects.create(
+            repository_id=repo_id,
+            user_id=user_id,
+            module_path=module_path,
+            workflow_task_id=workflow_task_id,
+            content_hashes={str(symbol_id): content_hash_by_id[symbol_id] for symbol_id in part},
+            item_count=len(part),
+            # The workflow is not finished until all of them exist and are done.
+            expected_jobs=len(parts),
+        )
+        job_ids.append(job.id)
+        batch_input_file_path = None
+        try:
+            with tempfile.NamedTemporaryFile(mode='w+', suffix=".jsonl", delete=False, encoding='utf-8') as tmp_file:
+                for symbol_id in part:
+                    tmp_file.write(json.dumps(requests_by_symbol[symbol_id]) + "\n")
+                batch_input_file_path = tmp_file.name
+            uploaded_file = call_openai("batch_api", get_openai_client().files.create, file=Path(batch_input_file_path),
+                                        purpose="batch", timeout=settings.HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS)
+            openai_batch = call_openai("batch_api", get_openai_client().batches.create,
+                input_file_id=uploaded_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+                metadata={
+                    "helix_docstring_job_id": str(job.id),
+                    "repository_id": str(repo_id),
+                    "description": f"Helix: docstrings for {module_path or 'selected files'}"
+                }
+            )
+            job.input_file_id = uploaded_file.id
+            job.batch_id = openai_batch.id
+            job.status = openai_batch.status
+            job.submitted_to_openai_at = timezone.now()
+            job.openai_metadata = openai_batch.to_dict()
+            job.save()
+            print(f"{log_prefix}: Submitted Job {job.id} ({len(part)} symbols) as OpenAI Batch {openai_batch.id}.")
+        except Exception as e:
+            error_message = f"Error during OpenAI batch submission for Job ID {job.id}: {str(e)}"
+            print(f"{log_prefix}: FATAL - {error_message}")
+            job.status = EmbeddingBatchJob.JobStatus.FAILED_VALIDATION
+            job.error_details = error_message
+            job.completed_at = timezone.now()
+            job.save()
+        finally:
+            if batch_input_file_path and os.path.exists(batch_input_file_path):
+                os.remove(batch_input_file_path)
+
+    _maybe_finish_docstring_workflow(repo_id, module_path, workflow_task_id)
+    return {"status": "success", "message": f"Submitted {len(symbol_ids)} symbols in {len(job_ids)} batch job(s).", "job_ids": job_ids}
+
+
+DOCSTRING_BATCH_TERMINAL_STATUSES = [
+    EmbeddingBatchJob.JobStatus.FAILED_VALIDATION, EmbeddingBatchJob.JobStatus.FAILED,
+    EmbeddingBatchJob.JobStatus.EXPIRED, EmbeddingBatchJob.JobStatus.CANCELLED,
+    EmbeddingBatchJob.JobStatus.RESULTS_PROCESSED, EmbeddingBatchJob.JobStatus.RESULTS_FAILED_TO_PROCESS,
+]
+
+
+def _maybe_finish_docstring_workflow(repo_id: int, module_path: str | None, workflow_task_id: str | None):
+    """
+    Finishes the workflow once every batch job submitted for it exists (the
+    submit task may still be creating later ones) and has reached a terminal state.
+    """
+    if not workflow_task_id:
+        # Jobs outside a workflow only need the coverage stats refreshed.
+        calculate_documentation_coverage_task.delay(repo_id)
+        return
+    jobs = DocstringBatchJob.objects.filter(repository_id=repo_id, workflow_task_id=workflow_task_id)
+    totals = jobs.aggregate(
+        count=models.Count('id'), expected=models.Max('expected_jobs'),
+        succeeded=models.Sum('succeeded_count'), failed=models.Sum('failed_count'),
+    )
+    if totals['count'] < (totals['expected'] or 0):
+        return
+    if jobs.exclude(status__in=DOCSTRING_BATCH_TERMINAL_STATUSES).exists():
+        return
+    _finish_docstring_workflow(
+        repo_id, module_path, workflow_task_id,
+        summary=f"{totals['succeeded'] or 0} docstrings generated, {totals['failed'] or 0} failed."
+    )
+
+
+def _finish_docstring_workflow(repo_id: int, module_path: str | None, workflow_task_id: str | None,
+                               summary: str = "", failure_message: str | None = None):
+    calculate_documentation_coverage_task.delay(repo_id)
+    if workflow_task_id:
+        status_tracker = AsyncTaskStatus.objects.filter(task_id=workflow_task_id).first()
+        if status_tracker:
+            if failure_message:
+                status_tracker.status = AsyncTaskStatus.TaskStatus.FAILURE
+                status_tracker.message = failure_message
+            else:
+                status_tracker.message = f"Step 2: Generating module README... ({summary})" if summary else "Step 2: Generating module README..."
+            status_tracker.save()
+    if module_path is not None and not failure_message:
+        generate_and_save_module_readme_task.delay(None, repo_id=repo_id, module_path=module_path)
+
+
+def process_docstring_batch_jobs():
+    """
+    Polls in-flight DocstringBatchJobs and applies completed results to
+    CodeSymbol.documentation in bulk. Called by poll_and_process_completed_batches_task.
+    """
+    jobs = DocstringBatchJob.objects.filter(status__in=['validating', 'in_progress', 'finalizing'])
+    for job in jobs:
+        try:
+            openai_batch = call_openai("batch_api", get_openai_client().batches.retrieve, job.batch_id)
+            job.status = openai_batch.status
+            job.openai_metadata = openai_batch.to_dict()
+            job.save(update_fields=['status', 'openai_metadata', 'updated_at'])
+
+            if openai_batch.status == 'completed':
+                output_file_id = openai_batch.output_file_id
+                if not output_file_id:
+                    raise Exception("Batch job completed but no output_file_id was provided by OpenAI.")
+                output_data = call_openai("batch_api", get_openai_client().files.content, output_file_id, timeout=settings.HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS).read().decode('utf-8')
+
+                raw_docstrings, call_logs = {}, []
+                for line in output_data.splitlines():
+                    if not line.strip():
+                        continue
+                    try:
+                        result_item = json.loads(line)
+                        custom_id = result_item.get('custom_id') or ''
+                        if result_item.get('error') or not custom_id.startswith('symbol-'):
+                            continue
+                        body = result_item['response']['body']
+                        usage = body.get('usage') or {}
+                        call_logs.append(call_log(
+                            "docstring", body.get('model') or '', symbol_id=int(custom_id.split('-')[1]),
+                            prompt_tokens=usage.get('prompt_tokens', 0), completion_tokens=usage.get('completion_tokens', 0),
+                            batch=True,
+                        ))
+                        content = body['choices'][0]['message']['content']
+                        if content:
+                            raw_docstrings[int(custom_id.split('-')[1])] = content
+                    except (json.JSONDecodeError, IndexError, KeyError, TypeError, ValueError) as e:
+                        print(f"DOCSTRING_BATCH_POLL: [Job {job.id}] Parse error - {e}")
+                LLMCallLog.objects.bulk_create(call_logs, batch_size=1000)
+
+                # Only symbols whose code is unchanged since submission get the result.
+                symbols = [
+                    symbol for symbol in _symbols_for_docstring_results(raw_docstrings)
+                    if job.content_hashes.get(str(symbol.id)) == symbol.content_hash
+                ]
+                docstrings = {symbol_id: clean_docstring(content) for symbol_id, content in raw_docstrings.items()}
+                with transaction.atomic():
+                    updated = save_generated_docstrings(symbols, docstrings)
+
+                # Make the answers available to later synchronous requests with the
+                # same prompt, keyed by the request exactly as it was submitted.
+                try:
+                    submitted = _docstring_batch_requests(job)
+                except Exception as e:
+                    print(f"DOCSTRING_BATCH_POLL: [Job {job.id}] Could not read the input file; results not cached - {e}")
+                    submitted = {}
+                for symbol_id, content in raw_docstrings.items():
+                    body = submitted.get(symbol_id)
+                    if body:
+                        store_completion(
+                            content, "docstring", "v1",
+                            model=body['model'], messages=body['messages'], max_tokens=body['max_tokens']
+                        )
+
+                job.output_file_id = output_file_id
+                job.error_file_id = openai_batch.error_file_id
+                job.succeeded_count = len(updated)
+                job.failed_count = job.item_count - len(updated)
+                job.status = EmbeddingBatchJob.JobStatus.RESULTS_PROCESSED
+                job.completed_at = timezone.now()
+                job.save()
+                print(f"DOCSTRING_BATCH_POLL: [Job {job.id}] Applied {len(updated)}/{job.item_count} docstrings.")
+                _maybe_finish_docstring_workflow(job.repository_id, job.module_path, job.workflow_task_id)
+
+            elif openai_batch.status in ['failed', 'expired', 'cancelled']:
+                job.error_details = json.dumps(openai_batch.errors.to_dict()) if openai_batch.errors else f"Job terminated with status: {openai_batch.status}"
+                job.failed_count = job.item_count
+                job.completed_at = timezone.now()
+                job.save()
+                _maybe_finish_docstring_workflow(job.repository_id, job.module_path, job.workflow_task_id)
+
+        except Exception as e:
+            print(f"DOCSTRING_BATCH_POLL: ERROR - Job {job.id}: {e}")
+            job.status = EmbeddingBatchJob.JobStatus.RESULTS_FAILED_TO_PROCESS
+            job.error_details = str(e)
+            job.completed_at = timezone.now()
+            job.save()
+            _maybe_finish_docstring_workflow(job.repository_id, job.module_path, job.workflow_task_id)
+
+
+def _docstring_batch_requests(job: DocstringBatchJob) -> dict[int, dict]:
+    """{symbol_id: request body} of a job, read back from its submitted input file."""
+    input_data = call_openai("batch_api", get_openai_client().files.content, job.input_file_id,
+                             timeout=settings.HELIX_OPENAI_UPLOAD_TIMEOUT_SECONDS).read().decode('utf-8')
+    requests_by_symbol = {}
+    for line in input_data.splitlines():
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            requests_by_symbol[int(request['custom_id'].split('-')[1])] = request['body']
+        except (json.JSONDecodeError, IndexError, KeyError, TypeError, ValueError) as e:
+            print(f"DOCSTRING_BATCH_POLL: [Job {job.id}] Input parse error - {e}")
+    return requests_by_symbol
+
+
+def _symbols_for_docstring_results(symbol_ids) -> list[CodeSymbol]:
+    return list(CodeSymbol.objects.filter(id__in=list(symbol_ids)).select_related(
+        'code_class__code_file__repository', 'code_file__repository'
+    ))
 from .models import ModuleDependency
     
 @app.task
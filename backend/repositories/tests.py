@@ -1,3 +1,192 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import usage
+from .chunking import source_chunks, split_lines, statement_boundaries
+from .models import CodeFile, CodeSymbol, KnowledgeChunk, Organization, Repository
+
+
+def _word_count(text: str) -> int:
+    # Deterministic stand-in for the tokenizer: one token per word.
+    return len(text.split())
+
+
+@mock.patch('repositories.chunking.count_tokens', _word_count)
+class SplitLinesTests(SimpleTestCase):
+    def assertSlicesMatchLines(self, text, slices, start_line):
+        lines = text.splitlines(keepends=True)
+        for slice_text, first_line, last_line in slices:
+            self.assertEqual(slice_text, "".join(lines[first_line - start_line:last_line - start_line + 1]))
+
+    def test_text_within_budget_is_one_slice(self):
+        text = "a b\nc d\n"
+        self.assertEqual(split_lines(text, start_line=7, max_tokens=10, overlap_tokens=0), [(text, 7, 8)])
+
+    def test_empty_text_has_no_slices(self):
+        self.assertEqual(split_lines("", max_tokens=10, overlap_tokens=0), [])
+
+    def test_single_line_over_budget_gets_its_own_slice(self):
+        text = "w w w w w\nx\ny\n"
+        slices = split_lines(text, start_line=1, max_tokens=3, overlap_tokens=0)
+        self.assertEqual(slices, [("w w w w w\n", 1, 1), ("x\ny\n", 2, 3)])
+
+    def test_slices_fill_the_budget_without_boundaries(self):
+        text = "a\nb\nc\nd\n"
+        slices = split_lines(text, start_line=1, max_tokens=2, overlap_tokens=0)
+        self.assertEqual(slices, [("a\nb\n", 1, 2), ("c\nd\n", 3, 4)])
+
+    def test_overlap_always_advances(self):
+        text = "a\nb\nc\nd\n"
+        # An overlap budget larger than a whole slice must not stall the loop.
+        slices = split_lines(text, start_line=1, max_tokens=2, overlap_tokens=100)
+        self.assertEqual(slices, [("a\nb\n", 1, 2), ("b\nc\n", 2, 3), ("c\nd\n", 3, 4)])
+
+    def test_overlap_carries_trailing_lines(self):
+        text = "a\nb\nc\nd\ne\nf\n"
+        slices = split_lines(text, start_line=1, max_tokens=3, overlap_tokens=1)
+        self.assertEqual([(first, last) for _, first, last in slices], [(1, 3), (3, 5), (5, 6)])
+        self.assertSlicesMatchLines(text, slices, 1)
+
+    def test_slices_end_before_a_boundary(self):
+        text = "l0\nl1\nl2\nl3\nl4\n"
+        slices = split_lines(text, start_line=10, max_tokens=3, overlap_tokens=0, boundaries={0, 2})
+        self.assertEqual(slices, [("l0\nl1\n", 10, 11), ("l2\nl3\nl4\n", 12, 14)])
+
+    def test_line_ranges_are_offset_by_start_line(self):
+        text = "".join(f"line {i} here\n" for i in range(20))
+        slices = split_lines(text, start_line=41, max_tokens=10, overlap_tokens=3)
+        self.assertEqual(slices[0][1], 41)
+        self.assertEqual(slices[-1][2], 60)
+        self.assertSlicesMatchLines(text, slices, 41)
+        starts = [first for _, first, _ in slices]
+        self.assertEqual(starts, sorted(set(starts)))
+
+
+class StatementBoundariesTests(SimpleTestCase):
+    def test_statements_at_any_depth(self):
+        source = "def f():\n    a = 1\n    if a:\n        b = 2\n    return a\n"
+        self.assertEqual(statement_boundaries(source), {0, 1, 2, 3, 4})
+
+    def test_indented_method_source_is_dedented(self):
+        source = "    def g(self):\n        x = 1\n\n        return x\n"
+        self.assertEqual(statement_boundaries(source), {0, 1, 3})
+
+    def test_invalid_source_falls_back_to_blank_lines_and_dedents(self):
+        source = "x = (\n    1,\n\ny = 2\n"
+        self.assertEqual(statement_boundaries(source), {0, 3})
+
+
+@mock.patch('repositories.chunking.count_tokens', _word_count)
+@override_settings(HELIX_CHUNK_MAX_TOKENS=10, HELIX_CHUNK_PACK_MAX_TOKENS=4, HELIX_CHUNK_OVERLAP_TOKENS=0)
+class SourceChunksTests(SimpleTestCase):
+    def setUp(self):
+        self.repo = Repository(id=1)
+        self.file_a = CodeFile(id=1, repository=self.repo, file_path="a.py")
+        self.file_b = CodeFile(id=2, repository=self.repo, file_path="b.py")
+
+    def symbol(self, symbol_id, code_file, start_line, end_line):
+        return CodeSymbol(id=symbol_id, name=f"s{symbol_id}", code_file=code_file,
+                          start_line=start_line, end_line=end_line)
+
+    def test_small_symbols_are_packed_within_a_file_only(self):
+        s1 = self.symbol(1, self.file_a, 1, 1)
+        s2 = self.symbol(2, self.file_a, 3, 3)
+        s3 = self.symbol(3, self.file_b, 1, 1)
+        chunks = source_chunks(self.repo, [(s3, "e f"), (s2, "c d"), (s1, "a b")])
+
+        self.assertEqual(len(chunks), 2)
+        packed, single = chunks
+        self.assertIsNone(packed.related_symbol)
+        self.assertEqual(packed.related_file, self.file_a)
+        self.assertEqual((packed.start_line, packed.end_line), (1, 3))
+        self.assertIn("'s1', 's2'", packed.content)
+        self.assertEqual(single.related_symbol, s3)
+        self.assertEqual(single.related_file, self.file_b)
+        self.assertEqual((single.start_line, single.end_line), (1, 1))
+
+    @override_settings(HELIX_CHUNK_MAX_TOKENS=5)
+    def test_pack_is_flushed_when_the_budget_is_used_up(self):
+        symbols = [self.symbol(i, self.file_a, i, i) for i in (1, 2, 3)]
+        chunks = source_chunks(self.repo, [(symbol, "x y") for symbol in symbols])
+        self.assertEqual([(c.start_line, c.end_line) for c in chunks], [(1, 2), (3, 3)])
+        self.assertEqual(chunks[1].related_symbol, symbols[2])
+
+    def test_long_symbol_is_split_with_line_ranges(self):
+        small = self.symbol(1, self.file_b, 1, 1)
+        large = self.symbol(2, self.file_b, 10, 13)
+        source = "w w w w\nw w w w\nw w w w\nw w w w\n"
+        chunks = source_chunks(self.repo, [(large, source), (small, "a b")])
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0].related_symbol, small)
+        parts = chunks[1:]
+        self.assertEqual([(c.start_line, c.end_line) for c in parts], [(10, 11), (12, 13)])
+        self.assertTrue(all(c.related_symbol == large for c in parts))
+        self.assertIn("(lines 10-11, part 1/2)", parts[0].content)
+        self.assertIn("(lines 12-13, part 2/2)", parts[1].content)
+        self.assertTrue(all(c.chunk_type == KnowledgeChunk.ChunkType.SYMBOL_SOURCE for c in chunks))
+
+
+class _FakeRedis:
+    """The handful of Redis commands flush_usage uses, over dicts."""
+    def __init__(self, values=None, sets=None):
+        self.values = values or {}
+        self.sets = sets or {}
+
+    def spop(self, key, count):
+        members = self.sets.get(key, set())
+        popped = [members.pop() for _ in range(min(count, len(members)))]
+        return popped or None
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+
+class FlushUsageTests(TestCase):
+    now = datetime.datetime(2026, 10, 20, 12, 0, tzinfo=datetime.timezone.utc)
+    october = datetime.date(2026, 10, 1)
+    september = datetime.date(2026, 9, 1)
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create_user(username="owner", password="x")
+
+    def organization(self, last_usage_reset, used=0):
+        return Organization.objects.create(
+            name="Acme", owner=self.owner, ai_requests_this_month=used, last_usage_reset=last_usage_reset
+        )
+
+    def flush(self, month, counts):
+        client = _FakeRedis(
+            values={usage._counter_key(month, org_id): str(count).encode() for org_id, count in counts.items()},
+            sets={usage._dirty_key(month): {str(org_id).encode() for org_id in counts}},
+        )
+        with mock.patch.object(usage, '_redis', return_value=client), \
+                mock.patch.object(usage.timezone, 'now', return_value=self.now):
+            return usage.flush_usage()
+
+    def test_organization_created_mid_month_is_flushed(self):
+        org = self.organization(datetime.date(2026, 10, 15))
+        self.assertEqual(self.flush(self.october, {org.id: 7}), 1)
+        org.refresh_from_db()
+        self.assertEqual(org.ai_requests_this_month, 7)
+        self.assertEqual(org.last_usage_reset, self.october)
+
+    def test_previous_month_is_flushed_for_organization_created_in_it(self):
+        org = self.organization(datetime.date(2026, 9, 20))
+        self.assertEqual(self.flush(self.september, {org.id: 4}), 1)
+        org.refresh_from_db()
+        self.assertEqual(org.ai_requests_this_month, 4)
+        self.assertEqual(org.last_usage_reset, self.september)
+
+    def test_previous_month_never_overwrites_a_newer_count(self):
+        org = self.organization(self.october, used=2)
+        self.assertEqual(self.flush(self.september, {org.id: 40}), 0)
+        org.refresh_from_db()
+        self.assertEqual(org.ai_requests_this_month, 2)
+        self.assertEqual(org.last_usage_reset, self.october)
@@ -0,0 +1,182 @@
+# backend/repositories/usage.py
+"""
+Monthly AI request quotas per organization, metered in Redis.
+
+Each organization has one counter per calendar month (UTC), e.g.
+helix:usage:2026-10:org:7. A Lua script checks the limit and increments the
+counter in one atomic step, so concurrent requests never lose an increment
+or overshoot the limit, and a request costs one Redis round trip instead of
+a read and a write of the Organization row. A new month simply starts a new
+key, which is the monthly reset.
+
+Organization.ai_requests_this_month stays the durable copy: flush_usage()
+(run by Celery beat) writes the counters of organizations that made requests
+since the last flush back to the database, and a month's counter that is
+missing in Redis (first request of the month, or Redis was flushed) is
+seeded from the database before it is used. If Redis cannot be reached, the
+check falls back to a single conditional UPDATE of the Organization row.
+"""
+import datetime
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Organization, Repository
+
+_KEY_PREFIX = "helix:usage:"
+# Counters outlive their month long enough for the last flush to read them.
+_COUNTER_TTL_SECONDS = 40 * 24 * 3600
+
+# KEYS[1] = the month's counter, KEYS[2] = the month's set of unflushed orgs.
+# ARGV[1] = the limit, ARGV[2] = the organization id.
+# Returns {1, count} if the request was counted, {0, count} if the limit is
+# reached, or {-1, 0} if the counter has to be seeded first.
+_CONSUME_SCRIPT = """
+local used = redis.call('GET', KEYS[1])
+if not used then
+    return {-1, 0}
+end
+used = tonumber(used)
+if used >= tonumber(ARGV[1]) then
+    return {0, used}
+end
+used = redis.call('INCR', KEYS[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return {1, used}
+"""
+
+_client = None
+_script = None
+_client_lock = threading.Lock()
+
+
+def _redis():
+    global _client, _script
+    with _client_lock:
+        if _client is None:
+            import redis
+            _client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1.0, socket_connect_timeout=1.0)
+            _script = _client.register_script(_CONSUME_SCRIPT)
+        return _client
+
+
+def _month_start(now: datetime.datetime | None = None) -> datetime.date:
+    now = now or timezone.now()
+    return now.astimezone(datetime.timezone.utc).date().replace(day=1)
+
+
+def _counter_key(month: datetime.date, org_id: int) -> str:
+    return f"{_KEY_PREFIX}{month:%Y-%m}:org:{org_id}"
+
+
+def _dirty_key(month: datetime.date) -> str:
+    return f"{_KEY_PREFIX}{month:%Y-%m}:dirty"
+
+
+def _previous_month(month: datetime.date) -> datetime.date:
+    return (month - datetime.timedelta(days=1)).replace(day=1)
+
+
+def _next_month(month: datetime.date) -> datetime.date:
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def organization_quota(org_id: int | None = None, repo_id: int | None = None) -> tuple[int, int] | None:
+    """
+    (organization id, monthly limit) for an organization or for the
+    organization owning a repository, cached for HELIX_USAGE_QUOTA_CACHE_SECONDS.
+    None if neither is given; raises DoesNotExist for unknown ids.
+    """
+    if org_id:
+        cache_key = f"{_KEY_PREFIX}quota:org:{org_id}"
+    elif repo_id:
+        cache_key = f"{_KEY_PREFIX}quota:repo:{repo_id}"
+    else:
+        return None
+    quota = cache.get(cache_key)
+    if quota is None:
+        if org_id:
+            quota = tuple(Organization.objects.values_list('id', 'ai_requests_limit').get(id=org_id))
+        else:
+            quota = tuple(
+                Repository.objects.values_list('organization_id', 'organization__ai_requests_limit').get(id=repo_id)
+            )
+        cache.set(cache_key, quota, settings.HELIX_USAGE_QUOTA_CACHE_SECONDS)
+    return quota
+
+
+def _seed_counter(client, month: datetime.date, org_id: int):
+    """Starts the month's counter from the database (0 if the stored count is from an earlier month)."""
+    used, last_reset = Organization.objects.values_list('ai_requests_this_month', 'last_usage_reset').get(id=org_id)
+    seed = used if last_reset is not None and last_reset >= month else 0
+    client.set(_counter_key(month, org_id), seed, nx=True, ex=_COUNTER_TTL_SECONDS)
+
+
+def _consume_in_database(org_id: int, month: datetime.date) -> bool:
+    """Fallback without Redis: one conditional UPDATE that resets a stale month and counts the request."""
+    Organization.objects.filter(id=org_id, last_usage_reset__lt=month).update(
+        ai_requests_this_month=0, last_usage_reset=month
+    )
+    return bool(
+        Organization.objects.filter(id=org_id, ai_requests_this_month__lt=F('ai_requests_limit')).update(
+            ai_requests_this_month=F('ai_requests_this_month') + 1
+        )
+    )
+
+
+def consume(org_id: int, limit: int) -> bool:
+    """Counts one AI request for the organization; False (and nothing counted) if it is at its monthly limit."""
+    month = _month_start()
+    try:
+        client = _redis()
+        keys = [_counter_key(month, org_id), _dirty_key(month)]
+        for _ in range(2):
+            allowed, _used = _script(keys=keys, args=[limit, org_id])
+            if allowed != -1:
+                return allowed == 1
+            _seed_counter(client, month, org_id)
+        return False
+    except Organization.DoesNotExist:
+        raise
+    except Exception as e:
+        print(f"USAGE: Redis unavailable for organization {org_id} ({e}); counting in the database.")
+        return _consume_in_database(org_id, month)
+
+
+def flush_usage() -> int:
+    """
+    Writes the Redis counters of organizations that made requests since the
+    last flush to Organization.ai_requests_this_month. The previous month is
+    flushed too, so the requests of a month's last minutes are not lost, but
+    it never overwrites a count that already belongs to a newer month.
+    Returns the number of organizations written.
+    """
+    client = _redis()
+    current = _month_start()
+    written = 0
+    for month in (_previous_month(current), current):
+        dirty_key = _dirty_key(month)
+        while True:
+            org_ids = client.spop(dirty_key, 500)
+            if not org_ids:
+                break
+            counters = client.mget([_counter_key(month, int(org_id)) for org_id in org_ids])
+            try:
+                for org_id, count in zip(org_ids, counters):
+                    if count is None:
+                        continue
+                    # last_usage_reset is the creation date until the first flush, so
+                    # compare against the next month's start, not this one's.
+                    written += Organization.objects.filter(
+                        id=int(org_id), last_usage_reset__lt=_next_month(month)
+                    ).update(
+                        ai_requests_this_month=int(count), last_usage_reset=month
+                    )
+            except Exception:
+                # Put the batch back so the next flush retries it.
+                client.sadd(dirty_key, *org_ids)
+                raise
+    return written
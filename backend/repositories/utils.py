@@ -1,5 +1,6 @@
 # backend/repositories/utils.py
 import os
+import re
 from typing import TYPE_CHECKING
 
 # Import your models and settings
@@ -61,4 +62,20 @@ def get_source_for_symbol(symbol_obj: 'CodeSymbol') -> str:
             
     except Exception as e:
         print(f"ERROR_UTIL: Error reading file for {symbol_obj.unique_id or symbol_obj.name}: {e}")
-        return f"# Error reading file: {e}"
\ No newline at end of file
+        return f"# Error reading file: {e}"
+
+# These mirror the `helix_identifier_words` SQL function (migration 0038).
+_ACRONYM_BOUNDARY = re.compile(r'([A-Z]+)([A-Z][a-z])')
+_CAMEL_BOUNDARY = re.compile(r'([a-z0-9])([A-Z])')
+_NON_ALNUM = re.compile(r'[^A-Za-z0-9]+')
+
+
+def identifier_words(text: str) -> list[str]:
+    """
+    Splits text into lowercase words the same way the full-text index does:
+    CamelCase boundaries are split and every non-alphanumeric run separates
+    words, so `getUserName`, `get_user_name` and `GET-USER-NAME` all give
+    ['get', 'user', 'name'].
+    """
+    text = _CAMEL_BOUNDARY.sub(r'\1 \2', _ACRONYM_BOUNDARY.sub(r'\1 \2', text))
+    return [word.lower() for word in _NON_ALNUM.split(text) if word]
@@ -0,0 +1,348 @@
+# backend/repositories/vector_store.py
+"""
+Per-repository, memory-mapped embedding matrices for exact brute-force search.
+
+For repositories with at most HELIX_VECTOR_STORE_MAX_ROWS embedded rows, a
+NumPy matrix-vector product over a contiguous float32 matrix is both faster
+and more accurate than an HNSW query with a repository post-filter. Each
+repository gets one matrix per kind ("chunks" for KnowledgeChunk, "symbols"
+for CodeSymbol) under HELIX_VECTOR_STORE_DIR:
+
+    <dir>/<repo_id>/<kind>.json          manifest (generation, row count, capacity)
+    <dir>/<repo_id>/<kind>.g<N>.vectors  float32 [capacity, dims]
+    <dir>/<repo_id>/<kind>.g<N>.ids      int64 [capacity]
+    <dir>/<repo_id>/<kind>.g<N>.sqnorms  float32 [capacity], squared row norms
+    <dir>/<repo_id>/<kind>.g<N>.types    int8 [capacity], chunk type codes
+
+Files are opened read-only with np.memmap, so every web and worker process on
+the host shares the same pages through the OS page cache.
+
+Each kind of store is versioned by its own generation counter on the
+repository (GENERATION_FIELDS), which is bumped whenever embeddings of that
+kind change. When new embeddings land, the
+worker that stored them patches the matrix in place and advances the
+manifest; any other change (deletions, a full re-index) leaves the manifest
+behind the database, and the store is rebuilt in the background while
+searches fall back to SQL.
+"""
+import fcntl
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .embeddings import EMBEDDING_DIMENSIONS
+from .models import CodeSymbol, KnowledgeChunk, Repository
+
+STORE_KINDS = {
+    "chunks": KnowledgeChunk,
+    "symbols": CodeSymbol,
+}
+GENERATION_FIELDS = {
+    "chunks": "chunk_embedding_generation",
+    "symbols": "symbol_embedding_generation",
+}
+# Stored in the matrices' "types" column; codes must never be reassigned.
+CHUNK_TYPE_CODES = {
+    KnowledgeChunk.ChunkType.MODULE_README: 0,
+    KnowledgeChunk.ChunkType.CLASS_SUMMARY: 1,
+    KnowledgeChunk.ChunkType.SYMBOL_DOCSTRING: 2,
+    KnowledgeChunk.ChunkType.SYMBOL_SOURCE: 3,
+}
+
+
+def _store_dir(repo_id: int) -> str:
+    return os.path.join(settings.HELIX_VECTOR_STORE_DIR, str(int(repo_id)))
+
+
+def _path(repo_id: int, name: str) -> str:
+    return os.path.join(_store_dir(repo_id), name)
+
+
+def _read_manifest(repo_id: int, kind: str) -> dict | None:
+    try:
+        with open(_path(repo_id, f"{kind}.json")) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_manifest(repo_id: int, kind: str, manifest: dict):
+    # Written to a temporary file and renamed, so readers never see a partial manifest.
+    target = _path(repo_id, f"{kind}.json")
+    tmp = f"{target}.tmp{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, target)
+
+
+class _StoreLock:
+    """Exclusive per-(repository, kind) file lock held while a store is written."""
+    def __init__(self, repo_id: int, kind: str):
+        os.makedirs(_store_dir(repo_id), exist_ok=True)
+        self.path = _path(repo_id, f"{kind}.lock")
+
+    def __enter__(self):
+        self.handle = open(self.path, "w")
+        fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+
+def _array_files(repo_id: int, kind: str, files_generation: int) -> dict:
+    prefix = _path(repo_id, f"{kind}.g{files_generation}")
+    return {name: f"{prefix}.{name}" for name in ("vectors", "ids", "sqnorms", "types")}
+
+
+def _map_arrays(repo_id: int, kind: str, manifest: dict, mode: str) -> dict:
+    files = _array_files(repo_id, kind, manifest["files_generation"])
+    capacity, dims = manifest["capacity"], manifest["dims"]
+    return {
+        "vectors": np.memmap(files["vectors"], dtype=np.float32, mode=mode, shape=(capacity, dims)),
+        "ids": np.memmap(files["ids"], dtype=np.int64, mode=mode, shape=(capacity,)),
+        "sqnorms": np.memmap(files["sqnorms"], dtype=np.float32, mode=mode, shape=(capacity,)),
+        "types": np.memmap(files["types"], dtype=np.int8, mode=mode, shape=(capacity,)),
+    }
+
+
+class VectorStore:
+    """A read-only view of one repository's matrix at a given generation."""
+    def __init__(self, manifest: dict, arrays: dict):
+        self.generation = manifest["generation"]
+        self.count = manifest["count"]
+        self.vectors = arrays["vectors"]
+        self.ids = arrays["ids"]
+        self.sqnorms = arrays["sqnorms"]
+        self.types = arrays["types"]
+
+    def search(self, query_embedding, k: int, type_codes=None) -> list[tuple[int, float]]:
+        """
+        Exact L2 top-k over the matrix, optionally restricted to rows whose
+        chunk type code is in `type_codes`. Returns (id, distance) tuples.
+        """
+        if not self.count or k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2
+        squared = self.sqnorms[:self.count] - 2.0 * (self.vectors[:self.count] @ query) + float(query @ query)
+        if type_codes is not None:
+            squared = np.where(np.isin(self.types[:self.count], list(type_codes)), squared, np.inf)
+        k = min(k, self.count)
+        top = np.argpartition(squared, k - 1)[:k]
+        top = top[np.argsort(squared[top])]
+        return [
+            (int(self.ids[row]), float(np.sqrt(max(squared[row], 0.0))))
+            for row in top if np.isfinite(squared[row])
+        ]
+
+
+# Per-process cache of mapped stores: (repo_id, kind) -> (manifest mtime, manifest, arrays)
+_mapped: dict = {}
+
+
+def get_store(repo_id: int, kind: str, generation: int) -> VectorStore | None:
+    """Returns the repository's store if it is current for `generation`, otherwise None."""
+    manifest_path = _path(repo_id, f"{kind}.json")
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _mapped.get((repo_id, kind))
+    if cached is None or cached[0] != mtime:
+        manifest = _read_manifest(repo_id, kind)
+        if manifest is None:
+            return None
+        arrays = None
+        if not manifest.get("too_large"):
+            if cached and cached[2] is not None and cached[1].get("files_generation") == manifest["files_generation"] \
+                    and cached[1].get("capacity") == manifest["capacity"]:
+                arrays = cached[2]
+            else:
+                try:
+                    arrays = _map_arrays(repo_id, kind, manifest, mode="r")
+                except (FileNotFoundError, ValueError):
+                    return None
+        cached = (mtime, manifest, arrays)
+        _mapped[(repo_id, kind)] = cached
+    _, manifest, arrays = cached
+    if manifest.get("too_large") or manifest["generation"] != generation:
+        return None
+    return VectorStore(manifest, arrays)
+
+
+def is_too_large(repo_id: int, kind: str, generation: int) -> bool:
+    manifest = _read_manifest(repo_id, kind)
+    return bool(manifest and manifest.get("too_large") and manifest["generation"] == generation)
+
+
+def _rows(repo_id: int, kind: str):
+    model = STORE_KINDS[kind]
+    queryset = model.objects.filter(repository_id=repo_id, embedding__isnull=False).order_by('id')
+    if kind == "chunks":
+        return queryset.values_list('id', 'embedding', 'chunk_type')
+    return queryset.values_list('id', 'embedding')
+
+
+def build_store(repo_id: int, kind: str) -> bool:
+    """
+    (Re)builds a repository's matrix for the current embedding generation.
+    Returns True if a store exists afterwards; repositories above
+    HELIX_VECTOR_STORE_MAX_ROWS are recorded as too large instead.
+    """
+    with _StoreLock(repo_id, kind):
+        generation = Repository.objects.filter(id=repo_id).values_list(GENERATION_FIELDS[kind], flat=True).first()
+        if generation is None:
+            return False
+        manifest = _read_manifest(repo_id, kind)
+        if manifest and manifest["generation"] == generation:
+            return not manifest.get("too_large")
+
+        count = STORE_KINDS[kind].objects.filter(repository_id=repo_id, embedding__isnull=False).count()
+        if count > settings.HELIX_VECTOR_STORE_MAX_ROWS:
+            _write_manifest(repo_id, kind, {"generation": generation, "too_large": True, "count": count})
+            _remove_stale_files(repo_id, kind, keep=None)
+            return False
+
+        # Leave room for incremental appends before a rebuild is needed.
+        capacity = max(int(count * 1.25), count + 1024)
+        new_manifest = {
+            "generation": generation, "files_generation": generation,
+            "count": 0, "capacity": capacity, "dims": EMBEDDING_DIMENSIONS,
+        }
+        files = _array_files(repo_id, kind, generation)
+        for name, path in files.items():
+            if os.path.exists(path):
+                os.remove(path)
+        arrays = _map_arrays(repo_id, kind, new_manifest, mode="w+")
+        row = 0
+        for values in _rows(repo_id, kind).iterator(chunk_size=2000):
+            if row >= capacity:
+                break  # Rows embedded during the build; the next generation picks them up.
+            vector = np.asarray(values[1], dtype=np.float32)
+            arrays["ids"][row] = values[0]
+            arrays["vectors"][row] = vector
+            arrays["sqnorms"][row] = float(vector @ vector)
+            arrays["types"][row] = CHUNK_TYPE_CODES.get(values[2], -1) if kind == "chunks" else 0
+            row += 1
+        for array in arrays.values():
+            array.flush()
+        new_manifest["count"] = row
+        _write_manifest(repo_id, kind, new_manifest)
+        _remove_stale_files(repo_id, kind, keep=generation)
+    print(f"VECTOR_STORE: Built {kind} matrix for repo {repo_id} (generation {generation}, {row} rows).")
+    return True
+
+
+def _remove_stale_files(repo_id: int, kind: str, keep: int | None):
+    """
+    Deletes array files of other generations. Processes that still map them
+    keep reading the old pages until they notice the new manifest.
+    """
+    keep_files = set(_array_files(repo_id, kind, keep).values()) if keep is not None else set()
+    directory = _store_dir(repo_id)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(f"{kind}.g") and path not in keep_files:
+            os.remove(path)
+
+
+def apply_updates(repo_id: int, kind: str, updates: dict, previous_generation: int, new_generation: int) -> bool:
+    """
+    Patches {pk: vector} into the repository's matrix in place and advances
+    its manifest to `new_generation`, provided the store was current for
+    `previous_generation` and has room for the new rows. Otherwise the store
+    is left behind and will be rebuilt. Returns True if the store was patched.
+    """
+    if not os.path.exists(_path(repo_id, f"{kind}.json")):
+        return False
+    with _StoreLock(repo_id, kind):
+        manifest = _read_manifest(repo_id, kind)
+        if not manifest or manifest.get("too_large") or manifest["generation"] != previous_generation:
+            return False
+        arrays = _map_arrays(repo_id, kind, manifest, mode="r+")
+        count = manifest["count"]
+        row_of = {int(pk): row for row, pk in enumerate(arrays["ids"][:count])}
+        new_ids = [pk for pk in updates if pk not in row_of]
+        if count + len(new_ids) > manifest["capacity"]:
+            return False
+
+        types = {}
+        if kind == "chunks" and new_ids:
+            types = dict(KnowledgeChunk.objects.filter(id__in=new_ids).values_list('id', 'chunk_type'))
+        for pk, vector in updates.items():
+            row = row_of.get(pk)
+            if row is None:
+                row = count
+                count += 1
+                arrays["ids"][row] = pk
+                arrays["types"][row] = CHUNK_TYPE_CODES.get(types.get(pk), -1) if kind == "chunks" else 0
+            vector = np.asarray(vector, dtype=np.float32)
+            arrays["vectors"][row] = vector
+            arrays["sqnorms"][row] = float(vector @ vector)
+        for array in arrays.values():
+            array.flush()
+        manifest.update({"generation": new_generation, "count": count})
+        _write_manifest(repo_id, kind, manifest)
+    return True
+
+
+def bump_generation(repo_ids, kinds=tuple(STORE_KINDS)) -> dict[int, dict[str, int]]:
+    """
+    Increments the repositories' generation of each store kind in `kinds`
+    and returns {repo_id: {kind: new generation}}.
+    """
+    repo_ids = [int(r) for r in repo_ids if r is not None]
+    if not repo_ids:
+        return {}
+    fields = [GENERATION_FIELDS[kind] for kind in kinds]
+    with transaction.atomic():
+        Repository.objects.filter(id__in=repo_ids).update(**{field: F(field) + 1 for field in fields})
+        return {
+            row[0]: dict(zip(kinds, row[1:]))
+            for row in Repository.objects.filter(id__in=repo_ids).values_list('id', *fields)
+        }
+
+
+def record_embedding_updates(kind: str, updates_by_repo: dict):
+    """
+    Called when embeddings of `kind` are stored: bumps each repository's
+    generation of that kind and, once the transaction commits, patches its
+    on-disk matrices. The other kind's stores stay current.
+    """
+    generations = bump_generation(updates_by_repo.keys(), kinds=(kind,))
+    for repo_id, kind_generations in generations.items():
+        updates = updates_by_repo[repo_id]
+        new_generation = kind_generations[kind]
+        transaction.on_commit(
+            lambda repo_id=repo_id, updates=updates, new_generation=new_generation:
+                apply_updates(repo_id, kind, updates, new_generation - 1, new_generation)
+        )
+
+
+def stores_for_search(repo_ids, kind: str) -> dict:
+    """
+    Returns {repo_id: VectorStore} for the repositories whose store is current,
+    in a single query. Missing or stale stores of small-enough repositories are
+    rebuilt in the background; their searches fall back to SQL meanwhile.
+    """
+    if not settings.HELIX_VECTOR_STORE_ENABLED:
+        return {}
+    generations = Repository.objects.filter(id__in=list(repo_ids)).values_list('id', GENERATION_FIELDS[kind])
+    stores = {}
+    for repo_id, generation in generations:
+        store = get_store(repo_id, kind, generation)
+        if store is not None:
+            stores[repo_id] = store
+        elif not is_too_large(repo_id, kind, generation):
+            # One build request per generation; the task itself is idempotent.
+            if cache.add(f"vector_store_build:{repo_id}:{kind}:{generation}", True, timeout=600):
+                from .tasks import build_vector_store_task  # Imported here to avoid a circular import.
+                build_vector_store_task.delay(repo_id=repo_id, kind=kind)
+    return stores
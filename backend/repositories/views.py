@@ -7,11 +7,17 @@ from django.core.files.storage import default_storage
 from rest_framework.parsers import MultiPartParser, FormParser
 import uuid
 from .permissions import IsMemberOfOrganization
+from .access import accessible_repository_ids, can_access_repository, is_organization_member
+from .context_packs import SymbolContext, bump_context_generation, symbol_contexts
 from .tasks import calculate_documentation_coverage_task, create_documentation_pr_task,batch_generate_docstrings_task, parse_coverage_report_task # We will create this task soon
+from .tasks import refresh_symbol_knowledge_task
+from .org_search import search_organization
+from .model_router import route as route_call
+from .llm_client import get_openai_client
 from django.utils.decorators import method_decorator
 from rest_framework import viewsets
 from .models import CodeFile, CodeSymbol as CodeFunction, Repository, CodeSymbol,CodeDependency,AsyncTaskStatus, Notification,CodeClass,Insight, TestCoverageReport, Organization, OrganizationMember
-from .ai_services import generate_class_summary_stream, generate_module_readme_stream,generate_refactor_stream, generate_refactoring_suggestions # 03c03c03c NEW IMPORT
+from .ai_services import generate_refactoring_suggestions # 03c03c03c NEW IMPORT
 from .tasks import process_repository # Import the Celery task
 import json
 from .serializers import CodeSymbolSerializer, DashboardRepositorySerializer, DetailedOrganizationSerializer, GraphLinkSerializer, RepositorySerializer,RepositoryDetailSerializer,NotificationSerializer, SymbolAnalysisSerializer, TestCoverageReportSerializer
@@ -30,7 +36,6 @@ from .tasks import create_docs_pr_for_file_task
 from .tasks import batch_generate_docstrings_for_files_task, create_pr_for_multiple_files_task # We'll define these tasks next
 from .diagram_utils import generate_react_flow_data
 from openai import OpenAI as OpenAIClient # Renaming to avoid conflict if you have an 'OpenAI' model
-from pgvector.django import L2Distance # Or CosineDistance, MaxInnerProduct
 from .serializers import CodeSymbolSerializer,AsyncTaskStatusSerializer,InsightSerializer # We can reuse this for results
 import os
 from .models import ModuleDependency
@@ -41,8 +46,6 @@ from django.contrib.auth import get_user_model
 User = get_user_model() # <--- 2. Call the function to get the active User model
 
 REPO_CACHE_BASE_PATH = "/var/repos" # Use the same constant
-OPENAI_CLIENT_INSTANCE = OpenAIClient()
-OPENAI_EMBEDDING_MODEL_FOR_SEARCH = "text-embedding-3-small"
 from django.db import connection  # For debugging SQL queries
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -265,7 +268,7 @@ class FileContentView(APIView):
             # CodeFile -> Repository -> Organization -> OrganizationMember -> User
             code_file = CodeFile.objects.get(
                 id=file_id,
-                repository__organization__memberships__user=request.user
+                repository_id__in=accessible_repository_ids(request.user)
             )
         except CodeFile.DoesNotExist:
             return Response(
@@ -284,154 +287,55 @@ class FileContentView(APIView):
             # We could trigger a re-index here in a real product.
             return Response({"error": "File not found in cache."}, status=404)
             
-def openai_stream_generator(prompt: str, openai_client_instance: OpenAIClient | None):
-    if not openai_client_instance:
-        print("STREAM_GEN: OpenAI client not available in generator.")
-        yield "// Error: OpenAI service not configured for streaming.\n"
-        return
-    
-    # print(f"DEBUG_AI_PROMPT (Contextual Stream - in generator):\n{prompt}\n--------------------") # Moved from view
-
-    try:
-        stream = openai_client_instance.chat.completions.create(
-            model="gpt-4o-mini", # Fixed model name
-            messages=[
-                {"role": "system", "content": "You are a helpful AI programming assistant specialized in writing Python docstrings."},
-                {"role": "user", "content": prompt} # The full prompt is now constructed in the view
-            ],
-            stream=True,
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        error_message = f"// Error during OpenAI stream: {str(e)}\n"
-        print(f"STREAM_GEN: {error_message}")
-        yield error_message
-def get_source_for_symbol_from_view(symbol_obj: CodeSymbol) -> str | None:
-    actual_code_file = None
-    if symbol_obj.code_file:
-        actual_code_file = symbol_obj.code_file
-    elif symbol_obj.code_class and symbol_obj.code_class.code_file:
-        actual_code_file = symbol_obj.code_class.code_file
-    else:
-        print(f"ERROR_HELPER_VIEW: Symbol {symbol_obj.id} ({symbol_obj.name}) has no associated CodeFile.")
-        return None
-
-    if not REPO_CACHE_BASE_PATH:
-        print("ERROR_HELPER_VIEW: REPO_CACHE_BASE_PATH is not defined.")
-        return None
-
-    repo_path_for_file = os.path.join(REPO_CACHE_BASE_PATH, str(actual_code_file.repository.id))
-    full_file_path_for_file = os.path.join(repo_path_for_file, actual_code_file.file_path)
-
-    if os.path.exists(full_file_path_for_file):
-        try:
-            with open(full_file_path_for_file, 'r', encoding='utf-8', errors='ignore') as f:
-                lines = f.readlines()
-            if symbol_obj.start_line > 0 and \
-               symbol_obj.end_line >= symbol_obj.start_line and \
-               symbol_obj.end_line <= len(lines):
-                symbol_code_lines = lines[symbol_obj.start_line - 1 : symbol_obj.end_line]
-                return "".join(symbol_code_lines)
-            else:
-                print(f"WARNING_HELPER_VIEW: Invalid line numbers for {symbol_obj.unique_id or symbol_obj.name}")
-                return f"# Error: Invalid line numbers ({symbol_obj.start_line}-{symbol_obj.end_line})."
-        except Exception as e:
-            print(f"ERROR_HELPER_VIEW: Error reading file for {symbol_obj.unique_id or symbol_obj.name}: {e}")
-            return f"# Error reading file: {e}"
-    else:
-        print(f"WARNING_HELPER_VIEW: File not found in cache for {symbol_obj.unique_id or symbol_obj.name}: {full_file_path_for_file}")
-        return "# Error: Source file not found in cache."
-    return None
-
-@method_decorator(csrf_exempt, name='dispatch')
-class GenerateDocstringView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get(self, request, *args, **kwargs):
-        function_id = kwargs.get('function_id') # Assuming URL uses 'function_id'
-        print(f"VIEW_GEN_DOC: Request for symbol_id={function_id}, user={request.user.username}")
-
-        # --- Initialize OpenAI Client ---
-        openai_client = OPENAI_CLIENT_INSTANCE
-        
-        # If client init fails critically, it's better to stop and inform.
-        if not openai_client:
-             # Return a non-streaming error response
-            return Response({"error": "OpenAI service not available or not configured."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+def docstring_stream_request(prompt: str, symbol: CodeSymbol | None = None, context: SymbolContext | None = None) -> dict:
+    """Builds the (a)cached_chat_stream arguments that generate a docstring from `prompt`."""
+    route = route_call("docstring_stream", symbol, context.fan_in, context.fan_out) if context else \
+        route_call("docstring_stream", symbol)
+    return {
+        "kind": "docstring_stream",
+        "prompt_version": "v1",
+        "model": route.model,
+        "messages": [
+            {"role": "system", "content": "You are a helpful AI programming assistant specialized in writing Python docstrings."},
+            {"role": "user", "content": prompt} # The full prompt is built by docstring_stream_prompt
+        ],
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
+
+def docstring_stream_prompt(context: SymbolContext) -> str:
+    """Builds the docstring prompt for a symbol from its context pack, with its callers and callees as context."""
+    callers_names = context.callers[:3] # Limit for prompt
+    callees_names = context.callees[:3] # Limit for prompt
+    symbol_file_path_for_prompt = context.file_path
+    function_code = context.source_code
+
+    print(f"VIEW_GEN_DOC: Context for '{context.name}': Callers: {callers_names}, Callees: {callees_names}, File: {symbol_file_path_for_prompt}")
+
+    # --- Construct the full prompt with context ---
+    context_parts = []
+    if callers_names:
+        context_parts.append(f"it is called by: {', '.join(callers_names)}{'...' if len(callers_names) > 3 else ''}") # Though already sliced
+    if callees_names:
+        context_parts.append(f"it calls: {', '.join(callees_names)}{'...' if len(callees_names) > 3 else ''}")
 
-        try:
-            # Your existing Q filter for ownership check
-            q_filter = Q(id=function_id) & (
-                Q(code_file__repository__organization__memberships__user=request.user) | 
-                Q(code_class__code_file__repository__organization__memberships__user=request.user)
-            )
-            code_symbol_obj = CodeSymbol.objects.select_related(
-                'code_file__repository', 
-                'code_class__code_file__repository'
-            ).get(q_filter)
-            print(f"VIEW_GEN_DOC: Successfully fetched symbol '{code_symbol_obj.name}' (ID: {code_symbol_obj.id}).")
+    context_str_for_prompt = ""
+    if context_parts:
+        context_str_for_prompt = f"\n\nFor context, this symbol " + " and ".join(context_parts) + "."
 
-        except CodeSymbol.DoesNotExist:
-            print(f"VIEW_GEN_DOC: Symbol with ID {function_id} not found or permission denied for user {request.user.username}.")
-            return Response({"error": "Symbol not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            print(f"VIEW_GEN_DOC: Error fetching symbol {function_id}: {e}")
-            return Response({"error": "Internal server error fetching symbol."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Your original prompt structure, now with added context
+    prompt = (
+        f"You are an expert Python programmer. Your task is to write a concise, professional, "
+        f"Google-style docstring for the Python symbol named '{context.name}' located in file '{symbol_file_path_for_prompt}'. "
+        f"Do not include the function/method signature itself, only the docstring content inside triple quotes. "
+        f"Start with a one-line summary. Then, if applicable, describe arguments and what it returns."
+        f"{context_str_for_prompt}\n\n"
+        f"Here is the source code for '{context.name}':\n"
+        f"```python\n{function_code}\n```\n"
+        f"Generate only the docstring content:"
+    )
+    return prompt
 
-        # --- Fetch symbol's source code ---
-        # (Using the corrected variable name `code_symbol_obj` from your provided code)
-        function_code = get_source_for_symbol_from_view(code_symbol_obj) # Use your helper
-        
-        if not function_code or function_code.startswith("# Error:"):
-            error_msg = function_code or "Could not retrieve source code for the symbol."
-            print(f"VIEW_GEN_DOC: {error_msg} for symbol {code_symbol_obj.name}")
-            # Return non-streaming error
-            return Response({"error": error_msg}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # --- NEW: Fetch Callers and Callees for Context ---
-        callers_qs = CodeDependency.objects.filter(callee=code_symbol_obj).select_related('caller')[:3] # Limit for prompt
-        callees_qs = CodeDependency.objects.filter(caller=code_symbol_obj).select_related('callee')[:3] # Limit for prompt
-        
-        callers_names = [dep.caller.name for dep in callers_qs]
-        callees_names = [dep.callee.name for dep in callees_qs]
-        
-        symbol_file_path_for_prompt = "N/A"
-        actual_code_file = code_symbol_obj.code_file or (code_symbol_obj.code_class and code_symbol_obj.code_class.code_file)
-        if actual_code_file:
-            symbol_file_path_for_prompt = actual_code_file.file_path
-        
-        print(f"VIEW_GEN_DOC: Context for '{code_symbol_obj.name}': Callers: {callers_names}, Callees: {callees_names}, File: {symbol_file_path_for_prompt}")
-
-        # --- Construct the full prompt with context ---
-        context_parts = []
-        if callers_names:
-            context_parts.append(f"it is called by: {', '.join(callers_names)}{'...' if len(callers_names) > 3 else ''}") # Though already sliced
-        if callees_names:
-            context_parts.append(f"it calls: {', '.join(callees_names)}{'...' if len(callees_names) > 3 else ''}")
-        
-        context_str_for_prompt = ""
-        if context_parts:
-            context_str_for_prompt = f"\n\nFor context, this symbol " + " and ".join(context_parts) + "."
-
-        # Your original prompt structure, now with added context
-        prompt = (
-            f"You are an expert Python programmer. Your task is to write a concise, professional, "
-            f"Google-style docstring for the Python symbol named '{code_symbol_obj.name}' located in file '{symbol_file_path_for_prompt}'. "
-            f"Do not include the function/method signature itself, only the docstring content inside triple quotes. "
-            f"Start with a one-line summary. Then, if applicable, describe arguments and what it returns."
-            f"{context_str_for_prompt}\n\n"
-            f"Here is the source code for '{code_symbol_obj.name}':\n"
-            f"```python\n{function_code}\n```\n"
-            f"Generate only the docstring content:"
-        )
-        
-        # --- Stream the Response using the generator ---
-        # Pass the initialized openai_client to the generator
-        response_stream = openai_stream_generator(prompt, openai_client) 
-        return StreamingHttpResponse(response_stream, content_type='text/plain; charset=utf-8')
 class SaveDocstringView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -442,18 +346,15 @@ class SaveDocstringView(APIView):
 
         try:
             q_filter = Q(id=symbol_id) & (
-                Q(code_file__repository__organization__memberships__user=request.user) | 
-                Q(code_class__code_file__repository__organization__memberships__user=request.user)
+                Q(code_file__repository_id__in=accessible_repository_ids(request.user)) | 
+                Q(code_class__code_file__repository_id__in=accessible_repository_ids(request.user))
             )
             symbol = CodeSymbol.objects.select_related( # Select related for serializer efficiency
                 'code_file__repository', 
                 'code_class__code_file__repository'
             ).get(q_filter)
             repo = symbol.code_file.repository if symbol.code_file else symbol.code_class.code_file.repository
-            is_member = OrganizationMember.objects.filter(
-                organization=repo.organization,
-                user=request.user
-            ).exists()
+            is_member = can_access_repository(request.user, repo.id)
 
             if not is_member:
                  return Response({"error": "Permission denied. You are not a member of this repository's organization."}, status=status.HTTP_403_FORBIDDEN)
@@ -494,10 +395,13 @@ class SaveDocstringView(APIView):
 
         try:
             symbol.save(update_fields=update_fields_list)
+            bump_context_generation([repo.id]) # Prompt context packs include documentation
             # Serialize the updated symbol to send back to the frontend
             # This ensures the frontend gets the latest hashes and status
             serializer = CodeSymbolSerializer(symbol) 
             calculate_documentation_coverage_task.delay(repo.id)
+            # Re-embed the symbol and its docstring chunk so search reflects the edit within seconds.
+            refresh_symbol_knowledge_task.delay(symbol.id)
             print(f"VIEW_SAVE_DOC: Successfully saved documentation and status for symbol {symbol.id}")
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:
@@ -516,10 +420,13 @@ class CodeSymbolDetailView(generics.RetrieveAPIView):
         # This queryset ensures a user can only ever access symbols
         # that belong to repositories they own.
         return CodeSymbol.objects.filter(
-            Q(code_file__repository__organization__memberships__user=self.request.user) |
-            Q(code_class__code_file__repository__organization__memberships__user=self.request.user)
+            Q(code_file__repository_id__in=accessible_repository_ids(self.request.user)) |
+            Q(code_class__code_file__repository_id__in=accessible_repository_ids(self.request.user))
         ).distinct()
 
+from .embeddings import get_embedding_provider
+from .retrieval import looks_like_identifier, search_symbols, search_symbols_by_name
+
 class SemanticSearchView(generics.ListAPIView):
     serializer_class = CodeSymbolSerializer # We'll return a list of matching symbols
     permission_classes = [permissions.IsAuthenticated]
@@ -531,27 +438,84 @@ class SemanticSearchView(generics.ListAPIView):
             return CodeSymbol.objects.none() # Return empty if no query
 
         try:
-            # 1. Get the embedding for the search query from OpenAI
-            response = OPENAI_CLIENT_INSTANCE.embeddings.create(
-                input=query_text,
-                model=OPENAI_EMBEDDING_MODEL_FOR_SEARCH
-            )
-            query_embedding = response.data[0].embedding
-
-            user_repos = Repository.objects.filter(user=self.request.user)
-
-            similar_symbols = CodeSymbol.objects.filter(
-                Q(code_file__repository__in=user_repos) | Q(code_class__code_file__repository__in=user_repos)
-            ).annotate(
-                distance=L2Distance('embedding', query_embedding)
-            ).order_by('distance')[:5] # Get top 10 results
-
+            # Restrict the search to repositories the user can access, optionally
+            # narrowed down to a single repository via ?repo_id=.
+            repo_ids = sorted(accessible_repository_ids(self.request.user))
+            repo_id = self.request.query_params.get('repo_id')
+            if repo_id:
+                repo_ids = [repo_id_ for repo_id_ in repo_ids if str(repo_id_) == repo_id]
+
+            # 1. Exact-name lookups are answered from the name index without an embedding call.
+            hits = search_symbols_by_name(repo_ids, query_text, limit=5) if looks_like_identifier(query_text) else []
+
+            if not hits:
+                # 2. Embed the search query with the configured provider
+                query_embedding = get_embedding_provider().embed_query(query_text)
+
+                # 3. Repository-scoped ANN search on the symbol HNSW index(es).
+                hits = search_symbols(repo_ids, query_embedding, limit=5)
+            symbols_by_id = CodeSymbol.objects.in_bulk([symbol_id for symbol_id, _ in hits])
+
+            similar_symbols = []
+            for symbol_id, distance in hits:
+                symbol = symbols_by_id.get(symbol_id)
+                if symbol:
+                    symbol.distance = distance
+                    similar_symbols.append(symbol)
             return similar_symbols
 
         except Exception as e:
             print(f"Error during semantic search: {e}")
             return CodeSymbol.objects.none()
 
+
+class OrganizationSemanticSearchView(APIView):
+    """
+    Semantic search across every repository of an organization.
+    GET /organizations/<org_id>/search/semantic/?q=...&limit=10
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, org_id, *args, **kwargs):
+        query_text = request.query_params.get('q', '').strip()
+        if not query_text:
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+        if not is_organization_member(request.user, org_id):
+            raise Http404
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({"error": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        repo_ids = list(Repository.objects.filter(organization_id=org_id).values_list('id', flat=True))
+        result = search_organization(repo_ids, query_text, limit=limit)
+
+        symbols_by_id = CodeSymbol.objects.select_related(
+            'repository', 'code_file', 'code_class__code_file'
+        ).in_bulk([symbol_id for _, symbol_id, _ in result["hits"]])
+        results = []
+        for repo_id, symbol_id, distance in result["hits"]:
+            symbol = symbols_by_id.get(symbol_id)
+            if not symbol:
+                continue
+            code_file = symbol.code_file or (symbol.code_class and symbol.code_class.code_file)
+            results.append({
+                "id": symbol.id,
+                "name": symbol.name,
+                "unique_id": symbol.unique_id,
+                "repository": {"id": repo_id, "full_name": symbol.repository.full_name if symbol.repository else None},
+                "file_path": code_file.file_path if code_file else None,
+                "start_line": symbol.start_line,
+                "end_line": symbol.end_line,
+                "distance": distance,
+            })
+        return Response({
+            "results": results,
+            "repositories_searched": len(result["searched"]),
+            "repositories_timed_out": result["timed_out"],
+            "repositories_failed": result["failed"],
+        })
+
 from .tasks import create_documentation_pr_task
 from django.core.exceptions import PermissionDenied
 
@@ -578,7 +542,7 @@ class CreateDocPRView(APIView):
                 raise PermissionDenied("Symbol is not associated with a repository.")
 
             # 3. Check if the user is a member of that organization
-            if not OrganizationMember.objects.filter(organization=org, user=request.user).exists():
+            if not is_organization_member(request.user, org.id):
                 raise PermissionDenied("You do not have permission to access this symbol.")
             # --- END FIX ---
 
@@ -620,7 +584,7 @@ class GenerateArchitectureDiagramView(APIView):
                 raise PermissionDenied("Symbol is not associated with a repository.")
 
             # 3. Check membership
-            if not OrganizationMember.objects.filter(organization=org, user=request.user).exists():
+            if not is_organization_member(request.user, org.id):
                 raise PermissionDenied("You do not have permission to access this symbol.")
         except CodeSymbol.DoesNotExist:
             return Response({"error": "Symbol not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
@@ -657,7 +621,7 @@ class BatchGenerateDocsForFileView(APIView):
             # Verify user has access to this code_file by checking ownership of the repository
             code_file_exists = CodeFile.objects.filter(
                 id=code_file_id,
-                repository__organization__memberships__user=request.user
+                repository_id__in=accessible_repository_ids(request.user)
             ).exists()
             if not code_file_exists:
                 print(f"Permission denied or file not found for file_id: {code_file_id}, user_id: {user_id}")
@@ -696,10 +660,7 @@ class CreateBatchDocsPRView(APIView):
             code_file = CodeFile.objects.select_related('repository__organization').get(id=code_file_id)
             
             # 2. Check if the current user is a member of that organization
-            is_member = OrganizationMember.objects.filter(
-                organization=code_file.repository.organization,
-                user=request.user
-            ).exists()
+            is_member = can_access_repository(request.user, code_file.repository_id)
 
             if not is_member:
                 # Raise a permission error if they are not a member
@@ -746,10 +707,7 @@ class BatchGenerateDocsForSelectedFilesView(APIView):
             repo = Repository.objects.get(id=repo_id)
 
             # 2. Check if the current user is a member of the repo's organization
-            is_member = OrganizationMember.objects.filter(
-                organization=repo.organization,
-                user=request.user
-            ).exists()
+            is_member = can_access_repository(request.user, repo.id)
 
             if not is_member:
                 raise PermissionDenied("You do not have permission to access this repository.")
@@ -803,10 +761,7 @@ class CreateBatchPRForSelectedFilesView(APIView):
         try:
             # --- THIS IS THE FIX (Identical to the previous view) ---
             repo = Repository.objects.get(id=repo_id)
-            is_member = OrganizationMember.objects.filter(
-                organization=repo.organization,
-                user=request.user
-            ).exists()
+            is_member = can_access_repository(request.user, repo.id)
             if not is_member:
                 raise PermissionDenied("You do not have permission to access this repository.")
             # --- END FIX ---
@@ -843,7 +798,7 @@ class TaskStatusView(APIView):
             # Fetch the task status, ensuring it belongs to the requesting user
             task_status = AsyncTaskStatus.objects.get(
                 task_id=task_id,
-                repository__organization__memberships__user=request.user
+                repository_id__in=accessible_repository_ids(request.user)
             )
             serializer = AsyncTaskStatusSerializer(task_status)
             return Response(serializer.data)
@@ -863,8 +818,8 @@ class ApproveDocstringView(APIView):
         try:
             # Ensure user owns the symbol
             q_filter = Q(id=symbol_id) & (
-                Q(code_file__repository__organization__memberships__user=request.user) | 
-                Q(code_class__code_file__repository__organization__memberships__user=request.user)
+                Q(code_file__repository_id__in=accessible_repository_ids(request.user)) | 
+                Q(code_class__code_file__repository_id__in=accessible_repository_ids(request.user))
             )
             symbol = CodeSymbol.objects.get(q_filter)
         except CodeSymbol.DoesNotExist:
@@ -896,6 +851,7 @@ class ApproveDocstringView(APIView):
 
         try:
             symbol.save(update_fields=['documentation', 'documentation_hash', 'documentation_status'])
+            bump_context_generation([symbol.repository_id]) # Prompt context packs include documentation
             serializer = CodeSymbolSerializer(symbol) # Assuming you have this serializer
             print(f"VIEW_APPROVE_DOC: Approved/updated doc for symbol {symbol.id}")
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -927,34 +883,24 @@ class MarkNotificationReadView(APIView):
         except Notification.DoesNotExist:
             return Response({"error": "Notification not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
 
-def generate_explanation_stream(
-    symbol_obj: CodeSymbol, 
-    source_code: str, 
-    openai_client: OpenAIClient
-):
+def explanation_request(symbol_obj: CodeSymbol, context: SymbolContext) -> dict:
     """
-    Generates a stream of text chunks for the code explanation.
+    Builds the (a)cached_chat_stream arguments for the code explanation from the symbol's context pack.
     """
-    callers_qs = CodeDependency.objects.filter(callee=symbol_obj).select_related('caller')[:3] # Limit for prompt
-    callees_qs = CodeDependency.objects.filter(caller=symbol_obj).select_related('callee')[:3] # Limit for prompt
-
-    callers_names = [dep.caller.name for dep in callers_qs]
-    callees_names = [dep.callee.name for dep in callees_qs]
-
-    symbol_file_path = symbol_obj.code_file.file_path if symbol_obj.code_file else \
-                       (symbol_obj.code_class.code_file.file_path if symbol_obj.code_class and symbol_obj.code_class.code_file else "N/A")
-    
-    symbol_kind = "method" if symbol_obj.code_class else "function"
+    callers_names = context.callers[:3] # Limit for prompt
+    callees_names = context.callees[:3] # Limit for prompt
+    symbol_file_path = context.file_path
+    symbol_kind = context.kind
+    source_code = context.source_code
 
     context_parts = []
     if callers_names:
         context_parts.append(f"- Is typically called by: {', '.join(callers_names)}")
     if callees_names:
         context_parts.append(f"- It calls the following: {', '.join(callees_names)}")
-    if symbol_obj.documentation and symbol_obj.documentation.strip():
+    if context.documentation:
         # Limit doc length for prompt
-        doc_preview = (symbol_obj.documentation[:200] + '...') if len(symbol_obj.documentation) > 200 else symbol_obj.documentation
-        context_parts.append(f"- Its existing documentation says: \"{doc_preview}\"")
+        context_parts.append(f"- Its existing documentation says: \"{context.doc_preview(200)}\"")
 
     context_str = ""
     if context_parts:
@@ -974,97 +920,33 @@ def generate_explanation_stream(
     
     print(f"DEBUG_EXPLAIN_PROMPT: For symbol {symbol_obj.id}\n{prompt}\n--------------------")
 
-    try:
-        stream = openai_client.chat.completions.create(
-            model="gpt-4.1-nano", # e.g., "gpt-3.5-turbo" or "gpt-4"
-            messages=[
-                {"role": "system", "content": "You are Helix, a helpful AI programming assistant that explains code clearly and concisely."},
-                {"role": "user", "content": prompt}
-            ],
-            stream=True,
-            temperature=0.3, # Lower temperature for more factual explanations
-            max_tokens=1000  # Adjust as needed for desired explanation length
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        error_message = f"// Helix encountered an error while generating the explanation: {str(e)}"
-        print(f"EXPLAIN_CODE_STREAM_ERROR: {error_message}")
-        # Stream error message in a way the frontend can parse if it expects text
-        # Or handle more gracefully if frontend expects structured errors
-        yield error_message
-
-@method_decorator(csrf_exempt, name='dispatch') # If using SessionAuth and POST
-class ExplainCodeView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request, symbol_id, *args, **kwargs): # Changed to POST as it's an action
-        print(f"VIEW_EXPLAIN_CODE: Request for symbol_id: {symbol_id} by user: {request.user.username}")
-
-        openai_client = OPENAI_CLIENT_INSTANCE
-
-        if not openai_client:
-            # Return a non-streaming error if client setup fails
-            return Response(
-                {"error": "Helix's explanation service is currently unavailable."}, 
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
-
-        try:
-            q_filter = Q(id=symbol_id) & (
-                Q(code_file__repository__organization__memberships__user=request.user) |
-                Q(code_class__code_file__repository__organization__memberships__user=request.user)
-            )
-            symbol_obj = CodeSymbol.objects.select_related(
-                'code_file__repository', 
-                'code_class__code_file__repository'
-            ).get(q_filter)
-        except CodeSymbol.DoesNotExist:
-            return Response(
-                {"error": "Symbol not found or permission denied."}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        source_code = symbol_obj.source_code # Use your existing helper
-        if not source_code or source_code.startswith("# Error:"):
-            error_msg = source_code if source_code else "Could not retrieve source code for the symbol."
-            print(f"VIEW_EXPLAIN_CODE: {error_msg} for symbol {symbol_obj.name}")
-            return Response({"error": error_msg}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Check if source_code is just an error message from the helper
-        if source_code.strip().startswith("# Error:"):
-             print(f"VIEW_EXPLAIN_CODE: Source code retrieval failed: {source_code} for symbol {symbol_obj.name}")
-             return Response({"error": f"Helix could not retrieve valid source code: {source_code}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        response_stream = generate_explanation_stream(symbol_obj, source_code, openai_client)
-        
-        # It's good practice to set appropriate headers for streaming
-        response = StreamingHttpResponse(response_stream, content_type='text/plain; charset=utf-8')
-        response['X-Accel-Buffering'] = 'no'  # Useful for Nginx to disable buffering
-        response['Cache-Control'] = 'no-cache'
-        return response
-    
-def generate_tests_stream(
-    symbol_obj: CodeSymbol,
-    source_code: str,
-    openai_client: OpenAIClient
-):
+    route = route_call("explanation", symbol_obj, context.fan_in, context.fan_out)
+    return {
+        "kind": "explanation",
+        "prompt_version": "v1",
+        "model": route.model,
+        "messages": [
+            {"role": "system", "content": "You are Helix, a helpful AI programming assistant that explains code clearly and concisely."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3, # Lower temperature for more factual explanations
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
+
+def tests_request(symbol_obj: CodeSymbol, context: SymbolContext) -> dict:
     """
-    Generates a stream of pytest code for the given symbol.
+    Builds the (a)cached_chat_stream arguments that suggest pytest code for the given symbol, from its context pack.
     """
-    symbol_file_path = symbol_obj.code_file.file_path if symbol_obj.code_file else \
-                       (symbol_obj.code_class.code_file.file_path if symbol_obj.code_class and symbol_obj.code_class.code_file else "N/A")
-    
-    symbol_kind = "method" if symbol_obj.code_class else "function"
-    
+    symbol_file_path = context.file_path
+    symbol_kind = context.kind
+    source_code = context.source_code
+
     context_parts = []
-    if symbol_obj.code_class:
-        context_parts.append(f"It is a method of the class `{symbol_obj.code_class.name}`.")
-    if symbol_obj.documentation and symbol_obj.documentation.strip():
-        doc_preview = (symbol_obj.documentation[:250] + '...') if len(symbol_obj.documentation) > 250 else symbol_obj.documentation
-        context_parts.append(f"Its documentation says: \"{doc_preview}\"")
+    if context.class_name:
+        context_parts.append(f"It is a method of the class `{context.class_name}`.")
+    if context.documentation:
+        context_parts.append(f"Its documentation says: \"{context.doc_preview(250)}\"")
 
     context_str = " ".join(context_parts)
 
@@ -1076,7 +958,7 @@ def generate_tests_stream(
         f"Instructions:\n"
         f"1. Focus on testing the 'happy path,' common edge cases (e.g., empty lists, zero, None values), and potential error conditions.\n"
         f"2. The generated code should be a single, complete Python code block. Do not add any explanation outside of the code block. Do not wrap it in ```python type markdown blocks.\n"
-        f"3. Assume necessary imports like `pytest` are available. For the code under test, assume it can be imported (e.g., `from {symbol_file_path.replace('.py', '').replace('/', '.')} import {symbol_obj.code_class.name if symbol_obj.code_class else symbol_obj.name}`).\n"
+        f"3. Assume necessary imports like `pytest` are available. For the code under test, assume it can be imported (e.g., `from {context.module_path} import {context.class_name or context.name}`).\n"
         f"4. If the function is a method of a class, show how to instantiate the class in the test.\n"
         f"5. Use clear and descriptive test function names, like `test_{symbol_obj.name}_[condition_being_tested]`.\n"
         f"6. Use `assert` statements to check for expected outcomes. For expected errors, use `pytest.raises`.\n\n"
@@ -1085,78 +967,48 @@ def generate_tests_stream(
 
     print(f"DEBUG_SUGGEST_TESTS_PROMPT: For symbol {symbol_obj.id}\n{prompt}\n--------------------")
 
-    try:
-        stream = openai_client.chat.completions.create(
-            model="gpt-4.1-mini", # "gpt-4-turbo-preview" is great for code
-            messages=[
-                {"role": "system", "content": "You are a helpful AI programming assistant that writes Python unit tests using pytest."},
-                {"role": "user", "content": prompt}
-            ],
-            stream=True,
-            temperature=0.4, # A bit of creativity for edge cases, but still factual
-            max_tokens=1500  # Allow for longer code blocks
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        error_message = f"// Helix encountered an error while generating test suggestions: {str(e)}"
-        print(f"SUGGEST_TESTS_STREAM_ERROR: {error_message}")
-        yield error_message
-
-# backend/repositories/ai_services.py
-# ... imports ...
-
-def generate_cohesive_tests_stream(
-    symbol_ids: list[int],
-    user: User,
-    openai_client: OpenAIClient
-):
+    route = route_call("test_suggestions", symbol_obj, context.fan_in, context.fan_out)
+    return {
+        "kind": "test_suggestions",
+        "prompt_version": "v1",
+        "model": route.model,
+        "messages": [
+            {"role": "system", "content": "You are a helpful AI programming assistant that writes Python unit tests using pytest."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.4, # A bit of creativity for edge cases, but still factual
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
+
+def cohesive_tests_request(symbols: list[CodeSymbol]) -> dict | None:
     """
-    Generates a single, cohesive pytest file for a list of symbols.
+    Builds the (a)cached_chat_stream arguments for a single, cohesive pytest file
+    covering the given symbols, or None if none of them has valid source.
     """
-    # 1. Fetch all symbols and perform a permission check
-    q_filter = Q(id__in=symbol_ids) & (
-        Q(code_file__repository__organization__memberships__user=user) |
-        Q(code_class__code_file__repository__organization__memberships__user=user)
-    )
-    symbols = CodeSymbol.objects.filter(q_filter).select_related('code_file', 'code_class')
-
-    if len(symbols) != len(symbol_ids):
-        yield "// Error: One or more symbols were not found or you do not have permission to access them."
-        return
-
-    # 2. Assemble the context blocks for the prompt
+    # 1. Assemble the context blocks for the prompt from the symbols' context packs
+    contexts = symbol_contexts(symbols)
     context_blocks = []
     import_paths = set()
-    file_path = symbols[0].code_file.file_path if symbols[0].code_file else symbols[0].code_class.code_file.file_path
+    file_path = contexts[symbols[0].id].file_path
 
     for symbol in symbols:
-        source_code = get_source_for_symbol_from_view(symbol)
-        if not source_code or source_code.strip().startswith("# Error:"):
+        context = contexts[symbol.id]
+        if not context.has_source:
             continue # Skip symbols we can't get source for
 
-        symbol_kind = "method" if symbol.code_class else "function"
         context_blocks.append(
-            f"--- Symbol: `{symbol.name}` ({symbol_kind}) ---\n"
-            f"Source Code:\n```python\n{source_code}\n```\n---"
+            f"--- Symbol: `{context.name}` ({context.kind}) ---\n"
+            f"Source Code:\n```python\n{context.source_code}\n```\n---"
         )
         
         # Collect necessary imports
-        module_path = symbol.code_file.file_path.replace('.py', '').replace('/', '.') if symbol.code_file else \
-                      symbol.code_class.code_file.file_path.replace('.py', '').replace('/', '.')
-        
-        if symbol.code_class:
-            import_paths.add(f"from {module_path} import {symbol.code_class.name}")
-        else:
-            import_paths.add(f"from {module_path} import {symbol.name}")
+        import_paths.add(f"from {context.module_path} import {context.class_name or context.name}")
 
     if not context_blocks:
-        yield "// Error: Could not retrieve source code for any of the selected symbols."
-        return
+        return None
 
-    # 3. Construct the final "Meta-Prompt"
+    # 2. Construct the final "Meta-Prompt"
     context_str = "\n\n".join(context_blocks)
     import_str = "\n".join(sorted(list(import_paths)))
 
@@ -1180,95 +1032,17 @@ def generate_cohesive_tests_stream(
 
     print(f"DEBUG_COHESIVE_TESTS_PROMPT:\n{final_prompt}\n--------------------")
 
-    # 4. Stream the response from the LLM
-    try:
-        stream = openai_client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[{"role": "user", "content": final_prompt}],
-            stream=True,
-            temperature=0.3
-        )
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                yield content
-    except Exception as e:
-        yield f"// Helix encountered an error: {str(e)}"
-
-# --- NEW VIEW CLASS ---
-@method_decorator(csrf_exempt, name='dispatch')
-class SuggestTestsView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request, symbol_id, *args, **kwargs):
-        print(f"VIEW_SUGGEST_TESTS: Request for symbol_id: {symbol_id} by user: {request.user.username}")
-
-        openai_client = OPENAI_CLIENT_INSTANCE
-        
-        if not openai_client:
-            return Response(
-                {"error": "Helix's AI service is currently unavailable."}, 
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
-
-        try:
-            q_filter = Q(id=symbol_id) & (
-                Q(code_file__repository__organization__memberships__user=request.user) |
-                Q(code_class__code_file__repository__organization__memberships__user=request.user)
-            )
-            symbol_obj = CodeSymbol.objects.select_related(
-                'code_file', 
-                'code_class'
-            ).get(q_filter)
-        except CodeSymbol.DoesNotExist:
-            return Response(
-                {"error": "Symbol not found or permission denied."}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        source_code = get_source_for_symbol_from_view(symbol_obj)
-        if not source_code or source_code.strip().startswith("# Error:"):
-            error_msg = source_code if source_code else "Could not retrieve source code for the symbol."
-            print(f"VIEW_SUGGEST_TESTS: {error_msg} for symbol {symbol_obj.name}")
-            return Response({"error": f"Helix could not retrieve valid source code: {source_code}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        response_stream = generate_tests_stream(symbol_obj, source_code, openai_client)
-        
-        response = StreamingHttpResponse(response_stream, content_type='text/plain; charset=utf-8')
-        response['X-Accel-Buffering'] = 'no'
-        response['Cache-Control'] = 'no-cache'
-        return response
-    
-@method_decorator(csrf_exempt, name='dispatch')
-class ClassSummaryView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request, class_id, *args, **kwargs):
-        print(f"VIEW_CLASS_SUMMARY: Request for class_id: {class_id} by user: {request.user.username}")
-
-        openai_client = OPENAI_CLIENT_INSTANCE
+    route = route_call("cohesive_tests")
+    return {
+        "kind": "cohesive_tests",
+        "prompt_version": "v1",
+        "model": route.model,
+        "messages": [{"role": "user", "content": final_prompt}],
+        "temperature": 0.3,
+        "max_tokens": route.max_tokens,
+        "route": route,
+    }
 
-        if not openai_client:
-            return Response({"error": "Helix's AI service is currently unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
-        try:
-            # Check ownership via the file the class belongs to
-            code_class_obj = CodeClass.objects.select_related(
-                'code_file__repository'
-            ).get(
-                id=class_id,
-                code_file__repository__organization__memberships__user=request.user
-            )
-        except CodeClass.DoesNotExist:
-            return Response({"error": "Class not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
-        
-        response_stream = generate_class_summary_stream(code_class_obj, openai_client)
-        
-        response = StreamingHttpResponse(response_stream, content_type='text/plain; charset=utf-8')
-        response['X-Accel-Buffering'] = 'no'
-        response['Cache-Control'] = 'no-cache'
-        return response
-    
 @method_decorator(csrf_exempt, name='dispatch')
 class ReprocessRepositoryView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -1283,7 +1057,7 @@ class ReprocessRepositoryView(APIView):
             # Ensure the user owns the repository they are trying to reprocess
             repo = Repository.objects.get(
                 id=repo_id, 
-                organization__memberships__user=request.user
+                id__in=accessible_repository_ids(request.user)
             )
         except Repository.DoesNotExist:
             return Response(
@@ -1327,10 +1101,7 @@ class RepositoryInsightsView(generics.ListAPIView):
         
         # --- THIS IS THE FIX ---
         # Change the permission check to use the new organization path.
-        is_member = Repository.objects.filter(
-            id=repo_id, 
-            organization__memberships__user=self.request.user
-        ).exists()
+        is_member = can_access_repository(self.request.user, repo_id)
 
         if not is_member:
             return Insight.objects.none() # Return empty queryset if no permission
@@ -1351,7 +1122,7 @@ class CommitHistoryView(APIView):
         try:
             repo = Repository.objects.get(
                 id=repo_id, 
-                organization__memberships__user=request.user
+                id__in=accessible_repository_ids(request.user)
             )
         except Repository.DoesNotExist:
             return Response(
@@ -1419,57 +1190,6 @@ class CommitHistoryView(APIView):
             print(f"VIEW_COMMIT_HISTORY: ERROR - {error_message}")
             return Response({"error": error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-from .ai_services import handle_chat_query_stream
-
-@method_decorator(csrf_exempt, name='dispatch')
-class ChatView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-    @method_decorator(check_usage_limit) # <--- APPLY DECORATOR
-
-    def post(self, request, repo_id, *args, **kwargs):
-        query = request.data.get('query')
-        # --- NEW: Get optional file_path context from the request ---
-        current_file_path = request.data.get('current_file_path')
-
-        if not query or not isinstance(query, str) or len(query.strip()) < 3:
-            return Response(
-                {"error": "A meaningful query string is required."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        print(f"CHAT_VIEW: Received query for repo {repo_id}: '{query}'. File context: '{current_file_path}'")
-
-        # The OPENAI_CLIENT check is no longer needed here as the service handles it
-        
-        try:
-            is_member = OrganizationMember.objects.filter(
-                organization__repositories__id=repo_id,
-                user=request.user
-            ).exists()
-
-            if not is_member:
-                # Raise a specific error to be caught below
-                raise Repository.DoesNotExist
-
-        except Repository.DoesNotExist: # This will catch the case where the repo doesn't exist at all
-            return Response(
-                {"error": "Repository not found or permission denied."}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        # Call the service function, now passing the file_path
-        response_stream = handle_chat_query_stream(
-            user_id=request.user.id,
-            repo_id=repo_id,
-            query=query.strip(),
-            file_path=current_file_path # Pass the context
-        )
-        
-        response = StreamingHttpResponse(response_stream, content_type='text/plain; charset=utf-8')
-        response['X-Accel-Buffering'] = 'no'
-        response['Cache-Control'] = 'no-cache'
-        return response
-    
 from .tasks import create_pr_with_changes_task # 03c03c03c NEW IMPORT
 import time
 @method_decorator(csrf_exempt, name='dispatch')
@@ -1518,39 +1238,6 @@ class ProposeChangeView(APIView):
             status=status.HTTP_202_ACCEPTED
         )
         
-@method_decorator(csrf_exempt, name='dispatch')
-class SummarizeModuleView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-    @method_decorator(check_usage_limit) # <--- APPLY DECORATOR
-
-    def post(self, request, repo_id, *args, **kwargs):
-        module_path = request.data.get('path')
-
-        if module_path is None or not isinstance(module_path, str):
-            return Response(
-                {"error": "A 'path' string for the module/directory is required."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        print(f"SUMMARIZE_MODULE_VIEW: Request for repo {repo_id}, path '{module_path}'")
-
-        if not OPENAI_CLIENT_INSTANCE:
-            return Response({"error": "Helix's AI service is currently unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
-        if not Repository.objects.filter(id=repo_id, user=request.user).exists():
-            return Response({"error": "Repository not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
-
-        response_stream = generate_module_readme_stream(
-            repo_id=repo_id,
-            module_path=module_path.strip(),
-            openai_client=OPENAI_CLIENT_INSTANCE
-        )
-        
-        response = StreamingHttpResponse(response_stream, content_type='text/plain; charset=utf-8')
-        response['X-Accel-Buffering'] = 'no'
-        response['Cache-Control'] = 'no-cache'
-        return response
-    
 @method_decorator(csrf_exempt, name='dispatch')
 class BatchDocumentModuleView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -1651,12 +1338,7 @@ class ModuleDocumentationView(APIView):
         # Instead, we check if the user is a member of the repository's organization.
         
         # This is a more explicit and secure way to check for permission.
-        is_member = OrganizationMember.objects.filter(
-            # Find a membership record...
-            user=request.user, 
-            # ...for the organization that owns the repository we're interested in.
-            organization__repositories__id=repo_id 
-        ).exists()
+        is_member = can_access_repository(request.user, repo_id)
 
         if not is_member:
             return Response({"error": "Repository not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
@@ -1681,10 +1363,7 @@ class GenerateModuleWorkflowView(APIView):
     def post(self, request, repo_id, *args, **kwargs):
         module_path = request.data.get('path', '')
 
-        is_member = OrganizationMember.objects.filter(
-            organization__repositories__id=repo_id, 
-            user=request.user
-        ).exists()
+        is_member = can_access_repository(request.user, repo_id)
 
         if not is_member:
             return Response({"error": "Repository not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
@@ -1708,10 +1387,7 @@ class DependencyGraphView(APIView):
         print(f"DEP_GRAPH_VIEW: Request for repo {repo_id}")
         
         try:
-            is_member = OrganizationMember.objects.filter(
-                organization__repositories__id=repo_id,
-                user=request.user
-            ).exists()
+            is_member = can_access_repository(request.user, repo_id)
 
             if not is_member:
                 raise PermissionDenied("You do not have permission to access this repository.")
@@ -2063,10 +1739,7 @@ class ComplexityHotspotsView(APIView):
         # 1. Check if a repository with the given ID exists AND
         # 2. if the current user is a member of the organization that owns that repository.
         # This is the new, correct permission check.
-        has_access = Repository.objects.filter(
-            id=repo_id,
-            organization__memberships__user=request.user
-        ).exists()
+        has_access = can_access_repository(request.user, repo_id)
 
         if not has_access:
             return Response({"error": "Repository not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
@@ -2107,10 +1780,7 @@ class OrphanSymbolsView(APIView):
         # --- THIS IS THE FIX ---
         # Use the correct, organization-based permission check to ensure the user
         # has access to the repository through their organization membership.
-        has_access = Repository.objects.filter(
-            id=repo_id,
-            organization__memberships__user=request.user
-        ).exists()
+        has_access = can_access_repository(request.user, repo_id)
 
         if not has_access:
             return Response({"error": "Repository not found or permission denied."}, status=status.HTTP_404_NOT_FOUND)
@@ -2135,7 +1805,7 @@ class CoverageUploadView(APIView):
         # Use the single, efficient query to check for existence and permission.
         repo = Repository.objects.filter(
             id=repo_id,
-            organization__memberships__user=request.user
+            id__in=accessible_repository_ids(request.user)
         ).first()
 
         # If the query returns nothing, the user either doesn't have permission
@@ -2169,7 +1839,7 @@ class LatestCoverageReportView(APIView):
         # This view is already correct.
         repo = Repository.objects.filter(
             id=repo_id,
-            organization__memberships__user=request.user
+            id__in=accessible_repository_ids(request.user)
         ).first()
 
         if not repo:
@@ -2184,27 +1854,6 @@ class LatestCoverageReportView(APIView):
         serializer = TestCoverageReportSerializer(latest_report)
         return Response(serializer.data)
     
-@method_decorator(csrf_exempt, name='dispatch')
-class CohesiveTestGenerationView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request, *args, **kwargs):
-        symbol_ids = request.data.get('symbol_ids')
-        if not isinstance(symbol_ids, list) or not symbol_ids:
-            return Response({"error": "A list of 'symbol_ids' is required."}, status=status.HTTP_400_BAD_REQUEST)
-
-        openai_client = OPENAI_CLIENT_INSTANCE
-        if not openai_client:
-            return Response({"error": "AI service unavailable."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
-        # We will create the new service function next
-        response_stream = generate_cohesive_tests_stream(symbol_ids, request.user, openai_client)
-        
-        response = StreamingHttpResponse(response_stream, content_type='text/plain; charset=utf-8')
-        response['X-Accel-Buffering'] = 'no'
-        response['Cache-Control'] = 'no-cache'
-        return response
-    
 from .tasks import run_tests_in_sandbox_task # Import our new task
 
 class RunTestsInSandboxView(APIView):
@@ -2315,14 +1964,14 @@ class SymbolAnalysisView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, symbol_id, *args, **kwargs):
-        openai_client = OPENAI_CLIENT_INSTANCE
+        openai_client = get_openai_client()
         try:
             # build one combined Q object: id must match, AND the user must belong to one of the two orgs
             lookup = (
                 Q(id=symbol_id) &
                 (
-                    Q(code_file__repository__organization__memberships__user=request.user) |
-                    Q(code_class__code_file__repository__organization__memberships__user=request.user)
+                    Q(code_file__repository_id__in=accessible_repository_ids(request.user)) |
+                    Q(code_class__code_file__repository_id__in=accessible_repository_ids(request.user))
                 )
             )
 
@@ -2341,41 +1990,6 @@ class SymbolAnalysisView(APIView):
         serializer = CodeSymbolSerializer(symbol) # Use the standard symbol serializer
         return Response(serializer.data)
     
-class SuggestRefactorsView(APIView):
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get(self, request, symbol_id, *args, **kwargs):
-        try:
-            # build one combined Q object: id must match, AND the user must belong to one of the two orgs
-            lookup = (
-                Q(id=symbol_id) &
-                (
-                    Q(code_file__repository__organization__memberships__user=request.user) |
-                    Q(code_class__code_file__repository__organization__memberships__user=request.user)
-                )
-            )
-
-            symbol = CodeSymbol.objects.select_related(
-                'code_file__repository__organization',
-                'code_class__code_file__repository__organization'
-            ).get(lookup)
-
-        except CodeSymbol.DoesNotExist:
-            return Response(
-                {"error": "Symbol not found or you do not have permission."},
-                status=status.HTTP_404_NOT_FOUND)
-
-        # Get the OpenAI client
-        client = OPENAI_CLIENT_INSTANCE # Or however you get your client
-        if not client:
-            return Response({"error": "AI service not configured."}, status=503)
-
-        # Use your existing streaming function
-        stream = generate_refactor_stream(symbol, client)
-        
-        # Return the generator as a streaming HTTP response
-        return StreamingHttpResponse(stream, content_type='text/plain; charset=utf-8')
-    
 from django.db.models import  FloatField
 from django.db.models.functions import Cast
 from .serializers import DocActionItemSerializer, FileCoverageStatSerializer
@@ -2385,7 +1999,7 @@ class DocumentationSummaryView(APIView):
 
     def get(self, request, repo_id, *args, **kwargs):
         try:
-            repo = Repository.objects.get(id=repo_id, organization__memberships__user=request.user)
+            repo = Repository.objects.get(id=repo_id, id__in=accessible_repository_ids(request.user))
         except Repository.DoesNotExist:
             return Response({"error": "Repository not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -2463,7 +2077,7 @@ class GenerateModuleReadmeView(APIView):
     def post(self, request, repo_id, *args, **kwargs):
         # 1. Permission Check: Ensure the user has access to this repository.
         try:
-            repo = Repository.objects.get(id=repo_id, organization__memberships__user=request.user)
+            repo = Repository.objects.get(id=repo_id, id__in=accessible_repository_ids(request.user))
         except Repository.DoesNotExist:
             return Response({"error": "Repository not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -2487,46 +2101,6 @@ class GenerateModuleReadmeView(APIView):
             status=status.HTTP_202_ACCEPTED
         )
 
-from django.views import View
-from django.contrib.auth.mixins import LoginRequiredMixin
-
-class StreamModuleReadmeView(LoginRequiredMixin, View):
-    
-    def get(self, request, repo_id, *args, **kwargs):
-        # Permission check (can be more robust, but this is a start)
-        if not Repository.objects.filter(id=repo_id, organization__memberships__user=request.user).exists():
-            # You can't return a DRF Response, so you'd handle errors differently
-            # For a stream, you might just close it or send an error event.
-            return StreamingHttpResponse(status=404)
-
-        module_path = request.GET.get('module_path', '').strip()
-        
-        # This is the generator function from your ai_services
-        stream_generator = generate_module_readme_stream(
-            repo_id=repo_id,
-            module_path=module_path,
-            openai_client=OPENAI_CLIENT_INSTANCE # Assuming OPENAI_CLIENT is globally available
-        )
-
-        def event_stream():
-            """A generator that yields Server-Sent Events."""
-            for chunk in stream_generator:
-                # Format the chunk as a Server-Sent Event (SSE)
-                data = json.dumps({"chunk": chunk})
-                yield f"data: {data}\n\n"
-                time.sleep(0.02) # Small sleep to prevent overwhelming the client
-            
-            # Signal the end of the stream
-            yield "event: end\n"
-            yield "data: {}\n\n"
-
-        # --- THIS IS THE KEY ---
-        # Return a StreamingHttpResponse with the correct content type
-        response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
-        response['Cache-Control'] = 'no-cache'
-        return response
-
-
 @method_decorator(csrf_exempt, name="dispatch")
 class LocalRepositoryUploadView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsMemberOfOrganization]